@@ -1,3 +1,29 @@
-from .dockerfile_parser import DockerfileParser
-from .ai_suggestor import GroqAISuggestor
-from .suggestion_parser import SuggestionParser
\ No newline at end of file
+import importlib
+
+# Submodules are imported on first attribute access, so `analysis.dockerfile_parser`
+# stays cheap for commands that never talk to the API (no requests, no dotenv)
+_EXPORTS = {
+    'DockerfileParser': '.dockerfile_parser',
+    'GroqAISuggestor': '.ai_suggestor',
+    'SuggestionParser': '.suggestion_parser',
+    'IncrementalSuggestionParser': '.suggestion_parser',
+    'ResponseCache': '.response_cache',
+    'GroqClient': '.groq_client',
+    'GroqAPIError': '.groq_client',
+    'KeywordAutomaton': '.keyword_matcher',
+    'DockerfileClusterIndex': '.similarity',
+    'project_suggestions': '.similarity',
+    'PromptBuilder': '.prompt_builder',
+    'count_tokens': '.prompt_builder',
+    'RuleEngine': '.rule_engine'
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -1,72 +1,474 @@
-import requests
 import os
 import json
-from dotenv import load_dotenv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from .dockerfile_parser import DockerfileParser
+from .groq_client import GroqClient, GroqAPIError
+from .prompt_builder import PromptBuilder, merge_sections, render_sections
+from .response_cache import ResponseCache
+from .rule_engine import RULES_VERSION, RuleEngine, prompt_notes
+from .similarity import DEFAULT_SIMILARITY_THRESHOLD, DockerfileClusterIndex, project_suggestions
+from .suggestion_parser import IncrementalSuggestionParser, SuggestionParser
 
-# Load environment variables from .env file
-load_dotenv()
+DEFAULT_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+_env_loaded = False
+
+
+def load_env():
+    """Load environment variables from .env once, when a suggestor is first created"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
 
 class GroqAISuggestor:
-    def __init__(self, api_key=None):
+    model = "llama-3.1-8b-instant"
+    temperature = 0.3
+
+    def __init__(self, api_key=None, api_url=None, cache=None, use_cache=True, client=None,
+                 hedge_after=None, requests_per_minute=30, prompt_builder=None, max_workers=8,
+                 tiered=True, rule_engine=None):
+        load_env()
         self.api_key = api_key or os.getenv('GROQ_API_KEY')
+        self.api_url = api_url or os.getenv('GROQ_API_URL', DEFAULT_API_URL)
         self.demo_mode = False
+        self.use_cache = use_cache and os.getenv('OPTIMIZER_NO_CACHE') != '1'
+        self.cache = cache
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.max_workers = max_workers
+        # Local rules answer first; the LLM is only asked about what they leave open
+        self.tiered = tiered
+        self.rule_engine = rule_engine or RuleEngine()
+        # Files settled per tier, plus the chat completions actually requested
+        self.tier_stats = {'files': 0, 'local_only': 0, 'cache_hits': 0, 'llm': 0, 'shared': 0, 'rules': 0, 'reused': 0,
+                           'llm_calls': 0}
+        self._tier_lock = threading.Lock()
         
         if not self.api_key:
-            print("⚠️  GROQ_API_KEY not found. Running in demo mode with sample suggestions.")
+            print("⚠️  GROQ_API_KEY not found. Running in demo mode with "
+                  f"{'local rule findings' if tiered else 'sample suggestions'}.")
             self.demo_mode = True
             return
         
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
-        self.headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
+        if self.use_cache and self.cache is None:
+            self.cache = ResponseCache()
+        
+        self.client = client or GroqClient(
+            self.api_key,
+            self.api_url,
+            hedge_after=hedge_after,
+            requests_per_minute=requests_per_minute
+        )
+    
+    def _request_params(self, max_tokens):
+        return {
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": max_tokens
+        }
+    
+    def signature(self):
+        """Everything besides the commands that changes an answer, for cache keys and stored results"""
+        return dict(self._request_params(None), prompt=self.prompt_builder.signature(),
+                    rules=RULES_VERSION if self.tiered else None)
+    
+    def _cache_key(self, commands):
+        if self.use_cache and self.cache is not None:
+            return ResponseCache.make_key(commands, self.signature())
+        return None
+    
+    def _complete(self, part):
+        """One chat completion for a prompt part; returns (content, call stats)"""
+        start = time.perf_counter()
+        result = self.client.chat({
+            "messages": [{"role": "user", "content": part['prompt']}],
+            **self._request_params(part['max_tokens'])
+        })
+        usage = result.get('usage') or {}
+        return result['choices'][0]['message']['content'], {
+            'part': part['label'],
+            'prompt_tokens': usage.get('prompt_tokens', part['prompt_tokens']),
+            'prompt_tokens_estimated': part['prompt_tokens'],
+            'completion_tokens': usage.get('completion_tokens'),
+            'max_tokens': part['max_tokens'],
+            'latency_seconds': round(time.perf_counter() - start, 4)
+        }
+    
+    def _map_reduce(self, parts):
+        """Analyze the parts of an over-budget Dockerfile concurrently and merge the parsed suggestions"""
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(parts))) as pool:
+            completed = list(pool.map(self._complete, parts))
+        structured = merge_sections([SuggestionParser.parse_ai_response(content) for content, _ in completed])
+        return render_sections(structured), structured, [call for _, call in completed]
+    
+    def _result(self, content, plan, calls, cached=False):
+        return {
+            "suggestions": content,
+            "source": "Groq Cloud",
+            "cached": cached,
+            "calls": calls,
+            "tokens_sent": sum(call['prompt_tokens'] for call in calls),
+            "compaction": plan['compaction']
+        }
+    
+    def _record_tier(self, tier, calls=0):
+        with self._tier_lock:
+            self.tier_stats['files'] += 1
+            self.tier_stats[tier] += 1
+            self.tier_stats['llm_calls'] += calls
+    
+    def tier_report(self):
+        """
+        How many files were settled by local rules, the response cache, an LLM
+        call or a cluster's answer; with per-stage analysis, by each stage's
+        own rules ('rules') or by suggestions kept from the previous run ('reused').
+        """
+        with self._tier_lock:
+            report = dict(self.tier_stats)
+        files = report['files']
+        report['without_network'] = sum(report[tier] for tier in ('local_only', 'cache_hits', 'shared', 'rules',
+                                                                   'reused'))
+        report['local_only_fraction'] = round(report['local_only'] / files, 4) if files else 0.0
+        report['without_network_fraction'] = round(report['without_network'] / files, 4) if files else 0.0
+        return report
+    
+    def _analyze_locally(self, commands):
+        """Rule findings, or None when tiering is off"""
+        return self.rule_engine.analyze(commands) if self.tiered else None
+    
+    def _local_result(self, analysis):
+        self._record_tier('local_only')
+        return {
+            "suggestions": render_sections(analysis['sections']),
+            "source": "Local rules",
+            "cached": False,
+            "structured": analysis['sections'],
+            "findings": analysis['findings'],
+            "open_questions": analysis['open_questions'],
+            "calls": [],
+            "tokens_sent": 0
         }
     
-    def get_suggestions(self, dockerfile_path):
-        if self.demo_mode:
+    @staticmethod
+    def _with_rules(result, analysis):
+        """
+        Put the rule findings in front of an LLM answer to the open questions.
+        The answer alone stays in `llm_suggestions`, for sharing within a cluster.
+        """
+        if analysis is None:
+            return result
+        result['llm_suggestions'] = result['suggestions']
+        structured = result.get('structured') or SuggestionParser.parse_ai_response(result['suggestions'])
+        result['structured'] = merge_sections([analysis['sections'], structured])
+        if analysis['findings']:
+            result['suggestions'] = render_sections(analysis['sections']) + '\n' + result['suggestions']
+        result['findings'] = analysis['findings']
+        result['open_questions'] = analysis['open_questions']
+        return result
+    
+    def get_suggestions(self, dockerfile_path, commands=None):
+        """
+        Get suggestions for a Dockerfile; pass `commands` to reuse an existing parse.
+        With tiering on, files the local rules fully decide never reach the API.
+        """
+        if self.demo_mode and not self.tiered:
             return self._get_demo_suggestions(dockerfile_path)
             
-        parser = DockerfileParser(dockerfile_path)
-        commands = parser.parse()
+        if commands is None:
+            commands = DockerfileParser(dockerfile_path).parse()
         
         if not commands:
-            return {"error": "No commands found in Dockerfile"}
+            return self._get_demo_suggestions(dockerfile_path) if self.demo_mode else \
+                {"error": "No commands found in Dockerfile"}
         
-        commands_text = "\n".join([cmd['original'] for cmd in commands])
+        analysis = self._analyze_locally(commands)
+        # Demo mode has no API to ask, so open questions stay open
+        if analysis is not None and (analysis['decided'] or self.demo_mode):
+            return self._local_result(analysis)
         
-        prompt = f"""
-        You are an expert Docker optimization specialist. Analyze this Dockerfile and provide specific optimization suggestions:
-
-        DOCKERFILE:
-        {commands_text}
-
-        Provide recommendations for smaller image size, faster build times, and better security.
-        Be specific and provide exact commands.
-        """
+        plan = self.prompt_builder.build(commands, prompt_notes(analysis) if analysis else '')
+        cache_key = self._cache_key(commands)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._record_tier('cache_hits')
+                return self._with_rules(self._result(cached, plan, [], cached=True), analysis)
         
         try:
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json={
-                    "model": "llama-3.1-8b-instant",  
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.3,
-                    "max_tokens": 800
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return {"suggestions": result['choices'][0]['message']['content'], "source": "Groq Cloud"}
+            if plan['map_reduce']:
+                content, structured, calls = self._map_reduce(plan['parts'])
             else:
-                return {"error": f"Groq API error: {response.status_code} - {response.text}"}
+                content, call = self._complete(plan['parts'][0])
+                structured, calls = None, [call]
+            if cache_key:
+                self.cache.set(cache_key, content)
+            self._record_tier('llm', len(calls))
+            result = self._result(content, plan, calls)
+            if structured is not None:
+                result['structured'] = structured
+            return self._with_rules(result, analysis)
                 
+        except GroqAPIError as e:
+            return {"error": str(e)}
         except Exception as e:
             return {"error": f"Request failed: {str(e)}"}
     
+    def get_suggestions_stream(self, dockerfile_path, commands=None, on_suggestion=None):
+        """
+        Stream the completion and categorize suggestions as each line arrives.
+        `on_suggestion(category, text)` is called for every suggestion as soon as it is parsed.
+        """
+        start = time.perf_counter()
+        timings = {'time_to_first_token': None, 'time_to_first_suggestion': None}
+        parser = IncrementalSuggestionParser()
+        
+        def _consume(chunk):
+            if timings['time_to_first_token'] is None:
+                timings['time_to_first_token'] = round(time.perf_counter() - start, 4)
+            for category, text in parser.feed(chunk):
+                _emit(category, text)
+        
+        def _emit(category, text):
+            if timings['time_to_first_suggestion'] is None:
+                timings['time_to_first_suggestion'] = round(time.perf_counter() - start, 4)
+            if on_suggestion:
+                on_suggestion(category, text)
+        
+        def _finish(result):
+            for category, text in parser.close():
+                _emit(category, text)
+            result['structured'] = parser.sections
+            result['total_time'] = round(time.perf_counter() - start, 4)
+            result.update(timings)
+            return result
+        
+        if commands is None and not (self.demo_mode and not self.tiered):
+            commands = DockerfileParser(dockerfile_path).parse()
+        
+        if self.demo_mode and not (self.tiered and commands):
+            result = self._get_demo_suggestions(dockerfile_path)
+            _consume(result['suggestions'])
+            return _finish(result)
+        
+        if not commands:
+            return {"error": "No commands found in Dockerfile"}
+        
+        # Rule findings are emitted first, before any network round-trip
+        analysis = self._analyze_locally(commands)
+        if analysis is not None:
+            for finding in analysis['findings']:
+                parser.sections[finding['category']].append(finding['message'])
+                _emit(finding['category'], finding['message'])
+            if analysis['decided'] or self.demo_mode:
+                return _finish(self._local_result(analysis))
+        
+        plan = self.prompt_builder.build(commands, prompt_notes(analysis) if analysis else '')
+        cache_key = self._cache_key(commands)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._record_tier('cache_hits')
+                _consume(cached)
+                return _finish(self._with_rules(self._result(cached, plan, [], cached=True), analysis))
+        
+        # Parts of a map-reduced Dockerfile can't be streamed as one answer; their merged result is replayed instead
+        if plan['map_reduce']:
+            try:
+                content, _, calls = self._map_reduce(plan['parts'])
+            except GroqAPIError as e:
+                return {"error": str(e)}
+            except Exception as e:
+                return {"error": f"Request failed: {str(e)}"}
+            if cache_key:
+                self.cache.set(cache_key, content)
+            self._record_tier('llm', len(calls))
+            _consume(content)
+            return _finish(self._with_rules(self._result(content, plan, calls), analysis))
+        
+        part = plan['parts'][0]
+        chunks = []
+        try:
+            for chunk in self.client.stream_chat({
+                "messages": [{"role": "user", "content": part['prompt']}],
+                **self._request_params(part['max_tokens'])
+            }):
+                chunks.append(chunk)
+                _consume(chunk)
+        except GroqAPIError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"Request failed: {str(e)}"}
+        
+        content = ''.join(chunks)
+        if cache_key:
+            self.cache.set(cache_key, content)
+        self._record_tier('llm', 1)
+        # The stream carries no usage block, so the local estimate stands in for the prompt tokens
+        call = {'part': part['label'], 'prompt_tokens': part['prompt_tokens'],
+                'prompt_tokens_estimated': part['prompt_tokens'], 'completion_tokens': None,
+                'max_tokens': part['max_tokens'], 'latency_seconds': round(time.perf_counter() - start, 4)}
+        return _finish(self._with_rules(self._result(content, plan, [call]), analysis))
+    
+    def share_result(self, result, representative, representative_commands, commands):
+        """
+        A cluster member's result from its representative's LLM result. The
+        member's own rules run on its own commands, so findings cite its lines;
+        only the LLM answer is shared, adapted to the instructions that differ.
+        """
+        analysis = self._analyze_locally(commands)
+        if analysis is not None and analysis['decided']:
+            return self._local_result(analysis)
+        text, projection = project_suggestions(result.get('llm_suggestions', result['suggestions']),
+                                               representative_commands, commands)
+        self._record_tier('shared')
+        shared = {
+            "suggestions": text,
+            "source": result['source'],
+            "cached": result['cached'],
+            "calls": [],
+            "tokens_sent": 0,
+            "compaction": result.get('compaction'),
+            "shared_from": representative,
+            "projection": projection
+        }
+        return self._with_rules(shared, analysis)
+    
+    def get_suggestions_many(self, dockerfile_paths, max_workers=8):
+        """Analyze several Dockerfiles concurrently over the pooled client; results keep input order"""
+        dockerfile_paths = list(dockerfile_paths)
+        if not dockerfile_paths:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(dockerfile_paths))) as pool:
+            return list(pool.map(self.get_suggestions, dockerfile_paths))
+    
+    def get_suggestions_by_stage(self, dockerfile_path, commands=None, reuse=None):
+        """
+        Suggestions built stage by stage, for incremental runs. `reuse` maps a
+        stage index to the structured suggestions a previous run got for the
+        same stage; only the other stages are sent, one stage per prompt, and
+        with tiering only if their own rules leave questions open. The result
+        carries `stage_sections` for every stage, to keep for the next run, and
+        `stage_status` (reused, analyzed or local).
+        """
+        if commands is None:
+            commands = DockerfileParser(dockerfile_path).parse()
+        if not commands or (self.demo_mode and not self.tiered):
+            return self.get_suggestions(dockerfile_path, commands=commands)
+        
+        analysis = self._analyze_locally(commands)
+        stages = {}
+        for cmd in commands:
+            stages.setdefault(cmd['stage'], []).append(cmd)
+        if analysis is not None and (analysis['decided'] or self.demo_mode):
+            result = self._local_result(analysis)
+            result['stage_sections'] = {stage: {} for stage in stages}
+            result['stage_status'] = {stage: 'local' for stage in stages}
+            return result
+        
+        reuse = reuse or {}
+        stage_sections, stage_status, parts, compaction = {}, {}, [], {}
+        for stage, stage_commands in stages.items():
+            if stage in reuse:
+                stage_sections[stage], stage_status[stage] = reuse[stage], 'reused'
+                continue
+            notes = ''
+            if analysis is not None:
+                stage_analysis = self.rule_engine.analyze(stage_commands)
+                if stage_analysis['decided']:
+                    stage_sections[stage], stage_status[stage] = {}, 'local'
+                    continue
+                lines = range(stage_commands[0]['start_line'], stage_commands[-1]['end_line'] + 1)
+                notes = prompt_notes({'findings': [finding for finding in analysis['findings']
+                                                   if finding['line'] in lines],
+                                      'open_questions': stage_analysis['open_questions']})
+            if len(stages) > 1:
+                name = stage_commands[0]['stage_name'] or stage
+                notes = f"\nThis is stage {name} of a {len(stages)}-stage Dockerfile; the others are analyzed " \
+                        f"separately.\n" + notes
+            plan = self.prompt_builder.build(stage_commands, notes)
+            for key, value in plan['compaction'].items():
+                compaction[key] = compaction.get(key, 0) + value
+            parts.extend((stage, part) for part in plan['parts'])
+            stage_status[stage] = 'analyzed'
+        
+        calls = []
+        try:
+            if parts:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(parts))) as pool:
+                    completed = list(pool.map(self._complete, [part for _, part in parts]))
+                answers = {}
+                for (stage, _), (content, call) in zip(parts, completed):
+                    answers.setdefault(stage, []).append(SuggestionParser.parse_ai_response(content))
+                    calls.append(call)
+                for stage, sections in answers.items():
+                    stage_sections[stage] = merge_sections(sections)
+        except GroqAPIError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"Request failed: {str(e)}"}
+        
+        if calls:
+            self._record_tier('llm', len(calls))
+        else:
+            # Stages never go through the response cache; without calls they were reused or settled by rules
+            self._record_tier('reused' if 'reused' in stage_status.values() else 'rules')
+        structured = merge_sections([stage_sections[stage] for stage in stages])
+        result = self._result(render_sections(structured), {'compaction': compaction}, calls)
+        result['structured'] = structured
+        result['stage_sections'] = stage_sections
+        result['stage_status'] = stage_status
+        return self._with_rules(result, analysis)
+    
+    def get_suggestions_clustered(self, dockerfile_paths, threshold=DEFAULT_SIMILARITY_THRESHOLD, max_workers=8):
+        """
+        Analyze a fleet with at most one LLM call per cluster of near-duplicate
+        Dockerfiles. Members get their representative's suggestions adapted to
+        the instructions that differ. Returns (results in input order, clustering
+        report with the LLM calls actually made).
+        """
+        dockerfile_paths = list(dockerfile_paths)
+        commands = {path: DockerfileParser(path).parse() for path in dockerfile_paths}
+        
+        start = time.perf_counter()
+        index = DockerfileClusterIndex(threshold=threshold)
+        for path in dockerfile_paths:
+            if commands[path]:
+                index.add(path, commands[path])
+        clustering_seconds = time.perf_counter() - start
+        
+        representatives = list(index.clusters)
+        representative_results = {}
+        if representatives:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(representatives))) as pool:
+                for path, result in zip(representatives, pool.map(
+                        lambda path: self.get_suggestions(path, commands=commands[path]), representatives)):
+                    representative_results[path] = result
+        
+        results = []
+        for path in dockerfile_paths:
+            if not commands[path]:
+                results.append({"error": "No commands found in Dockerfile"})
+                continue
+            representative = index.assignments[path]
+            result = representative_results[representative]
+            if representative == path or "error" in result:
+                results.append(result)
+                continue
+            if result.get('source') == "Local rules":
+                # Rules cost microseconds and cite exact lines, so members get their own
+                results.append(self.get_suggestions(path, commands=commands[path]))
+                continue
+            results.append(self.share_result(result, representative, commands[representative], commands[path]))
+        
+        report = index.report()
+        report['clustering_seconds'] = round(clustering_seconds, 4)
+        # Counted from this call's own results: tier_stats is shared with concurrent callers
+        report['llm_calls'] = sum(len(result.get('calls') or ()) for result in results)
+        report['shared_answers'] = sum(1 for result in results if 'shared_from' in result)
+        return results, report
+    
     def _get_demo_suggestions(self, dockerfile_path):
         """Return sample suggestions for demo purposes"""
         sample_suggestions = """
@@ -94,7 +496,7 @@ SECURITY:
             return
         
         print("=" * 60)
-        if self.demo_mode:
+        if result.get('source') == "Demo Mode":
             print("🤖 DEMO SUGGESTIONS (Get API key for real AI analysis)")
         else:
             print(f"🤖 AI SUGGESTIONS FROM: {result.get('source', 'Groq Cloud')}")
@@ -1,48 +1,204 @@
+import io
+import json
 import re
 
+# Precompiled scanners, shared by every parser instance
+DIRECTIVE_RE = re.compile(r'^#\s*([A-Za-z]+)\s*=\s*(\S+)\s*$')
+FLAG_RE = re.compile(r'--([A-Za-z][\w-]*)(?:=("[^"]*"|\'[^\']*\'|\S*))?\s*')
+HEREDOC_RE = re.compile(r'<<(-?)(["\']?)([A-Za-z_][A-Za-z0-9_]*)\2')
+STAGE_ALIAS_RE = re.compile(r'^(\S+)(?:\s+[Aa][Ss]\s+(\S+))?\s*$')
+
+HEREDOC_INSTRUCTIONS = {'RUN', 'COPY', 'ADD'}
+
+
 class DockerfileParser:
-    def __init__(self, dockerfile_path):
+    def __init__(self, dockerfile_path=None):
         self.dockerfile_path = dockerfile_path
         self.commands = []
+        self.stages = []
+        self.directives = {}
+        self.lines = []
+
+    @classmethod
+    def from_string(cls, content, dockerfile_path='<string>'):
+        """Parse Dockerfile content that is already in memory."""
+        parser = cls(dockerfile_path)
+        parser.parse_lines(io.StringIO(content))
+        return parser
 
     def parse(self):
         """Reads a Dockerfile and extracts its commands into a list of dictionaries."""
         try:
             with open(self.dockerfile_path, 'r') as f:
-                content = f.read()
-            
-            # Handle multi-line commands by joining lines ending with \
-            content = re.sub(r'\\\s*\n', ' ', content)
-            
-            lines = content.split('\n')
-            current_command = None
-            
-            for line in lines:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue  # Skip empty lines and comments
-                
-                # Check if this line continues a previous command
-                if current_command and not re.match(r'^\w+', line):
-                    current_command['original'] += ' ' + line
-                    current_command['arguments'] += ' ' + line
-                    continue
-                
-                # Match the instruction (like FROM, RUN, COPY) and its arguments
-                match = re.match(r'^(\w+)\s+(.*)$', line)
-                if match:
-                    instruction = match.group(1)
-                    args = match.group(2)
-                    
-                    current_command = {
-                        'instruction': instruction,
-                        'arguments': args,
-                        'original': line
-                    }
-                    self.commands.append(current_command)
-            
-            return self.commands
+                return self.parse_lines(f)
 
         except FileNotFoundError:
             print(f"Error: The file {self.dockerfile_path} was not found.")
-            return []
\ No newline at end of file
+            return []
+
+    def parse_lines(self, line_iter):
+        """
+        Single pass over physical lines. Each command carries its source span
+        (1-based lines, 0-based character offsets), stage membership, parsed
+        flags, JSON-form arguments and heredoc bodies.
+        """
+        self.commands = []
+        self.stages = []
+        self.directives = {}
+        self.lines = []
+
+        escape = '\\'
+        looking_for_directives = True
+        current = None        # Instruction whose logical line is still open
+        parts = []
+        first_arguments = ''
+        heredocs = []         # Pending heredoc markers for the last instruction
+        heredoc_body = []
+        offset = 0
+        last_line = 0         # Last physical line of the open instruction
+
+        for line_no, raw in enumerate(line_iter, 1):
+            self.lines.append(raw)
+            line_start = offset
+            offset += len(raw)
+
+            # Inside a heredoc: collect body lines until the terminator
+            if heredocs:
+                strip_tabs, name = heredocs[0]['strip_tabs'], heredocs[0]['name']
+                text = raw.rstrip('\r\n')
+                if (text.lstrip('\t') if strip_tabs else text) == name:
+                    heredocs[0]['body'] = ''.join(heredoc_body)
+                    self.commands[-1]['heredocs'].append({'name': name, 'body': heredocs[0]['body']})
+                    self.commands[-1]['original'] += '\n' + heredocs[0]['body'] + name
+                    self.commands[-1]['end_line'] = line_no
+                    self.commands[-1]['end_offset'] = offset
+                    heredocs.pop(0)
+                    heredoc_body = []
+                else:
+                    heredoc_body.append(text.lstrip('\t') + '\n' if strip_tabs else text + '\n')
+                continue
+
+            stripped = raw.strip()
+
+            if looking_for_directives:
+                match = DIRECTIVE_RE.match(stripped)
+                if match and match.group(1).lower() not in self.directives:
+                    self.directives[match.group(1).lower()] = match.group(2)
+                    if match.group(1).lower() == 'escape' and match.group(2) in ('\\', '`'):
+                        escape = match.group(2)
+                    continue
+                looking_for_directives = False
+
+            # Comments and blank lines are dropped, including inside continuations
+            if not stripped or stripped.startswith('#'):
+                continue
+
+            continues = stripped.endswith(escape)
+            content = stripped[:-1].rstrip() if continues else stripped
+
+            if current is None:
+                head = content.split(None, 1)
+                if not head:
+                    continue  # A lone escape character: an empty continuation with nothing to continue
+                if not head[0].isalpha():
+                    # Stray text without a continuation marker: attach to the previous command
+                    if self.commands:
+                        self.commands[-1]['original'] += ' ' + content
+                        self.commands[-1]['arguments'] += ' ' + content
+                        self.commands[-1]['end_line'] = line_no
+                        self.commands[-1]['end_offset'] = offset
+                    continue
+                current = {
+                    'instruction': head[0].upper(),
+                    'start_line': line_no,
+                    'start_offset': line_start
+                }
+                parts = [content]
+                first_arguments = head[1] if len(head) > 1 else ''
+            elif content:
+                parts.append(content)
+            last_line = line_no
+
+            if continues:
+                continue
+
+            heredocs = self._finish_command(current, parts, first_arguments, line_no, offset)
+            current = None
+            parts = []
+
+        if current is not None:
+            # File ended on a continuation line
+            self._finish_command(current, parts, first_arguments, last_line, offset)
+
+        if heredocs and self.commands:
+            # Unterminated heredoc: keep what was read
+            self.commands[-1]['heredocs'].append({'name': heredocs[0]['name'], 'body': ''.join(heredoc_body)})
+
+        return self.commands
+
+    def _finish_command(self, current, parts, first_arguments, end_line, end_offset):
+        if len(parts) == 1:
+            original, arguments = parts[0], first_arguments
+        else:
+            original = ' '.join(parts)
+            arguments = ' '.join([first_arguments] + parts[1:]).strip()
+        instruction = current['instruction']
+
+        flags = {}
+        pos = 0
+        while arguments.startswith('--', pos):
+            flag = FLAG_RE.match(arguments, pos)
+            if not flag:
+                break
+            name, value = flag.group(1), flag.group(2)
+            if value and value[0] in '"\'' and value[-1] == value[0]:
+                value = value[1:-1]
+            value = True if value is None else value
+            if name in flags:
+                existing = flags[name]
+                flags[name] = (existing if isinstance(existing, list) else [existing]) + [value]
+            else:
+                flags[name] = value
+            pos = flag.end()
+        value = arguments[pos:]
+
+        json_args = None
+        if value.startswith('['):
+            try:
+                parsed = json.loads(value)
+                if isinstance(parsed, list) and all(isinstance(item, str) for item in parsed):
+                    json_args = parsed
+            except ValueError:
+                pass
+
+        if instruction == 'FROM':
+            alias = STAGE_ALIAS_RE.match(value)
+            self.stages.append({
+                'index': len(self.stages),
+                'name': alias.group(2) if alias else None,
+                'base_image': alias.group(1) if alias else value,
+                'start_line': current['start_line']
+            })
+        stage = self.stages[-1] if self.stages else None
+
+        command = {
+            'instruction': instruction,
+            'arguments': arguments,
+            'original': original,
+            'value': value,
+            'flags': flags,
+            'json_args': json_args,
+            'heredocs': [],
+            'stage': stage['index'] if stage else None,
+            'stage_name': stage['name'] if stage else None,
+            'start_line': current['start_line'],
+            'end_line': end_line,
+            'start_offset': current['start_offset'],
+            'end_offset': end_offset
+        }
+        self.commands.append(command)
+
+        if instruction in HEREDOC_INSTRUCTIONS and '<<' in value and json_args is None:
+            return [{'strip_tabs': bool(m.group(1)), 'name': m.group(3)}
+                    for m in HEREDOC_RE.finditer(value)]
+        return []
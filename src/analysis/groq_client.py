@@ -0,0 +1,235 @@
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+DURATION_RE = re.compile(r'(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$')
+
+
+class GroqAPIError(Exception):
+    def __init__(self, message, status_code=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+def parse_duration(value):
+    """Parse rate-limit durations such as '7.66s', '2m59.56s', '120ms' or plain seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = DURATION_RE.match(value)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds, millis = (float(g) if g else 0.0 for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + millis / 1000.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket that also obeys server-reported rate-limit state."""
+
+    def __init__(self, rate_per_second, capacity=None):
+        self.rate = rate_per_second
+        self.capacity = capacity or max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = max(self.blocked_until - now, (1 - self.tokens) / self.rate if self.rate else 1.0)
+            time.sleep(min(max(wait_for, 0.001), 5.0))
+
+    def update_from_headers(self, headers):
+        """Sync with x-ratelimit-* / retry-after headers from the API."""
+        now = time.monotonic()
+        with self.lock:
+            retry_after = parse_duration(headers.get('retry-after'))
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+            remaining = headers.get('x-ratelimit-remaining-requests')
+            reset = parse_duration(headers.get('x-ratelimit-reset-requests'))
+            if remaining is not None:
+                try:
+                    remaining = int(float(remaining))
+                except ValueError:
+                    return
+                self._refill(now)
+                self.tokens = min(self.tokens, float(remaining))
+                if remaining <= 0 and reset is not None:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+
+
+class GroqClient:
+    """Pooled HTTP client for the Groq chat API with rate limiting, retries and hedging."""
+
+    def __init__(self, api_key, api_url, timeout=30, pool_size=10, requests_per_minute=30,
+                 max_retries=4, backoff_base=0.5, backoff_max=20.0, hedge_after=None):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=max(1, requests_per_minute // 6))
+        self.stats = {'requests': 0, 'retries': 0, 'hedged': 0, 'rate_limited': 0}
+        self._stats_lock = threading.Lock()
+
+        # Keep-alive connection pool shared by every worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        })
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size) if hedge_after else None
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def backoff_delay(self, attempt):
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send_once(self, payload):
+        self.bucket.acquire()
+        self._count('requests')
+        try:
+            response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise GroqAPIError(f"Request failed: {str(e)}", retryable=True)
+
+        self.bucket.update_from_headers(response.headers)
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 429:
+            self._count('rate_limited')
+        raise GroqAPIError(
+            f"Groq API error: {response.status_code} - {response.text}",
+            status_code=response.status_code,
+            retryable=response.status_code in RETRYABLE_STATUS
+        )
+
+    def _send_hedged(self, payload):
+        """Send a duplicate request if the first one is slower than `hedge_after`."""
+        if not self._hedge_pool:
+            return self._send_once(payload)
+        futures = [self._hedge_pool.submit(self._send_once, payload)]
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            self._count('hedged')
+            futures.append(self._hedge_pool.submit(self._send_once, payload))
+        last_error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except GroqAPIError as e:
+                    last_error = e
+        raise last_error
+
+    def chat(self, payload):
+        """POST a chat completion, retrying retryable failures with jittered backoff."""
+        attempt = 0
+        while True:
+            try:
+                return self._send_hedged(payload)
+            except GroqAPIError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                self._count('retries')
+                time.sleep(self.backoff_delay(attempt))
+                attempt += 1
+
+    def _open_stream(self, payload):
+        self.bucket.acquire()
+        self._count('requests')
+        try:
+            response = self.session.post(self.api_url, json=payload, timeout=self.timeout, stream=True)
+        except requests.RequestException as e:
+            raise GroqAPIError(f"Request failed: {str(e)}", retryable=True)
+
+        self.bucket.update_from_headers(response.headers)
+        if response.status_code == 200:
+            return response
+        body = response.text
+        response.close()
+        if response.status_code == 429:
+            self._count('rate_limited')
+        raise GroqAPIError(
+            f"Groq API error: {response.status_code} - {body}",
+            status_code=response.status_code,
+            retryable=response.status_code in RETRYABLE_STATUS
+        )
+
+    def stream_chat(self, payload):
+        """
+        Yield content deltas from a server-sent-events chat completion.
+        Retries only happen before the first byte of the body has been received.
+        """
+        payload = dict(payload, stream=True)
+        attempt = 0
+        while True:
+            try:
+                response = self._open_stream(payload)
+                break
+            except GroqAPIError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                self._count('retries')
+                time.sleep(self.backoff_delay(attempt))
+                attempt += 1
+
+        response.encoding = response.encoding or 'utf-8'
+        try:
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue  # Keep-alive comments and blank event separators
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                for choice in event.get('choices', []):
+                    content = (choice.get('delta') or {}).get('content')
+                    if content:
+                        yield content
+        except requests.RequestException as e:
+            raise GroqAPIError(f"Stream interrupted: {str(e)}")
+        finally:
+            response.close()
+
+    def close(self):
+        self.session.close()
+        if self._hedge_pool:
+            self._hedge_pool.shutdown(wait=False)
@@ -0,0 +1,160 @@
+import re
+from collections import deque
+
+TOKEN_RE = re.compile(r'[a-z0-9_]+')
+WORD_BYTES = frozenset(b'abcdefghijklmnopqrstuvwxyz0123456789_')
+# Lowercases ASCII letters and turns every other byte (punctuation, whitespace,
+# UTF-8 sequences) into a space, so tokenizing a line is translate() + split()
+TOKEN_TABLE = bytes(byte if byte in WORD_BYTES else 32 for byte in bytes(range(256)).lower())
+SIBILANT_ENDINGS = ('s', 'x', 'z', 'ch', 'sh')
+
+
+def tokenize(text):
+    """Lowercase ASCII word tokens of `text` as bytes; the words TOKEN_RE finds in `text.lower()`"""
+    return text.encode('utf-8').translate(TOKEN_TABLE).split()
+
+
+def plural(word):
+    """English plural of a keyword ("layers", "caches", "patches", "dependencies")"""
+    if word.endswith(SIBILANT_ENDINGS):
+        return word + 'es'
+    if len(word) > 1 and word[-1] == 'y' and word[-2] not in 'aeiou':
+        return word[:-1] + 'ies'
+    return word + 's'
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over word tokens for a fixed keyword table. Lines are
+    split into whole words once, so "run" never fires inside "running" and
+    multi-word keywords ("base image", "multi-stage") are matched in one scan.
+    A keyword's last word also matches in its plural form ("layers"), but no
+    other ending ("pipes" is not "pip", "runes" is not "run").
+    """
+
+    def __init__(self, weighted_keywords):
+        """`weighted_keywords` maps category -> {keyword: weight}."""
+        self.categories = list(weighted_keywords)
+        self.category_rank = {category: index for index, category in enumerate(self.categories)}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        # Multi-word keywords by first word: (" word word " forms in a space-joined token stream, category, weight)
+        self.phrases = {}
+        final_tokens = set()
+        for category, keywords in weighted_keywords.items():
+            for keyword, weight in keywords.items():
+                tokens = TOKEN_RE.findall(keyword.lower())
+                self._add(tokens, (keyword, category, weight))
+                final_tokens.add(tokens[-1])
+                if len(tokens) > 1:
+                    forms = tuple(f" {' '.join(tokens[:-1] + [last])} ".encode('ascii')
+                                  for last in (tokens[-1], plural(tokens[-1])))
+                    self.phrases.setdefault(tokens[0].encode('ascii'), []).append((forms, category, weight))
+        # Every accepted surface form, as the bytes tokenize() yields, mapped to its automaton token
+        self.aliases = {}
+        for transitions in self.goto:
+            for token in transitions:
+                self.aliases[token.encode('ascii')] = token
+        for token in final_tokens:
+            self.aliases.setdefault(plural(token).encode('ascii'), token)
+        self._build_failure_links()
+
+        # Fast path tables: surface form -> (category, weight) of its single-word
+        # keywords, plural forms -> their singular, and the words that can start
+        # a multi-word keyword
+        self.single_word = {alias: tuple((category, weight) for keyword, category, weight
+                                         in self.output[self.goto[0].get(token, 0)]
+                                         if len(TOKEN_RE.findall(keyword.lower())) == 1)
+                            for alias, token in self.aliases.items()}
+        self.singular = {alias: token.encode('ascii') for alias, token in self.aliases.items()
+                         if alias != token.encode('ascii')}
+        self.alias_set = frozenset(self.aliases)
+        self.phrase_starts = frozenset(self.phrases)
+
+    def _add(self, tokens, payload):
+        state = 0
+        for token in tokens:
+            next_state = self.goto[state].get(token)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][token] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(payload)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                candidate = self.goto[fallback].get(token, 0)
+                self.fail[next_state] = candidate if candidate != next_state else 0
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def _matches(self, tokens):
+        goto, fail, output, aliases = self.goto, self.fail, self.output, self.aliases
+        matches = []
+        state = 0
+        for token in tokens:
+            token = aliases.get(token)
+            if token is None:
+                state = 0  # Words outside the keyword table can't continue any match
+                continue
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if state:
+                matches.extend(output[state])
+        return matches
+
+    def find(self, text):
+        """Return (keyword, category, weight) for every whole-word match in `text`."""
+        return self._matches(tokenize(text))
+
+    def scores(self, text):
+        """
+        Sum of weights per category; each distinct keyword counts once per text.
+        Only the set of keywords matters here, not their order, so single words
+        are a set intersection and multi-word keywords a substring test on the
+        normalized token stream; neither needs the automaton walk find() does.
+        """
+        tokens = tokenize(text)
+        present = self.alias_set.intersection(tokens)
+        totals = {}
+        if not present:
+            return totals
+        single_word, singular = self.single_word, self.singular
+        for alias in present:
+            if alias in singular and singular[alias] in present:
+                continue  # "images" next to "image" is still one keyword
+            for category, weight in single_word[alias]:
+                totals[category] = totals.get(category, 0) + weight
+        starts = self.phrase_starts.intersection(present) if len(present) > 1 else None
+        if starts:
+            stream = b' %s ' % b' '.join(tokens)
+            for start in starts:
+                for forms, category, weight in self.phrases[start]:
+                    if forms[0] in stream or forms[1] in stream:
+                        totals[category] = totals.get(category, 0) + weight
+        return totals
+
+    def categorize(self, text):
+        """Highest-scoring category for `text`, or None; ties go to the earlier category."""
+        totals = self.scores(text)
+        if not totals:
+            return None
+        if len(totals) == 1:
+            return next(iter(totals))
+        rank = self.category_rank
+        return max(totals, key=lambda category: (totals[category], -rank[category]))
+
+    def categorize_many(self, texts):
+        return [self.categorize(text) for text in texts]
@@ -0,0 +1,263 @@
+"""
+Token-budgeted prompts for Dockerfile analysis.
+
+Commands are compacted before they are sent: metadata-only instructions are
+dropped, repeated instructions become short back-references, long package
+lists are abbreviated and oversized commands (heredocs, generated RUN lines)
+are truncated. A Dockerfile that still doesn't fit the prompt budget is split
+along its build stages into parts that are analyzed independently and merged
+locally. Completion budgets scale with the amount of input instead of being a
+fixed 800 tokens.
+"""
+import re
+
+from .suggestion_parser import CATEGORIES
+
+PROMPT_VERSION = 2
+TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+WHITESPACE_RE = re.compile(r'\s+')
+SEGMENT_RE = re.compile(r'(\s*(?:&&|\|\||;)\s*)')
+INSTALL_RE = re.compile(r'^((?:\S+=\S+\s+)*(?:sudo\s+)?(?:apt-get|apt|apk|yum|dnf|microdnf|pip3?|python3? -m pip|'
+                        r'npm|yarn|pnpm|gem|conda)\s+(?:install|add)\b)(.*)$')
+NOISE_INSTRUCTIONS = {'LABEL', 'MAINTAINER'}
+NORMALIZE_RE = re.compile(r'[^a-z0-9]+')
+NUMBER_RE = re.compile(r'\d+')
+MAX_NUMBER_CHANGES = 2
+
+SECTION_HEADERS = {
+    'base_image': 'BASE IMAGE OPTIMIZATION',
+    'layer_optimization': 'LAYER OPTIMIZATION',
+    'dependencies': 'DEPENDENCIES',
+    'security': 'SECURITY'
+}
+
+PROMPT_TEMPLATE = """You are an expert Docker optimization specialist. Analyze this Dockerfile and provide specific optimization suggestions:
+{context}
+DOCKERFILE:
+{commands}
+
+Provide recommendations for smaller image size, faster build times, and better security.
+Be specific and provide exact commands."""
+
+
+def count_tokens(text):
+    """
+    Local estimate of BPE tokens: a word is one token per ~6 letters, digits
+    come in groups of three and every punctuation mark counts as one. Close
+    enough to the Llama tokenizer to budget with; actual counts come back in
+    the API's `usage` field.
+    """
+    total = 0
+    for match in TOKEN_RE.finditer(text):
+        piece = match.group()
+        total += (len(piece) + 5) // 6 if piece.isalpha() else 1
+    return total
+
+
+def _truncate(text, max_tokens):
+    if count_tokens(text) <= max_tokens:
+        return text, False
+    low, high = 0, len(text)
+    while low < high:  # Longest prefix that fits
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + ' …[truncated]', True
+
+
+class PromptBuilder:
+    def __init__(self, prompt_budget=1200, min_completion_tokens=300, max_completion_tokens=1200,
+                 completion_ratio=0.6, max_packages=8, max_command_tokens=150):
+        self.prompt_budget = prompt_budget
+        self.min_completion_tokens = min_completion_tokens
+        self.max_completion_tokens = max_completion_tokens
+        self.completion_ratio = completion_ratio
+        self.max_packages = max_packages
+        self.max_command_tokens = max_command_tokens
+
+    def signature(self):
+        """Settings that change the prompt, for cache keys."""
+        return {'version': PROMPT_VERSION, 'prompt_budget': self.prompt_budget,
+                'max_packages': self.max_packages, 'max_command_tokens': self.max_command_tokens,
+                'completion': [self.min_completion_tokens, self.max_completion_tokens, self.completion_ratio]}
+
+    def _abbreviate_packages(self, text):
+        """`apt-get install -y a b c d e f g h i j` -> `apt-get install -y a b c d e f … (+4 more)`"""
+        pieces = SEGMENT_RE.split(text)
+        abbreviated = 0
+        for index in range(0, len(pieces), 2):
+            match = INSTALL_RE.match(pieces[index].strip())
+            if not match:
+                continue
+            words = match.group(2).split()
+            packages = [word for word in words if not word.startswith('-')]
+            if len(packages) <= self.max_packages:
+                continue
+            keep = self.max_packages - 2
+            flags = [word for word in words if word.startswith('-')]
+            pieces[index] = ' '.join([match.group(1)] + flags + packages[:keep] +
+                                     [f"… (+{len(packages) - keep} more)"])
+            abbreviated += len(packages) - keep
+        return ''.join(pieces), abbreviated
+
+    def compact(self, commands):
+        """Compacted (command, text) lines plus counts of what was removed."""
+        stats = {'instructions': len(commands), 'stripped': 0, 'deduplicated': 0,
+                 'packages_abbreviated': 0, 'truncated': 0}
+        seen = {}
+        lines = []
+        for cmd in commands:
+            if cmd['instruction'] in NOISE_INSTRUCTIONS:
+                stats['stripped'] += 1
+                continue
+            text = cmd['original'] if cmd['heredocs'] else WHITESPACE_RE.sub(' ', cmd['original']).strip()
+            flat = WHITESPACE_RE.sub(' ', cmd['original']).strip()
+            key = NUMBER_RE.sub('#', flat)
+            # FROM lines define stages, and a reference is only used when it is shorter than the command
+            if key in seen and cmd['instruction'] != 'FROM':
+                reference = self._reference(seen[key], cmd, flat)
+                if reference and count_tokens(reference) < count_tokens(text):
+                    lines.append((cmd, reference))
+                    stats['deduplicated'] += 1
+                    continue
+            seen.setdefault(key, cmd)
+            if cmd['instruction'] == 'RUN':
+                text, abbreviated = self._abbreviate_packages(text)
+                stats['packages_abbreviated'] += abbreviated
+            text, truncated = _truncate(text, self.max_command_tokens)
+            stats['truncated'] += truncated
+            lines.append((cmd, text))
+        return lines, stats
+
+    @staticmethod
+    def _reference(first, cmd, flat):
+        """`RUN [repeat from stage build, 0→4]` for a repeat that differs in at most two numbers"""
+        first_numbers = NUMBER_RE.findall(WHITESPACE_RE.sub(' ', first['original']))
+        changes = [f"{old}→{new}" for old, new in zip(first_numbers, NUMBER_RE.findall(flat)) if old != new]
+        if len(changes) > MAX_NUMBER_CHANGES:
+            return None
+        if first['stage'] == cmd['stage']:
+            where = ''
+        else:
+            where = f" from {first['stage_name']}" if first['stage_name'] else f" from stage {first['stage']}"
+        return f"{cmd['instruction']} [repeat{where}{', ' + ', '.join(changes) if changes else ''}]"
+
+    def completion_budget(self, content_tokens):
+        budget = self.min_completion_tokens + int(content_tokens * self.completion_ratio)
+        return max(self.min_completion_tokens, min(self.max_completion_tokens, budget))
+
+    def _part(self, label, lines, context='', notes=''):
+        commands_text = '\n'.join(text for _, text in lines)
+        prompt = PROMPT_TEMPLATE.format(context=context + notes, commands=commands_text)
+        content_tokens = count_tokens(commands_text)
+        return {
+            'label': label,
+            'prompt': prompt,
+            'prompt_tokens': count_tokens(prompt),
+            'content_tokens': content_tokens,
+            'max_tokens': self.completion_budget(content_tokens)
+        }
+
+    def _stage_context(self, stage_order, stages, part_stages=()):
+        # Consecutive stages on the same base collapse into one `first..last (base)` entry
+        runs = []
+        for stage in stage_order:
+            cmd = stages[stage][0][0]
+            base = cmd['value'].split()[0] if cmd['instruction'] == 'FROM' and cmd['value'].split() else '?'
+            key = (base, stage in part_stages)
+            name = str(cmd['stage_name'] or stage)
+            if runs and runs[-1][0] == key:
+                runs[-1][2] = name
+            else:
+                runs.append([key, name, name])
+        described = [f"{'*' if marked else ''}{first}{'..' + last if last != first else ''} ({base})"
+                     for (base, marked), first, last in runs]
+        return ("\nThis is one part of a multi-stage Dockerfile analyzed in parts. Stages, * marks the ones "
+                "below: " + ', '.join(described) + "\n")
+
+    def build(self, commands, notes=''):
+        """
+        Plan the calls for one Dockerfile: a single part if it fits the prompt
+        budget, otherwise consecutive stages packed into budget-sized parts
+        (a stage that alone exceeds the budget is split into chunks). `notes`
+        (e.g. local rule findings) go into every part.
+        """
+        lines, stats = self.compact(commands)
+        stats['original_tokens'] = count_tokens('\n'.join(cmd['original'] for cmd in commands))
+        stats['compacted_tokens'] = count_tokens('\n'.join(text for _, text in lines))
+        overhead = count_tokens(PROMPT_TEMPLATE.format(context=notes, commands=''))
+        if stats['compacted_tokens'] + overhead <= self.prompt_budget or not lines:
+            return {'parts': [self._part('dockerfile', lines, notes=notes)], 'compaction': stats, 'map_reduce': False}
+
+        stages = {}
+        for cmd, text in lines:
+            stages.setdefault(cmd['stage'], []).append((cmd, text))
+        stage_order = list(stages)
+        if len(stage_order) > 1:
+            overhead += count_tokens(self._stage_context(stage_order, stages, stage_order))
+        # Never below a quarter of the budget, so a tiny budget still makes progress
+        budget = max(self.prompt_budget - overhead, self.prompt_budget // 4)
+
+        groups = []
+        current, current_tokens = [], 0
+        for stage in stage_order:
+            stage_tokens = sum(count_tokens(text) for _, text in stages[stage])
+            if current and current_tokens + stage_tokens > budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(stage)
+            current_tokens += stage_tokens
+        groups.append(current)
+
+        parts = []
+        for group in groups:
+            context = self._stage_context(stage_order, stages, group) if len(stage_order) > 1 else ''
+            group_lines = [line for stage in group for line in stages[stage]]
+            names = [str(stages[stage][0][0]['stage_name'] or stage) for stage in group]
+            label = f"stage {names[0]}" if len(names) == 1 else f"stages {names[0]}..{names[-1]}"
+            chunks, chunk, chunk_tokens = [], [], 0
+            for line in group_lines:
+                tokens = count_tokens(line[1])
+                if chunk and chunk_tokens + tokens > budget:
+                    chunks.append(chunk)
+                    chunk, chunk_tokens = [], 0
+                chunk.append(line)
+                chunk_tokens += tokens
+            chunks.append(chunk)
+            for number, chunk in enumerate(chunks, 1):
+                chunk_label = f"{label} (part {number} of {len(chunks)})" if len(chunks) > 1 else label
+                parts.append(self._part(chunk_label, chunk, context, notes))
+        return {'parts': parts, 'compaction': stats, 'map_reduce': len(parts) > 1}
+
+
+def merge_sections(sections_list):
+    """Merge structured suggestions from several parts, dropping repeats that differ only in wording noise."""
+    merged = {category: [] for category in CATEGORIES}
+    seen = set()
+    for sections in sections_list:
+        for category in CATEGORIES:
+            for suggestion in sections.get(category, []):
+                key = NORMALIZE_RE.sub(' ', suggestion.lower()).strip()
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged[category].append(suggestion)
+    return merged
+
+
+def render_sections(sections):
+    """
+    Structured suggestions back to text that SuggestionParser and the rewriter
+    understand. General items go first, before any header; suggestion lines
+    carry no bullets because the parser treats bulleted lines as headers.
+    """
+    blocks = ['\n'.join(sections['general'])] if sections.get('general') else []
+    number = 1
+    for category in CATEGORIES:
+        if category == 'general' or not sections.get(category):
+            continue
+        blocks.append(f"{number}. {SECTION_HEADERS[category]}:\n" + '\n'.join(sections[category]))
+        number += 1
+    return '\n\n'.join(blocks) + '\n' if blocks else ''
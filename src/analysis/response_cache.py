@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ai-docker-optimizer', 'responses')
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache for LLM responses, safe to share between processes."""
+
+    def __init__(self, cache_dir=None, max_entries=1000, max_bytes=50 * 1024 * 1024,
+                 max_age_seconds=7 * 24 * 3600):
+        self.cache_dir = cache_dir or os.getenv('OPTIMIZER_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def normalize_commands(commands):
+        """Reduce parsed commands to a canonical form so cosmetic edits don't change the key."""
+        normalized = []
+        for cmd in commands:
+            arguments = ' '.join(cmd['arguments'].split())
+            normalized.append(f"{cmd['instruction'].upper()} {arguments}")
+        return normalized
+
+    @classmethod
+    def make_key(cls, commands, params):
+        """Hash the normalized commands together with every request parameter."""
+        payload = json.dumps({
+            'commands': cls.normalize_commands(commands),
+            'params': params
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss or expired entry."""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if time.time() - entry.get('created_at', 0) > self.max_age_seconds:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path, None)  # Refresh recency for LRU eviction
+        except OSError:
+            pass
+        self.hits += 1
+        return entry['value']
+
+    def set(self, key, value):
+        """Atomically store `value` under `key`, then evict if the cache is over budget."""
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'created_at': time.time(), 'value': value}, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until within size limits."""
+        with self._lock():
+            entries = []
+            now = time.time()
+            for path in self._iter_entries():
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age_seconds:
+                    self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            entries.sort()
+            total_bytes = sum(size for _, size, _ in entries)
+            removed = 0
+            while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+                _, size, path = entries.pop(0)
+                self._remove(path)
+                total_bytes -= size
+                removed += 1
+            return removed
+
+    def clear(self):
+        with self._lock():
+            for path in self._iter_entries():
+                self._remove(path)
+
+    def stats(self):
+        entries = list(self._iter_entries())
+        total_bytes = 0
+        for path in entries:
+            try:
+                total_bytes += os.path.getsize(path)
+            except OSError:
+                pass
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': len(entries),
+            'bytes': total_bytes
+        }
+
+    def _iter_entries(self):
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if name.endswith('.json'):
+                    yield os.path.join(shard_dir, name)
+
+    @contextmanager
+    def _lock(self):
+        """Cross-process lock so concurrent evictions don't race each other."""
+        with open(os.path.join(self.cache_dir, '.lock'), 'a+') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
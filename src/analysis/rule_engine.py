@@ -0,0 +1,358 @@
+"""
+Deterministic Dockerfile checks that run before (and often instead of) an LLM call.
+
+Each rule looks at the parsed instruction list and reports findings in the
+same categories as SuggestionParser. Anything the rules can't judge (a build
+script they don't know, an unfamiliar base image, an inline heredoc script)
+is reported as an open question; only files with open questions need the LLM.
+"""
+import posixpath
+import re
+
+from .suggestion_parser import CATEGORIES
+
+RULES_VERSION = 1
+SEGMENT_SPLIT_RE = re.compile(r'\s*(?:&&|\|\||;)\s*')
+PIPE_TO_SHELL_RE = re.compile(r'\b(?:curl|wget)\b[^|;&]*\|\s*(?:sudo\s+)?(?:ba|z)?sh\b')
+ENV_ASSIGNMENT_RE = re.compile(r'^\w+=\S*$')
+APT_INSTALL_RE = re.compile(r'^(?:apt-get|apt)\s+(?:\S+\s+)*?install\b')
+APT_UPDATE_RE = re.compile(r'^(?:apt-get|apt)\s+(?:-\S+\s+)*update\b')
+APK_ADD_RE = re.compile(r'^apk\s+(?:\S+\s+)*?add\b')
+PIP_INSTALL_RE = re.compile(r'^(?:pip3?|python3?\s+-m\s+pip)\s+install\b')
+NPM_INSTALL_RE = re.compile(r'^npm\s+(?:install|i)\b')
+SECRET_NAME_RE = re.compile(r'(?:PASSWORD|PASSWD|SECRET|TOKEN|API_KEY|ACCESS_KEY|PRIVATE_KEY)', re.IGNORECASE)
+ENV_PAIR_RE = re.compile(r'(\w+)(?:=|\s+)(\S+)')
+URL_RE = re.compile(r'^https?://')
+
+# Dependency installs that only need the manifests, keyed by the manifests to copy first
+DEPENDENCY_INSTALLS = (
+    (re.compile(r'^(?:pip3?|python3?\s+-m\s+pip)\s+install\b.*\s-r\s'), 'requirements.txt'),
+    (re.compile(r'^(?:npm\s+(?:ci|install|i)|yarn(?:\s+install)?|pnpm\s+install)\b'), 'package.json and the lockfile'),
+    (re.compile(r'^mvn\b'), 'pom.xml'),
+    (re.compile(r'^(?:gradle|\./gradlew)\b'), 'the Gradle build files'),
+    (re.compile(r'^go\s+(?:mod\s+download|build)\b'), 'go.mod and go.sum'),
+    (re.compile(r'^bundle\s+install\b'), 'Gemfile and Gemfile.lock'),
+    (re.compile(r'^composer\s+install\b'), 'composer.json and composer.lock'),
+    (re.compile(r'^cargo\s+(?:build|fetch)\b'), 'Cargo.toml and Cargo.lock'),
+)
+BUILD_STEP_RE = re.compile(r'^(?:mvn\b.*\b(?:package|install|verify)\b|gradle\b|\./gradlew\b|go\s+build\b|'
+                           r'cargo\s+build\b|npm\s+run\s+build\b|yarn\s+build\b|make\b|dotnet\s+publish\b)')
+BUILD_PACKAGES = {'build-essential', 'build-base', 'gcc', 'g++', 'make', 'cmake', 'musl-dev', 'python3-dev',
+                  'python-dev', 'cargo', 'rustc', 'pkg-config', 'autoconf', 'automake', 'libtool'}
+
+# Commands whose effect on size, caching and security the rules understand
+KNOWN_COMMANDS = {
+    'apt-get', 'apt', 'apk', 'yum', 'dnf', 'microdnf', 'pip', 'pip3', 'python', 'python3', 'npm', 'npx',
+    'yarn', 'pnpm', 'node', 'corepack', 'mvn', 'mvnw', 'gradle', 'gradlew', 'go', 'cargo', 'rustup', 'gem',
+    'bundle', 'composer', 'php', 'dotnet', 'java', 'make', 'rm', 'mkdir', 'chmod', 'chown', 'chgrp', 'ln',
+    'echo', 'printf', 'cp', 'mv', 'touch', 'useradd', 'adduser', 'groupadd', 'addgroup', 'usermod', 'curl',
+    'wget', 'tar', 'unzip', 'gzip', 'gunzip', 'cd', 'export', 'set', 'true', 'test', 'git', 'sed', 'ls',
+    'cat', 'find', 'xargs', 'update-ca-certificates', 'locale-gen', 'ldconfig', 'pecl', 'docker-php-ext-install',
+    'sh', 'bash', 'sudo', 'env', 'exit'
+}
+# Base images whose variants and runtime footprint the rules know
+KNOWN_IMAGES = {
+    'python', 'node', 'golang', 'openjdk', 'eclipse-temurin', 'amazoncorretto', 'maven', 'gradle', 'ruby',
+    'php', 'rust', 'nginx', 'httpd', 'alpine', 'debian', 'ubuntu', 'busybox', 'scratch', 'centos', 'fedora',
+    'rockylinux', 'almalinux', 'amazonlinux', 'postgres', 'redis', 'mysql', 'mariadb', 'mongo', 'caddy',
+    'traefik', 'haproxy', 'tomcat'
+}
+SLIM_VARIANTS = {'python', 'node', 'ruby'}
+
+
+def _first_word(segment):
+    """`FOO=1 sudo /usr/bin/python3 x.py` -> 'python3'"""
+    words = segment.split()
+    while words and (ENV_ASSIGNMENT_RE.match(words[0]) or words[0] in ('sudo', 'exec', 'time', 'nohup')):
+        words = words[1:]
+    return words[0].rsplit('/', 1)[-1] if words else ''
+
+
+def _image_parts(reference):
+    """('python', '3.11-slim') for `docker.io/library/python:3.11-slim`; tag is None when absent"""
+    reference = reference.split('@', 1)[0]
+    name, _, tag = reference.rpartition(':') if ':' in reference.rsplit('/', 1)[-1] else (reference, '', '')
+    return name.rsplit('/', 1)[-1].lower(), tag or None
+
+
+class Stage:
+    """The instructions of one build stage, with RUN commands pre-split into segments."""
+
+    def __init__(self, from_cmd):
+        self.from_cmd = from_cmd
+        words = from_cmd['value'].split() if from_cmd else []
+        self.image = words[0] if words else ''
+        self.name = from_cmd['stage_name'] if from_cmd else None
+        self.commands = []
+        self.runs = []  # (cmd, segments)
+
+    def add(self, cmd):
+        self.commands.append(cmd)
+        if cmd['instruction'] == 'RUN':
+            value = ' '.join(cmd['json_args']) if cmd['json_args'] else cmd['value']
+            self.runs.append((cmd, [segment for segment in SEGMENT_SPLIT_RE.split(value.strip()) if segment]))
+
+
+def _split_stages(commands):
+    stages = []
+    for cmd in commands:
+        if cmd['instruction'] == 'FROM':
+            stages.append(Stage(cmd))
+        elif not stages:
+            stages.append(Stage(None))  # ARGs before the first FROM
+        if cmd['instruction'] != 'FROM':
+            stages[-1].add(cmd)
+    return stages
+
+
+def _finding(category, cmd, message):
+    return {'category': category, 'line': cmd['start_line'] if cmd else None, 'message': message}
+
+
+def _mounts(cmd):
+    """Options of every --mount on a RUN; the parser keeps a repeated flag as a list"""
+    mounts = cmd['flags'].get('mount', [])
+    if isinstance(mounts, str):
+        mounts = [mounts]
+    return [dict(option.strip().partition('=')[::2] for option in mount.split(',')) for mount in mounts]
+
+
+def _cache_mounted(cmd, path):
+    """Whether a cache mount on the RUN holds `path`, a directory inside it or one of its parents"""
+    for mount in _mounts(cmd):
+        target = mount.get('target') or mount.get('dst') or mount.get('destination')
+        if mount.get('type') != 'cache' or not target:
+            continue
+        target = posixpath.normpath(target)
+        if target == path or target.startswith(path + '/') or path.startswith(target.rstrip('/') + '/'):
+            return True
+    return False
+
+
+def check_apt(stages):
+    for stage in stages:
+        updated_alone = None
+        for cmd, segments in stage.runs:
+            installs = [segment for segment in segments if APT_INSTALL_RE.match(segment)]
+            if any(APT_UPDATE_RE.match(segment) for segment in segments) and not installs:
+                updated_alone = cmd
+            if not installs:
+                continue
+            if updated_alone is not None:
+                yield 'apt-update-separate', _finding(
+                    'layer_optimization', updated_alone,
+                    f"Run apt-get update in the same layer as apt-get install (line {cmd['start_line']}) "
+                    f"so a cached package index never goes stale")
+                updated_alone = None
+            if any('--no-install-recommends' not in segment for segment in installs):
+                yield 'apt-no-recommends', _finding(
+                    'dependencies', cmd,
+                    f"Add --no-install-recommends to apt-get install on line {cmd['start_line']} "
+                    f"to skip optional packages")
+            if not any('/var/lib/apt/lists' in segment for segment in segments) \
+                    and not _cache_mounted(cmd, '/var/lib/apt'):
+                yield 'apt-lists-not-cleaned', _finding(
+                    'layer_optimization', cmd,
+                    f"Remove /var/lib/apt/lists/* in the same layer as the apt-get install on line "
+                    f"{cmd['start_line']}; cleaning it in a later layer doesn't shrink the image")
+
+
+def check_apk_and_pip(stages):
+    for stage in stages:
+        for cmd, segments in stage.runs:
+            for segment in segments:
+                if APK_ADD_RE.match(segment) and '--no-cache' not in segment:
+                    yield 'apk-no-cache', _finding(
+                        'dependencies', cmd,
+                        f"Use apk add --no-cache on line {cmd['start_line']} so the package index isn't kept")
+                elif PIP_INSTALL_RE.match(segment) and '--no-cache-dir' not in segment \
+                        and not _cache_mounted(cmd, '/root/.cache'):
+                    yield 'pip-no-cache', _finding(
+                        'dependencies', cmd,
+                        f"Add --no-cache-dir to pip install on line {cmd['start_line']} to keep wheels "
+                        f"out of the image")
+                elif NPM_INSTALL_RE.match(segment) and ' -g' not in segment:
+                    yield 'npm-install', _finding(
+                        'dependencies', cmd,
+                        f"Use npm ci --omit=dev instead of npm install on line {cmd['start_line']} for "
+                        f"reproducible installs without dev dependencies")
+
+
+def check_base_images(stages):
+    names = set()
+    final = stages[-1] if stages else None
+    for stage in stages:
+        image = stage.image
+        # Earlier stages, build args and scratch have no tag to pin
+        skip = stage.from_cmd is None or not image or '$' in image or image == 'scratch' or image.lower() in names
+        names.add((stage.name or '').lower())
+        if skip:
+            continue
+        repo, tag = _image_parts(image)
+        if tag is None or tag == 'latest':
+            yield 'unpinned-base-image', _finding(
+                'base_image', stage.from_cmd,
+                f"Pin the base image on line {stage.from_cmd['start_line']} to a specific version instead "
+                f"of {image if tag else image + ' (implicitly latest)'}")
+        if stage is final and repo in SLIM_VARIANTS and not any(variant in (tag or '') for variant in
+                                                                ('slim', 'alpine')):
+            version = tag if tag and tag != 'latest' else '<version>'
+            yield 'full-base-image', _finding(
+                'base_image', stage.from_cmd,
+                f"Use the slim base image {repo}:{version}-slim on line {stage.from_cmd['start_line']}; "
+                f"the full image ships compilers and docs the runtime doesn't need")
+
+
+def check_user(stages):
+    final = stages[-1] if stages else None
+    if final is None or final.image == 'scratch' or 'distroless' in final.image:
+        return
+    users = [cmd for cmd in final.commands if cmd['instruction'] == 'USER']
+    if not users or users[-1]['value'].split(':')[0] in ('root', '0'):
+        yield 'runs-as-root', _finding(
+            'security', users[-1] if users else final.from_cmd,
+            "Create an unprivileged user and switch to it with USER so the container doesn't run as root")
+
+
+def check_copy_order(stages):
+    for stage in stages:
+        broad_copy = None
+        for cmd in stage.commands:
+            if cmd['instruction'] in ('COPY', 'ADD') and 'from' not in cmd['flags']:
+                sources = (cmd['json_args'] or cmd['value'].split())[:-1]
+                if broad_copy is None and any(source in ('.', './') for source in sources):
+                    broad_copy = cmd
+            elif cmd['instruction'] == 'RUN' and broad_copy is not None:
+                segments = SEGMENT_SPLIT_RE.split(cmd['value'].strip())
+                manifests = next((manifests for segment in segments for pattern, manifests in DEPENDENCY_INSTALLS
+                                  if pattern.match(segment)), None)
+                if manifests:
+                    yield 'copy-before-install', _finding(
+                        'layer_optimization', broad_copy,
+                        f"Copy only {manifests} before installing dependencies on line {cmd['start_line']}, "
+                        f"then copy the rest of the source, so source edits keep the dependency layer cached")
+                    break
+
+
+def check_multistage(stages):
+    if len([stage for stage in stages if stage.from_cmd is not None]) != 1:
+        return
+    stage = stages[-1]
+    for cmd, segments in stage.runs:
+        for segment in segments:
+            installs_build_tools = (APT_INSTALL_RE.match(segment) or APK_ADD_RE.match(segment)) and \
+                any(word in BUILD_PACKAGES for word in segment.split())
+            if installs_build_tools or BUILD_STEP_RE.match(segment):
+                yield 'missing-multistage', _finding(
+                    'layer_optimization', cmd,
+                    f"Use a multi-stage build: build in a builder stage (line {cmd['start_line']} needs "
+                    f"build tooling) and copy only the artifacts into a slim runtime stage")
+                return
+
+
+def check_consecutive_runs(stages):
+    for stage in stages:
+        run_block = []
+        for cmd in stage.commands + [None]:
+            if cmd is not None and cmd['instruction'] == 'RUN' and not cmd['heredocs']:
+                run_block.append(cmd)
+                continue
+            if len(run_block) > 1:
+                yield 'consecutive-runs', _finding(
+                    'layer_optimization', run_block[0],
+                    f"Combine the {len(run_block)} consecutive RUN instructions on lines "
+                    f"{run_block[0]['start_line']}-{run_block[-1]['start_line']} to reduce layer count")
+            run_block = []
+
+
+def check_security(stages):
+    for stage in stages:
+        for cmd in stage.commands:
+            if cmd['instruction'] in ('ENV', 'ARG'):
+                for name, _ in ENV_PAIR_RE.findall(cmd['value']):
+                    if SECRET_NAME_RE.search(name):
+                        yield 'secret-in-env', _finding(
+                            'security', cmd,
+                            f"Don't bake {name} into the image with {cmd['instruction']}; pass secrets with "
+                            f"BuildKit secret mounts or at runtime")
+            elif cmd['instruction'] == 'ADD':
+                sources = (cmd['json_args'] or cmd['value'].split())[:-1]
+                if sources and not any(URL_RE.match(source) or source.startswith('git@') for source in sources):
+                    yield 'add-local-files', _finding(
+                        'general', cmd,
+                        f"Use COPY instead of ADD for local files on line {cmd['start_line']}; ADD also "
+                        f"unpacks archives and fetches URLs implicitly")
+        for cmd, segments in stage.runs:
+            if PIPE_TO_SHELL_RE.search(cmd['value']):
+                yield 'pipe-to-shell', _finding(
+                    'security', cmd,
+                    f"Download the script on line {cmd['start_line']} to a file and verify its checksum "
+                    f"instead of piping it straight into a shell")
+            if any(segment.split()[0] == 'sudo' for segment in segments if segment.split()):
+                yield 'sudo', _finding(
+                    'security', cmd,
+                    f"Drop sudo on line {cmd['start_line']}; build steps already run as the current USER")
+
+
+RULES = (check_apt, check_apk_and_pip, check_base_images, check_user, check_copy_order, check_multistage,
+         check_consecutive_runs, check_security)
+
+
+def open_questions(stages):
+    """What the rules can't judge and an LLM should look at."""
+    questions = []
+    unknown = set()
+    stage_names = {(stage.name or '').lower() for stage in stages}
+    for stage in stages:
+        if stage.from_cmd is not None and stage.image and '$' not in stage.image:
+            repo, _ = _image_parts(stage.image)
+            if repo not in KNOWN_IMAGES and 'distroless' not in stage.image and stage.image.lower() not in stage_names:
+                questions.append(f"Is there a smaller or more secure alternative to the base image {stage.image} "
+                                 f"(line {stage.from_cmd['start_line']})?")
+        for cmd, segments in stage.runs:
+            if cmd['heredocs']:
+                questions.append(f"Review the inline script on line {cmd['start_line']} for size and caching issues.")
+                continue
+            for segment in segments:
+                word = _first_word(segment)
+                if word and word not in KNOWN_COMMANDS and word not in unknown:
+                    unknown.add(word)
+                    questions.append(f"What does `{' '.join(segment.split()[:4])}` (line {cmd['start_line']}) "
+                                     f"install or produce, and can it move to a builder stage or be trimmed?")
+    return questions
+
+
+class RuleEngine:
+    def __init__(self, rules=RULES):
+        self.rules = rules
+
+    def analyze(self, commands):
+        """
+        Run every rule over parsed commands. Returns findings (rule, category,
+        line, message), the same sections dict SuggestionParser produces and the
+        open questions that need an LLM.
+        """
+        stages = _split_stages(commands)
+        sections = {category: [] for category in CATEGORIES}
+        findings = []
+        for rule in self.rules:
+            for rule_id, finding in rule(stages):
+                finding['rule'] = rule_id
+                findings.append(finding)
+                sections[finding['category']].append(finding['message'])
+        questions = open_questions(stages)
+        return {'findings': findings, 'sections': sections, 'open_questions': questions, 'decided': not questions}
+
+
+def prompt_notes(analysis):
+    """Rule results for the LLM prompt, so it answers the open questions instead of repeating the rules."""
+    if not analysis['findings'] and not analysis['open_questions']:
+        return ''
+    notes = ''
+    if analysis['findings']:
+        notes += "\nLocal checks already reported these, so don't repeat them:\n" + \
+            '\n'.join(f"- {finding['message']}" for finding in analysis['findings']) + '\n'
+    if analysis['open_questions']:
+        notes += "\nFocus on these open questions:\n" + \
+            '\n'.join(f"- {question}" for question in analysis['open_questions']) + '\n'
+    return notes
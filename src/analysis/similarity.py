@@ -0,0 +1,270 @@
+"""
+Near-duplicate detection for Dockerfiles.
+
+Files are compared as sets of k-token shingles over their normalized
+instruction sequences (lower-cased, version numbers collapsed). Each set is
+summarized by a MinHash signature and indexed with LSH banding, so finding
+the candidates for a new file costs a few dictionary lookups instead of a scan
+of every file seen so far. Candidates are verified with the exact Jaccard
+similarity before a file joins a cluster.
+"""
+import hashlib
+import re
+import threading
+from difflib import SequenceMatcher
+
+TOKEN_RE = re.compile(r"[^\s\"'\[\],\\]+")
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)*')
+SKIPPED_TOKENS = {'&&', '||', ';', '|'}
+HASH_BITS = 64
+MAX_HASH = (1 << HASH_BITS) - 1
+# Minimum Jaccard similarity for a file to share its cluster representative's suggestions
+DEFAULT_SIMILARITY_THRESHOLD = 0.7
+
+
+def _raw_tokens(cmd):
+    return [token for token in TOKEN_RE.findall(cmd['value']) if token not in SKIPPED_TOKENS]
+
+
+def normalize_command(cmd):
+    """`RUN pip install flask==2.0.1` -> ['RUN', 'pip', 'install', 'flask==#']"""
+    return [cmd['instruction'].upper()] + [NUMBER_RE.sub('#', token.lower()) for token in _raw_tokens(cmd)]
+
+
+def shingles(commands, size=3):
+    """Hashed k-token shingles of the whole instruction stream."""
+    stream = [token for cmd in commands for token in normalize_command(cmd)]
+    if len(stream) <= size:
+        grams = [' '.join(stream)] if stream else []
+    else:
+        grams = (' '.join(stream[i:i + size]) for i in range(len(stream) - size + 1))
+    return {int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'big')
+            for gram in grams}
+
+
+def minhash(shingle_hashes, num_perm=128):
+    """
+    One-permutation MinHash: the hash space is split into `num_perm` bins and
+    each bin keeps its minimum, so a signature costs one hash per shingle
+    instead of one per shingle and permutation. Empty bins borrow the value of
+    the next non-empty bin, offset by the distance, which keeps signatures of
+    small sets comparable (rotation densification).
+    """
+    if not shingle_hashes:
+        return None
+    bins = [None] * num_perm
+    for value in shingle_hashes:
+        index, rest = value % num_perm, value // num_perm
+        if bins[index] is None or rest < bins[index]:
+            bins[index] = rest
+    if None in bins:
+        offset = MAX_HASH // num_perm + 1
+        filled = list(bins)
+        for index in range(num_perm):
+            distance = 1
+            while filled[index] is None:
+                source = bins[(index + distance) % num_perm]
+                if source is not None:
+                    filled[index] = source + distance * offset
+                distance += 1
+        bins = filled
+    return tuple(bins)
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def lsh_bands(threshold, num_perm):
+    """(bands, rows) whose LSH threshold (1/b)^(1/r) is closest to `threshold`."""
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+class MinHashLSH:
+    """Banded LSH over MinHash signatures: similar signatures share at least one band bucket."""
+
+    def __init__(self, threshold=0.8, num_perm=128):
+        self.num_perm = num_perm
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        self.tables = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [signature[band * rows:(band + 1) * rows] for band in range(self.bands)]
+
+    def insert(self, key, signature):
+        for table, band_key in zip(self.tables, self._band_keys(signature)):
+            table.setdefault(band_key, []).append(key)
+
+    def query(self, signature):
+        candidates = set()
+        for table, band_key in zip(self.tables, self._band_keys(signature)):
+            candidates.update(table.get(band_key, ()))
+        return candidates
+
+
+class DockerfileClusterIndex:
+    """
+    Incremental leader clustering. A file joins the most similar existing
+    representative whose Jaccard similarity is at least `threshold`; otherwise
+    it becomes a new representative. Only representatives are indexed, so each
+    file is checked against a handful of LSH candidates.
+    """
+
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD, num_perm=128, shingle_size=3):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.lsh = MinHashLSH(threshold, num_perm)
+        self.representatives = {}
+        self.clusters = {}
+        self.assignments = {}
+        self.similarities = {}
+        self.candidates_checked = 0
+        self._lock = threading.Lock()
+
+    def add(self, key, commands):
+        """Cluster one file and return the key of its representative (`key` itself if new)."""
+        file_shingles = shingles(commands, self.shingle_size)
+        signature = minhash(file_shingles, self.num_perm)
+        with self._lock:
+            if key in self.assignments:
+                return self.assignments[key]
+            best, best_similarity = None, self.threshold
+            if signature is not None:
+                size = len(file_shingles)
+                candidates = self.lsh.query(signature)
+                self.candidates_checked += len(candidates)
+                for candidate in candidates:
+                    candidate_shingles = self.representatives[candidate]['shingles']
+                    # Jaccard can't exceed the ratio of the set sizes, so skip the intersection when that's too low
+                    if min(size, len(candidate_shingles)) < best_similarity * max(size, len(candidate_shingles)):
+                        continue
+                    similarity = jaccard(file_shingles, candidate_shingles)
+                    if similarity >= best_similarity:
+                        best, best_similarity = candidate, similarity
+            if best is None:
+                self.representatives[key] = {'shingles': file_shingles, 'commands': commands}
+                self.clusters[key] = [key]
+                self.assignments[key] = key
+                self.similarities[key] = 1.0
+                if signature is not None:
+                    self.lsh.insert(key, signature)
+                return key
+            self.clusters[best].append(key)
+            self.assignments[key] = best
+            self.similarities[key] = round(best_similarity, 4)
+            return best
+
+    def representative_commands(self, key):
+        return self.representatives[key]['commands']
+
+    def report(self):
+        """
+        Clustering statistics. `max_llm_calls` is one request per cluster; how
+        many are really made depends on the rules, the cache and the answers.
+        """
+        with self._lock:
+            files = len(self.assignments)
+            sizes = [len(members) for members in self.clusters.values()]
+        clusters = len(sizes)
+        return {
+            'files': files,
+            'clusters': clusters,
+            'singletons': sum(1 for size in sizes if size == 1),
+            'largest_cluster': max(sizes, default=0),
+            'max_llm_calls': clusters,
+            'members': files - clusters,
+            'avg_candidates_per_file': round(self.candidates_checked / files, 1) if files else 0.0
+        }
+
+
+def _boundary_pattern(token):
+    return re.compile(r'(?<![\w/:.-])' + re.escape(token) + r'(?![\w/:-])')
+
+
+def _pair_by_instruction(representative_block, member_block):
+    """Pair differing instructions in order by instruction type; returns (pairs, unpaired representative commands)."""
+    pairs = []
+    unpaired = []
+    used = set()
+    for rep_cmd in representative_block:
+        match = next((index for index, member_cmd in enumerate(member_block)
+                      if index not in used and member_cmd['instruction'] == rep_cmd['instruction']), None)
+        if match is None:
+            unpaired.append(rep_cmd)
+        else:
+            used.add(match)
+            pairs.append((rep_cmd, member_block[match]))
+    return pairs, unpaired
+
+
+def project_suggestions(suggestions, representative_commands, member_commands):
+    """
+    Adapt a representative's suggestion text to a near-duplicate member.
+
+    Instructions are aligned on their normalized form. Where aligned
+    instructions differ, the representative's tokens are replaced by the
+    member's (e.g. `python:3.11` -> `python:3.12`); lines that mention tokens
+    only the representative has (a package the member doesn't install) are
+    dropped. Member instructions with no counterpart are returned as
+    `uncovered_instructions` so callers can decide whether to ask again.
+    """
+    representative_norm = [' '.join(normalize_command(cmd)) for cmd in representative_commands]
+    member_norm = [' '.join(normalize_command(cmd)) for cmd in member_commands]
+    member_tokens = {token for cmd in member_commands for token in _raw_tokens(cmd)}
+    substitutions = {}
+    representative_only = set()
+    uncovered = []
+
+    matcher = SequenceMatcher(None, representative_norm, member_norm, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            # Equal once normalized: the raw values can still differ in versions
+            pairs = [(a, b) for a, b in zip(representative_commands[i1:i2], member_commands[j1:j2])
+                     if a['value'] != b['value']]
+        else:
+            pairs, unpaired = _pair_by_instruction(representative_commands[i1:i2], member_commands[j1:j2])
+            for cmd in unpaired:
+                representative_only.update(_raw_tokens(cmd))
+            paired_members = {id(member_cmd) for _, member_cmd in pairs}
+            uncovered.extend(cmd['original'] for cmd in member_commands[j1:j2] if id(cmd) not in paired_members)
+        for rep_cmd, member_cmd in pairs:
+            rep_tokens, mem_tokens = _raw_tokens(rep_cmd), _raw_tokens(member_cmd)
+            tokens = SequenceMatcher(None, rep_tokens, mem_tokens, autojunk=False)
+            for token_tag, a1, a2, b1, b2 in tokens.get_opcodes():
+                if token_tag == 'replace' and a2 - a1 == b2 - b1:
+                    substitutions.update(zip(rep_tokens[a1:a2], mem_tokens[b1:b2]))
+                elif token_tag in ('replace', 'delete'):
+                    representative_only.update(rep_tokens[a1:a2])
+
+    # Short or shared tokens ('-y', 'install') say nothing about what differs
+    representative_only = {token for token in representative_only
+                           if len(token) >= 3 and token not in member_tokens and token not in substitutions}
+    substitutions = {old: new for old, new in substitutions.items() if old != new and old not in member_tokens}
+    drop_patterns = [_boundary_pattern(token) for token in representative_only]
+    replace_patterns = [(_boundary_pattern(old), new)
+                        for old, new in sorted(substitutions.items(), key=lambda item: -len(item[0]))]
+
+    lines = []
+    dropped = 0
+    substituted = 0
+    for line in suggestions.split('\n'):
+        if any(pattern.search(line) for pattern in drop_patterns):
+            dropped += 1
+            continue
+        for pattern, new in replace_patterns:
+            line, count = pattern.subn(new.replace('\\', '\\\\'), line)
+            substituted += count
+        lines.append(line)
+
+    return '\n'.join(lines), {
+        'similarity': round(matcher.ratio(), 4),
+        'substitutions': substituted,
+        'dropped_lines': dropped,
+        'uncovered_instructions': uncovered
+    }
@@ -1,5 +1,110 @@
 import re
 
+from .keyword_matcher import KeywordAutomaton
+
+# Weighted keywords for each category; stronger signals carry more weight
+KEYWORDS = {
+    'base_image': {'base image': 3, 'alpine': 2, 'slim': 2, 'distroless': 2, 'from': 1, 'ubuntu': 1,
+                   'debian': 1, 'python': 1, 'image': 1},
+    'layer_optimization': {'multi-stage': 3, 'layer': 2, 'combine': 2, 'run': 1, 'cache': 1, 'build': 1},
+    'dependencies': {'apt-get': 2, 'install': 1, 'package': 2, 'dependency': 2, 'dependencies': 2,
+                     'pip': 2, 'requirements': 2},
+    'security': {'security': 3, 'user': 2, 'root': 2, 'non-root': 3, 'permission': 2,
+                 'vulnerability': 3, 'vulnerabilities': 3, 'chown': 2}
+}
+
+# Built once at import time and shared by every parser instance
+KEYWORD_MATCHER = KeywordAutomaton(KEYWORDS)
+
+HEADER_RE = re.compile(r'^(?:\d+\.|[*-]\s+)')
+NUMBERING_RE = re.compile(r'^[\d+\.\s*\-]+\s*')
+NUMBERING_START = frozenset('0123456789+.*-')  # First characters HEADER_RE or NUMBERING_RE can match
+MARKDOWN_RE = re.compile(r'[*_`]')
+SKIP_PREFIXES = ('```', '`', '$', 'docker', 'RUN', 'COPY', 'CMD', 'ENTRYPOINT', 'FROM', '//', '#')
+
+CATEGORIES = ('base_image', 'layer_optimization', 'dependencies', 'security', 'general')
+
+
+class IncrementalSuggestionParser:
+    """
+    Chunk-fed version of SuggestionParser.parse_ai_response. Text can arrive in
+    arbitrary pieces (e.g. streamed tokens); each suggestion is emitted as soon
+    as the line containing it is complete.
+    """
+
+    def __init__(self):
+        self.sections = {category: [] for category in CATEGORIES}
+        self.current_section = 'general'
+        self.in_code_block = False
+        self.buffer = ''
+
+    def feed(self, chunk):
+        """Add text and return the (category, suggestion) pairs completed by it."""
+        self.buffer += chunk
+        if '\n' not in self.buffer:
+            return []
+        *complete, self.buffer = self.buffer.split('\n')
+        emitted = []
+        for line in complete:
+            result = self._process_line(line)
+            if result:
+                emitted.append(result)
+        return emitted
+
+    def close(self):
+        """Flush the final, unterminated line."""
+        line, self.buffer = self.buffer, ''
+        result = self._process_line(line)
+        return [result] if result else []
+
+    def _strip_code(self, line):
+        # Drop everything between ``` fences, which may span several lines
+        if '```' not in line:
+            return ''
+        kept = []
+        pieces = line.split('```')
+        for index, piece in enumerate(pieces):
+            if not self.in_code_block:
+                kept.append(piece)
+            if index < len(pieces) - 1:
+                self.in_code_block = not self.in_code_block
+        return ''.join(kept)
+
+    def _process_line(self, line):
+        if self.in_code_block or '```' in line:
+            line = self._strip_code(line)
+        line = line.strip()
+        if len(line) < 10:  # Skip short lines
+            return None
+        
+        # Skip lines that are commands or code
+        if line.startswith(SKIP_PREFIXES):
+            return None
+        
+        # Check for section headers (numbered or bullet points)
+        if line[0] in NUMBERING_START and HEADER_RE.match(line):
+            # Check for keywords to set current section
+            category = KEYWORD_MATCHER.categorize(line)
+            if category:
+                self.current_section = category
+            # Skip adding the header itself to the suggestions
+            return None
+        
+        # Clean the line from markdown formatting and bullets
+        # The regexes only run on lines that have something for them to remove
+        clean_line = NUMBERING_RE.sub('', line) if line[0] in NUMBERING_START else line  # Remove numbering/bullets
+        if '*' in clean_line or '_' in clean_line or '`' in clean_line:
+            clean_line = MARKDOWN_RE.sub('', clean_line).strip()  # Remove markdown
+        
+        if len(clean_line) < 10:
+            return None
+        
+        # Categorize based on keywords
+        category = KEYWORD_MATCHER.categorize(clean_line) or self.current_section
+        self.sections[category].append(clean_line)
+        return category, clean_line
+
+
 class SuggestionParser:
     @staticmethod
     def parse_ai_response(ai_text):
@@ -7,68 +112,15 @@ class SuggestionParser:
         Parses the AI's text response into structured categories.
         Handles numbered sections, code blocks, and markdown formatting.
         """
-        sections = {
-            'base_image': [],
-            'layer_optimization': [],
-            'dependencies': [],
-            'security': [],
-            'general': []
-        }
-        
-        # Remove code blocks to avoid parsing them
-        text = re.sub(r'```.*?```', '', ai_text, flags=re.DOTALL)
-        
-        # Define keywords for each category
-        keywords = {
-            'base_image': ['base image', 'alpine', 'slim', 'from', 'ubuntu', 'python', 'image'],
-            'layer_optimization': ['multi-stage', 'layer', 'combine', 'run', 'cache', 'build'],
-            'dependencies': ['apt-get', 'install', 'package', 'dependency', 'pip', 'requirements'],
-            'security': ['security', 'user', 'root', 'permission', 'vulnerability', 'chown']
-        }
-        
-        lines = text.split('\n')
-        current_section = 'general'
-        
-        for line in lines:
-            line = line.strip()
-            if not line or len(line) < 10:  # Skip short lines
-                continue
-            
-            # Skip lines that are commands or code
-            if line.startswith(('```', '`', '$', 'docker', 'RUN', 'COPY', 'CMD', 'ENTRYPOINT', 'FROM', '//', '#')):
-                continue
-            
-            # Check for section headers (numbered or bullet points)
-            if re.match(r'^\d+\.', line) or re.match(r'^[*-]\s+', line):
-                lower_line = line.lower()
-                # Check for keywords to set current section
-                for category, keys in keywords.items():
-                    if any(key in lower_line for key in keys):
-                        current_section = category
-                        break
-                # Skip adding the header itself to the suggestions
-                continue
-            
-            # Clean the line from markdown formatting and bullets
-            clean_line = re.sub(r'^[\d+\.\s*\-]+\s*', '', line)  # Remove numbering/bullets
-            clean_line = re.sub(r'[*_`]', '', clean_line).strip()  # Remove markdown
-            
-            if not clean_line or len(clean_line) < 10:
-                continue
-            
-            # Categorize based on keywords
-            lower_clean = clean_line.lower()
-            categorized = False
-            for category, keys in keywords.items():
-                if any(key in lower_clean for key in keys):
-                    sections[category].append(clean_line)
-                    categorized = True
-                    break
-            
-            if not categorized:
-                sections[current_section].append(clean_line)
-                
-        return sections
+        parser = IncrementalSuggestionParser()
+        parser.feed(ai_text)
+        parser.close()
+        return parser.sections
+
+    @staticmethod
+    def parse_many(ai_texts):
+        """Parse a batch of AI responses with the shared keyword automaton."""
+        return [SuggestionParser.parse_ai_response(ai_text) for ai_text in ai_texts]
 
     @staticmethod
     def print_structured_suggestions(parsed_suggestions):
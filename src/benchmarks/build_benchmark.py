@@ -0,0 +1,260 @@
+"""
+Repeated build benchmark: original vs rewritten Dockerfiles under cold and warm layer cache.
+
+Each variant is built N times per mode with the build order shuffled every round,
+so host drift (other load, disk cache, network) spreads evenly over both variants.
+Differences are reported with bootstrap confidence intervals and only flagged when
+the interval excludes zero and the effect is larger than --min-effect percent.
+
+Run from src/:  python -m benchmarks.build_benchmark --runs 5
+                python -m benchmarks.build_benchmark --dockerfile ../Dockerfile --optimized ../Dockerfile.optimized
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from optimization.dockerfile_rewriter import DockerfileRewriter
+from orchestration.fleet import percentile
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'corpus')
+DEFAULT_HISTORY = 'build_benchmark_history.jsonl'
+MODES = ('cold', 'warm')
+# Fixed hints so the rewriter's output, and therefore the benchmark, is reproducible
+REWRITE_HINTS = "Use a slim base image, combine RUN commands and avoid copying unnecessary files."
+
+
+def summarize(samples):
+    """Median, p95 and spread of a list of build times in seconds."""
+    if not samples:
+        return {'runs': 0, 'median': None, 'p95': None, 'mean': None, 'min': None, 'max': None, 'stdev': None}
+    return {
+        'runs': len(samples),
+        'median': round(statistics.median(samples), 3),
+        'p95': round(percentile(samples, 95), 3),
+        'mean': round(statistics.mean(samples), 3),
+        'min': round(min(samples), 3),
+        'max': round(max(samples), 3),
+        'stdev': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0
+    }
+
+
+def bootstrap_ci(before, after, resamples=2000, confidence=0.95, rng=None):
+    """Percentile bootstrap interval for median(after) - median(before)."""
+    rng = rng or random.Random(0)
+    deltas = []
+    for _ in range(resamples):
+        resampled_before = [rng.choice(before) for _ in before]
+        resampled_after = [rng.choice(after) for _ in after]
+        deltas.append(statistics.median(resampled_after) - statistics.median(resampled_before))
+    deltas.sort()
+    tail = (1 - confidence) / 2
+    low = deltas[int(tail * (resamples - 1))]
+    high = deltas[int(round((1 - tail) * (resamples - 1)))]
+    return round(low, 3), round(high, 3)
+
+
+def compare_samples(before, after, min_effect_percent=5.0, resamples=2000, confidence=0.95, rng=None):
+    """Classify the change from `before` to `after`; only significant changes get a verdict."""
+    if not before or not after:
+        return {'error': 'Not enough successful builds to compare'}
+    base = statistics.median(before)
+    delta = statistics.median(after) - base
+    low, high = bootstrap_ci(before, after, resamples, confidence, rng)
+    relative = (delta / base * 100) if base else 0.0
+    significant = (low > 0 or high < 0) and abs(relative) >= min_effect_percent
+    if not significant:
+        verdict = 'no significant change'
+    elif delta > 0:
+        verdict = 'regression'
+    else:
+        verdict = 'improvement'
+    return {
+        'median_delta_seconds': round(delta, 3),
+        'median_delta_percent': round(relative, 2),
+        'ci_low_seconds': low,
+        'ci_high_seconds': high,
+        'confidence': confidence,
+        'significant': significant,
+        'verdict': verdict
+    }
+
+
+def _default_build_func():
+    from optimization.image_builder import ImageBuilder
+    builder = ImageBuilder()
+
+    def build(dockerfile_path, tag_name, nocache):
+        return builder.build_image(dockerfile_path, tag_name, nocache=nocache)
+    return build
+
+
+class BuildBenchmark:
+    """
+    Builds every variant `runs` times per cache mode. Cold runs pass nocache so
+    every layer is rebuilt (base images stay pulled); warm runs first prime the
+    cache with `warmup` unmeasured builds. The first variant is the baseline.
+    """
+
+    def __init__(self, build_func=None, runs=5, warmup=1, modes=MODES, seed=0,
+                 min_effect_percent=5.0, resamples=2000, confidence=0.95, clock=time.perf_counter):
+        self.build_func = build_func or _default_build_func()
+        self.runs = runs
+        self.warmup = warmup
+        self.modes = modes
+        self.rng = random.Random(seed)
+        self.min_effect_percent = min_effect_percent
+        self.resamples = resamples
+        self.confidence = confidence
+        self.clock = clock
+
+    def _timed_build(self, dockerfile_path, tag_name, nocache):
+        start = self.clock()
+        stats = self.build_func(dockerfile_path, tag_name, nocache)
+        return self.clock() - start, stats
+
+    def run(self, variants, label='benchmark'):
+        """`variants` is an ordered list of (name, dockerfile_path); returns the report."""
+        names = [name for name, _ in variants]
+        tags = {name: f"{label}-{name}".lower().replace('_', '-') for name in names}
+        report = {'label': label, 'runs': self.runs, 'modes': {}}
+
+        for mode in self.modes:
+            nocache = mode == 'cold'
+            samples = {name: [] for name in names}
+            sizes = {name: None for name in names}
+            errors = {name: [] for name in names}
+
+            if not nocache:
+                for _ in range(self.warmup):
+                    for name, path in variants:
+                        self._timed_build(path, tags[name], nocache=False)
+
+            order = list(variants)
+            for _ in range(self.runs):
+                self.rng.shuffle(order)
+                for name, path in order:
+                    elapsed, stats = self._timed_build(path, tags[name], nocache)
+                    if stats.get('success'):
+                        samples[name].append(elapsed)
+                        sizes[name] = stats.get('size_mb')
+                    else:
+                        errors[name].append(stats.get('error', 'Build failed'))
+
+            baseline = names[0]
+            mode_report = {'variants': {}, 'comparisons': {}}
+            for name in names:
+                mode_report['variants'][name] = dict(summarize(samples[name]), size_mb=sizes[name],
+                                                     failures=len(errors[name]))
+                if errors[name]:
+                    mode_report['variants'][name]['last_error'] = errors[name][-1]
+            for name in names[1:]:
+                mode_report['comparisons'][name] = compare_samples(
+                    samples[baseline], samples[name], self.min_effect_percent,
+                    self.resamples, self.confidence, self.rng
+                )
+            report['modes'][mode] = mode_report
+        return report
+
+
+def prepare_corpus(corpus_dir, work_dir):
+    """Copy each corpus project to `work_dir` and write its rewritten Dockerfile next to it."""
+    projects = []
+    for name in sorted(os.listdir(corpus_dir)):
+        source = os.path.join(corpus_dir, name)
+        if not os.path.isfile(os.path.join(source, 'Dockerfile')):
+            continue
+        target = os.path.join(work_dir, name)
+        shutil.copytree(source, target)
+        original = os.path.join(target, 'Dockerfile')
+        rewriter = DockerfileRewriter(original)
+        optimized_lines = rewriter.apply_optimizations(rewriter.read_dockerfile(), REWRITE_HINTS)
+        optimized = rewriter.write_optimized_dockerfile(optimized_lines, output_path=original + '.optimized')
+        projects.append((name, original, optimized))
+    return projects
+
+
+def significant_regressions(reports):
+    return [(report['label'], mode, name)
+            for report in reports
+            for mode, mode_report in report['modes'].items()
+            for name, comparison in mode_report['comparisons'].items()
+            if comparison.get('verdict') == 'regression']
+
+
+def print_report(report):
+    print(f"\n📊 {report['label']} ({report['runs']} runs per mode)")
+    print("-" * 72)
+    for mode, mode_report in report['modes'].items():
+        for name, summary in mode_report['variants'].items():
+            if summary['runs']:
+                print(f"   {mode:<5} {name:<10} median {summary['median']:7.2f}s  p95 {summary['p95']:7.2f}s  "
+                      f"size {summary['size_mb']}MB  failures {summary['failures']}")
+            else:
+                print(f"   {mode:<5} {name:<10} no successful builds ({summary.get('last_error', '')[:40]})")
+        for name, comparison in mode_report['comparisons'].items():
+            if 'error' in comparison:
+                print(f"   {mode:<5} {name:<10} ❌ {comparison['error']}")
+                continue
+            flag = {'regression': '⚠️ ', 'improvement': '✅'}.get(comparison['verdict'], '  ')
+            print(f"   {mode:<5} {name:<10} {flag} {comparison['median_delta_seconds']:+.2f}s "
+                  f"({comparison['median_delta_percent']:+.1f}%), "
+                  f"{int(comparison['confidence'] * 100)}% CI [{comparison['ci_low_seconds']:+.2f}, "
+                  f"{comparison['ci_high_seconds']:+.2f}]s → {comparison['verdict']}")
+    print("-" * 72)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Cold/warm cache build benchmark")
+    arg_parser.add_argument('--runs', type=int, default=5, help="Measured builds per variant and mode")
+    arg_parser.add_argument('--warmup', type=int, default=1, help="Unmeasured builds that prime the warm cache")
+    arg_parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    arg_parser.add_argument('--dockerfile', help="Benchmark this Dockerfile instead of the bundled corpus")
+    arg_parser.add_argument('--optimized', help="Optimized variant of --dockerfile (default: <dockerfile>.optimized)")
+    arg_parser.add_argument('--corpus', default=CORPUS_DIR, help="Directory of projects with a Dockerfile each")
+    arg_parser.add_argument('--min-effect', type=float, default=5.0,
+                            help="Smallest median change, in percent, that can be flagged")
+    arg_parser.add_argument('--seed', type=int, default=0, help="Seed for build order and bootstrap")
+    arg_parser.add_argument('--output', default='build_benchmark.json')
+    arg_parser.add_argument('--history', default=DEFAULT_HISTORY,
+                            help="JSONL file the run summary is appended to, to track results over time")
+    arg_parser.add_argument('--fail-on-regression', action='store_true',
+                            help="Exit with status 1 when a significant regression is found")
+    args = arg_parser.parse_args()
+
+    benchmark = BuildBenchmark(runs=args.runs, warmup=args.warmup, modes=args.modes, seed=args.seed,
+                               min_effect_percent=args.min_effect)
+    reports = []
+    with tempfile.TemporaryDirectory(prefix='build-benchmark-') as work_dir:
+        if args.dockerfile:
+            optimized = args.optimized or f"{args.dockerfile}.optimized"
+            projects = [(os.path.basename(os.path.dirname(os.path.abspath(args.dockerfile))) or 'dockerfile',
+                         args.dockerfile, optimized)]
+        else:
+            projects = prepare_corpus(args.corpus, work_dir)
+        for name, original, optimized in projects:
+            report = benchmark.run([('original', original), ('optimized', optimized)], label=name)
+            reports.append(report)
+            print_report(report)
+
+    with open(args.output, 'w') as f:
+        json.dump(reports, f, indent=2)
+    with open(args.history, 'a') as f:
+        f.write(json.dumps({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': args.seed,
+                            'reports': reports}) + '\n')
+
+    regressions = significant_regressions(reports)
+    for label, mode, name in regressions:
+        print(f"⚠️  Significant {mode}-cache build regression: {label} ({name})")
+    print(f"\n📄 Benchmark saved to: {args.output} (history: {args.history})")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
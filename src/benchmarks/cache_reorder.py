@@ -0,0 +1,114 @@
+"""
+Rebuilt steps after a simulated source edit, with and without cache-aware reordering.
+
+The default mode replays edits through CacheAwareReorderer.simulate. With --docker each
+variant is really built, a source file is touched and the rebuild is profiled with the
+streaming build API, so the cache misses come from Docker itself.
+
+Run from src/:  python -m benchmarks.cache_reorder [--docker]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from benchmarks.build_benchmark import CORPUS_DIR, REWRITE_HINTS
+from optimization.cache_reorder import CacheAwareReorderer
+from optimization.dockerfile_rewriter import DockerfileRewriter
+
+
+def rewrite_variants(project_dir, prefetch_dependencies=False):
+    """Rewritten Dockerfile lines without and with the reorder pass, and the reorder report."""
+    path = os.path.join(project_dir, 'Dockerfile')
+    variants = {}
+    for label, reorder in (('rewritten', False), ('reordered', True)):
+        rewriter = DockerfileRewriter(path, reorder=reorder, prefetch_dependencies=prefetch_dependencies)
+        variants['original'] = rewriter.read_dockerfile()
+        variants[label] = rewriter.apply_optimizations(variants['original'], REWRITE_HINTS)
+    return variants, rewriter.reorder_result
+
+
+def simulate_project(project_dir, prefetch_dependencies=False):
+    """Rebuilt steps per edit kind for the original, rewritten and reordered Dockerfile, plus added steps."""
+    variants, report = rewrite_variants(project_dir, prefetch_dependencies)
+    if report['applied']:
+        return report['cache_estimate'], report['added_steps']
+    reorderer = CacheAwareReorderer(project_dir)
+    return reorderer.estimate(variants['rewritten'], variants['rewritten'], variants['original']), []
+
+
+def _source_file(project_dir):
+    for dirpath, _, filenames in os.walk(project_dir):
+        for name in sorted(filenames):
+            if not name.startswith('Dockerfile') and name not in ('package.json', 'requirements.txt', 'pom.xml'):
+                return os.path.join(dirpath, name)
+    return None
+
+
+def docker_project(project_dir):
+    """Build, edit one source file, rebuild: returns cache misses of the rebuild per variant."""
+    from optimization.image_builder import ImageBuilder
+    builder = ImageBuilder()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='cache-reorder-') as work_dir:
+        target = os.path.join(work_dir, os.path.basename(project_dir))
+        shutil.copytree(project_dir, target)
+        variants, _ = rewrite_variants(target)
+        for label in ('rewritten', 'reordered'):
+            lines = variants[label]
+            dockerfile = os.path.join(target, f'Dockerfile.{label}')
+            with open(dockerfile, 'w') as f:
+                f.writelines(lines)
+            tag = f'cache-reorder-{os.path.basename(project_dir)}-{label}'
+            primed = builder.profile_build(dockerfile, tag)
+            if not primed['success']:
+                results[label] = {'error': primed['error']}
+                continue
+            source = _source_file(target)
+            with open(source, 'a') as f:
+                f.write('\n')
+            rebuilt = builder.profile_build(dockerfile, tag)
+            if not rebuilt['success']:
+                results[label] = {'error': rebuilt['error']}
+                continue
+            profile = rebuilt['profile']
+            results[label] = {'cache_misses': profile['cache_misses'], 'steps': len(profile['steps']),
+                              'rebuild_seconds': profile['total_seconds']}
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Cache-aware reordering benchmark")
+    arg_parser.add_argument('--corpus', default=CORPUS_DIR)
+    arg_parser.add_argument('--docker', action='store_true', help="Measure real rebuilds instead of simulating")
+    arg_parser.add_argument('--prefetch-dependencies', action='store_true',
+                            help="Let reordering add a dependency prefetch step (mvn dependency:go-offline)")
+    args = arg_parser.parse_args()
+
+    for name in sorted(os.listdir(args.corpus)):
+        project_dir = os.path.join(args.corpus, name)
+        if not os.path.isfile(os.path.join(project_dir, 'Dockerfile')):
+            continue
+        print(f"\n{name}")
+        if args.docker:
+            for label, result in docker_project(project_dir).items():
+                if 'error' in result:
+                    print(f"   {label:<10} ❌ {result['error'][:60]}")
+                else:
+                    print(f"   {label:<10} {result['cache_misses']}/{result['steps']} steps rebuilt "
+                          f"in {result['rebuild_seconds']:.1f}s after a source edit")
+            continue
+        estimate, added_steps = simulate_project(project_dir, args.prefetch_dependencies)
+        for row in estimate['scenarios']:
+            print(f"   {row['scenario']:<14} rebuilt steps {row['original']['avg_rebuilt_steps']:5.1f} original, "
+                  f"{row['before']['avg_rebuilt_steps']:5.1f} rewritten → {row['after']['avg_rebuilt_steps']:5.1f} "
+                  f"reordered ({row['rebuilt_steps_delta']:+.1f})")
+        steps = estimate['expected_rebuilt_steps']
+        print(f"   expected rebuilt steps per edit {steps['original']} original, {steps['before']} rewritten "
+              f"→ {steps['after']} reordered")
+        for added in added_steps:
+            print(f"   added step: {added['added']}")
+
+
+if __name__ == "__main__":
+    main()
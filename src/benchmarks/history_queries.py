@@ -0,0 +1,109 @@
+"""
+Write throughput and query latency of the history store at fleet scale.
+
+Concurrent workers record synthetic runs (two image_metrics rows each, one
+per variant) spread over the last 60 days, then the trend, fleet trend,
+regression and latest-runs queries are timed against the filled database.
+
+Run from src/:  python -m benchmarks.history_queries --runs 500000 --images 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from orchestration.history import DAY, HistoryStore
+
+STAGES = ('parse', 'ai', 'rewrite', 'build')
+
+
+def synthetic_run(rng, image, recorded_at, base_size):
+    growth = 1 + (recorded_at % (60 * DAY)) / (60 * DAY) * rng.uniform(-0.05, 0.3)
+    size = round(base_size * growth, 2)
+    return {
+        'recorded_at': recorded_at, 'source': 'benchmark', 'image': image, 'status': 'ok', 'error': None,
+        'ai_source': 'Local rules', 'ai_suggestions': None, 'report': '{}',
+        'images': {
+            'original': {'size_mb': round(size * 1.6, 2), 'build_seconds': rng.uniform(20, 200),
+                         'vulnerabilities': rng.randint(20, 200), 'critical': rng.randint(0, 5),
+                         'high': rng.randint(0, 20), 'ready_seconds': None, 'memory_mb': None},
+            'optimized': {'size_mb': size, 'build_seconds': rng.uniform(10, 120),
+                          'vulnerabilities': rng.randint(0, 80), 'critical': rng.randint(0, 2),
+                          'high': rng.randint(0, 10), 'ready_seconds': None, 'memory_mb': None}
+        },
+        'layers': {},
+        'stages': {stage: rng.uniform(0.01, 30) for stage in STAGES}
+    }
+
+
+def fill(store, runs, images, workers, seed):
+    """Record `runs` runs from `workers` threads; returns seconds until all are committed."""
+    now = time.time()
+    per_worker = runs // workers
+
+    def _worker(index):
+        rng = random.Random(seed + index)
+        bases = {}
+        for _ in range(per_worker):
+            image = f"services/svc-{rng.randrange(images):05d}/Dockerfile"
+            base = bases.setdefault(image, rng.uniform(50, 1500))
+            store.record(synthetic_run(rng, image, now - rng.uniform(0, 60 * DAY), base))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=_worker, args=(index,)) for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.flush()
+    return time.perf_counter() - start, per_worker * workers
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(rows)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="History store write and query benchmark")
+    arg_parser.add_argument('--runs', type=int, default=500000, help="Runs to record (two metric rows each)")
+    arg_parser.add_argument('--images', type=int, default=5000)
+    arg_parser.add_argument('--workers', type=int, default=8)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--seed', type=int, default=7)
+    arg_parser.add_argument('--db', help="Keep the database at this path instead of a temporary file")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = args.db or os.path.join(work_dir, 'history.db')
+        store = HistoryStore(path)
+        seconds, recorded = fill(store, args.runs, args.images, args.workers, args.seed)
+        store.close()
+        print(f"Recorded {recorded} runs ({recorded * 2} image metric rows) from {args.workers} threads in "
+              f"{seconds:.1f}s: {recorded / seconds:,.0f} runs/s in {store.batches} batches")
+
+        month = time.time() - 30 * DAY
+        image = f"services/svc-{0:05d}/Dockerfile"
+        queries = {
+            'trend (one image, 30d)': lambda: store.trend('size_mb', image=image, since=month),
+            'trend (fleet, 30d)': lambda: store.trend('size_mb', since=month),
+            'top 20 size growth (30d)': lambda: store.regressions('size_mb', since=month, limit=20),
+            'top 20 CVE growth (30d)': lambda: store.regressions('vulnerabilities', since=month, limit=20),
+            'stage trend (build, 30d)': lambda: store.stage_trend('build', since=month),
+            'latest runs (one image)': lambda: store.runs(image=image),
+            'latest runs (fleet)': lambda: store.runs(limit=20)
+        }
+        for name, query in queries.items():
+            median_ms, rows = timed(query, args.repeat)
+            print(f"   {name:<26} {median_ms:>8.1f}ms  ({rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
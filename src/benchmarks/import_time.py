@@ -0,0 +1,88 @@
+"""
+Cold-start budget for the CLI, measured with `python -X importtime`.
+
+Each subcommand runs in a fresh interpreter; the cumulative import time of
+everything imported after interpreter startup is compared with a budget, and
+local-only subcommands must not load the heavy network/docker dependencies.
+
+Run from src/:  python -m benchmarks.import_time [--budget-ms 60] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DOCKERFILE = os.path.join(SRC_DIR, 'benchmarks', 'corpus', 'python-flask', 'Dockerfile')
+HEAVY_MODULES = ('requests', 'urllib3', 'docker', 'dotenv')
+
+# Subcommands that must stay local: (label, argv)
+LOCAL_COMMANDS = (
+    ('--help', ['--help']),
+    ('parse', ['parse', CORPUS_DOCKERFILE]),
+    ('rewrite', ['rewrite', CORPUS_DOCKERFILE, '--output', '-'])
+)
+
+
+def parse_importtime(stderr):
+    """({top-level module: cumulative µs}, every module imported) from `-X importtime` output."""
+    top_level = {}
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            _, cumulative, name = line[len('import time:'):].split('|', 2)
+            cumulative = int(cumulative)
+        except ValueError:
+            continue  # The header line
+        module = name.strip()
+        modules.add(module)
+        if len(name) - len(name.lstrip()) == 1:  # Nested imports are indented further
+            top_level[module] = top_level.get(module, 0) + cumulative
+    return top_level, modules
+
+
+def measure(argv, baseline=()):
+    """Import time (ms) beyond interpreter startup for `cli.main(argv)`, and every module loaded."""
+    code = f"import sys, cli; sys.exit(cli.main({argv!r}))" if argv is not None else 'pass'
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, OPTIMIZER_CACHE_DIR=cache_dir)
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=SRC_DIR,
+                                capture_output=True, text=True, env=env)
+    top_level, modules = parse_importtime(result.stderr)
+    spent_us = sum(cumulative for name, cumulative in top_level.items() if name not in baseline)
+    return spent_us / 1000, modules
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="CLI import-time budget")
+    arg_parser.add_argument('--budget-ms', type=float, default=60.0,
+                            help="Maximum median import time per local subcommand")
+    arg_parser.add_argument('--runs', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    _, baseline = measure(None)  # Modules the bare interpreter already imports at startup
+    failed = False
+    for label, argv in LOCAL_COMMANDS:
+        samples = []
+        heavy = set()
+        for _ in range(args.runs):
+            spent_ms, modules = measure(argv, baseline)
+            samples.append(spent_ms)
+            heavy |= {module for module in modules if module.split('.')[0] in HEAVY_MODULES}
+        median = statistics.median(samples)
+        over = median > args.budget_ms
+        failed = failed or over or bool(heavy)
+        status = '❌' if over or heavy else '✅'
+        print(f"{status} {label:<8} median {median:6.1f}ms (budget {args.budget_ms:.0f}ms, "
+              f"min {min(samples):.1f}ms)")
+        if heavy:
+            print(f"   loaded heavy modules: {', '.join(sorted(heavy))}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
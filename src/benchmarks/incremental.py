@@ -0,0 +1,118 @@
+"""
+Turnaround of an incremental run after a one-line edit.
+
+A generated multi-stage Dockerfile goes through the pipeline steps
+(suggestions, rewrite, both builds, both scans) against the latency-model
+LLM client and the fake Docker/Trivy backends: once from scratch, then
+incrementally after no change and after editing one RUN line in one stage.
+
+Run from src/:  python -m benchmarks.incremental --stages 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from analysis.ai_suggestor import GroqAISuggestor
+from analysis.dockerfile_parser import DockerfileParser
+from analysis.response_cache import ResponseCache
+from benchmarks.parse_throughput import generate_dockerfile
+from benchmarks.prompt_budget import LatencyModelClient
+from optimization.dockerfile_rewriter import DockerfileRewriter
+from orchestration.fake_backends import FakeImageBuilder, FakeTrivyScanner
+from orchestration.incremental import IncrementalRun, print_incremental_report
+
+
+def run_pipeline(path, suggestor, builder, scanner, state_dir=None):
+    """The pipeline's steps in order; returns (seconds per step, incremental report)"""
+    timings = {}
+    start = time.perf_counter()
+    commands = DockerfileParser(path).parse()
+    run = IncrementalRun(path, commands, state_dir=state_dir) if state_dir else None
+    timings['fingerprint'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if run:
+        signature = suggestor.signature()
+        ai_result = suggestor.get_suggestions_by_stage(path, commands=commands, reuse=run.ai_reuse(signature))
+        run.record_ai(signature, ai_result)
+    else:
+        ai_result = suggestor.get_suggestions(path, commands=commands)
+    timings['ai'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rewriter = DockerfileRewriter(path)
+    if run:
+        optimized_path = run.rewrite(rewriter, ai_result['suggestions'], output_path=f"{path}.optimized")
+    else:
+        lines = rewriter.apply_optimizations(rewriter.read_dockerfile(), ai_result['suggestions'])
+        optimized_path = rewriter.write_optimized_dockerfile(lines, output_path=f"{path}.optimized")
+    timings['rewrite'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for dockerfile, tag in ((path, 'original-image'), (optimized_path, 'optimized-image')):
+        if run:
+            run.build(builder.build_image, builder, dockerfile, tag)
+        else:
+            builder.build_image(dockerfile, tag)
+    timings['build'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scans = scanner.scan_images(['original-image', 'optimized-image'])
+    if run:
+        for tag, scan in scans.items():
+            run.record_scan(tag, scan)
+        run.save()
+    timings['scan'] = time.perf_counter() - start
+    return timings, run.report() if run else None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Incremental re-optimization benchmark")
+    arg_parser.add_argument('--stages', type=int, default=20)
+    arg_parser.add_argument('--build-latency', type=float, default=1.0, help="Seconds per fake image build")
+    arg_parser.add_argument('--scan-latency', type=float, default=0.5, help="Seconds per fake Trivy run")
+    args = arg_parser.parse_args()
+
+    # State and caches stay outside the build context, where `COPY . .` would pick them up
+    with tempfile.TemporaryDirectory() as work_dir, tempfile.TemporaryDirectory() as cache_dir:
+        path = os.path.join(work_dir, 'Dockerfile')
+        text = generate_dockerfile(args.stages)
+        with open(path, 'w') as f:
+            f.write(text)
+        for index in range(args.stages):
+            with open(os.path.join(work_dir, f"requirements{index}.txt"), 'w') as f:
+                f.write(f"flask==3.0.{index}\n")
+
+        suggestor = GroqAISuggestor(api_key='benchmark', client=LatencyModelClient(), use_cache=False)
+        builder = FakeImageBuilder(latency=args.build_latency)
+        scanner = FakeTrivyScanner(builder, latency=args.scan_latency, use_cache=True,
+                                   cache=ResponseCache(cache_dir=os.path.join(cache_dir, 'trivy')))
+
+        edited = text.replace('echo "building stage 7"', 'echo "building stage 7 (edited)"', 1)
+        scenarios = [
+            ('full pipeline', text, False),
+            ('incremental, first run', text, True),
+            ('incremental, no change', text, True),
+            ('incremental, 1 line edit', edited, True)
+        ]
+        print(f"{args.stages}-stage Dockerfile, {args.build_latency}s per build, {args.scan_latency}s per scan")
+        print(f"{'run':<26} {'total':>7} {'ai':>7} {'rewrite':>8} {'build':>7} {'scan':>7}")
+        baseline = None
+        for name, content, incremental in scenarios:
+            with open(path, 'w') as f:
+                f.write(content)
+            if not incremental:
+                scanner.cache.clear()
+            timings, report = run_pipeline(path, suggestor, builder, scanner,
+                                           os.path.join(cache_dir, 'incremental') if incremental else None)
+            total = sum(timings.values())
+            baseline = baseline or total
+            print(f"{name:<26} {total:>6.2f}s {timings['ai']:>6.2f}s {timings['rewrite']:>7.3f}s "
+                  f"{timings['build']:>6.2f}s {timings['scan']:>6.2f}s  ({total / baseline:.0%} of full)")
+            if report and name.endswith('edit'):
+                print_incremental_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark for DockerfileParser throughput.
+
+Run from src/:  python -m benchmarks.parse_throughput --files 50 --stages 40
+"""
+import argparse
+import random
+import re
+import time
+
+from analysis.dockerfile_parser import DockerfileParser
+
+STAGE_TEMPLATE = """FROM python:3.11-slim AS stage{index}
+ARG VERSION=1.{index}
+ENV APP_HOME=/srv/app{index} \\
+    PYTHONDONTWRITEBYTECODE=1
+WORKDIR $APP_HOME
+# install system packages
+RUN apt-get update \\
+    && apt-get install -y --no-install-recommends {packages} \\
+    # keep the layer small
+    && rm -rf /var/lib/apt/lists/*
+COPY --chown=app:app requirements{index}.txt ./
+RUN --mount=type=cache,target=/root/.cache pip install -r requirements{index}.txt
+RUN <<EOF
+echo "building stage {index}"
+python -m compileall .
+EOF
+COPY . .
+EXPOSE {port}
+CMD ["python", "-m", "app{index}"]
+"""
+
+PACKAGES = ['gcc', 'g++', 'make', 'libpq-dev', 'curl', 'git', 'libffi-dev', 'libssl-dev', 'ca-certificates']
+
+
+def generate_dockerfile(stages, seed=0):
+    rng = random.Random(seed)
+    chunks = []
+    for index in range(stages):
+        packages = ' '.join(rng.sample(PACKAGES, 4))
+        chunks.append(STAGE_TEMPLATE.format(index=index, packages=packages, port=8000 + index))
+    return '\n'.join(chunks)
+
+
+def legacy_parse(content):
+    """The original regex parser, kept here as the baseline."""
+    commands = []
+    content = re.sub(r'\\\s*\n', ' ', content)
+    current_command = None
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if current_command and not re.match(r'^\w+', line):
+            current_command['original'] += ' ' + line
+            current_command['arguments'] += ' ' + line
+            continue
+        match = re.match(r'^(\w+)\s+(.*)$', line)
+        if match:
+            current_command = {'instruction': match.group(1), 'arguments': match.group(2), 'original': line}
+            commands.append(current_command)
+    return commands
+
+
+def measure(label, parse_func, corpus, repeat):
+    total_bytes = sum(len(text.encode('utf-8')) for text in corpus) * repeat
+    start = time.perf_counter()
+    commands = 0
+    for _ in range(repeat):
+        for text in corpus:
+            commands += len(parse_func(text))
+    elapsed = time.perf_counter() - start
+    mb_per_sec = total_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+    print(f"{label:<10} {mb_per_sec:8.2f} MB/s  {commands / elapsed:12.0f} instructions/s  ({elapsed:.3f}s)")
+    return mb_per_sec
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Dockerfile parser throughput benchmark")
+    arg_parser.add_argument('--files', type=int, default=50)
+    arg_parser.add_argument('--stages', type=int, default=40)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    corpus = [generate_dockerfile(args.stages, seed=i) for i in range(args.files)]
+    size_mb = sum(len(text.encode('utf-8')) for text in corpus) / (1024 * 1024)
+    print(f"Corpus: {args.files} Dockerfiles, {size_mb:.2f} MB")
+    measure('tokenizer', lambda text: DockerfileParser.from_string(text).commands, corpus, args.repeat)
+    measure('legacy', legacy_parse, corpus, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
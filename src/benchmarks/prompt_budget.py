@@ -0,0 +1,85 @@
+"""
+Tokens sent and simulated latency for budgeted prompts.
+
+Each Dockerfile is sent once as the verbatim prompt the suggestor used to
+build (every instruction, 800-token completions) and once through
+PromptBuilder. The fake client's latency grows with prompt and completion
+size, so a large file analyzed as one call is compared with its stage parts
+analyzed concurrently.
+
+Run from src/:  python -m benchmarks.prompt_budget --stages 10 40
+"""
+import argparse
+import glob
+import os
+import time
+
+from analysis.ai_suggestor import GroqAISuggestor
+from analysis.dockerfile_parser import DockerfileParser
+from analysis.prompt_builder import PROMPT_TEMPLATE, PromptBuilder, count_tokens
+from benchmarks.parse_throughput import PACKAGES, generate_dockerfile
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'corpus')
+LEGACY_MAX_TOKENS = 800
+
+
+class LatencyModelClient:
+    """Answers instantly but sleeps like a hosted model: prefill per prompt token plus decode per output token."""
+
+    def __init__(self, prefill_ms=0.2, decode_ms=4.0, completion_ratio=0.5):
+        self.prefill_ms = prefill_ms
+        self.decode_ms = decode_ms
+        self.completion_ratio = completion_ratio
+
+    def chat(self, payload):
+        prompt_tokens = count_tokens(payload['messages'][0]['content'])
+        completion_tokens = min(payload['max_tokens'], int(prompt_tokens * self.completion_ratio))
+        time.sleep((prompt_tokens * self.prefill_ms + completion_tokens * self.decode_ms) / 1000)
+        content = "1. LAYER OPTIMIZATION:\nCombine the apt-get install steps into a single RUN layer\n"
+        return {'choices': [{'message': {'content': content}}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}}
+
+
+def corpus(stage_counts):
+    files = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*', 'Dockerfile'))):
+        files.append((os.path.basename(os.path.dirname(path)), DockerfileParser(path).parse()))
+    for stages in stage_counts:
+        text = generate_dockerfile(stages)
+        # A long generated install line, as emitted by lockfile-to-Dockerfile tools
+        text += "\nRUN apt-get update && apt-get install -y " + ' '.join(PACKAGES * 4) + "\n"
+        files.append((f"generated-{stages}-stages", DockerfileParser.from_string(text, 'generated').commands))
+    return files
+
+
+def legacy_call(client, commands):
+    prompt = PROMPT_TEMPLATE.format(context='', commands='\n'.join(cmd['original'] for cmd in commands))
+    start = time.perf_counter()
+    result = client.chat({'messages': [{'role': 'user', 'content': prompt}], 'max_tokens': LEGACY_MAX_TOKENS})
+    return result['usage']['prompt_tokens'], time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Prompt compaction and map-reduce benchmark")
+    arg_parser.add_argument('--stages', type=int, nargs='*', default=[10, 40])
+    arg_parser.add_argument('--prompt-budget', type=int, default=1200)
+    args = arg_parser.parse_args()
+
+    client = LatencyModelClient()
+    suggestor = GroqAISuggestor(api_key='benchmark', client=client, use_cache=False, tiered=False,
+                                prompt_builder=PromptBuilder(prompt_budget=args.prompt_budget))
+    print(f"{'Dockerfile':<22} {'tokens':>7} {'budgeted':>9} {'calls':>6} {'latency':>9} {'budgeted':>9}")
+    for name, commands in corpus(args.stages):
+        legacy_tokens, legacy_seconds = legacy_call(client, commands)
+        start = time.perf_counter()
+        result = suggestor.get_suggestions(name, commands=commands)
+        seconds = time.perf_counter() - start
+        print(f"{name:<22} {legacy_tokens:>7} {result['tokens_sent']:>9} {len(result['calls']):>6} "
+              f"{legacy_seconds:>8.2f}s {seconds:>8.2f}s")
+        compaction = result['compaction']
+        print(f"{'':<22} deduplicated {compaction['deduplicated']}, stripped {compaction['stripped']}, "
+              f"packages abbreviated {compaction['packages_abbreviated']}, truncated {compaction['truncated']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Local rule engine throughput and how many files it settles without an LLM call.
+
+Runs the rules over the sample corpus and a synthetic monorepo of
+near-duplicate Dockerfiles (see similarity_clustering), plus generated
+multi-stage files whose heredoc scripts the rules leave as open questions.
+
+Run from src/:  python -m benchmarks.rule_engine --files 10000
+"""
+import argparse
+import glob
+import os
+import time
+from collections import Counter
+
+from analysis.dockerfile_parser import DockerfileParser
+from analysis.rule_engine import RuleEngine
+from benchmarks.parse_throughput import generate_dockerfile
+from benchmarks.similarity_clustering import generate_corpus
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'corpus')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Local rule engine benchmark")
+    arg_parser.add_argument('--files', type=int, default=10000, help="Synthetic near-duplicate Dockerfiles")
+    arg_parser.add_argument('--multistage-files', type=int, default=100, help="Generated multi-stage Dockerfiles")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    parsed = [DockerfileParser(path).parse() for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*', 'Dockerfile')))]
+    parsed += [DockerfileParser.from_string(text, key).commands
+               for key, _, text in generate_corpus(args.files, max(1, args.files // 50), args.seed)]
+    parsed += [DockerfileParser.from_string(generate_dockerfile(3, seed), 'generated').commands
+               for seed in range(args.multistage_files)]
+
+    engine = RuleEngine()
+    rules = Counter()
+    decided = 0
+    start = time.perf_counter()
+    for commands in parsed:
+        analysis = engine.analyze(commands)
+        decided += analysis['decided']
+        rules.update(finding['rule'] for finding in analysis['findings'])
+    seconds = time.perf_counter() - start
+
+    print(f"📏 {len(parsed)} Dockerfiles in {seconds:.3f}s ({seconds / len(parsed) * 1e6:.0f}µs per file)")
+    print(f"   Settled locally: {decided} ({decided / len(parsed):.1%}); "
+          f"{len(parsed) - decided} need the LLM for open questions")
+    for rule, count in rules.most_common():
+        print(f"   {rule:<24} {count}")
+
+
+if __name__ == "__main__":
+    main()
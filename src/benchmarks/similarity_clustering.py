@@ -0,0 +1,157 @@
+"""
+Clustering time and LLM calls saved for a synthetic monorepo of near-duplicate Dockerfiles.
+
+Files are generated from random templates with small per-file variations (versions,
+one package more or less, ports, an extra ENV, a renamed entrypoint), so the number
+of templates is the ideal number of clusters. The LSH index is compared with
+leader clustering that checks every representative.
+
+Run from src/:  python -m benchmarks.similarity_clustering --files 10000 --templates 200
+"""
+import argparse
+import random
+import time
+
+from analysis.dockerfile_parser import DockerfileParser
+from analysis.similarity import DEFAULT_SIMILARITY_THRESHOLD, DockerfileClusterIndex, jaccard, shingles
+
+SKELETONS = {
+    'python': ("FROM python:{v1}.{v2}-slim\nWORKDIR /{app}\n"
+               "RUN apt-get update && apt-get install -y {packages} && rm -rf /var/lib/apt/lists/*\n"
+               "COPY requirements.txt .\nRUN pip install --no-cache-dir -r requirements.txt\n"
+               "{extra}COPY . .\nEXPOSE {port}\nCMD [\"python\", \"{entry}.py\"]\n"),
+    'node': ("FROM node:{v1}-alpine\nWORKDIR /{app}\nRUN apk add --no-cache {packages}\n"
+             "COPY package*.json ./\nRUN npm ci --omit=dev\n{extra}COPY . .\nEXPOSE {port}\n"
+             "CMD [\"node\", \"{entry}.js\"]\n"),
+    'java': ("FROM maven:3.{v2}-eclipse-temurin-{v1}\nWORKDIR /{app}\n"
+             "RUN apt-get update && apt-get install -y {packages}\nCOPY pom.xml .\n"
+             "RUN mvn -B dependency:go-offline\n{extra}COPY src ./src\nRUN mvn -B package -DskipTests\n"
+             "EXPOSE {port}\nCMD [\"java\", \"-jar\", \"target/{entry}.jar\"]\n"),
+    'go': ("FROM golang:1.{v2}\nWORKDIR /{app}\nRUN apt-get update && apt-get install -y {packages}\n"
+           "COPY go.mod go.sum ./\nRUN go mod download\n{extra}COPY . .\nRUN go build -o /bin/{entry} .\n"
+           "EXPOSE {port}\nENTRYPOINT [\"/bin/{entry}\"]\n")
+}
+PACKAGES = ['gcc', 'g++', 'make', 'curl', 'git', 'wget', 'jq', 'unzip', 'openssl', 'ca-certificates',
+            'libpq-dev', 'libffi-dev', 'libssl-dev', 'libxml2-dev', 'zlib1g-dev', 'tini', 'bash',
+            'postgresql-client', 'imagemagick', 'ffmpeg', 'graphviz', 'netcat', 'vim', 'less']
+EXTRA_STEPS = ['RUN useradd -m app', 'ENV PYTHONUNBUFFERED=1', 'RUN mkdir -p /data /logs',
+               'ARG BUILD_ENV=production', 'ENV TZ=UTC', 'RUN update-ca-certificates',
+               'LABEL maintainer=platform-team', 'HEALTHCHECK CMD curl -f http://localhost/health',
+               'RUN chmod +x /usr/local/bin/entrypoint.sh', 'COPY config/ /etc/service/',
+               'RUN echo "export PATH=/opt/bin:$PATH" >> /etc/profile', 'USER app',
+               'VOLUME /data', 'ENV LOG_LEVEL=info', 'RUN ln -sf /dev/stdout /var/log/app.log']
+WORDS = ['billing', 'search', 'auth', 'gateway', 'worker', 'ingest', 'report', 'notify', 'catalog',
+         'orders', 'ledger', 'profile', 'media', 'export', 'metrics', 'scheduler']
+
+
+def make_templates(count, rng):
+    templates = []
+    for _ in range(count):
+        templates.append({
+            'ecosystem': rng.choice(sorted(SKELETONS)),
+            'app': f"{rng.choice(WORDS)}-{rng.choice(WORDS)}",
+            'entry': rng.choice(WORDS),
+            'packages': rng.sample(PACKAGES, 5),
+            'extra': rng.sample(EXTRA_STEPS, 3),
+            'port': rng.choice([3000, 5000, 8000, 8080, 9000])
+        })
+    return templates
+
+
+def make_variant(template, rng):
+    """A small edit of a template, like a copy-pasted Dockerfile drifting in a monorepo."""
+    packages = list(template['packages'])
+    extra = list(template['extra'])
+    roll = rng.random()
+    if roll < 0.25:
+        packages.remove(rng.choice(packages))
+    elif roll < 0.5:
+        packages.append(rng.choice([p for p in PACKAGES if p not in packages]))
+    if rng.random() < 0.2:
+        extra.append(rng.choice([step for step in EXTRA_STEPS if step not in extra]))
+    return SKELETONS[template['ecosystem']].format(
+        v1=rng.choice([11, 17, 18, 20, 21]), v2=rng.choice([9, 10, 11, 12, 21, 22]),
+        app=template['app'], packages=' '.join(packages), extra=''.join(step + '\n' for step in extra),
+        port=template['port'] + rng.choice([0, 0, 0, 1]),
+        entry=template['entry'] if rng.random() < 0.9 else rng.choice(WORDS))
+
+
+def generate_corpus(files, templates, seed=0):
+    rng = random.Random(seed)
+    pool = make_templates(templates, rng)
+    corpus = []
+    for index in range(files):
+        template_id = rng.randrange(len(pool))
+        corpus.append((f"service-{index}/Dockerfile", template_id, make_variant(pool[template_id], rng)))
+    return corpus
+
+
+def purity(index, labels):
+    """Fraction of files whose cluster's majority template is their own template."""
+    agreeing = 0
+    for members in index.clusters.values():
+        counts = {}
+        for member in members:
+            counts[labels[member]] = counts.get(labels[member], 0) + 1
+        agreeing += max(counts.values())
+    return agreeing / len(labels) if labels else 0.0
+
+
+def brute_force_clusters(parsed, threshold, shingle_size=3):
+    """Leader clustering that compares every file with every representative."""
+    representatives = []
+    for _, commands in parsed:
+        file_shingles = shingles(commands, shingle_size)
+        if not any(jaccard(file_shingles, rep) >= threshold for rep in representatives):
+            representatives.append(file_shingles)
+    return len(representatives)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Near-duplicate Dockerfile clustering benchmark")
+    arg_parser.add_argument('--files', type=int, default=10000)
+    arg_parser.add_argument('--templates', type=int, default=200)
+    arg_parser.add_argument('--threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLD)
+    arg_parser.add_argument('--brute-force-files', type=int, default=2000,
+                            help="Also time the all-representatives scan on this many files (0 to skip)")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    corpus = generate_corpus(args.files, args.templates, args.seed)
+    start = time.perf_counter()
+    parsed = [(key, DockerfileParser.from_string(text, key).commands) for key, _, text in corpus]
+    parse_seconds = time.perf_counter() - start
+    labels = {key: template_id for key, template_id, _ in corpus}
+
+    index = DockerfileClusterIndex(threshold=args.threshold)
+    start = time.perf_counter()
+    for key, commands in parsed:
+        index.add(key, commands)
+    cluster_seconds = time.perf_counter() - start
+    report = index.report()
+
+    print(f"📁 {args.files} Dockerfiles from {args.templates} templates (parsed in {parse_seconds:.2f}s)")
+    print(f"🔗 LSH clustering: {cluster_seconds:.2f}s ({args.files / cluster_seconds:,.0f} files/s, "
+          f"{index.lsh.bands} bands x {index.lsh.rows} rows, "
+          f"{report['avg_candidates_per_file']} candidates per file vs {report['clusters']} representatives)")
+    print(f"   Clusters: {report['clusters']} ({report['singletons']} singletons, "
+          f"largest {report['largest_cluster']}), purity {purity(index, labels):.1%}")
+    print(f"   LLM calls: at most {report['max_llm_calls']} instead of {report['files']} "
+          f"({report['members'] / report['files']:.1%} of files can reuse a representative's answer)")
+
+    if args.brute_force_files:
+        subset = parsed[:args.brute_force_files]
+        start = time.perf_counter()
+        brute_force_clusters(subset, args.threshold)
+        brute_seconds = time.perf_counter() - start
+        subset_index = DockerfileClusterIndex(threshold=args.threshold)
+        start = time.perf_counter()
+        for key, commands in subset:
+            subset_index.add(key, commands)
+        lsh_seconds = time.perf_counter() - start
+        print(f"⚖️  First {len(subset)} files: LSH {lsh_seconds:.2f}s vs scanning every representative "
+              f"{brute_seconds:.2f}s ({brute_seconds / lsh_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark SuggestionParser categorization over recorded LLM responses.
+
+Run from src/:  python -m benchmarks.suggestion_categorize --repeat 200
+
+Besides the full parse it times per-line categorization alone, against a
+substring scan of the same keyword table, as the table grows with synthetic
+keywords: the scan costs one `in` per keyword, the matcher one set
+intersection per line, so the matcher only pulls ahead on larger tables.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+from analysis.keyword_matcher import KeywordAutomaton
+from analysis.suggestion_parser import KEYWORDS, SuggestionParser
+
+RESPONSES_PATH = os.path.join(os.path.dirname(__file__), 'data', 'llm_responses.jsonl')
+
+
+def load_responses(path=RESPONSES_PATH):
+    with open(path, 'r') as f:
+        return [json.loads(line)['content'] for line in f if line.strip()]
+
+
+def legacy_parse_ai_response(ai_text):
+    """The original substring-scanning implementation, kept here as the baseline."""
+    sections = {'base_image': [], 'layer_optimization': [], 'dependencies': [], 'security': [], 'general': []}
+    text = re.sub(r'```.*?```', '', ai_text, flags=re.DOTALL)
+    keywords = {
+        'base_image': ['base image', 'alpine', 'slim', 'from', 'ubuntu', 'python', 'image'],
+        'layer_optimization': ['multi-stage', 'layer', 'combine', 'run', 'cache', 'build'],
+        'dependencies': ['apt-get', 'install', 'package', 'dependency', 'pip', 'requirements'],
+        'security': ['security', 'user', 'root', 'permission', 'vulnerability', 'chown']
+    }
+    current_section = 'general'
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line or len(line) < 10:
+            continue
+        if line.startswith(('```', '`', '$', 'docker', 'RUN', 'COPY', 'CMD', 'ENTRYPOINT', 'FROM', '//', '#')):
+            continue
+        if re.match(r'^\d+\.', line) or re.match(r'^[*-]\s+', line):
+            lower_line = line.lower()
+            for category, keys in keywords.items():
+                if any(key in lower_line for key in keys):
+                    current_section = category
+                    break
+            continue
+        clean_line = re.sub(r'^[\d+\.\s*\-]+\s*', '', line)
+        clean_line = re.sub(r'[*_`]', '', clean_line).strip()
+        if not clean_line or len(clean_line) < 10:
+            continue
+        lower_clean = clean_line.lower()
+        categorized = False
+        for category, keys in keywords.items():
+            if any(key in lower_clean for key in keys):
+                sections[category].append(clean_line)
+                categorized = True
+                break
+        if not categorized:
+            sections[current_section].append(clean_line)
+    return sections
+
+
+def substring_categorizer(weighted_keywords):
+    """The legacy first-match substring scan, over any keyword table"""
+    keywords = {category: list(table) for category, table in weighted_keywords.items()}
+
+    def categorize(line):
+        lower_line = line.lower()
+        for category, keys in keywords.items():
+            if any(key in lower_line for key in keys):
+                return category
+        return None
+    return categorize
+
+
+def grown_table(extra, seed=1):
+    """KEYWORDS plus `extra` random single-word keywords spread over the categories"""
+    rng = random.Random(seed)
+    table = {category: dict(keywords) for category, keywords in KEYWORDS.items()}
+    categories = list(table)
+    for index in range(extra):
+        word = ''.join(rng.choice('bcdfghjklmnpqrstvwxz') for _ in range(rng.randint(5, 9)))
+        table[categories[index % len(categories)]][word] = 1
+    return table
+
+
+def best_times(funcs, rounds):
+    """Minimum CPU time of each callable over interleaved rounds, so machine noise hits all alike"""
+    best = {label: float('inf') for label in funcs}
+    for _ in range(rounds):
+        for label, func in funcs.items():
+            start = time.process_time()
+            func()
+            best[label] = min(best[label], time.process_time() - start)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Suggestion categorization benchmark")
+    arg_parser.add_argument('--repeat', type=int, default=200, help="Times to replay the recorded corpus")
+    arg_parser.add_argument('--rounds', type=int, default=7, help="Interleaved timing rounds; the best is kept")
+    args = arg_parser.parse_args()
+
+    responses = load_responses()
+    corpus = responses * args.repeat
+    lines = sum(text.count('\n') + 1 for text in corpus)
+    print(f"Corpus: {len(responses)} recorded responses x {args.repeat} ({lines} lines)")
+    times = best_times({
+        'legacy': lambda: [legacy_parse_ai_response(text) for text in corpus],
+        'automaton': lambda: SuggestionParser.parse_many(corpus),
+    }, args.rounds)
+    for label, elapsed in times.items():
+        print(f"{label:<10} {lines / elapsed:12.0f} lines/s")
+    print(f"Full parse speedup: {times['legacy'] / times['automaton']:.2f}x")
+
+    candidates = [line.strip() for text in corpus for line in text.split('\n') if len(line.strip()) >= 10]
+    print(f"\nPer-line categorization, {len(candidates)} lines:")
+    for extra in (0, 30, 100, 300):
+        table = grown_table(extra)
+        substring, matcher = substring_categorizer(table), KeywordAutomaton(table).categorize
+        times = best_times({
+            'substring': lambda: [substring(line) for line in candidates],
+            'automaton': lambda: [matcher(line) for line in candidates],
+        }, args.rounds)
+        size = sum(len(keywords) for keywords in table.values())
+        per_line = {label: elapsed * 1e6 / len(candidates) for label, elapsed in times.items()}
+        print(f"  {size:4d} keywords: substring {per_line['substring']:.2f}us  automaton {per_line['automaton']:.2f}us"
+              f"  speedup {times['substring'] / times['automaton']:.2f}x")
+
+    changed = 0
+    for text in responses:
+        old, new = legacy_parse_ai_response(text), SuggestionParser.parse_ai_response(text)
+        for category in new:
+            for item in new[category]:
+                if item not in old[category]:
+                    changed += 1
+                    print(f"  recategorized -> {category}: {item[:70]}")
+    print(f"{changed} suggestions categorized differently from the legacy parser")
+
+
+if __name__ == "__main__":
+    main()
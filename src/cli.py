@@ -0,0 +1,328 @@
+"""
+Unified command line for the optimizer.
+
+Subcommands import what they need on demand: `parse` and `rewrite` never load
+requests, python-dotenv or the docker SDK, so they stay fast enough to run as a
+pre-commit hook or CI step.
+
+Installed:      docker-optimizer parse Dockerfile
+Run from src/:  python cli.py rewrite ../Dockerfile --output -
+"""
+import argparse
+import json
+import sys
+
+
+def cmd_parse(args):
+    from analysis.dockerfile_parser import DockerfileParser
+    parser = DockerfileParser(args.dockerfile)
+    commands = parser.parse()
+    if not commands:
+        return 1
+    if args.json:
+        print(json.dumps({'directives': parser.directives, 'stages': parser.stages, 'commands': commands}, indent=2))
+        return 0
+    for cmd in commands:
+        print(f"{cmd['start_line']:>4}  {cmd['instruction']:<11} {' '.join(cmd['value'].split())[:80]}")
+    print(f"\n{len(commands)} instructions in {len(parser.stages)} stage(s)")
+    return 0
+
+
+def _get_suggestions(dockerfile, use_cache=True, stream=False, on_suggestion=None, tiered=True):
+    from analysis.ai_suggestor import GroqAISuggestor
+    from analysis.dockerfile_parser import DockerfileParser
+    commands = DockerfileParser(dockerfile).parse()
+    suggestor = GroqAISuggestor(use_cache=use_cache, tiered=tiered)
+    if stream:
+        return suggestor.get_suggestions_stream(dockerfile, commands=commands, on_suggestion=on_suggestion)
+    return suggestor.get_suggestions(dockerfile, commands=commands)
+
+
+def cmd_suggest(args):
+    from analysis.suggestion_parser import SuggestionParser
+
+    def on_suggestion(category, text):
+        print(f"  [{category.upper().replace('_', ' ')}] {text}")
+
+    result = _get_suggestions(args.dockerfile, use_cache=not args.no_cache, stream=args.stream,
+                              on_suggestion=None if args.json else on_suggestion, tiered=not args.always_ai)
+    if "error" in result:
+        print(f"❌ Error: {result['error']}")
+        return 1
+    structured = result.get('structured') or SuggestionParser.parse_ai_response(result['suggestions'])
+    if args.json:
+        print(json.dumps({'source': result.get('source'), 'cached': result.get('cached', False),
+                          'calls': result.get('calls', []), 'tokens_sent': result.get('tokens_sent', 0),
+                          'open_questions': result.get('open_questions', []), 'suggestions': structured}, indent=2))
+        return 0
+    if not args.stream:
+        SuggestionParser.print_structured_suggestions(structured)
+    if result.get('source') == 'Local rules':
+        print("📏 Settled by local rules, no API call" if not result['open_questions'] else
+              f"📏 Local rules only; {len(result['open_questions'])} open question(s) need an API key")
+    for call in result.get('calls', []):
+        print(f"📨 {call['part']}: {call['prompt_tokens']} prompt tokens, "
+              f"max {call['max_tokens']} completion tokens, {call['latency_seconds']}s")
+    return 0
+
+
+def cmd_rewrite(args):
+    from optimization.dockerfile_rewriter import DockerfileRewriter
+    hints = args.hints or ''
+    if args.ai:
+        result = _get_suggestions(args.dockerfile, use_cache=not args.no_cache, tiered=not args.always_ai)
+        if "error" in result:
+            print(f"❌ AI Error: {result['error']}", file=sys.stderr)
+            return 1
+        hints = result['suggestions']
+
+    rewriter = DockerfileRewriter(args.dockerfile, multistage=not args.no_multistage, reorder=not args.no_reorder,
+                                  prefetch_dependencies=args.prefetch_dependencies,
+                                  cross_distribution=args.cross_distribution)
+    lines = rewriter.apply_optimizations(rewriter.read_dockerfile(), hints)
+    if args.output == '-':
+        sys.stdout.writelines(lines)
+        return 0
+
+    output = rewriter.write_optimized_dockerfile(lines, output_path=args.output or f"{args.dockerfile}.optimized")
+    print(f"✅ Optimized Dockerfile written to: {output}")
+    for change in rewriter.base_image_changes:
+        print(f"   Base image: {change['original']} → {change['replacement']} "
+              f"(-{change['bytes_saved'] / (1024 * 1024):.0f}MB)")
+    if rewriter.multistage_result and rewriter.multistage_result['applied']:
+        print(f"   Multi-stage: {rewriter.multistage_result['ecosystem']} builder → "
+              f"{rewriter.multistage_result['runtime_image']}")
+    if rewriter.reorder_result and rewriter.reorder_result['applied']:
+        steps = rewriter.reorder_result['cache_estimate']['expected_rebuilt_steps']
+        print(f"   Cache-aware reorder: {steps['before']} → {steps['after']} steps rebuilt per typical edit "
+              f"(original Dockerfile: {steps['original']})")
+        for added in rewriter.reorder_result['added_steps']:
+            print(f"   Added step: {added['added']} (ahead of {added['ahead_of']})")
+    if args.suggest_dockerignore:
+        from optimization.build_context import ContextMinimizer
+        print(f"   .dockerignore suggestions: {ContextMinimizer(args.dockerfile).write_dockerignore()}")
+    return 0
+
+
+def cmd_build(args):
+    from optimization.image_builder import ImageBuilder
+    builder = ImageBuilder()
+    if args.profile:
+        stats = builder.profile_build(args.dockerfile, args.tag, minimal_context=args.minimal_context)
+    else:
+        stats = builder.build_image(args.dockerfile, args.tag, minimal_context=args.minimal_context,
+                                    nocache=args.no_cache)
+    if not stats['success']:
+        print(f"❌ Build failed: {stats['error']}")
+        return 1
+    print(f"✅ Built {args.tag}: {stats['size_mb']}MB in {stats['build_time']}s")
+    if 'context' in stats:
+        context = stats['context']
+        print(f"   Context: {context['files']} files, {context['context_bytes']} of "
+              f"{context['full_context_bytes']} bytes ({context['reduction_percent']}% smaller)")
+    if 'profile' in stats:
+        profile = stats['profile']
+        print(f"   Steps: {len(profile['steps'])}, cache hits: {profile['cache_hits']}")
+        for step in sorted(profile['steps'], key=lambda step: step['seconds'], reverse=True)[:5]:
+            print(f"   {step['seconds']:7.2f}s {'(cached) ' if step['cached'] else ''}{step['instruction'][:60]}")
+    if args.analyze_layers:
+        from analysis.dockerfile_parser import DockerfileParser
+        from optimization.layer_analyzer import LayerAnalyzer, print_layer_report
+        analysis = LayerAnalyzer(builder.client).analyze_image(stats['image'], DockerfileParser(args.dockerfile).parse())
+        print_layer_report(args.tag, analysis)
+    return 0
+
+
+def cmd_scan(args):
+    from security.trivy_scanner import TrivyScanner
+    scanner = TrivyScanner(trivy_path=args.trivy_path, use_cache=not args.no_cache, max_parallel=args.parallel)
+    scans = scanner.scan_images(args.images)
+    failed = False
+    summary = {}
+    for image in args.images:
+        scan = scans[image]
+        if 'error' in scan:
+            failed = True
+            summary[image] = {'error': scan['error']}
+            continue
+        vulns = list(scanner.vulnerability_set(scan).values())
+        summary[image] = {'vulnerabilities': len(vulns), 'by_severity': scanner._severity_counts(vulns),
+                          'cached': scan.get('cached', False)}
+    diff = scanner.compare_vulnerabilities(scans[args.images[0]], scans[args.images[1]]) \
+        if len(args.images) == 2 and not failed else None
+
+    if args.json:
+        print(json.dumps({'images': summary, 'diff': diff}, indent=2))
+        return 1 if failed else 0
+    for image, result in summary.items():
+        if 'error' in result:
+            print(f"❌ {image}: {result['error'][:200]}")
+            continue
+        counts = ', '.join(f"{severity} {count}" for severity, count in result['by_severity'].items() if count)
+        print(f"🔒 {image}: {result['vulnerabilities']} vulnerabilities ({counts or 'none'})"
+              f"{' [cached]' if result['cached'] else ''}")
+    if diff:
+        print(f"   {args.images[0]} → {args.images[1]}: fixed {diff['vulnerabilities_fixed']}, "
+              f"introduced {diff['vulnerabilities_introduced']}, unchanged {diff['vulnerabilities_unchanged']}")
+        for vuln in diff['introduced'][:10]:
+            print(f"   + {vuln['severity']:<8} {vuln['id']} ({vuln['package']})")
+    return 1 if failed else 0
+
+
+def cmd_runtime(args):
+    import docker
+    from optimization.runtime_benchmark import (DockerRuntimeBackend, RuntimeBenchmark, make_probe,
+                                                print_runtime_comparison)
+    bench = RuntimeBenchmark(DockerRuntimeBackend(docker.from_env(), registry=args.registry), runs=args.runs,
+                             probe=make_probe(args.probe_cmd, args.probe_port), pull_runs=0 if args.no_pull else 1)
+    results = {image: bench.benchmark_image(image) for image in args.images}
+    comparison = bench.compare(results[args.images[0]], results[args.images[1]]) if len(args.images) == 2 else None
+
+    if args.json:
+        print(json.dumps({'images': results, 'comparison': comparison}, indent=2))
+        return 1 if any('error' in result for result in results.values()) else 0
+    failed = False
+    for image, result in results.items():
+        if 'error' in result:
+            failed = True
+            print(f"❌ {image}: {result['error'][:200]}")
+            continue
+        print(f"🏃 {image}: start {result['process_start_seconds']}s, ready {result['ready_seconds']}s, "
+              f"memory {result['memory_mb']}MB, CPU {result['cpu_percent']}%, pull {result['pull_seconds']}s "
+              f"(median of {result['runs']}{', ' + str(result['failed_runs']) + ' failed' if result['failed_runs'] else ''})")
+    if comparison and not failed:
+        print_runtime_comparison(comparison)
+    return 1 if failed else 0
+
+
+def _add_runtime_options(command):
+    command.add_argument('--probe-cmd', help="Readiness command run inside the container (exit 0 = ready)")
+    command.add_argument('--probe-port', type=int, help="Readiness port the container must accept connections on")
+    command.add_argument('--registry', help="Local registry (host:port) to time pulls against; "
+                                            "default is a save/load round-trip")
+
+
+def cmd_pipeline(args):
+    from main_pipeline import run_concurrent_pipeline, run_optimization_pipeline
+    from optimization.runtime_benchmark import make_probe
+    from orchestration.history import DEFAULT_HISTORY_PATH
+    options = dict(use_cache=not args.no_cache, analyze_layers=args.analyze_layers,
+                   profile_build=args.profile_build, minimal_context=args.minimal_context,
+                   runtime_benchmark=args.runtime_benchmark, runtime_runs=args.runtime_runs,
+                   probe=make_probe(args.probe_cmd, args.probe_port), registry=args.registry,
+                   history_path=None if args.no_history else args.history or DEFAULT_HISTORY_PATH,
+                   incremental=args.incremental)
+    if args.concurrent:
+        run_concurrent_pipeline(max_workers=args.max_workers, **options)
+    else:
+        run_optimization_pipeline(**options)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='docker-optimizer', description="AI-assisted Dockerfile optimizer")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    parse_cmd = subcommands.add_parser('parse', help="Parse a Dockerfile locally")
+    parse_cmd.add_argument('dockerfile', nargs='?', default='Dockerfile')
+    parse_cmd.add_argument('--json', action='store_true', help="Print commands, stages and directives as JSON")
+    parse_cmd.set_defaults(func=cmd_parse)
+
+    suggest_cmd = subcommands.add_parser('suggest', help="Get AI optimization suggestions")
+    suggest_cmd.add_argument('dockerfile', nargs='?', default='Dockerfile')
+    suggest_cmd.add_argument('--stream', action='store_true', help="Print suggestions as they arrive")
+    suggest_cmd.add_argument('--no-cache', action='store_true', help="Bypass the AI response cache")
+    suggest_cmd.add_argument('--always-ai', action='store_true',
+                             help="Call the LLM even when local rules settle every question")
+    suggest_cmd.add_argument('--json', action='store_true')
+    suggest_cmd.set_defaults(func=cmd_suggest)
+
+    rewrite_cmd = subcommands.add_parser('rewrite', help="Write an optimized Dockerfile")
+    rewrite_cmd.add_argument('dockerfile', nargs='?', default='Dockerfile')
+    rewrite_cmd.add_argument('--output', help="Output path, or - for stdout (default: <dockerfile>.optimized)")
+    rewrite_cmd.add_argument('--hints', help="Suggestion text to steer the rewrite, e.g. 'prefer alpine'")
+    rewrite_cmd.add_argument('--ai', action='store_true', help="Fetch AI suggestions to steer the rewrite")
+    rewrite_cmd.add_argument('--no-cache', action='store_true', help="Bypass the AI response cache")
+    rewrite_cmd.add_argument('--always-ai', action='store_true',
+                             help="With --ai, call the LLM even when local rules settle every question")
+    rewrite_cmd.add_argument('--no-multistage', action='store_true', help="Skip builder/runtime stage synthesis")
+    rewrite_cmd.add_argument('--no-reorder', action='store_true', help="Skip cache-aware reordering")
+    rewrite_cmd.add_argument('--prefetch-dependencies', action='store_true',
+                             help="Let reordering add a dependency prefetch step (mvn dependency:go-offline)")
+    rewrite_cmd.add_argument('--cross-distribution', action='store_true',
+                             help="Allow a smaller base from another distribution with the same libc and package "
+                                  "manager (e.g. ubuntu:22.04 -> debian:bookworm-slim)")
+    rewrite_cmd.add_argument('--suggest-dockerignore', action='store_true',
+                             help="Also write .dockerignore.suggested next to the Dockerfile")
+    rewrite_cmd.set_defaults(func=cmd_rewrite)
+
+    build_cmd = subcommands.add_parser('build', help="Build an image and report size and time")
+    build_cmd.add_argument('dockerfile', nargs='?', default='Dockerfile')
+    build_cmd.add_argument('--tag', default='optimizer-build')
+    build_cmd.add_argument('--profile', action='store_true', help="Time every step via the streaming build API")
+    build_cmd.add_argument('--minimal-context', action='store_true',
+                           help="Send only the files referenced by COPY/ADD")
+    build_cmd.add_argument('--no-cache', action='store_true', help="Build without the layer cache")
+    build_cmd.add_argument('--analyze-layers', action='store_true', help="Report per-layer wasted space")
+    build_cmd.set_defaults(func=cmd_build)
+
+    scan_cmd = subcommands.add_parser('scan', help="Scan images with Trivy; two images are diffed")
+    scan_cmd.add_argument('images', nargs='+')
+    scan_cmd.add_argument('--trivy-path', help="Trivy executable (default: $TRIVY_PATH or trivy)")
+    scan_cmd.add_argument('--parallel', type=int, default=2, help="Maximum concurrent scans")
+    scan_cmd.add_argument('--no-cache', action='store_true', help="Ignore cached scan reports")
+    scan_cmd.add_argument('--json', action='store_true')
+    scan_cmd.set_defaults(func=cmd_scan)
+
+    runtime_cmd = subcommands.add_parser('runtime', help="Benchmark container startup, memory, CPU and pull time; "
+                                                         "two images are compared")
+    runtime_cmd.add_argument('images', nargs='+')
+    runtime_cmd.add_argument('--runs', type=int, default=5, help="Container starts per image")
+    _add_runtime_options(runtime_cmd)
+    runtime_cmd.add_argument('--no-pull', action='store_true', help="Skip the pull/load measurement")
+    runtime_cmd.add_argument('--json', action='store_true')
+    runtime_cmd.set_defaults(func=cmd_runtime)
+
+    pipeline_cmd = subcommands.add_parser('pipeline', help="Run the full optimize/build/scan pipeline")
+    pipeline_cmd.add_argument('--concurrent', action='store_true', help="Run independent stages in parallel")
+    pipeline_cmd.add_argument('--max-workers', type=int, help="Default: $OPTIMIZER_MAX_WORKERS or 4")
+    pipeline_cmd.add_argument('--no-cache', action='store_true')
+    pipeline_cmd.add_argument('--analyze-layers', action='store_true')
+    pipeline_cmd.add_argument('--profile-build', action='store_true')
+    pipeline_cmd.add_argument('--minimal-context', action='store_true')
+    pipeline_cmd.add_argument('--runtime-benchmark', action='store_true',
+                              help="Compare startup, memory, CPU and pull time of both images")
+    pipeline_cmd.add_argument('--runtime-runs', type=int, default=5, help="Container starts per image")
+    _add_runtime_options(pipeline_cmd)
+    pipeline_cmd.add_argument('--history', help="SQLite history to append the run to "
+                                                "(default: $OPTIMIZER_HISTORY_DB or optimization_history.db)")
+    pipeline_cmd.add_argument('--no-history', action='store_true', help="Don't record the run in the history")
+    pipeline_cmd.add_argument('--incremental', action='store_true',
+                              help="Reuse suggestions, rewrite and builds of stages unchanged since the last run")
+    pipeline_cmd.set_defaults(func=cmd_pipeline)
+
+    service_cmd = subcommands.add_parser('service', add_help=False,
+                                         help="Run or submit jobs to the long-running service (serve/submit/metrics)")
+    service_cmd.add_argument('args', nargs=argparse.REMAINDER)
+
+    history_cmd = subcommands.add_parser('history', add_help=False,
+                                         help="Query run history: trend, regressions, stages, runs")
+    history_cmd.add_argument('args', nargs=argparse.REMAINDER)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['service']:
+        # Everything after `service`, --help included, belongs to the service's own parser
+        from orchestration.service import main as service_main
+        return service_main(argv[1:])
+    if argv[:1] == ['history']:
+        from orchestration.history import main as history_main
+        return history_main(argv[1:])
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
 from analysis.dockerfile_parser import DockerfileParser
 from analysis.ai_suggestor import GroqAISuggestor
 from analysis.suggestion_parser import SuggestionParser
+import argparse
 import os
 
-def main():
+def main(stream=False):
     # Check if Dockerfile exists
     if not os.path.exists('Dockerfile'):
         print("❌ Error: Dockerfile not found in current directory")
@@ -35,8 +36,12 @@ def main():
             
         suggestor = GroqAISuggestor(api_key=api_key)
     
+    if stream:
+        run_streaming(suggestor, commands)
+        return
+    
     print("🤖 Getting AI suggestions from Groq Cloud...")
-    result = suggestor.get_suggestions('Dockerfile')
+    result = suggestor.get_suggestions('Dockerfile', commands=commands)
     
     # FIXED: Removed the early return statement
     if "error" in result:
@@ -55,5 +60,30 @@ def main():
     
     print(f"\n🎯 Optimization complete! Source: {result.get('source', 'Groq Cloud')}")
 
+def run_streaming(suggestor, commands):
+    """Print each suggestion as soon as the model has produced it"""
+    print("🤖 Streaming AI suggestions from Groq Cloud...")
+    print("🔧 OPTIMIZATION SUGGESTIONS")
+    print("=" * 50)
+    
+    def on_suggestion(category, text):
+        print(f"  [{category.upper().replace('_', ' ')}] {text}")
+    
+    result = suggestor.get_suggestions_stream('Dockerfile', commands=commands, on_suggestion=on_suggestion)
+    if "error" in result:
+        print(f"Error: {result['error']}")
+        return
+    
+    if not any(result['structured'].values()):
+        print("\nNo specific optimization suggestions found.")
+    
+    print(f"\n⏱️  Time to first suggestion: {result['time_to_first_suggestion']}s "
+          f"(first token {result['time_to_first_token']}s, total {result['total_time']}s)")
+    print(f"🎯 Optimization complete! Source: {result.get('source', 'Groq Cloud')}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="AI Dockerfile analysis")
+    arg_parser.add_argument('--stream', action='store_true',
+                            help="Stream the AI response and print suggestions as they arrive")
+    args = arg_parser.parse_args()
+    main(stream=args.stream)
\ No newline at end of file
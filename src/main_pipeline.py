@@ -2,12 +2,41 @@ from analysis.dockerfile_parser import DockerfileParser
 from analysis.ai_suggestor import GroqAISuggestor
 from optimization.dockerfile_rewriter import DockerfileRewriter
 from optimization.image_builder import ImageBuilder
+from optimization.layer_analyzer import LayerAnalyzer, print_layer_report
+from optimization.build_profiler import compare_profiles, print_profile_comparison
+from optimization.runtime_benchmark import (DockerRuntimeBackend, RuntimeBenchmark, make_probe,
+                                            print_runtime_comparison)
 from security.trivy_scanner import TrivyScanner
+from orchestration.stage_graph import StageGraph
+from orchestration.history import DEFAULT_HISTORY_PATH, HistoryStore, run_record
+from orchestration.incremental import IncrementalRun, print_incremental_report
+import argparse
+import functools
+import itertools
 import os
 import json
+import sys
 from datetime import datetime
 
-def run_optimization_pipeline():
+DEFAULT_MAX_WORKERS = 4
+
+def default_max_workers():
+    """OPTIMIZER_MAX_WORKERS, or DEFAULT_MAX_WORKERS when it is unset or not a positive integer"""
+    value = os.getenv('OPTIMIZER_MAX_WORKERS')
+    if value is None:
+        return DEFAULT_MAX_WORKERS
+    try:
+        if int(value) > 0:
+            return int(value)
+    except ValueError:
+        pass
+    print(f"⚠️  Ignoring OPTIMIZER_MAX_WORKERS={value!r}: not a positive integer, using {DEFAULT_MAX_WORKERS}",
+          file=sys.stderr)
+    return DEFAULT_MAX_WORKERS
+
+def run_optimization_pipeline(use_cache=True, analyze_layers=False, profile_build=False, minimal_context=False,
+                              runtime_benchmark=False, runtime_runs=5, probe=None, registry=None,
+                              history_path=DEFAULT_HISTORY_PATH, incremental=False):
     print("🚀 Starting Docker Optimization Pipeline")
     print("=" * 60)
     
@@ -16,33 +45,52 @@ def run_optimization_pipeline():
         print("❌ Error: Dockerfile not found in current directory")
         print("   Please make sure you're running this from a directory with a Dockerfile")
         return
+    steps = itertools.count(1)
     
-    # Step 1: AI Analysis
-    print("1. 🤖 AI Analysis...")
+    # AI Analysis
+    print(f"{next(steps)}. 🤖 AI Analysis...")
     parser = DockerfileParser('Dockerfile')
-    suggestor = GroqAISuggestor()
-    ai_result = suggestor.get_suggestions('Dockerfile')
+    commands = parser.parse()
+    suggestor = GroqAISuggestor(use_cache=use_cache)
+    incremental_run = IncrementalRun('Dockerfile', commands) if incremental else None
+    ai_result = _get_suggestions(suggestor, commands, incremental_run)
     
     if "error" in ai_result:
         print(f"❌ AI Error: {ai_result['error']}")
         return
+    _print_ai_calls(ai_result)
     
-    # Step 2: Dockerfile Optimization
-    print("2. 🔧 Rewriting Dockerfile...")
-    rewriter = DockerfileRewriter('Dockerfile')
-    original_lines = rewriter.read_dockerfile()
-    optimized_lines = rewriter.apply_optimizations(original_lines, ai_result['suggestions'])
-    optimized_path = rewriter.write_optimized_dockerfile(optimized_lines)
+    # Dockerfile Optimization
+    print(f"{next(steps)}. 🔧 Rewriting Dockerfile...")
+    rewriter = DockerfileRewriter('Dockerfile', parser=parser)
+    if incremental_run:
+        optimized_path = incremental_run.rewrite(rewriter, ai_result['suggestions'])
+    else:
+        original_lines = rewriter.read_dockerfile()
+        optimized_lines = rewriter.apply_optimizations(original_lines, ai_result['suggestions'])
+        optimized_path = rewriter.write_optimized_dockerfile(optimized_lines)
+    if rewriter.multistage_result and rewriter.multistage_result['applied']:
+        result = rewriter.multistage_result
+        print(f"   Split into {result['ecosystem']} builder + runtime stage ({result['runtime_image']}), "
+              f"dropped from runtime: {', '.join(result['removed_packages']) or 'nothing'}")
+    if rewriter.reorder_result and rewriter.reorder_result['applied']:
+        steps = rewriter.reorder_result['cache_estimate']['expected_rebuilt_steps']
+        print(f"   Reordered {len(rewriter.reorder_result['moves'])} step(s) for caching, "
+              f"{steps['before']} → {steps['after']} steps rebuilt per typical edit "
+              f"(original Dockerfile: {steps['original']})")
     
-    # Step 3: Build Images
-    print("3. 🏗️ Building images...")
+    # Build Images
+    print(f"{next(steps)}. 🏗️ Building images...")
     builder = ImageBuilder()
+    build = builder.profile_build if profile_build else builder.build_image
+    if incremental_run:
+        build = functools.partial(incremental_run.build, build, builder)
     
     print("   Building original image...")
-    original_stats = builder.build_image('Dockerfile', 'original-image')
+    original_stats = build('Dockerfile', 'original-image', minimal_context=minimal_context)
     
     print("   Building optimized image...")
-    optimized_stats = builder.build_image(optimized_path, 'optimized-image')
+    optimized_stats = build(optimized_path, 'optimized-image', minimal_context=minimal_context)
     
     if not original_stats['success']:
         print(f"❌ Original build failed: {original_stats['error']}")
@@ -51,16 +99,203 @@ def run_optimization_pipeline():
         print(f"❌ Optimized build failed: {optimized_stats['error']}")
         return
     
-    # Step 4: Security Scan (Optional)
-    print("5. 🔒 Security scanning...")
-    scanner = TrivyScanner()
-    original_scan = scanner.scan_image('original-image')
-    optimized_scan = scanner.scan_image('optimized-image')
+    layer_analysis = None
+    if analyze_layers:
+        print(f"{next(steps)}. 🧱 Analyzing layers...")
+        analyzer = LayerAnalyzer(builder.client)
+        optimized_commands = DockerfileParser(optimized_path).parse()
+        layer_analysis = {
+            'original': analyzer.analyze_image(original_stats['image'], commands),
+            'optimized': analyzer.analyze_image(optimized_stats['image'], optimized_commands)
+        }
+    
+    runtime = None
+    if runtime_benchmark:
+        print(f"{next(steps)}. 🏃 Benchmarking containers ({runtime_runs} starts per image)...")
+        runtime = _benchmark_runtime(builder, runtime_runs, probe, registry)
+    
+    # Security Scan
+    print(f"{next(steps)}. 🔒 Security scanning...")
+    scanner = TrivyScanner(client=builder.client, use_cache=use_cache)
+    scans = scanner.scan_images(['original-image', 'optimized-image'])
+    original_scan, optimized_scan = scans['original-image'], scans['optimized-image']
+    if incremental_run:
+        for tag, scan in scans.items():
+            incremental_run.record_scan(tag, scan)
     
     vuln_comparison = scanner.compare_vulnerabilities(original_scan, optimized_scan)
     
-    # Step 5: Generate Report
-    print("6. 📊 Generating report...")
+    # Generate Report
+    print(f"{next(steps)}. 📊 Generating report...")
+    report = _build_report(builder, original_stats, optimized_stats, vuln_comparison, ai_result)
+    if suggestor.cache is not None:
+        report['ai_cache'] = suggestor.cache.stats()
+    if layer_analysis:
+        report['layer_analysis'] = layer_analysis
+    if runtime:
+        report['runtime'] = runtime
+    if incremental_run:
+        incremental_run.save()
+        report['incremental'] = incremental_run.report()
+    _save_and_print_report(report, original_stats, optimized_stats, vuln_comparison)
+    _record_history(history_path, report, ai_result)
+    
+    return report
+
+def run_concurrent_pipeline(max_workers=None, use_cache=True, analyze_layers=False,
+                            profile_build=False, minimal_context=False, runtime_benchmark=False, runtime_runs=5,
+                            probe=None, registry=None, history_path=DEFAULT_HISTORY_PATH, incremental=False):
+    """Run independent pipeline stages in parallel as a dependency graph"""
+    max_workers = max_workers or default_max_workers()
+    print(f"🚀 Starting Docker Optimization Pipeline (concurrent, {max_workers} workers)")
+    print("=" * 60)
+    
+    if not os.path.exists('Dockerfile'):
+        print("❌ Error: Dockerfile not found in current directory")
+        print("   Please make sure you're running this from a directory with a Dockerfile")
+        return
+    
+    parser = DockerfileParser('Dockerfile')
+    commands = parser.parse()
+    suggestor = GroqAISuggestor(use_cache=use_cache)
+    builder = ImageBuilder()
+    scanner = TrivyScanner(client=builder.client, use_cache=use_cache)
+    incremental_run = IncrementalRun('Dockerfile', commands) if incremental else None
+    
+    def ai_stage(_):
+        print("   🤖 AI analysis started...")
+        result = _get_suggestions(suggestor, commands, incremental_run)
+        if "error" in result:
+            raise RuntimeError(f"AI Error: {result['error']}")
+        _print_ai_calls(result)
+        return result
+    
+    def rewrite_stage(inputs):
+        print("   🔧 Rewriting Dockerfile...")
+        rewriter = DockerfileRewriter('Dockerfile', parser=parser)
+        if incremental_run:
+            return incremental_run.rewrite(rewriter, inputs['ai']['suggestions'])
+        original_lines = rewriter.read_dockerfile()
+        optimized_lines = rewriter.apply_optimizations(original_lines, inputs['ai']['suggestions'])
+        return rewriter.write_optimized_dockerfile(optimized_lines)
+    
+    def build_stage(dockerfile_dep, tag_name):
+        def _build(inputs):
+            dockerfile_path = inputs[dockerfile_dep] if dockerfile_dep else 'Dockerfile'
+            print(f"   🏗️ Building {tag_name}...")
+            build = builder.profile_build if profile_build else builder.build_image
+            if incremental_run:
+                build = functools.partial(incremental_run.build, build, builder)
+            stats = build(dockerfile_path, tag_name, minimal_context=minimal_context)
+            if not stats['success']:
+                raise RuntimeError(f"Build of {tag_name} failed: {stats['error']}")
+            return stats
+        return _build
+    
+    def scan_stage(tag_name):
+        def _scan(_):
+            print(f"   🔒 Scanning {tag_name}...")
+            scan = scanner.scan_image(tag_name)
+            if incremental_run:
+                incremental_run.record_scan(tag_name, scan)
+            return scan
+        return _scan
+    
+    graph = StageGraph(max_workers=max_workers)
+    graph.add_stage('ai', ai_stage)
+    graph.add_stage('build_original', build_stage(None, 'original-image'))
+    graph.add_stage('rewrite', rewrite_stage, depends_on=['ai'])
+    graph.add_stage('build_optimized', build_stage('rewrite', 'optimized-image'), depends_on=['rewrite'])
+    graph.add_stage('scan_original', scan_stage('original-image'), depends_on=['build_original'])
+    graph.add_stage('scan_optimized', scan_stage('optimized-image'), depends_on=['build_optimized'])
+    if analyze_layers:
+        analyzer = LayerAnalyzer(builder.client)
+        
+        def layers_stage(build_dep, parse_path):
+            def _analyze(inputs):
+                print(f"   🧱 Analyzing layers of {build_dep.replace('build_', '')} image...")
+                layer_commands = commands if parse_path is None else DockerfileParser(inputs[parse_path]).parse()
+                return analyzer.analyze_image(inputs[build_dep]['image'], layer_commands)
+            return _analyze
+        
+        graph.add_stage('layers_original', layers_stage('build_original', None), depends_on=['build_original'])
+        graph.add_stage('layers_optimized', layers_stage('build_optimized', 'rewrite'),
+                        depends_on=['build_optimized', 'rewrite'])
+    if runtime_benchmark:
+        def runtime_stage(_):
+            print(f"   🏃 Benchmarking containers ({runtime_runs} starts per image)...")
+            return _benchmark_runtime(builder, runtime_runs, probe, registry)
+        
+        # Runs last: measuring pulls re-loads the images, and other work on the host would skew the timings
+        graph.add_stage('runtime', runtime_stage, depends_on=[name for name in graph.stages])
+    
+    outcome = graph.run()
+    _print_stage_timings(outcome)
+    
+    if outcome['errors']:
+        for stage, error in outcome['errors'].items():
+            print(f"❌ Stage '{stage}' failed: {error}")
+        return
+    
+    results = outcome['results']
+    original_stats = results['build_original']
+    optimized_stats = results['build_optimized']
+    vuln_comparison = scanner.compare_vulnerabilities(results['scan_original'], results['scan_optimized'])
+    
+    print("📊 Generating report...")
+    report = _build_report(builder, original_stats, optimized_stats, vuln_comparison, results['ai'])
+    if suggestor.cache is not None:
+        report['ai_cache'] = suggestor.cache.stats()
+    if analyze_layers:
+        report['layer_analysis'] = {
+            'original': results['layers_original'],
+            'optimized': results['layers_optimized']
+        }
+    if runtime_benchmark:
+        report['runtime'] = results['runtime']
+    if incremental_run:
+        incremental_run.save()
+        report['incremental'] = incremental_run.report()
+    report['stage_timings'] = outcome['timings']
+    report['pipeline_time_seconds'] = outcome['total_time_seconds']
+    report['serial_time_seconds'] = outcome['serial_time_seconds']
+    _save_and_print_report(report, original_stats, optimized_stats, vuln_comparison)
+    _record_history(history_path, report, results['ai'])
+    
+    return report
+
+def _get_suggestions(suggestor, commands, incremental_run):
+    if incremental_run is None:
+        return suggestor.get_suggestions('Dockerfile', commands=commands)
+    signature = suggestor.signature()
+    result = suggestor.get_suggestions_by_stage('Dockerfile', commands=commands,
+                                                reuse=incremental_run.ai_reuse(signature))
+    if 'error' not in result:
+        incremental_run.record_ai(signature, result)
+    return result
+
+def _benchmark_runtime(builder, runs, probe, registry):
+    bench = RuntimeBenchmark(DockerRuntimeBackend(builder.client, registry=registry), runs=runs, probe=probe)
+    original = bench.benchmark_image('original-image')
+    optimized = bench.benchmark_image('optimized-image')
+    return {'original': original, 'optimized': optimized, 'comparison': bench.compare(original, optimized)}
+
+def _record_history(history_path, report, ai_result):
+    # The JSON report is overwritten each run and keeps a suggestion excerpt; history keeps every run in full
+    if not history_path:
+        return
+    with HistoryStore(history_path) as history:
+        history.record(run_record('pipeline', os.path.abspath('Dockerfile'), report, ai_result=ai_result))
+    print(f"🗄️  Run recorded in history: {history_path}")
+
+def _print_ai_calls(ai_result):
+    if ai_result.get('source') == 'Local rules':
+        print(f"   Settled by local rules ({len(ai_result['findings'])} findings), no API call")
+    for call in ai_result.get('calls', []):
+        print(f"   {call['part']}: {call['prompt_tokens']} prompt tokens, "
+              f"max {call['max_tokens']} completion tokens, {call['latency_seconds']}s")
+
+def _build_report(builder, original_stats, optimized_stats, vuln_comparison, ai_result):
     report = {
         'timestamp': datetime.now().isoformat(),
         'original_image': {
@@ -75,7 +310,20 @@ def run_optimization_pipeline():
         'security_improvements': vuln_comparison,
         'ai_suggestions': ai_result['suggestions'][:500] + "..." if len(ai_result['suggestions']) > 500 else ai_result['suggestions']
     }
-    
+    if ai_result.get('calls'):
+        report['ai_calls'] = {'calls': ai_result['calls'], 'tokens_sent': ai_result['tokens_sent'],
+                              'compaction': ai_result['compaction']}
+    if 'context' in original_stats:
+        report['original_image']['build_context'] = original_stats['context']
+    if 'context' in optimized_stats:
+        report['optimized_image']['build_context'] = optimized_stats['context']
+    if 'profile' in original_stats and 'profile' in optimized_stats:
+        report['original_image']['build_profile'] = original_stats['profile']
+        report['optimized_image']['build_profile'] = optimized_stats['profile']
+        report['build_profile_comparison'] = compare_profiles(original_stats['profile'], optimized_stats['profile'])
+    return report
+
+def _save_and_print_report(report, original_stats, optimized_stats, vuln_comparison):
     # Save report
     with open('optimization_report.json', 'w') as f:
         json.dump(report, f, indent=2)
@@ -88,14 +336,77 @@ def run_optimization_pipeline():
     print(f"⏱️  Build Time: {original_stats['build_time']}s → {optimized_stats['build_time']}s")
     print(f"   Time Saved: {report['improvements']['time_saved_seconds']}s ({report['improvements']['time_saved_percent']}%)")
     
+    context = report['original_image'].get('build_context')
+    if context:
+        print(f"📤 Build context: {round(context['full_context_bytes'] / (1024 * 1024), 2)}MB → "
+              f"{round(context['context_bytes'] / (1024 * 1024), 2)}MB ({context['files']} files)")
+    
+    if 'build_profile_comparison' in report:
+        print_profile_comparison(report['build_profile_comparison'])
+    
+    if 'layer_analysis' in report:
+        for label, analysis in report['layer_analysis'].items():
+            print_layer_report(label, analysis)
+    
+    if 'runtime' in report:
+        print_runtime_comparison(report['runtime']['comparison'])
+    
+    if 'incremental' in report:
+        print_incremental_report(report['incremental'])
+    
     if 'error' not in vuln_comparison:
         print(f"🔒 Vulnerabilities: {vuln_comparison['original_vulnerabilities']} → {vuln_comparison['optimized_vulnerabilities']}")
-        print(f"   Fixed: {vuln_comparison['vulnerabilities_fixed']}")
+        print(f"   Fixed: {vuln_comparison['vulnerabilities_fixed']}, "
+              f"introduced: {vuln_comparison['vulnerabilities_introduced']}")
     
     print("=" * 60)
     print("📄 Full report saved to: optimization_report.json")
-    
-    return report
+
+def _print_stage_timings(outcome):
+    print("\n⏱️  STAGE TIMINGS")
+    print("-" * 60)
+    for stage, timing in sorted(outcome['timings'].items(), key=lambda item: item[1]['start_offset_seconds']):
+        print(f"   {stage:<16} +{timing['start_offset_seconds']:>7.2f}s  {timing['duration_seconds']:>7.2f}s")
+    for stage in outcome['skipped']:
+        print(f"   {stage:<16} skipped")
+    print(f"   Wall clock: {outcome['total_time_seconds']}s (serial sum: {outcome['serial_time_seconds']}s)")
+    print("-" * 60)
 
 if __name__ == "__main__":
-    run_optimization_pipeline()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Docker optimization pipeline")
+    arg_parser.add_argument('--concurrent', action='store_true',
+                            help="Run independent stages in parallel")
+    arg_parser.add_argument('--max-workers', type=int,
+                            help="Worker pool size for --concurrent mode (default: $OPTIMIZER_MAX_WORKERS or 4)")
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help="Bypass the on-disk AI response cache")
+    arg_parser.add_argument('--analyze-layers', action='store_true',
+                            help="Report per-layer sizes and wasted bytes for both images")
+    arg_parser.add_argument('--profile-build', action='store_true',
+                            help="Time each Dockerfile step and record cache hits via the streaming build API")
+    arg_parser.add_argument('--minimal-context', action='store_true',
+                            help="Send only the files referenced by COPY/ADD as the build context")
+    arg_parser.add_argument('--runtime-benchmark', action='store_true',
+                            help="Start both images repeatedly and compare startup, memory, CPU and pull time")
+    arg_parser.add_argument('--runtime-runs', type=int, default=5, help="Container starts per image")
+    arg_parser.add_argument('--probe-cmd', help="Readiness command run inside the container (exit 0 = ready)")
+    arg_parser.add_argument('--probe-port', type=int, help="Readiness port the container must accept connections on")
+    arg_parser.add_argument('--registry', help="Local registry (host:port) to time pulls against; "
+                                               "default is a save/load round-trip")
+    arg_parser.add_argument('--history', default=DEFAULT_HISTORY_PATH, help="SQLite history to append the run to")
+    arg_parser.add_argument('--no-history', action='store_true', help="Don't record the run in the history")
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help="Reuse suggestions, rewrite and builds of stages unchanged since the last run")
+    args = arg_parser.parse_args()
+    
+    runtime_options = dict(runtime_benchmark=args.runtime_benchmark, runtime_runs=args.runtime_runs,
+                           probe=make_probe(args.probe_cmd, args.probe_port), registry=args.registry,
+                           history_path=None if args.no_history else args.history, incremental=args.incremental)
+    if args.concurrent:
+        run_concurrent_pipeline(max_workers=args.max_workers, use_cache=not args.no_cache,
+                                analyze_layers=args.analyze_layers, profile_build=args.profile_build,
+                                minimal_context=args.minimal_context, **runtime_options)
+    else:
+        run_optimization_pipeline(use_cache=not args.no_cache, analyze_layers=args.analyze_layers,
+                                  profile_build=args.profile_build, minimal_context=args.minimal_context,
+                                  **runtime_options)
\ No newline at end of file
@@ -1,2 +1,27 @@
-from .dockerfile_rewriter import DockerfileRewriter
-from .image_builder import ImageBuilder
\ No newline at end of file
+import importlib
+
+# Submodules are imported on first attribute access; only building pulls in the docker SDK
+_EXPORTS = {
+    'DockerfileRewriter': '.dockerfile_rewriter',
+    'ImageBuilder': '.image_builder',
+    'LayerAnalyzer': '.layer_analyzer',
+    'BuildProfiler': '.build_profiler',
+    'compare_profiles': '.build_profiler',
+    'ContextMinimizer': '.build_context',
+    'DockerignoreMatcher': '.build_context',
+    'BaseImageCatalog': '.base_image_catalog',
+    'MultiStageSynthesizer': '.multistage',
+    'CacheAwareReorderer': '.cache_reorder',
+    'RuntimeBenchmark': '.runtime_benchmark',
+    'DockerRuntimeBackend': '.runtime_benchmark'
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,266 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'data', 'base_images.json')
+FIELDS = ('image', 'repository', 'tag', 'os_family', 'libc', 'package_manager', 'runtime',
+          'runtime_version', 'edition', 'compressed_bytes', 'uncompressed_bytes')
+PATCH_VERSION_RE = re.compile(r'^(\d+\.\d+)\.\d+')
+REGISTRY_PREFIXES = ('docker.io/library/', 'docker.io/', 'library/')
+
+# Package-manager commands that tie a stage to an OS family
+PACKAGE_MANAGER_RE = {
+    'apt': re.compile(r'\b(?:apt-get|apt)\s'),
+    'apk': re.compile(r'\bapk\s'),
+    'microdnf': re.compile(r'\bmicrodnf\s'),
+    'yum': re.compile(r'\b(?:yum|dnf)\s')
+}
+
+_default_catalog = None
+_default_lock = threading.Lock()
+
+
+def normalize_image(reference):
+    """`docker.io/library/python` -> `python:latest`; None for digests and build-arg references."""
+    reference = reference.strip()
+    if not reference or '$' in reference or '@' in reference:
+        return None
+    for prefix in REGISTRY_PREFIXES:
+        if reference.startswith(prefix):
+            reference = reference[len(prefix):]
+            break
+    if ':' not in reference.rsplit('/', 1)[-1]:
+        reference += ':latest'
+    return reference.lower()
+
+
+def package_managers_in(text):
+    return {name for name, regex in PACKAGE_MANAGER_RE.items() if regex.search(text)}
+
+
+class BaseImageCatalog:
+    """
+    Versioned index of candidate base images. Entries are kept sorted by
+    (compatibility key, uncompressed size), so the smallest compatible image is
+    found with one bisect. Compatible means the same runtime, runtime version,
+    edition (e.g. JDK vs JRE), libc, OS family and package manager: only a
+    slimmer tag of the same distribution is offered (ubuntu stays ubuntu).
+    Plain OS images have no runtime, so their release (the tag up to the
+    first '-') stands in for the version: debian:bookworm may become
+    debian:bookworm-slim, but ubuntu:latest never becomes ubuntu:22.04.
+
+    Switching distributions is opt-in (`cross_distribution`): any OS family
+    and release with the same runtime, edition, libc and package manager,
+    looked up in a second index ordered by that key. ubuntu:22.04, which has
+    no slimmer ubuntu tag, may then become debian:bookworm-slim.
+    """
+
+    def __init__(self, entries=(), version=1, generated=None, platform='linux/amd64'):
+        self.version = version
+        self.generated = generated
+        self.platform = platform
+        self.by_image = {}
+        for entry in entries:
+            self.by_image[entry['image']] = {field: entry.get(field, '') for field in FIELDS}
+        self._reindex()
+
+    @staticmethod
+    def compat_key(entry):
+        version = entry['runtime_version'] if entry['runtime'] else (entry['tag'] or '').split('-')[0]
+        return (entry['runtime'] or '', version or '', entry['edition'] or '', entry['libc'] or '',
+                entry['os_family'] or '', entry['package_manager'] or '')
+
+    @staticmethod
+    def distribution_key(entry):
+        """compat_key without the OS family and release, shared by every distribution that could stand in"""
+        return (entry['runtime'] or '', entry['runtime_version'] or '', entry['edition'] or '', entry['libc'] or '',
+                entry['package_manager'] or '')
+
+    def _reindex(self):
+        self.entries = sorted(self.by_image.values(),
+                              key=lambda entry: (self.compat_key(entry), entry['uncompressed_bytes'] or 0,
+                                                 entry['image']))
+        self._keys = [self.compat_key(entry) for entry in self.entries]
+        self._by_distribution = sorted(self.entries, key=lambda entry: (self.distribution_key(entry),
+                                                                        entry['uncompressed_bytes'] or 0,
+                                                                        entry['image']))
+        self._distribution_keys = [self.distribution_key(entry) for entry in self._by_distribution]
+
+    @classmethod
+    def load(cls, path=DEFAULT_CATALOG_PATH):
+        """Load a catalog from a .json file or a SQLite database."""
+        if path.endswith(('.db', '.sqlite', '.sqlite3')):
+            import sqlite3
+            with sqlite3.connect(path) as connection:
+                connection.row_factory = sqlite3.Row
+                meta = dict(connection.execute('SELECT key, value FROM meta').fetchall())
+                entries = [dict(row) for row in connection.execute(f"SELECT {', '.join(FIELDS)} FROM images")]
+            return cls(entries, version=int(meta.get('version', 1)), generated=meta.get('generated'),
+                       platform=meta.get('platform', 'linux/amd64'))
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data.get('images', []), version=data.get('version', 1), generated=data.get('generated'),
+                   platform=data.get('platform', 'linux/amd64'))
+
+    @classmethod
+    def default(cls):
+        """The bundled catalog, loaded once per process and shared by every rewriter."""
+        global _default_catalog
+        with _default_lock:
+            if _default_catalog is None:
+                _default_catalog = cls.load(os.getenv('OPTIMIZER_BASE_IMAGE_CATALOG', DEFAULT_CATALOG_PATH))
+            return _default_catalog
+
+    def save(self, path):
+        if path.endswith(('.db', '.sqlite', '.sqlite3')):
+            import sqlite3
+            with sqlite3.connect(path) as connection:
+                connection.execute('DROP TABLE IF EXISTS images')
+                connection.execute('DROP TABLE IF EXISTS meta')
+                connection.execute(f"CREATE TABLE images ({', '.join(FIELDS)}, PRIMARY KEY (image))")
+                connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+                connection.executemany(f"INSERT INTO images VALUES ({', '.join('?' for _ in FIELDS)})",
+                                       [tuple(entry[field] for field in FIELDS) for entry in self.entries])
+                connection.executemany('INSERT INTO meta VALUES (?, ?)',
+                                       [('version', str(self.version)), ('generated', self.generated or ''),
+                                        ('platform', self.platform)])
+            return path
+        with open(path, 'w') as f:
+            json.dump({'version': self.version, 'generated': self.generated, 'platform': self.platform,
+                       'images': self.entries}, f, indent=2)
+            f.write('\n')
+        return path
+
+    def describe(self, image):
+        """Catalog entry for an image reference, tolerating patch versions (python:3.11.9-slim)."""
+        image = normalize_image(image)
+        if image is None:
+            return None
+        entry = self.by_image.get(image)
+        if entry is None:
+            repository, _, tag = image.rpartition(':')
+            short_tag = PATCH_VERSION_RE.sub(r'\1', tag)
+            entry = self.by_image.get(f"{repository}:{short_tag}")
+        return entry
+
+    def _smallest(self, prefix, package_managers=(), cross_distribution=False):
+        """Smallest entry whose compatibility (or, across distributions, distribution) key starts with `prefix`."""
+        entries, keys = (self._by_distribution, self._distribution_keys) if cross_distribution else \
+            (self.entries, self._keys)
+        best = None
+        index = bisect.bisect_left(keys, prefix)
+        while index < len(keys) and keys[index][:len(prefix)] == prefix:
+            candidate = entries[index]
+            index += 1
+            if package_managers and candidate['package_manager'] not in package_managers:
+                continue
+            if best is None or (candidate['uncompressed_bytes'] or 0) < (best['uncompressed_bytes'] or 0):
+                best = candidate
+        return best
+
+    def smallest_compatible(self, image, package_managers=(), allow_musl=False, cross_distribution=False):
+        """Smallest catalog image that can replace `image`, or None if nothing is smaller."""
+        current = self.describe(image)
+        if current is None:
+            return None
+        key = self.compat_key(current)
+        prefixes = [(key, False)]
+        if allow_musl and current['libc'] != 'musl':
+            prefixes.append((key[:3] + ('musl',), False))  # Any musl distribution, i.e. alpine
+        if cross_distribution:
+            prefixes.append((self.distribution_key(current), True))
+        candidates = [candidate for candidate in (self._smallest(prefix, package_managers, cross)
+                                                  for prefix, cross in prefixes)
+                      if candidate is not None]
+        best = min(candidates, key=lambda candidate: candidate['uncompressed_bytes'], default=None)
+        if best is None or best['image'] == current['image'] or \
+                best['uncompressed_bytes'] >= current['uncompressed_bytes']:
+            return None
+        return self._keep_patch_pin(image, current, best)
+
+    @staticmethod
+    def _keep_patch_pin(image, current, best):
+        """python:3.11.4 -> python:3.11.4-slim, not python:3.11-slim, when the tags share the version."""
+        pin = PATCH_VERSION_RE.match(normalize_image(image).rpartition(':')[2])
+        short = current['runtime_version']
+        if not pin or pin.group(1) != short or best['repository'] != current['repository'] or \
+                not (best['tag'] == short or best['tag'].startswith(short + '-')):
+            return best
+        tag = pin.group(0) + best['tag'][len(short):]
+        return dict(best, image=f"{best['repository']}:{tag}", tag=tag)
+
+    def smallest_for(self, runtime, runtime_version, edition='', libc='glibc', package_managers=()):
+        """Smallest image providing a runtime, e.g. ('java', '17', 'jre') for a runtime stage."""
+        return self._smallest((runtime, runtime_version, edition, libc), package_managers)
+
+    def refresh_from_docker(self, client=None):
+        """Update sizes from locally pulled images and add tags the catalog doesn't know yet."""
+        if client is None:
+            import docker
+            client = docker.from_env()
+        updated = 0
+        for image in client.images.list():
+            for reference in image.tags:
+                name = normalize_image(reference)
+                if name is None:
+                    continue
+                size = image.attrs.get('Size', 0)
+                entry = self.describe(name)
+                if entry is not None and entry['image'] == name:
+                    entry['uncompressed_bytes'] = size
+                else:
+                    entry = self._infer_entry(name, size)
+                    if entry is None:
+                        continue
+                    self.by_image[name] = entry
+                updated += 1
+        if updated:
+            self.version += 1
+            self.generated = time.strftime('%Y-%m-%d')
+            self._reindex()
+        return updated
+
+    def _infer_entry(self, name, size):
+        """Guess attributes of an unknown tag from a known sibling tag of the same repository."""
+        repository, _, tag = name.rpartition(':')
+        siblings = [entry for entry in self.entries if entry['repository'] == repository]
+        if not siblings:
+            return None
+        musl = 'alpine' in tag
+        sibling = next((entry for entry in siblings if (entry['libc'] == 'musl') == musl), siblings[0])
+        version = PATCH_VERSION_RE.sub(r'\1', tag).split('-')[0]
+        return dict(sibling, image=name, tag=tag, compressed_bytes=0, uncompressed_bytes=size,
+                    runtime_version=version if sibling['runtime'] and version[:1].isdigit()
+                    else sibling['runtime_version'],
+                    libc='musl' if musl else sibling['libc'],
+                    package_manager='apk' if musl else sibling['package_manager'],
+                    os_family='alpine' if musl else sibling['os_family'])
+
+
+def main():
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="Base-image catalog maintenance")
+    arg_parser.add_argument('--catalog', default=DEFAULT_CATALOG_PATH, help="Catalog to read (.json or .db)")
+    arg_parser.add_argument('--output', help="Where to write the catalog (default: overwrite --catalog)")
+    arg_parser.add_argument('--refresh', action='store_true', help="Update entries from locally pulled images")
+    arg_parser.add_argument('--lookup', nargs='+', default=[], help="Print the smallest compatible base for images")
+    arg_parser.add_argument('--cross-distribution', action='store_true',
+                            help="Let --lookup switch to another distribution with the same libc and package manager")
+    args = arg_parser.parse_args()
+
+    catalog = BaseImageCatalog.load(args.catalog)
+    if args.refresh:
+        print(f"Refreshed {catalog.refresh_from_docker()} entries (catalog version {catalog.version})")
+        print(f"Saved to {catalog.save(args.output or args.catalog)}")
+    elif args.output:
+        print(f"Saved to {catalog.save(args.output)}")
+    for image in args.lookup:
+        best = catalog.smallest_compatible(image, cross_distribution=args.cross_distribution)
+        print(f"{image} -> {best['image'] if best else '(already smallest or unknown)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import glob
+import os
+import re
+import shlex
+import tarfile
+import tempfile
+
+from analysis.dockerfile_parser import DockerfileParser
+
+SPOOL_MAX_BYTES = 32 * 1024 * 1024  # Keep small contexts in memory, spill larger ones to disk
+GLOB_CHARS = re.compile(r'[*?\[]')
+REMOTE_SOURCE = re.compile(r'^(?:https?://|git@|git://)')
+# Tool metadata that no image needs, suggested even when a COPY would pick it up
+METADATA_IGNORES = ['.git', '.hg', '.svn', '__pycache__', '*.pyc', '.pytest_cache', '.mypy_cache', '.tox']
+COMMON_IGNORES = METADATA_IGNORES + ['node_modules', '.venv', 'venv', 'dist', 'build', '*.log', '.env']
+
+
+class DockerignoreMatcher:
+    """.dockerignore semantics: Go-style globs, '**' across directories, '!' re-includes, last match wins."""
+
+    def __init__(self, patterns):
+        self.rules = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            negate = pattern.startswith('!')
+            if negate:
+                pattern = pattern[1:].strip()
+            pattern = os.path.normpath(pattern).replace(os.sep, '/').lstrip('/')
+            if pattern == '.':
+                continue
+            self.rules.append((negate, re.compile(self._to_regex(pattern))))
+
+    @classmethod
+    def from_context(cls, context_dir):
+        path = os.path.join(context_dir, '.dockerignore')
+        if not os.path.exists(path):
+            return cls([])
+        with open(path, 'r') as f:
+            return cls(f.readlines())
+
+    @staticmethod
+    def _to_regex(pattern):
+        regex = ''
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            if pattern.startswith('**', i):
+                regex += '.*'
+                i += 2
+                if pattern.startswith('/', i):
+                    regex += '/?'
+                    i += 1
+                continue
+            if char == '*':
+                regex += '[^/]*'
+            elif char == '?':
+                regex += '[^/]'
+            elif char == '[':
+                end = pattern.find(']', i)
+                if end == -1:
+                    regex += re.escape(char)
+                else:
+                    regex += pattern[i:end + 1].replace('[!', '[^')
+                    i = end
+            else:
+                regex += re.escape(char)
+            i += 1
+        # A pattern that names a directory also excludes everything below it
+        return f'^{regex}(?:/.*)?$'
+
+    def is_excluded(self, relative_path):
+        relative_path = relative_path.replace(os.sep, '/')
+        excluded = False
+        for negate, regex in self.rules:
+            if regex.match(relative_path):
+                excluded = not negate
+        return excluded
+
+
+class ContextMinimizer:
+    """Builds a context containing only the files referenced by COPY/ADD, plus the Dockerfile."""
+
+    def __init__(self, dockerfile_path, context_dir=None, commands=None):
+        self.dockerfile_path = os.path.abspath(dockerfile_path)
+        self.context_dir = os.path.abspath(context_dir or os.path.dirname(self.dockerfile_path))
+        self.commands = commands if commands is not None else DockerfileParser(dockerfile_path).parse()
+        self.ignore = DockerignoreMatcher.from_context(self.context_dir)
+
+    def copy_sources(self):
+        """Source operands of every COPY/ADD that reads from the build context."""
+        sources = []
+        for cmd in self.commands:
+            if cmd['instruction'] not in ('COPY', 'ADD') or 'from' in cmd['flags']:
+                continue
+            if cmd['heredocs']:
+                continue  # Inline content, nothing read from the context
+            if cmd['json_args'] is not None:
+                operands = cmd['json_args']
+            else:
+                try:
+                    operands = shlex.split(cmd['value'])
+                except ValueError:
+                    operands = cmd['value'].split()
+            for source in operands[:-1]:
+                if cmd['instruction'] == 'ADD' and REMOTE_SOURCE.match(source):
+                    continue
+                sources.append(source)
+        return sources
+
+    def _walk(self, relative_dir):
+        """Yield context-relative files under `relative_dir`, skipping ignored paths."""
+        root = os.path.join(self.context_dir, relative_dir)
+        for dirpath, dirnames, filenames in os.walk(root):
+            rel_dir = os.path.relpath(dirpath, self.context_dir)
+            rel_dir = '' if rel_dir == '.' else rel_dir
+            dirnames[:] = [d for d in dirnames
+                           if not self._ignored_dir(os.path.join(rel_dir, d))]
+            for name in filenames:
+                relative = os.path.join(rel_dir, name)
+                if not self.ignore.is_excluded(relative):
+                    yield relative
+
+    def context_files(self):
+        """Every context-relative file the build could read: the whole context minus .dockerignore."""
+        return sorted(self._walk(''))
+
+    def _ignored_dir(self, relative_dir):
+        # Directories can only be pruned when no '!' rule could re-include something below them
+        if any(negate for negate, _ in self.ignore.rules):
+            return False
+        return self.ignore.is_excluded(relative_dir)
+
+    def resolve_files(self):
+        """Exact set of context-relative files the build can read; None if it can't be determined."""
+        files = set()
+        for source in self.copy_sources():
+            if '$' in source:
+                return None  # Build args/env in a source path: can't resolve statically
+            relative = os.path.normpath(source.lstrip('/')) if source.strip('/') else '.'
+            if relative.startswith('..'):
+                continue
+            if GLOB_CHARS.search(relative):
+                matches = glob.glob(os.path.join(self.context_dir, relative))
+            else:
+                matches = [os.path.join(self.context_dir, relative)]
+            for match in matches:
+                rel_match = os.path.relpath(match, self.context_dir)
+                if os.path.isdir(match):
+                    files.update(self._walk('' if rel_match == '.' else rel_match))
+                elif os.path.exists(match) and not self.ignore.is_excluded(rel_match):
+                    files.add(rel_match)
+
+        for always in (os.path.relpath(self.dockerfile_path, self.context_dir), '.dockerignore'):
+            if os.path.exists(os.path.join(self.context_dir, always)):
+                files.add(always)
+        return sorted(files)
+
+    def full_context_bytes(self):
+        """Bytes the default build would send: the whole directory minus .dockerignore."""
+        return sum(self._size(relative) for relative in self._walk(''))
+
+    def _size(self, relative):
+        try:
+            return os.path.getsize(os.path.join(self.context_dir, relative))
+        except OSError:
+            return 0
+
+    def build_tar(self):
+        """Stream the minimal file set into a tar; returns (fileobj, stats)."""
+        files = self.resolve_files()
+        minimal = files is not None
+        if not minimal:
+            files = self.context_files()
+
+        archive_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        with tarfile.open(fileobj=archive_file, mode='w') as archive:
+            for relative in files:
+                archive.add(os.path.join(self.context_dir, relative),
+                            arcname=relative.replace(os.sep, '/'), recursive=False)
+        archive_file.seek(0, os.SEEK_END)
+        tar_bytes = archive_file.tell()
+        archive_file.seek(0)
+
+        full_bytes = self.full_context_bytes()
+        context_bytes = sum(self._size(relative) for relative in files)
+        return archive_file, {
+            'minimal': minimal,
+            'files': len(files),
+            'full_context_bytes': full_bytes,
+            'context_bytes': context_bytes,
+            'tar_bytes': tar_bytes,
+            'bytes_saved': full_bytes - context_bytes,
+            'reduction_percent': round((1 - context_bytes / full_bytes) * 100, 2) if full_bytes else 0.0
+        }
+
+    def suggest_dockerignore(self):
+        """Top-level entries the build never reads, plus common heavy directories."""
+        files = self.resolve_files()
+        suggestions = []
+        if files is not None:
+            needed_roots = {relative.replace(os.sep, '/').split('/')[0] for relative in files}
+            for entry in sorted(os.listdir(self.context_dir)):
+                if entry in needed_roots or entry == '.dockerignore':
+                    continue
+                relative = entry + ('/' if os.path.isdir(os.path.join(self.context_dir, entry)) else '')
+                if not self.ignore.is_excluded(entry):
+                    suggestions.append(relative.rstrip('/'))
+        for pattern in COMMON_IGNORES:
+            present = glob.glob(os.path.join(self.context_dir, pattern))
+            if present and pattern not in suggestions and not self.ignore.is_excluded(pattern):
+                # Only suggest what can be excluded without breaking a COPY
+                if pattern in METADATA_IGNORES or files is None or \
+                        not any(DockerignoreMatcher([pattern]).is_excluded(f) for f in files):
+                    suggestions.append(pattern)
+        return suggestions
+
+    def write_dockerignore(self, output_path=None):
+        output_path = output_path or os.path.join(self.context_dir, '.dockerignore.suggested')
+        with open(output_path, 'w') as f:
+            f.write('# Generated from COPY/ADD sources; review before renaming to .dockerignore\n')
+            for pattern in self.suggest_dockerignore():
+                f.write(pattern + '\n')
+        return output_path
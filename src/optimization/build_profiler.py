@@ -0,0 +1,181 @@
+import re
+import time
+
+STEP_RE = re.compile(r'^Step (\d+)/(\d+) : (.*)$')
+CACHE_MARKER = '---> Using cache'
+LAYER_ID_RE = re.compile(r'^ ---> ([0-9a-f]{12,})$')
+
+
+class BuildProfiler:
+    """
+    Turns the event stream of the low-level build API (`client.api.build(decode=True)`)
+    into a per-instruction timing profile. Each event is timestamped as it arrives,
+    so a step's duration runs from its 'Step N/M' line to the next one.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.started = None
+        self.first_event = None
+        self.steps = []
+        self.image_id = None
+        self.error = None
+
+    def start(self, timestamp=None):
+        self.started = self.clock() if timestamp is None else timestamp
+
+    def feed(self, event, timestamp=None):
+        """Record one decoded build event."""
+        now = self.clock() if timestamp is None else timestamp
+        if self.started is None:
+            self.started = now
+        if self.first_event is None:
+            self.first_event = now
+
+        if 'error' in event:
+            self.error = event.get('error') or event.get('errorDetail', {}).get('message')
+            return
+        if 'aux' in event and isinstance(event['aux'], dict) and 'ID' in event['aux']:
+            self.image_id = event['aux']['ID']
+            return
+
+        for line in event.get('stream', '').splitlines():
+            line = line.rstrip()
+            match = STEP_RE.match(line)
+            if match:
+                self._close_step(now)
+                self.steps.append({
+                    'step': int(match.group(1)),
+                    'total': int(match.group(2)),
+                    'instruction': match.group(3).strip(),
+                    'start': now,
+                    'end': None,
+                    'cached': False,
+                    'layer_id': None
+                })
+            elif self.steps and line.strip() == CACHE_MARKER:
+                self.steps[-1]['cached'] = True
+            elif self.steps:
+                layer = LAYER_ID_RE.match(line)
+                if layer:
+                    self.steps[-1]['layer_id'] = layer.group(1)
+            if line.startswith('Successfully built '):
+                self.image_id = self.image_id or line.split()[-1]
+
+    def _close_step(self, now):
+        if self.steps and self.steps[-1]['end'] is None:
+            self.steps[-1]['end'] = now
+
+    def finish(self, timestamp=None):
+        """Close the last step and return the profile."""
+        now = self.clock() if timestamp is None else timestamp
+        self._close_step(now)
+        started = self.started if self.started is not None else now
+        steps = [{
+            'step': step['step'],
+            'total': step['total'],
+            'instruction': step['instruction'],
+            'seconds': round(step['end'] - step['start'], 3),
+            'cached': step['cached'],
+            'layer_id': step['layer_id']
+        } for step in self.steps]
+        cached = sum(1 for step in steps if step['cached'])
+        return {
+            'steps': steps,
+            'cache_hits': cached,
+            'cache_misses': len(steps) - cached,
+            'context_upload_seconds': round(self.first_event - started, 3) if self.first_event is not None else None,
+            'total_seconds': round(now - started, 3),
+            'image_id': self.image_id,
+            'error': self.error
+        }
+
+    @classmethod
+    def from_recorded(cls, timed_events):
+        """Profile a recorded stream of (timestamp, event) pairs."""
+        timed_events = list(timed_events)
+        profiler = cls()
+        if not timed_events:
+            return profiler.finish(0.0)
+        profiler.start(timed_events[0][0])
+        for timestamp, event in timed_events:
+            profiler.feed(event, timestamp)
+        return profiler.finish(timed_events[-1][0])
+
+
+def _normalize_instruction(text):
+    return ' '.join(text.split())
+
+
+def compare_profiles(original_profile, optimized_profile):
+    """Match steps by instruction text and explain where time was gained or lost."""
+    optimized_steps = {}
+    for step in optimized_profile['steps']:
+        optimized_steps.setdefault(_normalize_instruction(step['instruction']), []).append(step)
+
+    rows = []
+    for step in original_profile['steps']:
+        key = _normalize_instruction(step['instruction'])
+        matches = optimized_steps.get(key)
+        if not matches:
+            rows.append({
+                'instruction': step['instruction'],
+                'original_seconds': step['seconds'],
+                'optimized_seconds': None,
+                'delta_seconds': -step['seconds'],
+                'reason': 'removed or merged by the rewriter'
+            })
+            continue
+        other = matches.pop(0)
+        delta = round(other['seconds'] - step['seconds'], 3)
+        if other['cached'] and not step['cached']:
+            reason = 'cache hit in optimized build'
+        elif step['cached'] and not other['cached']:
+            reason = 'cache miss in optimized build'
+        elif delta < 0:
+            reason = 'faster'
+        elif delta > 0:
+            reason = 'slower'
+        else:
+            reason = 'unchanged'
+        rows.append({
+            'instruction': step['instruction'],
+            'original_seconds': step['seconds'],
+            'optimized_seconds': other['seconds'],
+            'delta_seconds': delta,
+            'reason': reason
+        })
+
+    for remaining in optimized_steps.values():
+        for step in remaining:
+            rows.append({
+                'instruction': step['instruction'],
+                'original_seconds': None,
+                'optimized_seconds': step['seconds'],
+                'delta_seconds': step['seconds'],
+                'reason': 'new or rewritten step'
+            })
+
+    rows.sort(key=lambda row: row['delta_seconds'])
+    return {
+        'steps': rows,
+        'context_upload_delta_seconds': _delta(original_profile.get('context_upload_seconds'),
+                                               optimized_profile.get('context_upload_seconds')),
+        'cache_hits': {'original': original_profile['cache_hits'], 'optimized': optimized_profile['cache_hits']}
+    }
+
+
+def _delta(before, after):
+    if before is None or after is None:
+        return None
+    return round(after - before, 3)
+
+
+def print_profile_comparison(comparison):
+    print("\n⏱️  PER-INSTRUCTION BUILD PROFILE")
+    print("-" * 60)
+    for row in comparison['steps']:
+        before = f"{row['original_seconds']:.2f}s" if row['original_seconds'] is not None else '   -  '
+        after = f"{row['optimized_seconds']:.2f}s" if row['optimized_seconds'] is not None else '   -  '
+        print(f"   {before:>8} → {after:>8}  {row['delta_seconds']:+7.2f}s  {row['instruction'][:40]} ({row['reason']})")
+    print("-" * 60)
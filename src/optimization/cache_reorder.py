@@ -0,0 +1,366 @@
+import fnmatch
+import os
+import posixpath
+import re
+import shlex
+
+from analysis.dockerfile_parser import DockerfileParser
+from .build_context import DockerignoreMatcher
+from .multistage import _absolute, _copy_operands, _is_within, _pip_manifests, _segments
+
+# Source edits are far more common than dependency changes
+SCENARIO_WEIGHTS = {'source edit': 0.9, 'manifest edit': 0.1}
+MAX_SIMULATED_FILES = 200
+VAR_RE = re.compile(r'\$\{?(\w+)')
+METADATA_INSTRUCTIONS = {'EXPOSE', 'LABEL', 'MAINTAINER', 'CMD', 'ENTRYPOINT', 'HEALTHCHECK', 'STOPSIGNAL'}
+PIP_INSTALL_RE = re.compile(r'^(?:pip3?|python3?\s+-m\s+pip)\s+install\s+(.*)$')
+MVN_BUILD_RE = re.compile(r'^mvn\s+(?:-\S+\s+)*(?:\S+\s+)*(?:package|install|verify)\b')
+# Segments that neither read project files nor depend on them
+NEUTRAL_SEGMENT_RE = re.compile(r'^(?:(?:npm|yarn)\s+cache\s+clean\b|pip3?\s+cache\s+purge\b|rm\s+-rf\s+\S*cache\S*)')
+
+# (segment regex, required manifests, optional lockfiles, tool directory written under WORKDIR)
+INSTALL_RULES = (
+    (re.compile(r'^npm\s+(?:ci|install|i)(?:\s+-[-\w=]+)*\s*$'), ('package.json',),
+     ('package-lock.json', 'npm-shrinkwrap.json'), 'node_modules'),
+    (re.compile(r'^yarn(?:\s+install)?(?:\s+--[-\w=]+)*\s*$'), ('package.json',), ('yarn.lock',), 'node_modules'),
+    (re.compile(r'^pnpm\s+(?:install|i)(?:\s+--[-\w=]+)*\s*$'), ('package.json',), ('pnpm-lock.yaml',),
+     'node_modules'),
+    (re.compile(r'^go\s+mod\s+download\b'), ('go.mod',), ('go.sum',), None),
+    (re.compile(r'^bundle\s+install\b'), ('Gemfile',), ('Gemfile.lock',), None),
+    (re.compile(r'^poetry\s+install\b.*--no-root\b'), ('pyproject.toml',), ('poetry.lock',), None),
+)
+MANIFEST_NAMES = {'requirements.txt', 'pom.xml'} | {name for _, required, optional, _ in INSTALL_RULES
+                                                    for name in required + optional}
+
+
+def _source_matches(source, path):
+    source = posixpath.normpath(source.lstrip('/')) if source.strip('/') else '.'
+    if source == '.':
+        return True
+    return path == source or path.startswith(source + '/') or fnmatch.fnmatch(path, source)
+
+
+class _Step:
+    def __init__(self, cmd, text, workdir, synthetic=None):
+        self.cmd = cmd
+        self.text = text
+        self.workdir = workdir  # Working directory in effect when the step runs
+        self.synthetic = synthetic  # None for the user's steps, 'manifest' or 'prefetch' for added ones
+
+
+class CacheAwareReorderer:
+    """
+    Moves rarely changing layers ahead of the COPY that brings in the whole
+    source tree. Dependency installs get their own manifest COPY so they only
+    rebuild when a manifest changes; COPY --from of earlier stages is hoisted
+    when nothing in between could observe the move. A step is only moved past
+    instructions it provably doesn't depend on (files written, ENV/ARG, WORKDIR,
+    USER, SHELL, VOLUME); anything unknown, such as another RUN, blocks the move.
+
+    Build steps that need the source (mvn package) stay where they are. With
+    `prefetch_dependencies` a step that warms the dependency cache (mvn
+    dependency:go-offline) is added ahead of the source COPY instead; that
+    changes what the build does and fetches from the network, so it is opt-in
+    and reported apart from the moves.
+    """
+
+    def __init__(self, context_dir=None, prefetch_dependencies=False):
+        self.context_dir = context_dir
+        self.prefetch_dependencies = prefetch_dependencies
+        self.ignore = DockerignoreMatcher.from_context(context_dir) if context_dir else None
+
+    def _context_has(self, relative):
+        """True/False when the context is known, None otherwise."""
+        if self.context_dir is None:
+            return None
+        relative = posixpath.normpath(relative)
+        return os.path.exists(os.path.join(self.context_dir, relative)) and \
+            not self.ignore.is_excluded(relative)
+
+    def _split_stages(self, lines):
+        parser = DockerfileParser.from_string(''.join(lines))
+        stages = []
+        previous_end = 0
+        workdir = None
+        for cmd in parser.commands:
+            text = ''.join(parser.lines[previous_end:cmd['end_line']])  # Leading comments travel with the step
+            previous_end = cmd['end_line']
+            if cmd['instruction'] == 'FROM':
+                stages.append([])
+                workdir = None
+            if not stages:
+                stages.append([])  # Global ARGs before the first FROM
+            stages[-1].append(_Step(cmd, text, workdir))
+            if cmd['instruction'] == 'WORKDIR':
+                value = cmd['value'].strip()
+                workdir = None if '$' in value else _absolute(value, workdir)
+        trailer = ''.join(parser.lines[previous_end:])
+        return stages, trailer
+
+    def _is_broad_copy(self, cmd):
+        if cmd['instruction'] not in ('COPY', 'ADD') or 'from' in cmd['flags'] or cmd['heredocs']:
+            return False
+        for source in _copy_operands(cmd)[:-1]:
+            stripped = source.strip('/')
+            if stripped in ('', '.') or source.endswith('/') or '*' in source:
+                return True
+            if self.context_dir and os.path.isdir(os.path.join(self.context_dir, stripped)):
+                return True
+        return False
+
+    def _install_plan(self, step):
+        """(manifests, optional manifests, tool dir, prefetch command) for an install RUN, else None."""
+        cmd = step.cmd
+        if cmd['instruction'] != 'RUN' or cmd['heredocs'] or cmd['flags'] or cmd['json_args'] is not None:
+            return None
+        manifests, optional, tool_dirs, prefetch = [], [], [], None
+        movable = True
+        for segment in _segments(cmd):
+            pip = PIP_INSTALL_RE.match(segment)
+            if pip:
+                found = _pip_manifests(pip.group(1))
+                if found is None:
+                    movable = False
+                else:
+                    manifests += found
+                continue
+            if self.prefetch_dependencies and MVN_BUILD_RE.match(segment) \
+                    and not re.search(r'\s(?:-s|--settings|-f|--file)\b', segment):
+                manifests.append('pom.xml')
+                prefetch = 'mvn -B dependency:go-offline'
+                continue
+            rule = next((rule for rule in INSTALL_RULES if rule[0].match(segment)), None)
+            if rule is not None:
+                manifests += rule[1]
+                optional += rule[2]
+                if rule[3]:
+                    tool_dirs.append(rule[3])
+                continue
+            if not NEUTRAL_SEGMENT_RE.match(segment):
+                movable = False
+        # A build step stays where it is, so it may do anything else; an install that moves may not
+        if not manifests or not (movable or prefetch):
+            return None
+        return manifests, optional, tool_dirs, prefetch
+
+    @staticmethod
+    def _blocks(step, blocker, kind):
+        """Whether `step` can't be moved ahead of `blocker`."""
+        instruction = blocker.cmd['instruction']
+        if instruction in METADATA_INSTRUCTIONS:
+            return False
+        if kind == 'copy_from':
+            dest = _absolute(_copy_operands(step.cmd)[-1], step.workdir)
+            if instruction in ('COPY', 'ADD'):
+                other = _absolute(_copy_operands(blocker.cmd)[-1], blocker.workdir)
+                return _is_within(other, dest) or _is_within(dest, other)
+            if instruction in ('ENV', 'ARG'):
+                names = set(re.findall(r'(\w+)=', blocker.cmd['value'])) or {blocker.cmd['value'].split()[0]}
+                return bool(names & set(VAR_RE.findall(step.cmd['value'])))
+            if instruction == 'WORKDIR':
+                return not _copy_operands(step.cmd)[-1].startswith('/')
+            return instruction not in ('USER', 'SHELL')
+        # Installs see the environment, user and every file: anything but metadata blocks them
+        return True
+
+    def _manifest_copy(self, broad, manifests, optional, workdir):
+        """COPY lines that bring the manifests in ahead of the broad COPY, or None."""
+        operands = _copy_operands(broad.cmd)
+        if len(operands) != 2:
+            return None
+        source, dest = operands
+        dest_dir = _absolute(dest, broad.workdir)
+        grouped = {}
+        for manifest in manifests + optional:
+            image_path = _absolute(manifest, workdir)
+            if not _is_within(image_path, dest_dir):
+                if manifest in optional:
+                    continue
+                return None
+            context_path = posixpath.normpath(posixpath.join(source, posixpath.relpath(image_path, dest_dir)))
+            present = self._context_has(context_path)
+            if manifest in optional:
+                if present is False:
+                    continue
+                if present is None:
+                    context_path += '*'  # Matches nothing without failing while package.json is present
+            elif present is False:
+                return None
+            grouped.setdefault(posixpath.dirname(image_path), []).append(context_path)
+
+        flags = ''.join(f"--{name}={value} " for name, value in broad.cmd['flags'].items()
+                        if name in ('chown', 'chmod') and isinstance(value, str))
+        return [f"COPY {flags}{' '.join(dict.fromkeys(paths))} {directory.rstrip('/')}/\n"
+                for directory, paths in grouped.items()]
+
+    def _reorder_stage(self, steps, moves, added):
+        broad_index = next((index for index, step in enumerate(steps) if self._is_broad_copy(step.cmd)), None)
+        if broad_index is None:
+            return steps
+        broad = steps[broad_index]
+        hoisted = []
+        remaining = steps[broad_index + 1:]
+        kept = []
+        for step in remaining:
+            cmd = step.cmd
+            if cmd['instruction'] == 'COPY' and 'from' in cmd['flags']:
+                kind = 'copy_from'
+            else:
+                plan = self._install_plan(step)
+                kind = 'install' if plan else None
+            if kind is None or any(self._blocks(step, blocker, kind) for blocker in kept):
+                kept.append(step)
+                continue
+            if step.workdir != broad.workdir and kind == 'install':
+                kept.append(step)
+                continue
+
+            if kind == 'copy_from':
+                hoisted.append(step)
+                moves.append({'moved': ' '.join(cmd['original'].split()), 'ahead_of': broad.cmd['original']})
+                continue
+
+            manifests, optional, tool_dirs, prefetch = plan
+            # The later broad COPY must not clobber what the install wrote
+            if any(self._context_has(directory) for directory in tool_dirs):
+                kept.append(step)
+                continue
+            copies = self._manifest_copy(broad, manifests, optional, step.workdir)
+            if copies is None:
+                kept.append(step)
+                continue
+            hoisted += [_Step(None, line, step.workdir, synthetic='manifest') for line in copies]
+            if prefetch:
+                # Build steps need the source; warm the dependency cache ahead of it instead
+                hoisted.append(_Step(None, f"RUN {prefetch}\n", step.workdir, synthetic='prefetch'))
+                kept.append(step)
+                added.append({'added': f"RUN {prefetch}", 'ahead_of': broad.cmd['original'],
+                              'for': ' '.join(cmd['original'].split())})
+            else:
+                hoisted.append(step)
+                moves.append({'moved': ' '.join(cmd['original'].split()), 'ahead_of': broad.cmd['original']})
+        return steps[:broad_index] + hoisted + [broad] + kept
+
+    def reorder(self, lines, original_lines=None):
+        """
+        Returns (new_lines, report); new_lines is None when nothing could be
+        moved. `original_lines` is the user's Dockerfile when `lines` is an
+        earlier rewrite of it; the estimate reports rebuilds for both.
+        """
+        stages, trailer = self._split_stages(lines)
+        moves, added = [], []
+        new_stages = [self._reorder_stage(steps, moves, added) for steps in stages]
+        if not moves and not added:
+            return None, {'applied': False, 'moves': [], 'added_steps': []}
+
+        new_lines = []
+        manifest_copies = set()  # Lines of the added manifest COPYs, left out of the rebuilt-step counts
+        for steps in new_stages:
+            for step in steps:
+                if step.synthetic == 'manifest':
+                    manifest_copies.add(len(new_lines) + 1)
+                text = step.text if step.text.endswith('\n') else step.text + '\n'
+                new_lines += text.splitlines(True)
+        new_lines += trailer.splitlines(True)
+        return new_lines, {'applied': True, 'moves': moves, 'added_steps': added,
+                           'cache_estimate': self.estimate(lines, new_lines, original_lines, manifest_copies)}
+
+    def simulate(self, lines, changed_paths, uncounted_lines=()):
+        """
+        Steps a classic-builder rebuild would re-execute after `changed_paths`
+        changed. A step misses once any earlier step in its chain missed; COPY
+        --from is keyed on the copied content, so it only misses when a rebuilt
+        step of the source stage could have written the copied path. Steps
+        starting on `uncounted_lines` still invalidate what follows them but
+        are not counted themselves.
+        """
+        parser = DockerfileParser.from_string(''.join(lines))
+        stage_writes = {}  # Stage name/index -> paths written by rebuilt steps ('/' for a RUN)
+        rebuilt = []
+        total = 0
+        dirty = False
+        writes = []
+        workdir = None
+        for cmd in parser.commands:
+            instruction = cmd['instruction']
+            if instruction == 'FROM':
+                base = next((part for part in cmd['value'].split() if not part.startswith('--')), '')
+                writes = list(stage_writes.get(base.lower(), []))
+                dirty = bool(writes)
+                workdir = None
+            elif cmd['stage'] is None:
+                continue  # ARG before the first FROM
+            else:
+                counted = cmd['start_line'] not in uncounted_lines
+                total += counted
+                if not dirty and instruction in ('COPY', 'ADD') and not cmd['heredocs']:
+                    operands = _copy_operands(cmd)
+                    source_stage = cmd['flags'].get('from')
+                    if source_stage is not None:
+                        written = stage_writes.get(str(source_stage).lower(), [])
+                        dirty = any(_is_within(_absolute(source, '/'), path) or _is_within(path, _absolute(source, '/'))
+                                    for source in operands[:-1] for path in written)
+                    else:
+                        dirty = any(_source_matches(source, path)
+                                    for source in operands[:-1] for path in changed_paths)
+                if instruction == 'WORKDIR' and '$' not in cmd['value']:
+                    workdir = _absolute(cmd['value'].strip(), workdir)
+                if dirty:
+                    if counted:
+                        rebuilt.append(cmd['start_line'])
+                    if instruction in ('COPY', 'ADD'):
+                        writes.append(_absolute(_copy_operands(cmd)[-1], workdir))
+                    elif instruction == 'RUN':
+                        writes.append('/')
+            stage_writes[str(cmd['stage'])] = writes
+            if cmd['stage_name']:
+                stage_writes[cmd['stage_name'].lower()] = writes
+        return {'total_steps': total, 'rebuilt_steps': len(rebuilt), 'rebuilt_lines': rebuilt}
+
+    def _edit_scenarios(self):
+        if self.context_dir is None:
+            return {'source edit': [['__source__/edited.py']],
+                    'manifest edit': [[name] for name in sorted(MANIFEST_NAMES)]}
+        source_files, manifest_files = [], []
+        for dirpath, dirnames, filenames in os.walk(self.context_dir):
+            relative_dir = os.path.relpath(dirpath, self.context_dir)
+            relative_dir = '' if relative_dir == '.' else relative_dir
+            dirnames[:] = [d for d in dirnames if not self.ignore.is_excluded(posixpath.join(relative_dir, d))]
+            for name in filenames:
+                relative = posixpath.join(relative_dir.replace(os.sep, '/'), name)
+                if self.ignore.is_excluded(relative) or name.startswith('Dockerfile'):
+                    continue
+                (manifest_files if name in MANIFEST_NAMES else source_files).append(relative)
+        return {'source edit': [[path] for path in sorted(source_files)[:MAX_SIMULATED_FILES]],
+                'manifest edit': [[path] for path in sorted(manifest_files)]}
+
+    def estimate(self, old_lines, new_lines, original_lines=None, uncounted_lines=()):
+        """
+        Average steps rebuilt per kind of edit: in the user's Dockerfile
+        ('original'), before this pass ('before') and after it ('after'), and
+        the expectation over typical edits. Manifest COPYs this pass added are
+        not counted, since they only split out a file the source COPY already
+        copied; an added prefetch step is real work and counts.
+        """
+        variants = {'original': (original_lines if original_lines is not None else old_lines, ()),
+                    'before': (old_lines, ()), 'after': (new_lines, uncounted_lines)}
+        scenarios = []
+        expected = {label: 0.0 for label in variants}
+        weight_used = 0.0
+        for name, edits in self._edit_scenarios().items():
+            if not edits:
+                continue
+            row = {'scenario': name, 'weight': SCENARIO_WEIGHTS[name], 'edits_simulated': len(edits)}
+            for label, (lines, uncounted) in variants.items():
+                results = [self.simulate(lines, edit, uncounted) for edit in edits]
+                rebuilt = sum(result['rebuilt_steps'] for result in results) / len(results)
+                row[label] = {'avg_rebuilt_steps': round(rebuilt, 2), 'total_steps': results[0]['total_steps']}
+                expected[label] += SCENARIO_WEIGHTS[name] * rebuilt
+            row['rebuilt_steps_delta'] = round(row['after']['avg_rebuilt_steps'] -
+                                               row['before']['avg_rebuilt_steps'], 2)
+            weight_used += SCENARIO_WEIGHTS[name]
+            scenarios.append(row)
+        if weight_used:
+            expected = {label: round(value / weight_used, 2) for label, value in expected.items()}
+        return {'scenarios': scenarios, 'expected_rebuilt_steps': expected,
+                'steps_saved': round(expected['before'] - expected['after'], 2)}
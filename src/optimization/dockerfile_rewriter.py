@@ -1,88 +1,150 @@
+import os
 import re
+from analysis.dockerfile_parser import DockerfileParser
+from .base_image_catalog import BaseImageCatalog, package_managers_in
+from .multistage import MultiStageSynthesizer
+from .cache_reorder import CacheAwareReorderer
+
+MUSL_HINT_RE = re.compile(r'\b(?:alpine|musl)\b', re.IGNORECASE)
 
 class DockerfileRewriter:
-    def __init__(self, original_path):
+    def __init__(self, original_path, parser=None, catalog=None, multistage=True, reorder=True,
+                 prefetch_dependencies=False, cross_distribution=False):
         self.original_path = original_path
+        self.parser = parser
+        self.catalog = catalog or BaseImageCatalog.default()
+        self.multistage = multistage
+        self.reorder = reorder
+        # Lets the reorder pass add a dependency prefetch step (mvn dependency:go-offline)
+        self.prefetch_dependencies = prefetch_dependencies
+        # Lets a base image switch distributions with the same libc and package manager (ubuntu → debian slim)
+        self.cross_distribution = cross_distribution
+        self.base_image_changes = []
+        self.multistage_result = None
+        self.reorder_result = None
         
     def read_dockerfile(self):
+        # Reuse the source lines captured by a shared DockerfileParser instead of re-reading
+        if self.parser is not None and self.parser.lines:
+            return list(self.parser.lines)
         with open(self.original_path, 'r') as f:
             return f.readlines()
     
     def apply_optimizations(self, lines, ai_suggestions):
         """Apply common optimization patterns based on AI suggestions"""
+        commands = self._commands(lines)
+        stage_package_managers = self._stage_package_managers(commands)
         optimized_lines = []
+        emitted = 0  # Source lines already copied or rewritten
         i = 0
         
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # Skip empty lines and comments
-            if not line or line.startswith('#'):
-                optimized_lines.append(lines[i])
-                i += 1
-                continue
+        while i < len(commands):
+            cmd = commands[i]
+            # Comments and blank lines between instructions are kept as they are
+            optimized_lines.extend(lines[emitted:cmd['start_line'] - 1])
+            source = lines[cmd['start_line'] - 1:cmd['end_line']]
+            emitted = cmd['end_line']
             
             # Optimize base images
-            if line.startswith('FROM'):
-                optimized_line = self._optimize_base_image(line, ai_suggestions)
-                optimized_lines.append(optimized_line + '\n')
+            if cmd['instruction'] == 'FROM':
+                optimized_line = self._optimize_base_image(cmd['original'], ai_suggestions,
+                                                           stage_package_managers.get(cmd['stage'], ()))
+                if optimized_line != cmd['original']:
+                    optimized_lines.append(optimized_line + '\n')
+                else:
+                    optimized_lines.extend(source)
             
             # Combine consecutive RUN commands
-            elif line.startswith('RUN'):
-                run_lines = [line]
-                j = i + 1
-                while j < len(lines) and lines[j].strip().startswith('RUN'):
-                    run_lines.append(lines[j].strip())
-                    j += 1
+            elif self._mergeable_run(cmd):
+                run_commands = [cmd]
+                while i + 1 < len(commands) and self._mergeable_run(commands[i + 1]) \
+                        and commands[i + 1]['start_line'] == run_commands[-1]['end_line'] + 1:
+                    i += 1
+                    run_commands.append(commands[i])
                 
-                if len(run_lines) > 1:
-                    optimized_run = self._combine_run_commands(run_lines)
-                    optimized_lines.append(optimized_run + '\n')
-                    i = j  # Skip the processed lines
-                    continue
+                if len(run_commands) > 1:
+                    optimized_lines.append(self._combine_run_commands(run_commands) + '\n')
+                    emitted = run_commands[-1]['end_line']
                 else:
-                    optimized_lines.append(lines[i])
+                    optimized_lines.extend(source)
             
             # Remove unnecessary files
-            elif line.startswith('COPY') or line.startswith('ADD'):
-                optimized_line = self._optimize_copy_commands(line)
+            elif cmd['instruction'] in ('COPY', 'ADD') and len(source) == 1 and not cmd['heredocs']:
+                optimized_line = self._optimize_copy_commands(source[0].strip())
                 optimized_lines.append(optimized_line + '\n')
             
             else:
-                optimized_lines.append(lines[i])
+                optimized_lines.extend(source)
             
             i += 1
+        optimized_lines.extend(lines[emitted:])
         
+        if self.multistage:
+            synthesized, self.multistage_result = MultiStageSynthesizer(self.catalog).synthesize(optimized_lines)
+            if synthesized is not None:
+                optimized_lines = synthesized
+        if self.reorder:
+            context_dir = os.path.dirname(os.path.abspath(self.original_path))
+            reorderer = CacheAwareReorderer(context_dir, prefetch_dependencies=self.prefetch_dependencies)
+            reordered, self.reorder_result = reorderer.reorder(optimized_lines, original_lines=lines)
+            if reordered is not None:
+                optimized_lines = reordered
         return optimized_lines
     
-    def _optimize_base_image(self, line, ai_suggestions):
-        """Replace with lighter base image"""
-        # Simple optimization: replace bulky images with slim versions
-        replacements = {
-            'ubuntu:latest': 'ubuntu:22.04-slim',
-            'node:latest': 'node:20-alpine',
-            'python:latest': 'python:3.11-slim',
-            'openjdk:latest': 'openjdk:17-jre-slim'
-        }
+    def _commands(self, lines):
+        """Parsed instructions of `lines`, from the shared parser when it read these same lines"""
+        if self.parser is not None and self.parser.lines == list(lines):
+            return self.parser.commands
+        return DockerfileParser.from_string(''.join(lines), self.original_path).commands
+    
+    @staticmethod
+    def _mergeable_run(cmd):
+        """Shell-form RUN without flags or heredocs, which can be joined with && into its neighbour"""
+        return cmd['instruction'] == 'RUN' and not cmd['flags'] and not cmd['heredocs'] \
+            and cmd['json_args'] is None
+    
+    @staticmethod
+    def _stage_package_managers(commands):
+        """Package managers invoked in each stage, keyed by stage index"""
+        stages = {}
+        for cmd in commands:
+            if cmd['stage'] is None:
+                continue
+            managers = stages.setdefault(cmd['stage'], set())
+            if cmd['instruction'] != 'FROM':
+                managers.update(package_managers_in(cmd['original']))
+        return stages
+    
+    def _optimize_base_image(self, line, ai_suggestions, package_managers=()):
+        """Replace the base with the smallest compatible image from the catalog"""
+        parts = line.split()
+        image_index = next((index for index, part in enumerate(parts[1:], 1) if not part.startswith('--')), None)
+        if image_index is None:
+            return line
         
-        for bulky, slim in replacements.items():
-            if bulky in line:
-                return line.replace(bulky, slim)
-        return line
+        # Switching glibc for musl breaks prebuilt wheels and binaries; only do it when suggested
+        allow_musl = bool(ai_suggestions) and bool(MUSL_HINT_RE.search(ai_suggestions))
+        replacement = self.catalog.smallest_compatible(parts[image_index], package_managers, allow_musl,
+                                                       self.cross_distribution)
+        if replacement is None:
+            return line
+        
+        current = self.catalog.describe(parts[image_index])
+        self.base_image_changes.append({
+            'original': parts[image_index],
+            'replacement': replacement['image'],
+            'bytes_saved': current['uncompressed_bytes'] - replacement['uncompressed_bytes']
+        })
+        parts[image_index] = replacement['image']
+        return ' '.join(parts)
     
-    def _combine_run_commands(self, run_lines):
+    def _combine_run_commands(self, run_commands):
         """Combine multiple RUN commands into one"""
-        commands = []
-        for run_line in run_lines:
-            # Extract the command after 'RUN'
-            command = run_line[4:].strip()
-            commands.append(command)
-        
         # Remove duplicate commands and combine with &&
         unique_commands = []
-        for cmd in commands:
-            if cmd not in unique_commands:
-                unique_commands.append(cmd)
+        for cmd in run_commands:
+            if cmd['value'] not in unique_commands:
+                unique_commands.append(cmd['value'])
         
         combined = " && ".join(unique_commands)
         return f"RUN {combined}"
@@ -94,6 +156,12 @@ class DockerfileRewriter:
             return line + " # Consider adding to .dockerignore"
         return line
     
+    def suggest_dockerignore(self):
+        """Patterns for a .dockerignore derived from the COPY/ADD sources"""
+        from .build_context import ContextMinimizer
+        commands = self.parser.commands if self.parser is not None and self.parser.commands else None
+        return ContextMinimizer(self.original_path, commands=commands).suggest_dockerignore()
+    
     def write_optimized_dockerfile(self, optimized_lines, output_path='Dockerfile.optimized'):
         with open(output_path, 'w') as f:
             f.writelines(optimized_lines)
@@ -0,0 +1,288 @@
+import hashlib
+import io
+import json
+import posixpath
+import re
+import tarfile
+
+HASH_CHUNK_SIZE = 1024 * 1024
+METADATA_LIMIT = 16 * 1024 * 1024  # Larger members are never configs or manifests
+WHITEOUT_PREFIX = '.wh.'
+OPAQUE_MARKER = '.wh..wh..opq'
+NOP_RE = re.compile(r'^/bin/sh -c #\(nop\)\s*')
+SHELL_RE = re.compile(r'^(?:RUN )?(?:\|\d+ (?:\S+=\S* )*)?/bin/sh -c ')
+BUILDKIT_SUFFIX = ' # buildkit'
+
+
+class _ChunkStream(io.RawIOBase):
+    """File-like view over an iterator of byte chunks, e.g. the generator from image.save()."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            try:
+                self.pending = next(self.chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+class _PrefixedReader(io.RawIOBase):
+    """Re-attach bytes that were already read to peek at a member's content."""
+
+    def __init__(self, prefix, fileobj):
+        self.prefix = prefix
+        self.fileobj = fileobj
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.prefix:
+            size = min(len(buffer), len(self.prefix))
+            buffer[:size] = self.prefix[:size]
+            self.prefix = self.prefix[size:]
+            return size
+        data = self.fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _normalize_path(name):
+    return posixpath.normpath('/' + name)
+
+
+def clean_created_by(created_by):
+    """Turn a history CreatedBy string back into a Dockerfile-like instruction."""
+    created_by = (created_by or '').strip()
+    if created_by.endswith(BUILDKIT_SUFFIX):
+        created_by = created_by[:-len(BUILDKIT_SUFFIX)]
+    if NOP_RE.match(created_by):
+        return NOP_RE.sub('', created_by).strip()
+    if SHELL_RE.match(created_by):
+        return 'RUN ' + SHELL_RE.sub('', created_by).strip()
+    return created_by
+
+
+class LayerAnalyzer:
+    """
+    Per-layer size and wasted-space analysis of a built image. The `docker save`
+    stream is walked member by member (including each nested layer tar), so
+    memory grows with the number of files, never with the number of bytes.
+    """
+
+    def __init__(self, client=None, top_n=10):
+        self.client = client
+        self.top_n = top_n
+
+    def analyze_image(self, image, commands=None):
+        """Analyze a docker SDK Image object; `commands` from DockerfileParser adds line numbers."""
+        result = self.analyze_stream(_ChunkStream(image.save(chunk_size=HASH_CHUNK_SIZE)), commands)
+        if not result['layers'] or all(layer['instruction'] is None for layer in result['layers']):
+            self._apply_api_history(result, image.history())
+        result['image'] = image.tags[0] if image.tags else image.id
+        return result
+
+    def analyze_tarball(self, tar_path, commands=None):
+        """Analyze an image archive on disk, e.g. the output of `docker save -o`."""
+        with open(tar_path, 'rb') as f:
+            return self.analyze_stream(f, commands)
+
+    def analyze_stream(self, fileobj, commands=None):
+        layer_stats = {}
+        metadata = {}
+
+        with tarfile.open(fileobj=fileobj, mode='r|') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                content = archive.extractfile(member)
+                head = content.read(1)
+                if head in (b'{', b'[') and member.size <= METADATA_LIMIT:
+                    try:
+                        metadata[member.name] = json.loads(head + content.read())
+                    except ValueError:
+                        pass
+                    continue
+                if member.size < tarfile.BLOCKSIZE:
+                    continue
+                stats = self._scan_layer(io.BufferedReader(_PrefixedReader(head, content)))
+                if stats is not None:
+                    layer_stats[member.name] = stats
+
+        manifest, config = self._find_manifest(metadata)
+        layer_names = manifest.get('Layers', []) if manifest else sorted(layer_stats)
+        ordered = [(name, layer_stats.get(name, self._empty_layer())) for name in layer_names]
+        return self._build_report(ordered, config, commands)
+
+    @staticmethod
+    def _empty_layer():
+        return {'files': {}, 'whiteouts': [], 'opaque_dirs': [], 'added_bytes': 0}
+
+    def _scan_layer(self, fileobj):
+        """Walk one layer tar, hashing file contents in fixed-size chunks."""
+        stats = self._empty_layer()
+        try:
+            with tarfile.open(fileobj=fileobj, mode='r|') as layer:
+                for entry in layer:
+                    path = _normalize_path(entry.name)
+                    base = posixpath.basename(path)
+                    if base == OPAQUE_MARKER:
+                        stats['opaque_dirs'].append(posixpath.dirname(path))
+                        continue
+                    if base.startswith(WHITEOUT_PREFIX):
+                        stats['whiteouts'].append(posixpath.join(posixpath.dirname(path), base[len(WHITEOUT_PREFIX):]))
+                        continue
+                    if not entry.isfile():
+                        continue
+                    digest = hashlib.sha256()
+                    data = layer.extractfile(entry)
+                    while True:
+                        chunk = data.read(HASH_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                    stats['files'][path] = (entry.size, digest.hexdigest())
+                    stats['added_bytes'] += entry.size
+        except tarfile.ReadError:
+            return None  # Not a layer tar (e.g. a non-JSON blob)
+        return stats
+
+    @staticmethod
+    def _find_manifest(metadata):
+        manifest = None
+        for name, value in metadata.items():
+            if posixpath.basename(name) == 'manifest.json' and isinstance(value, list) and value:
+                manifest = value[0]
+                break
+        config = metadata.get(manifest.get('Config')) if manifest else None
+        if config is None:
+            config = next((value for value in metadata.values()
+                           if isinstance(value, dict) and 'rootfs' in value), None)
+        return manifest, config
+
+    @staticmethod
+    def _ancestors(path):
+        while path not in ('/', ''):
+            yield path
+            path = posixpath.dirname(path)
+
+    def _build_report(self, ordered, config, commands):
+        count = len(ordered)
+        layers = [{
+            'index': index,
+            'layer': name,
+            'instruction': None,
+            'dockerfile_line': None,
+            'files': len(stats['files']),
+            'added_bytes': stats['added_bytes'],
+            'wasted_bytes': 0,       # Bytes added here that a later layer deletes or overwrites
+            'deleted_bytes': 0,      # Bytes from lower layers removed by this layer's whiteouts
+            'overwritten_bytes': 0   # Bytes from lower layers replaced by files in this layer
+        } for index, (name, stats) in enumerate(ordered)]
+
+        # Walk from the top layer down, remembering the nearest later layer that
+        # adds, whites out or makes opaque each path. Whatever survives is live.
+        later_files = {}
+        later_deletes = {}
+        by_digest = {}
+        for index in range(count - 1, -1, -1):
+            stats = ordered[index][1]
+            for path, (size, digest) in stats['files'].items():
+                if path in later_files:
+                    layers[index]['wasted_bytes'] += size
+                    layers[later_files[path]]['overwritten_bytes'] += size
+                    continue
+                deleter = next((later_deletes[ancestor] for ancestor in self._ancestors(path)
+                                if ancestor in later_deletes), None)
+                if deleter is not None:
+                    layers[index]['wasted_bytes'] += size
+                    layers[deleter]['deleted_bytes'] += size
+                    continue
+                group = by_digest.setdefault(digest, {'size': size, 'paths': []})
+                group['paths'].append(path)
+            for path in stats['files']:
+                later_files[path] = index
+            for path in stats['whiteouts']:
+                later_deletes[path] = index
+            for directory in stats['opaque_dirs']:
+                later_deletes[directory] = index
+
+        # Identical content stored more than once in the final filesystem
+        duplicates = sorted(
+            ({'digest': digest, 'size_bytes': group['size'], 'copies': len(group['paths']),
+              'wasted_bytes': group['size'] * (len(group['paths']) - 1), 'paths': sorted(group['paths'])[:5]}
+             for digest, group in by_digest.items() if len(group['paths']) > 1 and group['size'] > 0),
+            key=lambda item: item['wasted_bytes'], reverse=True
+        )
+
+        self._apply_config_history(layers, config)
+        if commands:
+            self._match_commands(layers, commands)
+
+        wasted = sum(layer['wasted_bytes'] for layer in layers)
+        duplicate_bytes = sum(item['wasted_bytes'] for item in duplicates)
+        ranked = sorted(layers, key=lambda layer: layer['wasted_bytes'], reverse=True)
+        return {
+            'layer_count': count,
+            'total_added_bytes': sum(layer['added_bytes'] for layer in layers),
+            'wasted_bytes': wasted,
+            'duplicate_bytes': duplicate_bytes,
+            'wasted_mb': round((wasted + duplicate_bytes) / (1024 * 1024), 2),
+            'layers': layers,
+            'top_wasted_layers': [
+                {'index': layer['index'], 'instruction': layer['instruction'],
+                 'dockerfile_line': layer['dockerfile_line'], 'wasted_bytes': layer['wasted_bytes']}
+                for layer in ranked[:self.top_n] if layer['wasted_bytes'] > 0
+            ],
+            'duplicate_files': duplicates[:self.top_n]
+        }
+
+    @staticmethod
+    def _apply_config_history(layers, config):
+        if not config:
+            return
+        history = [entry for entry in config.get('history', []) if not entry.get('empty_layer')]
+        # Base-image layers come first; align history with layers from the top down
+        for layer, entry in zip(reversed(layers), reversed(history)):
+            layer['instruction'] = clean_created_by(entry.get('created_by'))
+
+    @staticmethod
+    def _apply_api_history(result, history):
+        """Fallback when the archive has no config: use image.history() (newest first)."""
+        entries = [entry for entry in reversed(history) if entry.get('Size', 0) > 0]
+        for layer, entry in zip(reversed(result['layers']), reversed(entries)):
+            layer['instruction'] = clean_created_by(entry.get('CreatedBy'))
+
+    @staticmethod
+    def _match_commands(layers, commands):
+        normalized = [(' '.join(cmd['original'].split()), cmd) for cmd in commands]
+        for layer in layers:
+            instruction = ' '.join((layer['instruction'] or '').split())
+            if not instruction:
+                continue
+            for text, cmd in normalized:
+                body = ' '.join(cmd['value'].split()) if cmd.get('value') else text
+                if text == instruction or (body and body in instruction):
+                    layer['dockerfile_line'] = cmd.get('start_line')
+                    break
+
+
+def print_layer_report(label, analysis):
+    print(f"\n🧱 LAYER ANALYSIS: {label}")
+    print("-" * 60)
+    for layer in analysis['layers']:
+        line = f"L{layer['dockerfile_line']}" if layer['dockerfile_line'] else '   '
+        print(f"   {layer['added_bytes'] / (1024 * 1024):8.2f}MB {line:>5}  {(layer['instruction'] or '?')[:60]}")
+    print(f"   Wasted: {analysis['wasted_mb']}MB "
+          f"(deleted/overwritten {analysis['wasted_bytes']} B, duplicates {analysis['duplicate_bytes']} B)")
+    print("-" * 60)
@@ -0,0 +1,423 @@
+import posixpath
+import re
+import shlex
+from abc import ABC, abstractmethod
+
+from analysis.dockerfile_parser import DockerfileParser
+
+BUILDER_STAGE = 'builder'
+SEGMENT_SPLIT_RE = re.compile(r'\s*(?:&&|;)\s*')
+APT_INSTALL_RE = re.compile(r'^(?:apt-get|apt)\s+(?:-\S+\s+)*install\b')
+APK_INSTALL_RE = re.compile(r'^apk\s+(?:-\S+\s+)*add\b')
+PACKAGE_HOUSEKEEPING_RE = re.compile(
+    r'^(?:apt-get|apt)\s+(?:-\S+\s+)*(?:update|clean|autoremove)\b|^rm -rf /var/lib/apt/lists|^apk\s+update\b'
+)
+ARTIFACT_COPY_RE = re.compile(r'^(?:cp|mv)\s+(?:-\S+\s+)*(\S+)\s+(\S+)$')
+
+# Compilers, headers and tooling only needed while dependencies are built
+BUILD_ONLY_PACKAGES = {
+    'apt': {'build-essential', 'gcc', 'g++', 'make', 'cmake', 'pkg-config', 'autoconf', 'automake',
+            'libtool', 'git', 'python3-dev', 'python-dev', 'cargo', 'rustc'},
+    'apk': {'build-base', 'gcc', 'g++', 'make', 'cmake', 'pkgconfig', 'autoconf', 'automake', 'libtool',
+            'git', 'musl-dev', 'linux-headers', 'python3-dev', 'cargo', 'rust'}
+}
+# Header packages whose shared libraries are still needed at runtime
+DEV_TO_RUNTIME = {
+    'apt': {'libpq-dev': 'libpq5', 'libffi-dev': 'libffi8', 'libssl-dev': 'libssl3', 'libxml2-dev': 'libxml2',
+            'libxslt1-dev': 'libxslt1.1', 'libjpeg-dev': 'libjpeg62-turbo', 'zlib1g-dev': 'zlib1g',
+            'default-libmysqlclient-dev': 'libmariadb3', 'libmariadb-dev': 'libmariadb3',
+            'libsqlite3-dev': 'libsqlite3-0', 'libyaml-dev': 'libyaml-0-2'},
+    'apk': {'postgresql-dev': 'libpq', 'libffi-dev': 'libffi', 'openssl-dev': 'openssl',
+            'libxml2-dev': 'libxml2', 'libxslt-dev': 'libxslt', 'jpeg-dev': 'libjpeg-turbo', 'zlib-dev': 'zlib'}
+}
+BOTH_STAGES = {'ARG', 'ENV', 'WORKDIR', 'SHELL'}
+RUNTIME_ONLY = {'LABEL', 'MAINTAINER', 'EXPOSE', 'CMD', 'ENTRYPOINT', 'HEALTHCHECK', 'VOLUME', 'STOPSIGNAL',
+                'USER', 'ONBUILD'}
+
+
+class EcosystemRule(ABC):
+    """
+    How one ecosystem builds and what its runtime stage needs. `build_re`
+    recognizes build steps; `post_build` says where commands that follow the
+    last build step belong ('runtime' for interpreted installs that the runtime
+    stage can still use, 'builder' when only build outputs are shipped).
+    """
+
+    name = None
+    build_re = None
+    tool_re = None  # Any use of the ecosystem's tooling, which stays in the builder
+    post_build = 'runtime'
+    runtimes = ()
+
+    def applies(self, base_entry, segments):
+        runtime = base_entry['runtime'] if base_entry else None
+        return runtime in self.runtimes and any(self.build_re.search(segment) for segment in segments)
+
+    def builder_prologue(self):
+        return []
+
+    def builder_epilogue(self):
+        return []
+
+    def runtime_base(self, catalog, base_image, base_entry, package_managers):
+        replacement = catalog.smallest_compatible(base_image, package_managers)
+        return replacement['image'] if replacement else base_image
+
+    @abstractmethod
+    def artifacts(self, workdir, post_build_segments):
+        """COPY --from lines (and any ENV) that bring build outputs into the runtime stage."""
+
+    def dependency_manifests(self, segment):
+        """
+        Files a build segment reads, relative to its working directory, when
+        the builder needs nothing else from the context; None when it may read
+        any source file.
+        """
+        return None
+
+    def copies_context(self, destination, workdir, after_build):
+        """Whether a context COPY/ADD must be repeated in the runtime stage."""
+        return True
+
+
+class PipRule(EcosystemRule):
+    """Dependencies go into a virtualenv that the runtime stage copies as a whole."""
+
+    name = 'pip'
+    build_re = re.compile(r'\bpip3?\s+install\b|\bpython3?\s+-m\s+pip\s+install\b')
+    tool_re = re.compile(r'\bpip3?\s|\bpython3?\s+-m\s+pip\b')
+    runtimes = ('python',)
+    venv = '/opt/venv'
+    install_re = re.compile(r'\b(?:pip3?|python3?\s+-m\s+pip)\s+install\b(.*)$')
+
+    def builder_prologue(self):
+        return [f'RUN python -m venv {self.venv}', f'ENV PATH="{self.venv}/bin:$PATH"']
+
+    def artifacts(self, workdir, post_build_segments):
+        return [f'COPY --from={BUILDER_STAGE} {self.venv} {self.venv}', f'ENV PATH="{self.venv}/bin:$PATH"']
+
+    def dependency_manifests(self, segment):
+        # Only the virtualenv leaves the builder, so requirement files are all it needs
+        match = self.install_re.search(segment)
+        return _pip_manifests(match.group(1)) if match else None
+
+
+class NpmRule(EcosystemRule):
+    """The whole working directory is shipped after dev dependencies are pruned."""
+
+    name = 'npm'
+    build_re = re.compile(r'\b(?:npm|yarn|pnpm)\s+(?:ci|install|run|build)\b')
+    tool_re = re.compile(r'\b(?:npm|npx|yarn|pnpm)\s')
+    post_build = 'builder'
+    runtimes = ('node',)
+
+    def builder_epilogue(self):
+        return ['RUN npm prune --omit=dev']
+
+    def artifacts(self, workdir, post_build_segments):
+        return [f'COPY --from={BUILDER_STAGE} {workdir} {workdir}']
+
+    def copies_context(self, destination, workdir, after_build):
+        # Everything under the working directory arrives with the builder's copy
+        return not _is_within(destination, workdir)
+
+
+class MavenRule(EcosystemRule):
+    """Only the packaged jars are shipped, on a JRE instead of a JDK with Maven."""
+
+    name = 'maven'
+    build_re = re.compile(r'(?:^|\s|/)mvnw?\s')
+    tool_re = build_re
+    post_build = 'builder'
+    runtimes = ('maven', 'java')
+
+    def runtime_base(self, catalog, base_image, base_entry, package_managers):
+        jre = catalog.smallest_for('java', base_entry['runtime_version'], 'jre', base_entry['libc'],
+                                   package_managers)
+        return jre['image'] if jre else None
+
+    def artifacts(self, workdir, post_build_segments):
+        copied = [ARTIFACT_COPY_RE.match(segment) for segment in post_build_segments]
+        destinations = [match.group(2) for match in copied if match]
+        if destinations:
+            return [f'COPY --from={BUILDER_STAGE} {_absolute(destination, workdir)} '
+                    f'{_absolute(destination, workdir)}' for destination in destinations]
+        return [f'COPY --from={BUILDER_STAGE} {posixpath.join(workdir, "target")}/*.jar '
+                f'{posixpath.join(workdir, "target")}/']
+
+    def copies_context(self, destination, workdir, after_build):
+        # Sources are compiled into the jar; only files added after the build are needed
+        return after_build
+
+
+RULES = (PipRule(), NpmRule(), MavenRule())
+
+
+def _absolute(path, workdir):
+    return posixpath.normpath(posixpath.join(workdir or '/', path))
+
+
+def _is_within(path, directory):
+    if directory is None:
+        return False
+    path = _absolute(path, directory)
+    return path == directory or path.startswith(directory.rstrip('/') + '/')
+
+
+def _copy_operands(cmd):
+    if cmd['json_args'] is not None:
+        return list(cmd['json_args'])
+    try:
+        return shlex.split(cmd['value'])
+    except ValueError:
+        return cmd['value'].split()
+
+
+def _pip_manifests(arguments):
+    """Requirement/constraint files of a `pip install`, or None if it installs local paths."""
+    try:
+        tokens = shlex.split(arguments)
+    except ValueError:
+        return None
+    manifests = []
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token in ('-r', '--requirement', '-c', '--constraint') and index + 1 < len(tokens):
+            manifests.append(tokens[index + 1])
+            index += 2
+            continue
+        if token.startswith(('--requirement=', '--constraint=')):
+            manifests.append(token.split('=', 1)[1])
+        elif token.startswith('-r') and len(token) > 2:
+            manifests.append(token[2:])
+        elif token in ('-e', '--editable') or (not token.startswith('-') and
+                                               (token.startswith(('.', '/')) or '/' in token)):
+            return None  # Installs the project itself, which needs the full source
+        index += 1
+    return manifests
+
+
+def _segments(cmd):
+    if cmd['heredocs']:
+        return [cmd['heredocs'][0]['body']]
+    if cmd['json_args'] is not None:
+        return [' '.join(cmd['json_args'])]
+    return [segment for segment in SEGMENT_SPLIT_RE.split(cmd['value']) if segment]
+
+
+def _install_packages(segment):
+    """(package manager, packages) for an apt/apk install segment, else None."""
+    for manager, regex in (('apt', APT_INSTALL_RE), ('apk', APK_INSTALL_RE)):
+        match = regex.match(segment)
+        if match:
+            try:
+                tokens = shlex.split(segment[match.end():])
+            except ValueError:
+                tokens = segment[match.end():].split()
+            return manager, [token for token in tokens if not token.startswith('-')]
+    return None
+
+
+class MultiStageSynthesizer:
+    """
+    Splits a single-stage Dockerfile into a builder stage and a minimal runtime
+    stage. The builder keeps every original instruction needed to build; the
+    runtime stage gets the runtime packages, the non-build instructions and the
+    build outputs via COPY --from. Results are re-parsed before they're used.
+    """
+
+    def __init__(self, catalog, rules=RULES):
+        self.catalog = catalog
+        self.rules = rules
+
+    def synthesize(self, lines):
+        """Returns (new_lines, report); new_lines is None when the pass doesn't apply."""
+        parser = DockerfileParser.from_string(''.join(lines))
+        commands = parser.commands
+        if len(parser.stages) != 1:
+            return None, {'applied': False, 'reason': 'not a single-stage Dockerfile'}
+
+        from_index = next(index for index, cmd in enumerate(commands) if cmd['instruction'] == 'FROM')
+        from_cmd = commands[from_index]
+        base_image = next(part for part in from_cmd['value'].split() if not part.startswith('--'))
+        base_entry = self.catalog.describe(base_image)
+        all_segments = [segment for cmd in commands if cmd['instruction'] == 'RUN' for segment in _segments(cmd)]
+        rule = next((rule for rule in self.rules if rule.applies(base_entry, all_segments)), None)
+        if rule is None:
+            return None, {'applied': False, 'reason': 'no ecosystem rule matches the base image and build steps'}
+
+        last_build = max(index for index, cmd in enumerate(commands)
+                         if cmd['instruction'] == 'RUN' and any(rule.build_re.search(s) for s in _segments(cmd)))
+        manifests = self._builder_manifests(rule, commands[from_index + 1:last_build + 1])
+
+        def source(cmd):
+            return ''.join(parser.lines[cmd['start_line'] - 1:cmd['end_line']]).rstrip('\n')
+
+        global_args = [source(cmd) for cmd in commands[:from_index]]
+        builder = [f"{source(from_cmd)} AS {BUILDER_STAGE}" if not from_cmd['stage_name']
+                   else re.sub(r'(?i)\s+AS\s+\S+\s*$', f' AS {BUILDER_STAGE}', source(from_cmd))]
+        builder += rule.builder_prologue()
+        runtime = []
+        runtime_packages = {}
+        removed_packages = []
+        post_build_segments = []
+        workdir = None
+        artifacts_inserted = False
+
+        for index, cmd in enumerate(commands[from_index + 1:], from_index + 1):
+            instruction = cmd['instruction']
+            after_build = index > last_build
+            if after_build and not artifacts_inserted:
+                builder += rule.builder_epilogue()
+                artifacts_inserted = True
+                runtime += ['__ARTIFACTS__']
+
+            if instruction == 'WORKDIR':
+                workdir = _absolute(cmd['value'].strip(), workdir)
+            if instruction in BOTH_STAGES:
+                builder.append(source(cmd))
+                runtime.append(source(cmd))
+            elif instruction in RUNTIME_ONLY:
+                runtime.append(source(cmd))
+            elif instruction in ('COPY', 'ADD'):
+                destination = (cmd['json_args'] or cmd['value'].split() or [''])[-1]
+                if not after_build:
+                    builder += self._builder_copy(cmd, source(cmd), workdir, manifests)
+                if rule.copies_context(destination, workdir, after_build) or 'from' in cmd['flags']:
+                    runtime.append(source(cmd))
+            elif instruction == 'RUN':
+                before, after = [], []
+                build_seen = after_build
+                for segment in _segments(cmd):
+                    if rule.build_re.search(segment):
+                        build_seen = build_seen or index == last_build
+                        continue
+                    installed = _install_packages(segment)
+                    if installed:
+                        manager, packages = installed
+                        for package in packages:
+                            if package in BUILD_ONLY_PACKAGES[manager]:
+                                removed_packages.append(package)
+                                continue
+                            runtime_package = DEV_TO_RUNTIME[manager].get(package, package)
+                            if runtime_package != package:
+                                removed_packages.append(package)
+                            runtime_packages.setdefault(manager, []).append(runtime_package)
+                    elif not (PACKAGE_HOUSEKEEPING_RE.match(segment) or rule.tool_re.search(segment)):
+                        (after if build_seen else before).append(segment)
+                if not after_build or rule.post_build == 'builder':
+                    builder.append(source(cmd))
+                if rule.post_build == 'builder':
+                    post_build_segments += after
+                    after = []
+                # Commands that ran before the build may set up users or directories the runtime needs too
+                runtime_segments = before + after
+                if runtime_segments:
+                    runtime.append(source(cmd) if cmd['heredocs'] else 'RUN ' + ' && '.join(runtime_segments))
+            else:
+                builder.append(source(cmd))
+
+        if not artifacts_inserted:
+            builder += rule.builder_epilogue()
+            runtime.append('__ARTIFACTS__')
+        if rule.name == 'npm' and workdir is None:
+            return None, {'applied': False, 'reason': 'npm build without a WORKDIR; outputs cannot be located'}
+
+        package_managers = set(runtime_packages)
+        runtime_image = rule.runtime_base(self.catalog, base_image, base_entry, package_managers)
+        if runtime_image is None:
+            return None, {'applied': False, 'reason': f'no runtime image in the catalog for {base_image}'}
+
+        install_lines = []
+        if runtime_packages.get('apt'):
+            packages = ' '.join(dict.fromkeys(runtime_packages['apt']))
+            install_lines.append('RUN apt-get update && apt-get install -y --no-install-recommends '
+                                 f'{packages} && rm -rf /var/lib/apt/lists/*')
+        if runtime_packages.get('apk'):
+            install_lines.append(f"RUN apk add --no-cache {' '.join(dict.fromkeys(runtime_packages['apk']))}")
+
+        final = list(global_args) + ['# Build stage'] + builder + ['', '# Runtime stage', f'FROM {runtime_image}']
+        final += install_lines
+        for line in runtime:
+            if line == '__ARTIFACTS__':
+                final += rule.artifacts(workdir or '/', post_build_segments)
+            else:
+                final.append(line)
+        new_lines = [line + '\n' for line in final]
+
+        problem = self.verify(new_lines, commands)
+        if problem:
+            return None, {'applied': False, 'reason': f'verification failed: {problem}'}
+        return new_lines, {
+            'applied': True,
+            'ecosystem': rule.name,
+            'builder_image': base_image,
+            'runtime_image': runtime_image,
+            'removed_packages': sorted(set(removed_packages)),
+            'runtime_packages': sorted({package for packages in runtime_packages.values() for package in packages})
+        }
+
+    @staticmethod
+    def _builder_manifests(rule, commands):
+        """
+        Absolute paths of every file the builder's build steps read, when those
+        installs are all it runs before the build; None when it may need the
+        whole source tree.
+        """
+        manifests = []
+        workdir = None
+        for cmd in commands:
+            if cmd['instruction'] == 'WORKDIR':
+                value = cmd['value'].strip()
+                if '$' in value:
+                    return None
+                workdir = _absolute(value, workdir)
+            if cmd['instruction'] != 'RUN':
+                continue
+            for segment in _segments(cmd):
+                if rule.build_re.search(segment):
+                    found = rule.dependency_manifests(segment)
+                    if found is None:
+                        return None
+                    manifests += [_absolute(manifest, workdir) for manifest in found]
+                elif not (_install_packages(segment) or PACKAGE_HOUSEKEEPING_RE.match(segment)):
+                    return None  # Any other step may read the copied sources
+        return list(dict.fromkeys(manifests))
+
+    @staticmethod
+    def _builder_copy(cmd, line, workdir, manifests):
+        """
+        Builder lines for a COPY ahead of the build: a whole-context COPY is cut
+        down to the dependency manifests, so source edits don't invalidate the
+        install, and the sources only arrive in the runtime stage.
+        """
+        operands = _copy_operands(cmd)
+        if manifests is None or cmd['instruction'] != 'COPY' or cmd['heredocs'] or len(operands) != 2 or \
+                operands[0].strip('/') not in ('', '.') or set(cmd['flags']) - {'chown', 'chmod'}:
+            return [line]
+        dest_dir = _absolute(operands[1], workdir)
+        if not all(_is_within(manifest, dest_dir) for manifest in manifests):
+            return [line]
+        flags = ''.join(f"--{name}={value} " for name, value in cmd['flags'].items() if isinstance(value, str))
+        grouped = {}
+        for manifest in manifests:
+            grouped.setdefault(posixpath.dirname(manifest), []).append(posixpath.relpath(manifest, dest_dir))
+        return [f"COPY {flags}{' '.join(paths)} {directory.rstrip('/')}/" for directory, paths in grouped.items()]
+
+    @staticmethod
+    def verify(new_lines, original_commands):
+        """Re-parse the synthesized Dockerfile and check it is a sound two-stage build."""
+        parser = DockerfileParser.from_string(''.join(new_lines))
+        if len(parser.stages) != 2 or parser.stages[0]['name'] != BUILDER_STAGE:
+            return 'expected a builder stage followed by a runtime stage'
+        final_stage = [cmd for cmd in parser.commands if cmd['stage'] == 1]
+        if not any(cmd['instruction'] == 'COPY' and cmd['flags'].get('from') == BUILDER_STAGE
+                   for cmd in final_stage):
+            return 'runtime stage receives no build outputs'
+        final_instructions = {(cmd['instruction'], ' '.join(cmd['value'].split())) for cmd in final_stage}
+        for cmd in original_commands:
+            if cmd['instruction'] in ('CMD', 'ENTRYPOINT', 'EXPOSE', 'USER') and \
+                    (cmd['instruction'], ' '.join(cmd['value'].split())) not in final_instructions:
+                return f"{cmd['instruction']} missing from the runtime stage"
+        return None
@@ -0,0 +1,295 @@
+"""
+Runtime cost of an image: how fast its containers start and become ready,
+how much memory and CPU they use once up, and how long the image takes to
+pull onto a fresh host.
+
+Measurements go through a RuntimeBackend, so the benchmark can run against
+the Docker daemon (DockerRuntimeBackend) or an in-process fake.
+"""
+import os
+import socket
+import statistics
+import tempfile
+import time
+from abc import ABC, abstractmethod
+
+DEFAULT_RUNS = 5
+DEFAULT_READY_TIMEOUT = 30.0
+POLL_INTERVAL = 0.05
+
+
+class RuntimeBackend(ABC):
+    """
+    What the benchmark needs from a container runtime. `probe` is None (ready
+    once the container is running, or once it exited 0 for one-shot images),
+    {'command': '...'} (ready once the command exits 0 inside the container)
+    or {'port': 8080} (ready once the port accepts and holds a connection).
+    """
+
+    @abstractmethod
+    def start(self, image, probe=None):
+        """Create and start a container; returns when its process has been started."""
+
+    @abstractmethod
+    def is_ready(self, container, probe=None):
+        """True once the probe passes; raises RuntimeError if the container can no longer pass it."""
+
+    @abstractmethod
+    def stats(self, container, samples):
+        """Up to `samples` readings of {'memory_bytes', 'cpu_percent'}; fewer once the container exited."""
+
+    @abstractmethod
+    def remove(self, container):
+        """Stop and delete the container."""
+
+    @abstractmethod
+    def pull_seconds(self, image):
+        """Seconds to fetch the image from a registry (or a stand-in for one)."""
+
+
+def make_probe(command=None, port=None):
+    """Probe config from CLI options; None means 'ready once running'"""
+    if command:
+        return {'command': command}
+    if port:
+        return {'port': int(port)}
+    return None
+
+
+def _cpu_percent(sample):
+    cpu, precpu = sample.get('cpu_stats') or {}, sample.get('precpu_stats') or {}
+    cpu_delta = cpu.get('cpu_usage', {}).get('total_usage', 0) - precpu.get('cpu_usage', {}).get('total_usage', 0)
+    system_delta = cpu.get('system_cpu_usage', 0) - precpu.get('system_cpu_usage', 0)
+    if cpu_delta <= 0 or system_delta <= 0:
+        return 0.0
+    online = cpu.get('online_cpus') or len(cpu.get('cpu_usage', {}).get('percpu_usage') or ()) or 1
+    return cpu_delta / system_delta * online * 100
+
+
+def _memory_bytes(sample):
+    memory = sample.get('memory_stats') or {}
+    details = memory.get('stats') or {}
+    # Page cache can be reclaimed; `docker stats` leaves it out too (inactive_file on cgroup v2, cache on v1)
+    return max(0, memory.get('usage', 0) - details.get('inactive_file', details.get('cache', 0)))
+
+
+class DockerRuntimeBackend(RuntimeBackend):
+    """
+    Docker daemon backend. Pull time is measured against `registry`
+    (e.g. 'localhost:5000', a `registry:2` container) when given; otherwise the
+    image is saved to a tarball, untagged and loaded back, which stands in for
+    a pull from a registry on the same host and gives a lower bound on one.
+    """
+
+    def __init__(self, client, registry=None):
+        self.client = client
+        self.registry = registry
+
+    def start(self, image, probe=None):
+        ports = {f"{probe['port']}/tcp": None} if probe and probe.get('port') else None
+        return self.client.containers.run(image, detach=True, ports=ports)
+
+    def is_ready(self, container, probe=None):
+        container.reload()
+        if container.status in ('exited', 'dead'):
+            exit_code = container.attrs['State'].get('ExitCode')
+            # A one-shot image (CMD ["python3", "--version"]) is done, not broken, when it exits 0
+            if probe or exit_code != 0 or container.status == 'dead':
+                raise RuntimeError(f"Container exited with code {exit_code}")
+            return True
+        if container.status != 'running':
+            return False
+        if not probe:
+            return True
+        if probe.get('command'):
+            exit_code, _ = container.exec_run(probe['command'])
+            return exit_code == 0
+        bindings = (container.attrs['NetworkSettings'].get('Ports') or {}).get(f"{probe['port']}/tcp")
+        return bool(bindings) and self._port_ready(int(bindings[0]['HostPort']))
+
+    @staticmethod
+    def _port_ready(port):
+        # docker-proxy accepts every connection and closes it at once while nothing listens inside
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5) as connection:
+                connection.settimeout(0.1)
+                try:
+                    return connection.recv(1) != b''
+                except socket.timeout:
+                    return True
+        except OSError:
+            return False
+
+    def stats(self, container, samples):
+        container.reload()
+        if container.status != 'running':
+            return []  # An exited container has no usage left to sample
+        readings = []
+        stream = container.stats(stream=True, decode=True)
+        try:
+            for sample in stream:
+                if not sample.get('memory_stats'):
+                    break  # The container exited while being sampled
+                if not sample.get('precpu_stats', {}).get('system_cpu_usage'):
+                    continue  # The first event has no previous reading to compute CPU from
+                readings.append({'memory_bytes': _memory_bytes(sample), 'cpu_percent': _cpu_percent(sample)})
+                if len(readings) >= samples:
+                    break
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+        return readings
+
+    def remove(self, container):
+        container.remove(force=True)
+
+    def pull_seconds(self, image):
+        if self.registry:
+            return self._registry_pull(image)
+        return self._save_and_load(image)
+
+    def _registry_pull(self, image):
+        repository = f"{self.registry}/{image.split(':')[0].rsplit('/', 1)[-1]}-runtime-benchmark"
+        self.client.images.get(image).tag(repository, tag='latest')
+        for line in self.client.images.push(repository, tag='latest', stream=True, decode=True):
+            if line.get('error'):
+                raise RuntimeError(line['error'])
+        self.client.images.remove(f"{repository}:latest")
+        start = time.perf_counter()
+        self.client.images.pull(repository, tag='latest')
+        seconds = time.perf_counter() - start
+        self.client.images.remove(f"{repository}:latest")
+        return seconds
+
+    def _save_and_load(self, image):
+        """
+        Seconds to load the image back from a `docker save` tarball after
+        untagging it. This is a lower bound on a pull: nothing crosses a
+        network, and layers that other local images share stay on disk, so
+        they are never loaded again. The image and its tags are restored even
+        when the load fails.
+        """
+        saved = self.client.images.get(image)
+        image_id, tags = saved.id, list(saved.tags)
+        with tempfile.TemporaryDirectory() as work_dir:
+            archive = os.path.join(work_dir, 'image.tar')
+            with open(archive, 'wb') as f:
+                for chunk in saved.save(named=True):
+                    f.write(chunk)
+            self.client.images.remove(image)
+            try:
+                start = time.perf_counter()
+                with open(archive, 'rb') as f:
+                    self.client.images.load(f)  # Streamed to the daemon, not read into memory
+                return time.perf_counter() - start
+            finally:
+                self._restore(image_id, tags, archive)
+
+    def _restore(self, image_id, tags, archive):
+        """Give the image back the tags it had before the untag, loading it from `archive` if it is gone"""
+        try:
+            restored = self.client.images.get(image_id)
+        except Exception:
+            with open(archive, 'rb') as f:
+                self.client.images.load(f)
+            restored = self.client.images.get(image_id)
+        for name in tags:
+            repository, _, tag = name.rpartition(':')
+            restored.tag(repository, tag=tag)
+
+
+def _median(values):
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values), 4) if values else None
+
+
+class RuntimeBenchmark:
+    def __init__(self, backend, runs=DEFAULT_RUNS, probe=None, ready_timeout=DEFAULT_READY_TIMEOUT,
+                 stats_samples=3, pull_runs=1):
+        self.backend = backend
+        self.runs = max(1, runs)
+        self.probe = probe
+        self.ready_timeout = ready_timeout
+        self.stats_samples = stats_samples
+        self.pull_runs = pull_runs
+
+    def _run_once(self, image):
+        start = time.perf_counter()
+        container = self.backend.start(image, self.probe)
+        try:
+            process_start = time.perf_counter() - start
+            deadline = start + self.ready_timeout
+            while not self.backend.is_ready(container, self.probe):
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"Not ready after {self.ready_timeout}s")
+                time.sleep(POLL_INTERVAL)
+            ready = time.perf_counter() - start
+            readings = self.backend.stats(container, self.stats_samples) if self.stats_samples else []
+            return {
+                'process_start_seconds': round(process_start, 4),
+                'ready_seconds': round(ready, 4),
+                'memory_mb': _median([reading['memory_bytes'] / (1024 * 1024) for reading in readings]),
+                'cpu_percent': _median([reading['cpu_percent'] for reading in readings])
+            }
+        finally:
+            self.backend.remove(container)
+
+    def benchmark_image(self, image):
+        """Start `image` `runs` times and return the medians plus every run."""
+        runs, errors = [], []
+        for _ in range(self.runs):
+            try:
+                runs.append(self._run_once(image))
+            except Exception as e:
+                errors.append(str(e))
+        if not runs:
+            return {'error': errors[0] if errors else 'No runs', 'runs': 0}
+
+        pulls = []
+        for _ in range(self.pull_runs):
+            try:
+                pulls.append(self.backend.pull_seconds(image))
+            except Exception as e:
+                errors.append(f"pull: {e}")
+        return {
+            'runs': len(runs),
+            'failed_runs': self.runs - len(runs),
+            'process_start_seconds': _median([run['process_start_seconds'] for run in runs]),
+            'ready_seconds': _median([run['ready_seconds'] for run in runs]),
+            'memory_mb': _median([run['memory_mb'] for run in runs]),
+            'cpu_percent': _median([run['cpu_percent'] for run in runs]),
+            'pull_seconds': _median(pulls),
+            'probe': self.probe,
+            'samples': runs,
+            'errors': errors
+        }
+
+    def compare(self, original, optimized):
+        """Before/after medians with the reduction of each metric"""
+        if 'error' in original or 'error' in optimized:
+            return {'error': original.get('error') or optimized.get('error')}
+        comparison = {}
+        for metric in ('process_start_seconds', 'ready_seconds', 'memory_mb', 'cpu_percent', 'pull_seconds'):
+            before, after = original[metric], optimized[metric]
+            if before is None or after is None:
+                continue
+            comparison[metric] = {
+                'original': before,
+                'optimized': after,
+                'reduction_percent': round((1 - after / before) * 100, 2) if before else 0.0
+            }
+        return comparison
+
+
+def print_runtime_comparison(comparison):
+    if 'error' in comparison:
+        print(f"🏃 Runtime benchmark failed: {comparison['error']}")
+        return
+    labels = {'process_start_seconds': ('Process start', 's'), 'ready_seconds': ('Time to ready', 's'),
+              'memory_mb': ('Memory', 'MB'), 'cpu_percent': ('CPU', '%'), 'pull_seconds': ('Pull/load', 's')}
+    print("🏃 Runtime (medians):")
+    for metric, values in comparison.items():
+        label, unit = labels[metric]
+        print(f"   {label:<14} {values['original']}{unit} → {values['optimized']}{unit} "
+              f"({values['reduction_percent']}% less)")
@@ -0,0 +1 @@
+from .stage_graph import StageGraph
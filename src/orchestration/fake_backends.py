@@ -0,0 +1,195 @@
+"""
+Test helpers: in-process stand-ins for the Groq API, the Docker daemon, Trivy
+and a container runtime. Not part of the optimizer's API.
+
+They implement just the methods the pipeline and the optimizer service call,
+with deterministic results and configurable latency, so the tests, the
+benchmarks and `service serve --fake-backends` run on machines without
+Docker, Trivy or an API key.
+"""
+import hashlib
+import threading
+import time
+
+from analysis.dockerfile_parser import DockerfileParser
+from optimization.base_image_catalog import BaseImageCatalog
+from optimization.runtime_benchmark import RuntimeBackend
+from security.trivy_scanner import TrivyScanner
+
+FAKE_SUGGESTIONS = """
+BASE IMAGE OPTIMIZATION:
+- Use a slim variant of the base image
+- Use multi-stage builds to reduce final image size
+
+LAYER OPTIMIZATION:
+- Combine RUN commands to reduce layer count
+- Clean up package manager cache in the same layer
+"""
+DEFAULT_BASE_BYTES = 100 * 1024 * 1024
+RUN_LAYER_BYTES = 15 * 1024 * 1024
+GIGABYTE = 1024 * 1024 * 1024
+
+
+class FakeSuggestor:
+    """Answers like GroqAISuggestor.get_suggestions after `latency` seconds."""
+
+    def __init__(self, latency=0.0, suggestions=FAKE_SUGGESTIONS):
+        self.latency = latency
+        self.suggestions = suggestions
+        self.cache = None
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_suggestions(self, dockerfile_path, commands=None):
+        if commands is None:
+            commands = DockerfileParser(dockerfile_path).parse()
+        if not commands:
+            return {"error": "No commands found in Dockerfile"}
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return {"suggestions": self.suggestions, "source": "Fake", "cached": False}
+
+
+class FakeImageBuilder:
+    """
+    "Builds" an image by sizing it from the catalog entry of its final base image
+    plus a fixed amount per RUN layer. Layer digests are derived from the
+    instructions, so identical Dockerfiles produce identical images.
+    """
+
+    def __init__(self, latency=0.0, catalog=None):
+        self.latency = latency
+        self.catalog = catalog or BaseImageCatalog.default()
+        self.client = None
+        self.images = {}
+        self._lock = threading.Lock()
+
+    def build_image(self, dockerfile_path, tag_name, minimal_context=False, nocache=False):
+        start_time = time.time()
+        commands = DockerfileParser(dockerfile_path).parse()
+        if not commands:
+            return {'success': False, 'error': f"Cannot build {dockerfile_path}", 'build_time': 0, 'size_mb': 0}
+        final_stage = max(cmd['stage'] for cmd in commands)
+        stage_commands = [cmd for cmd in commands if cmd['stage'] == final_stage]
+        base = stage_commands[0]['value'].split()[0] if stage_commands[0]['instruction'] == 'FROM' else ''
+        entry = self.catalog.describe(base) if base else None
+        size = (entry['uncompressed_bytes'] if entry else DEFAULT_BASE_BYTES) + \
+            RUN_LAYER_BYTES * sum(1 for cmd in stage_commands if cmd['instruction'] == 'RUN')
+        layers = [f"sha256:{hashlib.sha256(cmd['original'].encode('utf-8')).hexdigest()}"
+                  for cmd in stage_commands]
+        time.sleep(self.latency)
+        with self._lock:
+            self.images[tag_name] = {'base': base, 'size': size, 'layers': layers}
+        return {
+            'image': tag_name,
+            'build_time': round(time.time() - start_time, 2),
+            'size_bytes': size,
+            'size_mb': round(size / (1024 * 1024), 2),
+            'success': True
+        }
+
+    def profile_build(self, dockerfile_path, tag_name, minimal_context=False):
+        return self.build_image(dockerfile_path, tag_name, minimal_context=minimal_context)
+
+    def reuse_image(self, image_id, tag_name):
+        with self._lock:
+            if image_id not in self.images:
+                return None
+            self.images[tag_name] = self.images[image_id]
+        return tag_name
+
+    def compare_images(self, original_stats, optimized_stats):
+        if not original_stats['success'] or not optimized_stats['success']:
+            return {'error': 'Build failed'}
+
+        def _percent(before, after):
+            return round((1 - after / before) * 100, 2) if before else 0.0
+
+        return {
+            'size_reduction_mb': round(original_stats['size_mb'] - optimized_stats['size_mb'], 2),
+            'size_reduction_percent': _percent(original_stats['size_mb'], optimized_stats['size_mb']),
+            'time_saved_seconds': round(original_stats['build_time'] - optimized_stats['build_time'], 2),
+            'time_saved_percent': _percent(original_stats['build_time'], optimized_stats['build_time'])
+        }
+
+
+class FakeTrivyScanner(TrivyScanner):
+    """
+    TrivyScanner whose `trivy` run is replaced by a synthetic report: one
+    vulnerability per 20MB of image, with IDs keyed by the base image so
+    switching bases fixes and introduces findings like a real scan would.
+    Layer-digest caching and deduplication still go through TrivyScanner.
+    """
+
+    def __init__(self, builder, latency=0.0, **kwargs):
+        kwargs.setdefault('use_cache', False)
+        super().__init__(digest_resolver=self._layers, **kwargs)
+        self.builder = builder
+        self.latency = latency
+
+    def _layers(self, image_name):
+        image = self.builder.images.get(image_name)
+        return image['layers'] if image else None
+
+    def _run_trivy(self, image_name):
+        image = self.builder.images.get(image_name)
+        if image is None:
+            return {'error': f"No such image: {image_name}"}
+        with self._slots:
+            self.stats['scans'] += 1
+            time.sleep(self.latency)
+        prefix = hashlib.sha1(image['base'].encode('utf-8')).hexdigest()[:6].upper()
+        severities = ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+        return {'Results': [{
+            'Target': image_name,
+            'Vulnerabilities': [
+                {'VulnerabilityID': f"CVE-FAKE-{prefix}-{i}", 'PkgName': f"pkg{i}",
+                 'Severity': severities[i % len(severities)]}
+                for i in range(image['size'] // (20 * 1024 * 1024))
+            ]
+        }]}
+
+
+class FakeRuntimeBackend(RuntimeBackend):
+    """
+    Containers that start, become ready and use memory in proportion to the
+    size FakeImageBuilder gave their image: bigger images take longer to start
+    (more layers to mount), longer to pull and carry more resident memory.
+    `latency_scale` shrinks or stretches the simulated sleeps.
+    """
+
+    def __init__(self, builder, latency_scale=1.0, pull_bytes_per_second=200 * 1024 * 1024):
+        self.builder = builder
+        self.latency_scale = latency_scale
+        self.pull_bytes_per_second = pull_bytes_per_second
+        self.started = 0
+        self._lock = threading.Lock()
+
+    def _size(self, image):
+        built = self.builder.images.get(image)
+        if built is None:
+            raise RuntimeError(f"No such image: {image}")
+        return built['size']
+
+    def start(self, image, probe=None):
+        size = self._size(image)
+        time.sleep((0.01 + 0.05 * size / GIGABYTE) * self.latency_scale)
+        with self._lock:
+            self.started += 1
+        return {'image': image, 'size': size,
+                'ready_at': time.perf_counter() + (0.02 + 0.1 * size / GIGABYTE) * self.latency_scale}
+
+    def is_ready(self, container, probe=None):
+        return time.perf_counter() >= container['ready_at']
+
+    def stats(self, container, samples):
+        memory = 20 * 1024 * 1024 + container['size'] // 20
+        return [{'memory_bytes': memory + index * 1024 * 1024, 'cpu_percent': 1.5 + index * 0.5}
+                for index in range(samples)]
+
+    def remove(self, container):
+        pass
+
+    def pull_seconds(self, image):
+        return self._size(image) / self.pull_bytes_per_second
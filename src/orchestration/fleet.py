@@ -0,0 +1,387 @@
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from analysis.dockerfile_parser import DockerfileParser
+from analysis.similarity import DEFAULT_SIMILARITY_THRESHOLD, DockerfileClusterIndex
+from orchestration.history import HistoryStore, run_record
+from optimization.dockerfile_rewriter import DockerfileRewriter
+
+DOCKERFILE_PATTERNS = ('Dockerfile', 'Dockerfile.*', '*.Dockerfile', '*.dockerfile')
+EXCLUDED_SUFFIXES = ('.optimized', '.txt')
+SKIPPED_DIRS = {'.git', 'node_modules', '__pycache__', '.venv', 'venv', '.tox'}
+
+
+def discover_dockerfiles(root):
+    """Yield Dockerfiles under `root` in a stable order without loading the whole tree."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIPPED_DIRS)
+        for name in sorted(filenames):
+            if name.endswith(EXCLUDED_SUFFIXES):
+                continue
+            if any(fnmatch.fnmatch(name, pattern) for pattern in DOCKERFILE_PATTERNS):
+                yield os.path.join(dirpath, name)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _parse_worker(dockerfile_path):
+    """Parse a Dockerfile into plain, picklable command dicts and source lines."""
+    parser = DockerfileParser(dockerfile_path)
+    return parser.parse(), parser.lines
+
+
+def _parse_batch_worker(dockerfile_paths):
+    """
+    Process-pool task: parse a batch of Dockerfiles. A parse takes well under
+    a millisecond, so one task per file would spend most of its time on IPC.
+    Returns (commands, lines, seconds, error) per path.
+    """
+    results = []
+    for path in dockerfile_paths:
+        start = time.time()
+        try:
+            commands, lines = _parse_worker(path)
+            results.append((commands, lines, round(time.time() - start, 4), None))
+        except Exception as e:
+            results.append((None, None, round(time.time() - start, 4), str(e)))
+    return results
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _rewrite_worker(dockerfile_path, lines, ai_suggestions):
+    """Process-pool task: rewrite a Dockerfile next to the original."""
+    rewriter = DockerfileRewriter(dockerfile_path)
+    optimized_lines = rewriter.apply_optimizations(list(lines), ai_suggestions)
+    return rewriter.write_optimized_dockerfile(optimized_lines, output_path=f"{dockerfile_path}.optimized")
+
+
+class FleetOptimizer:
+    """Optimizes many Dockerfiles in parallel and streams one JSONL record per file."""
+
+    def __init__(self, root, report_path='fleet_report.jsonl', parse_workers=None,
+                 ai_concurrency=4, build_concurrency=1, build=False, resume=True,
+                 suggestor=None, builder=None, share_similar=False,
+                 similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD, history_path=None,
+                 parse_batch_size=32):
+        self.root = root
+        self.report_path = report_path
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.parse_batch_size = max(1, parse_batch_size)
+        self.ai_concurrency = max(1, ai_concurrency)
+        self.build_concurrency = max(1, build_concurrency)
+        self.build = build
+        self.resume = resume
+        self.suggestor = suggestor
+        self.builder = builder
+        self.history_path = history_path
+        self._ai_slots = threading.BoundedSemaphore(self.ai_concurrency)
+        self._build_slots = threading.BoundedSemaphore(self.build_concurrency)
+        self._write_lock = threading.Lock()
+        # Near-duplicates wait for their cluster representative's suggestions instead of calling the LLM
+        self._clusters = DockerfileClusterIndex(threshold=similarity_threshold) if share_similar else None
+        self._shared_results = {}
+        self._shared_answers = 0
+        self._llm_calls = 0  # Chat completions made for this fleet's files
+        self._shared_lock = threading.Lock()
+
+    def _completed_paths(self):
+        """
+        Real paths already recorded by a previous (possibly crashed) run, so
+        resuming with `./repos`, `repos` or an absolute root skips the same files.
+        """
+        completed = set()
+        if not self.resume or not os.path.exists(self.report_path):
+            return completed
+        with open(self.report_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Partially written line from an interrupted run
+                if record.get('status') == 'ok':
+                    completed.add(os.path.realpath(record['path']))
+        return completed
+
+    def _open_report(self):
+        mode = 'a' if self.resume else 'w'
+        if mode == 'a' and os.path.exists(self.report_path) and os.path.getsize(self.report_path):
+            with open(self.report_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+            report = open(self.report_path, mode)
+            if needs_newline:
+                report.write('\n')
+            return report
+        return open(self.report_path, mode)
+
+    def _get_suggestions(self, path, commands):
+        if self._clusters is None:
+            with self._ai_slots:
+                return self.suggestor.get_suggestions(path, commands=commands)
+        
+        with self._shared_lock:
+            representative = self._clusters.add(path, commands)
+            pending = self._shared_results.get(representative)
+            owner = pending is None
+            if owner:
+                pending = self._shared_results[representative] = Future()
+        if owner:
+            try:
+                with self._ai_slots:
+                    result = self.suggestor.get_suggestions(path, commands=commands)
+            except Exception as e:
+                result = {'error': str(e)}
+            pending.set_result(result)
+            return result
+        
+        result = pending.result()
+        if 'error' in result:
+            return result
+        if result.get('source') == 'Local rules':
+            # Rules cost microseconds and cite exact lines, so members get their own
+            with self._ai_slots:
+                return self.suggestor.get_suggestions(path, commands=commands)
+        shared = self.suggestor.share_result(result, representative,
+                                             self._clusters.representative_commands(representative), commands)
+        if 'shared_from' in shared:
+            with self._shared_lock:
+                self._shared_answers += 1
+        return shared
+
+    def _process(self, path, parsed, process_pool):
+        record = {'path': path, 'status': 'ok', 'timings': {}}
+        timings = record['timings']
+
+        commands, lines, timings['parse'], error = parsed
+        if error:
+            raise RuntimeError(error)
+        record['commands'] = len(commands)
+        if not commands:
+            record['status'] = 'error'
+            record['error'] = 'No commands found in Dockerfile'
+            return record
+
+        start = time.time()
+        ai_result = self._get_suggestions(path, commands)
+        timings['ai'] = round(time.time() - start, 4)
+        # Counted from this fleet's own results: the suggestor's tier_stats may be shared
+        with self._shared_lock:
+            self._llm_calls += len(ai_result.get('calls') or ())
+        if 'error' in ai_result:
+            record['status'] = 'error'
+            record['error'] = ai_result['error']
+            return record
+        record['ai_cached'] = ai_result.get('cached', False)
+        record['ai_source'] = ai_result.get('source')
+        if self.history_path:
+            # Full text goes to the history store only; the JSONL report stays one short line per file
+            record['ai_suggestions'] = ai_result['suggestions']
+        if 'shared_from' in ai_result:
+            record['ai_shared_from'] = ai_result['shared_from']
+            record['ai_projection'] = ai_result['projection']
+
+        start = time.time()
+        optimized_path = process_pool.submit(_rewrite_worker, path, lines, ai_result['suggestions']).result()
+        timings['rewrite'] = round(time.time() - start, 4)
+        record['optimized_path'] = optimized_path
+
+        if self.build:
+            tag_prefix = f"fleet-{hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]}"
+            start = time.time()
+            with self._build_slots:
+                original_stats = self.builder.build_image(path, f"{tag_prefix}-original")
+                optimized_stats = self.builder.build_image(optimized_path, f"{tag_prefix}-optimized")
+            timings['build'] = round(time.time() - start, 4)
+            for label, stats in (('original', original_stats), ('optimized', optimized_stats)):
+                if not stats['success']:
+                    record['status'] = 'error'
+                    record['error'] = f"{label} build failed: {stats['error']}"
+                    return record
+            record['original_size_mb'] = original_stats['size_mb']
+            record['optimized_size_mb'] = optimized_stats['size_mb']
+            record['improvements'] = self.builder.compare_images(original_stats, optimized_stats)
+
+        return record
+
+    def _safe_process(self, path, batch, index, process_pool):
+        try:
+            return self._process(path, batch.result()[index], process_pool)
+        except Exception as e:
+            return {'path': path, 'status': 'error', 'error': str(e), 'timings': {}}
+
+    def run(self):
+        """Process every discovered Dockerfile and return a throughput summary."""
+        if self.suggestor is None:
+            from analysis.ai_suggestor import GroqAISuggestor
+            self.suggestor = GroqAISuggestor()
+        if self.build and self.builder is None:
+            from optimization.image_builder import ImageBuilder
+            self.builder = ImageBuilder()
+
+        completed = self._completed_paths()
+        # Enough coordinator threads to keep every stage busy without buffering the whole fleet
+        max_in_flight = self.parse_workers + self.ai_concurrency + self.build_concurrency
+        stage_latencies = {}
+        counts = {'ok': 0, 'error': 0, 'skipped': 0}
+        history = HistoryStore(self.history_path) if self.history_path else None
+        start = time.time()
+
+        with self._open_report() as report, \
+                ProcessPoolExecutor(max_workers=self.parse_workers) as process_pool, \
+                ThreadPoolExecutor(max_workers=max_in_flight) as coordinators:
+            in_flight = set()
+
+            def _drain(return_when):
+                done, _ = wait(in_flight, return_when=return_when)
+                for future in done:
+                    in_flight.discard(future)
+                    record = future.result()
+                    counts[record['status']] += 1
+                    for stage, seconds in record['timings'].items():
+                        stage_latencies.setdefault(stage, []).append(seconds)
+                    suggestions = record.pop('ai_suggestions', None)
+                    if history is not None:
+                        history.record(run_record(
+                            'fleet', os.path.abspath(record['path']), record, timings=record['timings'],
+                            ai_result={'source': record.get('ai_source'), 'suggestions': suggestions},
+                            status=record['status'], error=record.get('error')))
+                    with self._write_lock:
+                        report.write(json.dumps(record) + '\n')
+                        report.flush()
+
+            def _pending():
+                for path in discover_dockerfiles(self.root):
+                    if os.path.realpath(path) in completed:
+                        counts['skipped'] += 1
+                    else:
+                        yield path
+
+            for batch in _batches(_pending(), self.parse_batch_size):
+                parsed = process_pool.submit(_parse_batch_worker, batch)
+                for index, path in enumerate(batch):
+                    if len(in_flight) >= max_in_flight:
+                        _drain(FIRST_COMPLETED)
+                    in_flight.add(coordinators.submit(self._safe_process, path, parsed, index, process_pool))
+
+            while in_flight:
+                _drain(FIRST_COMPLETED)
+
+        if history is not None:
+            history.close()
+        elapsed = time.time() - start
+        processed = counts['ok'] + counts['error']
+        summary = {
+            'files_processed': processed,
+            'files_ok': counts['ok'],
+            'files_failed': counts['error'],
+            'files_skipped': counts['skipped'],
+            'elapsed_seconds': round(elapsed, 3),
+            'files_per_second': round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+            'stage_latency_seconds': {
+                stage: {
+                    'p50': percentile(values, 50),
+                    'p90': percentile(values, 90),
+                    'p99': percentile(values, 99),
+                    'max': max(values)
+                }
+                for stage, values in stage_latencies.items()
+            }
+        }
+        if self._clusters is not None:
+            clusters = summary['similarity_clusters'] = self._clusters.report()
+            clusters['llm_calls'] = self._llm_calls
+            clusters['shared_answers'] = self._shared_answers
+        if hasattr(self.suggestor, 'tier_report'):
+            summary['ai_tiers'] = self.suggestor.tier_report()
+        if history is not None:
+            summary['history'] = {'path': self.history_path, 'runs_recorded': history.written,
+                                  'batches': history.batches, 'failed': history.errors}
+        return summary
+
+
+def print_summary(summary):
+    print("\n📊 FLEET SUMMARY")
+    print("=" * 60)
+    print(f"Files: {summary['files_processed']} processed, {summary['files_ok']} ok, "
+          f"{summary['files_failed']} failed, {summary['files_skipped']} resumed")
+    print(f"Throughput: {summary['files_per_second']} files/sec over {summary['elapsed_seconds']}s")
+    clusters = summary.get('similarity_clusters')
+    if clusters:
+        calls = clusters['llm_calls'] if clusters['llm_calls'] is not None else 'unknown'
+        print(f"LLM calls: {calls} for {clusters['files']} files in {clusters['clusters']} clusters "
+              f"({clusters['shared_answers']} files reused a representative's answer)")
+    tiers = summary.get('ai_tiers')
+    if tiers and tiers['files']:
+        extra = ''.join(f", {tiers[tier]} {label}" for tier, label in (
+            ('shared', 'shared within a cluster'), ('rules', 'settled stage by stage'),
+            ('reused', 'reused from the previous run')) if tiers.get(tier))
+        print(f"AI tiers: {tiers['local_only']} settled by local rules, {tiers['cache_hits']} cached, "
+              f"{tiers['llm']} sent to the LLM{extra} ({tiers['without_network_fraction']:.0%} without a network call)")
+    history = summary.get('history')
+    if history:
+        failed = f", {history['failed']} failed to write" if history['failed'] else ''
+        print(f"History: {history['runs_recorded']} runs recorded in {history['batches']} batches "
+              f"to {history['path']}{failed}")
+    for stage, stats in summary['stage_latency_seconds'].items():
+        print(f"   {stage:<8} p50={stats['p50']}s p90={stats['p90']}s p99={stats['p99']}s max={stats['max']}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Optimize every Dockerfile under a directory")
+    arg_parser.add_argument('root', help="Directory to search for Dockerfiles")
+    arg_parser.add_argument('--report', default='fleet_report.jsonl', help="JSONL output path")
+    arg_parser.add_argument('--parse-workers', type=int, default=None)
+    arg_parser.add_argument('--parse-batch-size', type=int, default=32,
+                            help="Dockerfiles parsed per process-pool task")
+    arg_parser.add_argument('--ai-concurrency', type=int, default=4)
+    arg_parser.add_argument('--build-concurrency', type=int, default=1)
+    arg_parser.add_argument('--build', action='store_true', help="Also build original and optimized images")
+    arg_parser.add_argument('--no-resume', action='store_true', help="Start a fresh report instead of resuming")
+    arg_parser.add_argument('--share-similar', action='store_true',
+                            help="Ask the LLM once per cluster of near-duplicate Dockerfiles")
+    arg_parser.add_argument('--similarity-threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLD,
+                            help="Minimum Jaccard similarity of instruction shingles to share suggestions")
+    arg_parser.add_argument('--history', help="SQLite history to record every file's run in")
+    args = arg_parser.parse_args()
+
+    fleet = FleetOptimizer(
+        args.root,
+        report_path=args.report,
+        parse_workers=args.parse_workers,
+        parse_batch_size=args.parse_batch_size,
+        ai_concurrency=args.ai_concurrency,
+        build_concurrency=args.build_concurrency,
+        build=args.build,
+        resume=not args.no_resume,
+        share_similar=args.share_similar,
+        similarity_threshold=args.similarity_threshold,
+        history_path=args.history
+    )
+    summary = fleet.run()
+    print_summary(summary)
+    with open(f"{args.report}.summary.json", 'w') as f:
+        json.dump(summary, f, indent=2)
@@ -0,0 +1,456 @@
+"""
+Append-only history of optimization results in SQLite.
+
+Every pipeline run, fleet file and service job becomes one row in `runs`,
+with per-image, per-layer and per-stage metrics in child tables. Writers hand
+runs to a background thread that commits them in batches, one transaction per
+batch, so concurrent workers never wait on the disk. Trend queries are index
+range scans over (image, variant, recorded_at), regressions take two index
+seeks per image, and fleet-wide and stage trends read daily rollups kept up to
+date on write.
+
+    python -m orchestration.history trend Dockerfile --metric size_mb --since 30d
+    python -m orchestration.history regressions --metric size_mb --since 30d --limit 20
+    python -m orchestration.history runs --image Dockerfile
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+DEFAULT_HISTORY_PATH = os.getenv('OPTIMIZER_HISTORY_DB', 'optimization_history.db')
+SCHEMA_VERSION = 1
+DEFAULT_BATCH_SIZE = 500
+VARIANTS = ('original', 'optimized')
+METRICS = ('size_mb', 'build_seconds', 'vulnerabilities', 'critical', 'high', 'ready_seconds', 'memory_mb')
+DURATION_RE = re.compile(r'^(\d+(?:\.\d+)?)([mhdw])$')
+DURATION_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+DAY = 86400
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS images (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+    'CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, recorded_at REAL NOT NULL, source TEXT NOT NULL, '
+    'image_id INTEGER NOT NULL, status TEXT NOT NULL, error TEXT, ai_source TEXT, ai_suggestions TEXT, report TEXT)',
+    'CREATE INDEX IF NOT EXISTS runs_by_image ON runs (image_id, recorded_at)',
+    'CREATE INDEX IF NOT EXISTS runs_by_time ON runs (recorded_at)',
+    f"CREATE TABLE IF NOT EXISTS image_metrics (run_id INTEGER NOT NULL, image_id INTEGER NOT NULL, "
+    f"variant TEXT NOT NULL, recorded_at REAL NOT NULL, {', '.join(f'{metric} REAL' for metric in METRICS)}, "
+    # Clustered on the trend key: a seek lands on the row itself, not on an index entry pointing at it
+    f"PRIMARY KEY (image_id, variant, recorded_at, run_id)) WITHOUT ROWID",
+    'CREATE INDEX IF NOT EXISTS image_metrics_by_run ON image_metrics (run_id)',
+    'CREATE TABLE IF NOT EXISTS layer_metrics (run_id INTEGER NOT NULL, variant TEXT NOT NULL, '
+    'position INTEGER NOT NULL, instruction TEXT, added_bytes INTEGER, wasted_bytes INTEGER)',
+    'CREATE INDEX IF NOT EXISTS layer_metrics_by_run ON layer_metrics (run_id)',
+    'CREATE TABLE IF NOT EXISTS stage_metrics (run_id INTEGER NOT NULL, stage TEXT NOT NULL, '
+    'recorded_at REAL NOT NULL, seconds REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS stage_metrics_by_run ON stage_metrics (run_id)',
+    # Sums and counts per day so fleet-wide trends never scan the detail tables
+    f"CREATE TABLE IF NOT EXISTS daily_metrics (day INTEGER NOT NULL, variant TEXT NOT NULL, "
+    f"{', '.join(f'{metric}_sum REAL NOT NULL DEFAULT 0, {metric}_count INTEGER NOT NULL DEFAULT 0' for metric in METRICS)}, "
+    f"PRIMARY KEY (day, variant)) WITHOUT ROWID",
+    'CREATE TABLE IF NOT EXISTS daily_stages (day INTEGER NOT NULL, stage TEXT NOT NULL, seconds_sum REAL NOT NULL, '
+    'seconds_max REAL NOT NULL, samples INTEGER NOT NULL, PRIMARY KEY (stage, day)) WITHOUT ROWID'
+]
+
+
+def parse_duration(value):
+    """'30d', '12h', '2w', '15m' -> seconds"""
+    match = DURATION_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid duration {value!r}; expected e.g. 30d, 12h, 2w")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def parse_since(value, now=None):
+    """A duration ago ('30d') or an ISO date -> unix timestamp"""
+    if DURATION_RE.match(value.strip()):
+        return (time.time() if now is None else now) - parse_duration(value)
+    return datetime.fromisoformat(value.strip()).timestamp()
+
+
+def _utc_label(timestamp, timespec='minutes'):
+    # Rollups bucket by UTC day, so labels are UTC too, with the offset spelled out
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec=timespec)
+
+
+def _severity_count(vuln_comparison, variant, severity):
+    # Only the diff carries severities: original = fixed + unchanged, optimized = introduced + unchanged
+    changed = vuln_comparison.get('fixed' if variant == 'original' else 'introduced', [])
+    return sum(1 for vuln in changed + vuln_comparison.get('unchanged', []) if vuln.get('severity') == severity)
+
+
+def run_record(source, image, result, timings=None, ai_result=None, status='ok', error=None, recorded_at=None):
+    """
+    History run from a pipeline report, a fleet record or a service job
+    result; they share the improvement keys but differ in where sizes live.
+    """
+    images = {variant: dict.fromkeys(METRICS) for variant in VARIANTS}
+    for variant in VARIANTS:
+        metrics = images[variant]
+        details = result.get(f"{variant}_image") or {}
+        metrics['size_mb'] = details.get('size_mb', result.get(f"{variant}_size_mb"))
+        metrics['build_seconds'] = details.get('build_time_seconds')
+
+        vulns = result.get('security_improvements') or {}
+        if vulns and 'error' not in vulns:
+            metrics['vulnerabilities'] = vulns[f"{variant}_vulnerabilities"]
+            metrics['critical'] = _severity_count(vulns, variant, 'CRITICAL')
+            metrics['high'] = _severity_count(vulns, variant, 'HIGH')
+
+        runtime = (result.get('runtime') or {}).get('comparison') or result.get('runtime_improvements') or {}
+        if 'error' not in runtime:
+            for metric in ('ready_seconds', 'memory_mb'):
+                if metric in runtime:
+                    metrics[metric] = runtime[metric][variant]
+
+    layers = {}
+    for variant, analysis in (result.get('layer_analysis') or {}).items():
+        if analysis and 'error' not in analysis:
+            layers[variant] = [(layer['index'], layer['instruction'], layer['added_bytes'], layer['wasted_bytes'])
+                               for layer in analysis['layers']]
+
+    stages = {}
+    # Pipeline stage graphs report {'duration_seconds': ...}, fleet and service timings are plain seconds
+    for stage, timing in (timings or result.get('stage_timings') or {}).items():
+        stages[stage] = timing['duration_seconds'] if isinstance(timing, dict) else timing
+
+    ai_result = ai_result or {}
+    return {
+        'recorded_at': time.time() if recorded_at is None else recorded_at,
+        'source': source,
+        'image': image,
+        'status': status,
+        'error': error,
+        'ai_source': ai_result.get('source'),
+        'ai_suggestions': ai_result.get('suggestions'),
+        'report': json.dumps({key: value for key, value in result.items() if key != 'ai_suggestions'}, default=str),
+        'images': images if status == 'ok' else {},
+        'layers': layers,
+        'stages': stages
+    }
+
+
+def content_image_name(content):
+    """Stable history key for a Dockerfile submitted inline rather than by path"""
+    return f"content:{hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]}"
+
+
+class HistoryStore:
+    """
+    SQLite results store. `record()` only enqueues; a writer thread commits
+    up to `batch_size` runs per transaction. WAL mode lets queries (and
+    writers in other processes, after a busy wait) run alongside.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.execute('INSERT OR IGNORE INTO meta VALUES (?, ?)', ('schema_version', str(SCHEMA_VERSION)))
+        connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def record(self, run):
+        """Queue a run from `run_record` for the next batch."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+                self._writer.start()
+        self._queue.put(run)
+
+    def flush(self):
+        """Block until every queued run is committed."""
+        self._queue.join()
+
+    def close(self):
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_loop(self):
+        connection = self._connect()
+        try:
+            while True:
+                batch = [self._queue.get()]
+                # Whatever piled up while the previous batch committed goes into this one
+                while batch[-1] is not None and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                runs = [run for run in batch if run is not None]
+                try:
+                    if runs:
+                        self.write_batch(runs, connection)
+                except sqlite3.Error as e:
+                    self.errors += len(runs)
+                    print(f"⚠️  History write failed ({len(runs)} runs): {e}", file=sys.stderr)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if batch[-1] is None:
+                    return
+        finally:
+            connection.close()
+
+    def write_batch(self, runs, connection=None):
+        """Insert runs in a single transaction; used directly for bulk imports."""
+        own_connection = connection is None
+        connection = connection or self._connect()
+        try:
+            with connection:
+                image_ids = {}
+                for name in {run['image'] for run in runs}:
+                    connection.execute('INSERT OR IGNORE INTO images (name) VALUES (?)', (name,))
+                    image_ids[name] = connection.execute('SELECT id FROM images WHERE name = ?',
+                                                         (name,)).fetchone()[0]
+                image_rows, layer_rows, stage_rows, daily, daily_stages = [], [], [], {}, {}
+                for run in runs:
+                    cursor = connection.execute(
+                        'INSERT INTO runs (recorded_at, source, image_id, status, error, ai_source, ai_suggestions, '
+                        'report) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (run['recorded_at'], run['source'], image_ids[run['image']], run['status'], run['error'],
+                         run['ai_source'], run['ai_suggestions'], run['report']))
+                    run_id = cursor.lastrowid
+                    day = int(run['recorded_at'] // DAY)
+                    for variant, metrics in run['images'].items():
+                        if all(metrics[metric] is None for metric in METRICS):
+                            continue
+                        image_rows.append((run_id, image_ids[run['image']], variant, run['recorded_at']) +
+                                          tuple(metrics[metric] for metric in METRICS))
+                        totals = daily.setdefault((day, variant), [0.0, 0] * len(METRICS))
+                        for index, metric in enumerate(METRICS):
+                            if metrics[metric] is not None:
+                                totals[2 * index] += metrics[metric]
+                                totals[2 * index + 1] += 1
+                    for variant, layers in run['layers'].items():
+                        layer_rows.extend((run_id, variant) + layer for layer in layers)
+                    for stage, seconds in run['stages'].items():
+                        stage_rows.append((run_id, stage, run['recorded_at'], seconds))
+                        totals = daily_stages.setdefault((day, stage), [0.0, 0.0, 0])
+                        totals[0] += seconds
+                        totals[1] = max(totals[1], seconds)
+                        totals[2] += 1
+
+                connection.executemany(f"INSERT INTO image_metrics VALUES ({', '.join('?' * (4 + len(METRICS)))})",
+                                       image_rows)
+                connection.executemany('INSERT INTO layer_metrics VALUES (?, ?, ?, ?, ?, ?)', layer_rows)
+                connection.executemany('INSERT INTO stage_metrics VALUES (?, ?, ?, ?)', stage_rows)
+                columns = [f"{metric}_{part}" for metric in METRICS for part in ('sum', 'count')]
+                connection.executemany(
+                    f"INSERT INTO daily_metrics (day, variant, {', '.join(columns)}) "
+                    f"VALUES (?, ?, {', '.join('?' * len(columns))}) ON CONFLICT (day, variant) DO UPDATE SET "
+                    f"{', '.join(f'{column} = {column} + excluded.{column}' for column in columns)}",
+                    [key + tuple(totals) for key, totals in daily.items()])
+                connection.executemany(
+                    'INSERT INTO daily_stages VALUES (?, ?, ?, ?, ?) ON CONFLICT (stage, day) DO UPDATE SET '
+                    'seconds_sum = seconds_sum + excluded.seconds_sum, samples = samples + excluded.samples, '
+                    'seconds_max = MAX(seconds_max, excluded.seconds_max)',
+                    [key + tuple(totals) for key, totals in daily_stages.items()])
+            self.written += len(runs)
+            self.batches += 1
+        finally:
+            if own_connection:
+                connection.close()
+
+    # Queries
+
+    @staticmethod
+    def _check(metric, variant):
+        # Metric names end up in SQL, so only known columns are accepted
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}; expected one of {', '.join(METRICS)}")
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown variant {variant!r}; expected one of {', '.join(VARIANTS)}")
+
+    def _query(self, sql, params):
+        connection = self._connect()
+        try:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute(sql, params)]
+        finally:
+            connection.close()
+
+    def trend(self, metric='size_mb', image=None, variant='optimized', since=None, bucket_seconds=DAY):
+        """
+        Average, min and max of `metric` per time bucket. With an image it
+        reads that image's index range; without one it reads the daily rollup,
+        which only has averages and whole-day buckets.
+        """
+        self._check(metric, variant)
+        since = since or 0.0
+        if image is None:
+            rows = self._query(
+                f"SELECT day * {DAY} AS bucket_start, {metric}_count AS samples, "
+                f"{metric}_sum / {metric}_count AS average FROM daily_metrics "
+                f"WHERE variant = ? AND day >= ? AND {metric}_count > 0 ORDER BY day",
+                (variant, int(since // DAY)))
+        else:
+            rows = self._query(
+                f"SELECT CAST((recorded_at - :since) / :bucket AS INTEGER) * :bucket + :since AS bucket_start, "
+                f"COUNT({metric}) AS samples, AVG({metric}) AS average, MIN({metric}) AS minimum, "
+                f"MAX({metric}) AS maximum FROM image_metrics "
+                f"WHERE image_id = (SELECT id FROM images WHERE name = :image) AND variant = :variant "
+                f"AND recorded_at >= :since AND {metric} IS NOT NULL GROUP BY 1 ORDER BY 1",
+                {'since': since, 'bucket': bucket_seconds, 'image': image, 'variant': variant})
+        for row in rows:
+            row['bucket_start'] = _utc_label(row['bucket_start'])
+        return rows
+
+    def regressions(self, metric='size_mb', variant='optimized', since=None, limit=20, by_percent=False):
+        """Images whose `metric` grew the most between their first and latest run since `since`."""
+        self._check(metric, variant)
+        order = 'growth_percent' if by_percent else 'growth'
+        seek = (f"SELECT {metric} FROM image_metrics WHERE image_id = images.id AND variant = :variant "
+                f"AND recorded_at >= :since AND {metric} IS NOT NULL ORDER BY recorded_at")
+        rows = self._query(
+            f"SELECT image, first_value, latest_value, latest_value - first_value AS growth, "
+            f"CASE WHEN first_value > 0 THEN (latest_value - first_value) * 100.0 / first_value END "
+            f"AS growth_percent FROM (SELECT name AS image, ({seek} LIMIT 1) AS first_value, "
+            f"({seek} DESC LIMIT 1) AS latest_value FROM images) "
+            f"WHERE first_value IS NOT NULL AND latest_value > first_value "
+            f"ORDER BY {order} DESC LIMIT :limit",
+            {'variant': variant, 'since': since or 0.0, 'limit': limit})
+        for row in rows:
+            row['growth'] = round(row['growth'], 2)
+            row['growth_percent'] = round(row['growth_percent'], 2) if row['growth_percent'] is not None else None
+        return rows
+
+    def stage_trend(self, stage, since=None):
+        """Daily average and maximum duration of a pipeline stage, from the rollup."""
+        rows = self._query(
+            f"SELECT day * {DAY} AS bucket_start, samples, seconds_sum / samples AS average, "
+            f"seconds_max AS maximum FROM daily_stages WHERE stage = ? AND day >= ? ORDER BY day",
+            (stage, int((since or 0.0) // DAY)))
+        for row in rows:
+            row['bucket_start'] = _utc_label(row['bucket_start'])
+        return rows
+
+    def runs(self, image=None, limit=20, with_suggestions=False):
+        """Latest runs, newest first, optionally for one image."""
+        columns = 'runs.id, recorded_at, source, name AS image, status, error, ai_source'
+        if with_suggestions:
+            columns += ', ai_suggestions'
+        where = 'WHERE image_id = (SELECT id FROM images WHERE name = :image)' if image else ''
+        index = 'runs_by_image' if image else 'runs_by_time'
+        rows = self._query(
+            f"SELECT {columns} FROM runs INDEXED BY {index} JOIN images ON images.id = runs.image_id {where} "
+            f"ORDER BY recorded_at DESC LIMIT :limit",
+            {'image': image, 'limit': limit})
+        for row in rows:
+            row['recorded_at'] = _utc_label(row['recorded_at'], 'seconds')
+        return rows
+
+
+def _print_rows(rows, columns):
+    if not rows:
+        print("No matching history")
+        return
+    widths = {column: max(len(column), *(len(_format(row.get(column))) for row in rows)) for column in columns}
+    print('  '.join(f"{column:<{widths[column]}}" for column in columns))
+    for row in rows:
+        print('  '.join(f"{_format(row.get(column)):<{widths[column]}}" for column in columns))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.2f}" if abs(value) >= 1 else f"{value:.4f}"
+    return '' if value is None else str(value)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='history', description="Query the optimization history store")
+    arg_parser.add_argument('--db', default=DEFAULT_HISTORY_PATH, help="History database path")
+    arg_parser.add_argument('--json', action='store_true')
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    trend_cmd = commands.add_parser('trend', help="A metric over time, for one image or the whole fleet")
+    trend_cmd.add_argument('image', nargs='?', help="Image (Dockerfile path); omit for the fleet-wide daily average")
+    trend_cmd.add_argument('--metric', default='size_mb', choices=METRICS)
+    trend_cmd.add_argument('--variant', default='optimized', choices=VARIANTS)
+    trend_cmd.add_argument('--since', default='30d', help="Window start: 30d, 12h, 2w or an ISO date")
+    trend_cmd.add_argument('--bucket', default='1d', help="Bucket width for a single image: 1d, 12h, 1w")
+
+    regressions_cmd = commands.add_parser('regressions', help="Images whose metric grew the most")
+    regressions_cmd.add_argument('--metric', default='size_mb', choices=METRICS)
+    regressions_cmd.add_argument('--variant', default='optimized', choices=VARIANTS)
+    regressions_cmd.add_argument('--since', default='30d')
+    regressions_cmd.add_argument('--limit', type=int, default=20)
+    regressions_cmd.add_argument('--percent', action='store_true', help="Rank by relative instead of absolute growth")
+
+    stages_cmd = commands.add_parser('stages', help="Daily duration of a pipeline stage")
+    stages_cmd.add_argument('stage', help="Stage name, e.g. ai, build, build_original")
+    stages_cmd.add_argument('--since', default='30d')
+
+    runs_cmd = commands.add_parser('runs', help="Latest runs")
+    runs_cmd.add_argument('--image')
+    runs_cmd.add_argument('--limit', type=int, default=20)
+    runs_cmd.add_argument('--suggestions', action='store_true', help="Include the full AI suggestions")
+    args = arg_parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"❌ No history at {args.db}")
+        return 1
+    store = HistoryStore(args.db)
+    start = time.perf_counter()
+    if args.command == 'trend':
+        rows = store.trend(args.metric, image=args.image, variant=args.variant, since=parse_since(args.since),
+                           bucket_seconds=parse_duration(args.bucket))
+        columns = ['bucket_start', 'samples', 'average'] + (['minimum', 'maximum'] if args.image else [])
+    elif args.command == 'regressions':
+        rows = store.regressions(args.metric, variant=args.variant, since=parse_since(args.since),
+                                 limit=args.limit, by_percent=args.percent)
+        columns = ['image', 'first_value', 'latest_value', 'growth', 'growth_percent']
+    elif args.command == 'stages':
+        rows = store.stage_trend(args.stage, since=parse_since(args.since))
+        columns = ['bucket_start', 'samples', 'average', 'maximum']
+    else:
+        rows = store.runs(image=args.image, limit=args.limit, with_suggestions=args.suggestions)
+        columns = ['id', 'recorded_at', 'source', 'image', 'status', 'ai_source']
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    if args.command == 'runs' and args.suggestions:
+        for row in rows:
+            print(f"#{row['id']} {row['recorded_at']} {row['image']} [{row['status']}]")
+            print(row['ai_suggestions'] or row['error'] or '(no suggestions)')
+            print()
+    else:
+        _print_rows(rows, columns)
+    print(f"({len(rows)} rows in {elapsed * 1000:.1f}ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Incremental re-optimization.
+
+Every Dockerfile stage gets two fingerprints. `content` covers the stage's
+instructions, which is all the LLM sees. `fingerprint` adds the content
+hashes of the context files its COPY/ADD instructions read and the
+fingerprints of the stages it builds on (FROM <stage>, COPY --from=<stage>),
+which is everything its build depends on. A small JSON state file per
+Dockerfile keeps the previous run's fingerprints, per-stage suggestions,
+rewrite and image IDs. It lives under the cache directory rather than in the
+build context, where it would itself invalidate `COPY . .`. The next run only
+recomputes what an edit actually touched:
+
+- suggestions: stages with an unchanged `content` reuse their previous
+  structured suggestions and only changed stages are prompted;
+- rewrite: reused when the Dockerfile text, the suggestions and the rewriter
+  settings are all unchanged (rewrites such as multi-stage synthesis and
+  cache-aware reordering look across stages, so they are not split per stage);
+- builds: skipped when every stage fingerprint of that Dockerfile matches
+  and the previous image still exists; otherwise Docker's layer cache serves
+  the unchanged stages;
+- scans: Trivy reports are already cached by layer digests, so an unchanged
+  image is never rescanned.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+
+from optimization.build_context import ContextMinimizer
+
+STATE_VERSION = 1
+DEFAULT_STATE_DIR = os.path.join(os.getenv('OPTIMIZER_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache',
+                                                                               'ai-docker-optimizer')), 'incremental')
+WHITESPACE_RE = re.compile(r'\s+')
+# Files the optimizer writes next to the Dockerfile; hashing them would make every run look like an edit
+OUTPUT_SUFFIXES = ('.optimized', '.dockerignore.suggested')
+# Stands in for the content of a file that vanished or became unreadable after the context was listed
+UNREADABLE = 'unreadable'
+
+
+def _digest(parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _hash_file(path, memo):
+    """
+    Content hash, re-read only when size or mtime changed since the memoized
+    one. A file deleted or unreadable since the context was listed hashes to
+    UNREADABLE, so its stage counts as changed instead of failing the run.
+    """
+    try:
+        stat = os.stat(path)
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+        cached = memo.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    except OSError:
+        memo.pop(path, None)
+        return UNREADABLE
+    memo[path] = [stamp, digest.hexdigest()]
+    return memo[path][1]
+
+
+def stage_fingerprints(dockerfile_path, commands, context_dir=None, file_hashes=None):
+    """[{stage, name, content, fingerprint, files}] in stage order"""
+    file_hashes = {} if file_hashes is None else file_hashes
+    dockerfile_path = os.path.abspath(dockerfile_path)
+    context_dir = os.path.abspath(context_dir or os.path.dirname(dockerfile_path))
+    dockerfile = os.path.relpath(dockerfile_path, context_dir)
+
+    stages = {}
+    for cmd in commands:
+        stages.setdefault(cmd['stage'], []).append(cmd)
+    by_reference = {}
+    fingerprints = []
+    for stage, stage_commands in stages.items():
+        content = _digest(WHITESPACE_RE.sub(' ', cmd['original']).strip() for cmd in stage_commands)
+        minimizer = ContextMinimizer(dockerfile_path, context_dir, commands=stage_commands)
+        files = minimizer.resolve_files()
+        if files is None:
+            files = minimizer.context_files()  # Sources built from ARG/ENV: any file could be read
+        files = [path for path in files if path != dockerfile and not path.endswith(OUTPUT_SUFFIXES)]
+
+        upstream = []
+        for cmd in stage_commands:
+            if cmd['instruction'] == 'FROM':
+                reference = cmd['value'].split()[0] if cmd['value'].split() else ''
+            elif cmd['instruction'] in ('COPY', 'ADD'):
+                reference = cmd['flags'].get('from', '')
+            else:
+                continue
+            if reference.lower() in by_reference:
+                upstream.append(by_reference[reference.lower()])
+
+        fingerprint = _digest([content] + upstream +
+                              [f"{path}={_hash_file(os.path.join(context_dir, path), file_hashes)}" for path in files])
+        name = stage_commands[0]['stage_name']
+        by_reference[str(stage)] = fingerprint
+        if name:
+            by_reference[name.lower()] = fingerprint
+        fingerprints.append({'stage': stage, 'name': name or str(stage), 'content': content,
+                             'fingerprint': fingerprint, 'files': len(files)})
+    return fingerprints
+
+
+class IncrementalRun:
+    """
+    Reuse decisions for one pipeline run over one Dockerfile. Builds may run
+    concurrently, so recording goes through a lock; `save()` writes the
+    state for the next run.
+    """
+
+    def __init__(self, dockerfile_path, commands, context_dir=None, state_dir=None):
+        self.dockerfile_path = os.path.abspath(dockerfile_path)
+        self.context_dir = context_dir
+        key = hashlib.sha256(self.dockerfile_path.encode('utf-8')).hexdigest()[:16]
+        self.state_path = os.path.join(state_dir or DEFAULT_STATE_DIR, f"{key}.json")
+        self.previous = self._load()
+        self.file_hashes = self.previous.get('file_hashes', {})
+        self.stages = stage_fingerprints(dockerfile_path, commands, context_dir, self.file_hashes)
+        previous_fingerprints = {stage['fingerprint'] for stage in self.previous.get('stages', [])}
+        for stage in self.stages:
+            stage['changed'] = stage['fingerprint'] not in previous_fingerprints
+        self.state = {'version': STATE_VERSION, 'dockerfile': self.dockerfile_path, 'stages': self.stages,
+                      'ai': None, 'rewrite': None, 'builds': dict(self.previous.get('builds', {}))}
+        self.outcome = {'ai': {}, 'rewrite': None, 'builds': {}, 'scans': {}}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if state.get('version') == STATE_VERSION else {}
+
+    def save(self):
+        self.state['file_hashes'] = self.file_hashes
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.state_path)
+
+    # Suggestions
+
+    def ai_reuse(self, signature):
+        """Stage index -> previous structured suggestions, for stages whose instructions didn't change"""
+        previous = self.previous.get('ai')
+        if not previous or previous['signature'] != _digest([json.dumps(signature, sort_keys=True)]):
+            return {}
+        return {stage['stage']: previous['sections'][stage['content']] for stage in self.stages
+                if stage['content'] in previous['sections']}
+
+    def record_ai(self, signature, result):
+        status = result.get('stage_status') or {}
+        sections = result.get('stage_sections') or {}
+        self.outcome['ai'] = {stage['name']: status.get(stage['stage'], 'analyzed') for stage in self.stages}
+        self.state['ai'] = {'signature': _digest([json.dumps(signature, sort_keys=True)]),
+                            'sections': {stage['content']: sections[stage['stage']] for stage in self.stages
+                                         if stage['stage'] in sections}}
+
+    # Rewrite
+
+    def rewrite(self, rewriter, suggestions, output_path=None):
+        """Optimized Dockerfile path: the previous output when nothing it depends on changed"""
+        with open(self.dockerfile_path, 'r') as f:
+            text = f.read()
+        key = _digest([text, suggestions, str(rewriter.multistage), str(rewriter.reorder),
+                       str(rewriter.prefetch_dependencies), str(rewriter.cross_distribution),
+                       str(getattr(rewriter.catalog, 'version', ''))])
+        previous = self.previous.get('rewrite')
+        if previous and previous['key'] == key and os.path.exists(previous['path']):
+            with open(previous['path'], 'r') as f:
+                if _digest([f.read()]) == previous['output']:
+                    self.state['rewrite'] = previous
+                    self.outcome['rewrite'] = 'reused'
+                    return previous['path']
+
+        lines = rewriter.apply_optimizations(rewriter.read_dockerfile(), suggestions)
+        path = rewriter.write_optimized_dockerfile(lines, **({'output_path': output_path} if output_path else {}))
+        self.state['rewrite'] = {'key': key, 'path': os.path.abspath(path), 'output': _digest([''.join(lines)])}
+        self.outcome['rewrite'] = 'recomputed'
+        return path
+
+    # Builds and scans
+
+    def build_key(self, dockerfile_path, options):
+        if os.path.abspath(dockerfile_path) == self.dockerfile_path:
+            stages = self.stages
+        else:
+            from analysis.dockerfile_parser import DockerfileParser
+            context_dir = self.context_dir or os.path.dirname(self.dockerfile_path)
+            stages = stage_fingerprints(dockerfile_path, DockerfileParser(dockerfile_path).parse(), context_dir,
+                                        self.file_hashes)
+        return _digest([stage['fingerprint'] for stage in stages] + [json.dumps(options, sort_keys=True)])
+
+    def build(self, build, builder, dockerfile_path, tag_name, **options):
+        """Build stats for `tag_name`, reusing the previous image when its build inputs are unchanged"""
+        with self._lock:
+            key = self.build_key(dockerfile_path, options)
+            previous = self.previous.get('builds', {}).get(tag_name)
+        if previous and previous['key'] == key:
+            image = builder.reuse_image(previous['image_id'], tag_name)
+            if image is not None:
+                with self._lock:
+                    self.outcome['builds'][tag_name] = 'reused'
+                return {'image': image, 'build_time': previous['build_time'], 'size_bytes': previous['size_bytes'],
+                        'size_mb': previous['size_mb'], 'success': True, 'reused': True}
+
+        stats = build(dockerfile_path, tag_name, **options)
+        with self._lock:
+            self.outcome['builds'][tag_name] = 'rebuilt'
+            if stats['success']:
+                self.state['builds'][tag_name] = {
+                    'key': key, 'image_id': getattr(stats['image'], 'id', stats['image']),
+                    'build_time': stats['build_time'], 'size_bytes': stats['size_bytes'], 'size_mb': stats['size_mb']
+                }
+        return stats
+
+    def record_scan(self, tag_name, scan):
+        with self._lock:
+            self.outcome['scans'][tag_name] = 'reused' if scan.get('cached') else 'scanned'
+
+    def report(self):
+        changed = [stage['name'] for stage in self.stages if stage['changed']]
+        ai = self.outcome['ai']
+        return {
+            'state_path': self.state_path,
+            'first_run': not self.previous,
+            'stages': [{'stage': stage['name'], 'changed': stage['changed'], 'ai': ai.get(stage['name'])}
+                       for stage in self.stages],
+            'stages_changed': changed,
+            'ai_reused': [name for name, status in ai.items() if status == 'reused'],
+            'ai_recomputed': [name for name, status in ai.items() if status != 'reused'],
+            'rewrite': self.outcome['rewrite'],
+            'builds': dict(self.outcome['builds']),
+            'scans': dict(self.outcome['scans'])
+        }
+
+
+def print_incremental_report(report):
+    def _names(names):
+        return ', '.join(names[:8]) + (f" (+{len(names) - 8} more)" if len(names) > 8 else '') if names else 'none'
+
+    print(f"♻️  Incremental: {len(report['stages_changed'])} of {len(report['stages'])} stage(s) changed"
+          f"{' (first run, nothing to reuse)' if report['first_run'] else ''}")
+    print(f"   Changed: {_names(report['stages_changed'])}")
+    print(f"   Suggestions reused for {len(report['ai_reused'])} stage(s), recomputed for "
+          f"{_names(report['ai_recomputed'])}")
+    print(f"   Rewrite {report['rewrite'] or 'not run'}; builds: "
+          f"{', '.join(f'{tag} {status}' for tag, status in report['builds'].items()) or 'none'}; scans: "
+          f"{', '.join(f'{tag} {status}' for tag, status in report['scans'].items()) or 'none'}")
@@ -0,0 +1,691 @@
+"""
+Long-running optimizer service.
+
+A pipeline run creates a Docker client, a Groq connection pool, the response
+and Trivy caches and the base-image catalog, uses them for one Dockerfile and
+throws them away. The service creates them once and keeps them warm across
+jobs submitted over a local HTTP port or Unix socket. Jobs go through a
+bounded priority queue; when it is full, submissions are rejected with 429 and
+a Retry-After estimate instead of piling up. With --history, every finished job
+is appended to the SQLite history store (see orchestration.history).
+
+    python -m orchestration.service serve --socket /tmp/optimizer.sock
+    python -m orchestration.service submit jobs.jsonl --socket /tmp/optimizer.sock --wait
+
+API:
+    POST /jobs                 {"dockerfile": path} or {"content": text}, plus optional
+                               "priority" (high/normal/low or an int, lower runs first),
+                               "hints", "ai", "build", "scan", "multistage", "reorder",
+                               "prefetch_dependencies" (let reordering add mvn dependency:go-offline),
+                               "cross_distribution" (allow e.g. ubuntu -> debian slim bases),
+                               "runtime" (start both images and compare startup, memory and pull
+                               time) and "probe" ({"command": "..."} or {"port": 8080})
+    GET  /jobs/<id>?wait=30    job record; `wait` long-polls until the job finishes
+    GET  /metrics              queue depth, job counters, latency percentiles, backend stats
+    GET  /healthz
+"""
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from analysis.dockerfile_parser import DockerfileParser
+from optimization.base_image_catalog import BaseImageCatalog
+from optimization.dockerfile_rewriter import DockerfileRewriter
+from orchestration.fleet import percentile
+from orchestration.history import HistoryStore, content_image_name, run_record
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = int(os.getenv('OPTIMIZER_SERVICE_PORT', '8765'))
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+JOB_FIELDS = {'dockerfile', 'content', 'priority', 'hints', 'ai', 'build', 'scan', 'runtime', 'probe',
+              'multistage', 'reorder', 'prefetch_dependencies', 'cross_distribution', 'request_id'}
+LATENCY_WINDOW = 1000
+MAX_BODY_BYTES = 1024 * 1024
+MAX_LONG_POLL_SECONDS = 60
+FINISHED = ('done', 'error')
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _latency_summary(values):
+    values = list(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 4),
+        'p90': round(percentile(values, 90), 4),
+        'p99': round(percentile(values, 99), 4),
+        'max': round(max(values), 4)
+    }
+
+
+class OptimizerService:
+    """Warm backends plus a bounded priority queue drained by a fixed pool of worker threads."""
+
+    def __init__(self, workers=2, max_queue=64, build_concurrency=1, suggestor=None, builder=None,
+                 scanner=None, catalog=None, use_cache=True, max_finished_jobs=1000, runtime_backend=None,
+                 runtime_runs=3, history_path=None):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.suggestor = suggestor
+        self.builder = builder
+        self.scanner = scanner
+        self.runtime_backend = runtime_backend
+        self.runtime_runs = runtime_runs
+        self.catalog = catalog
+        self.history = HistoryStore(history_path) if history_path else None
+        self.use_cache = use_cache
+        self.max_finished_jobs = max_finished_jobs
+        self.backend_errors = {}
+        self.counters = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+        self.running = 0
+        self.started_at = None
+        self._queue = queue.PriorityQueue(maxsize=self.max_queue)
+        self._sequence = itertools.count()  # FIFO among jobs of equal priority
+        self._jobs = OrderedDict()
+        self._finished_events = {}
+        self._lock = threading.Lock()
+        self._build_slots = threading.BoundedSemaphore(max(1, build_concurrency))
+        self._threads = []
+        self._wait_latency = deque(maxlen=LATENCY_WINDOW)
+        self._run_latency = deque(maxlen=LATENCY_WINDOW)
+        self._stage_latency = {}
+
+    def warm(self):
+        """Create every backend once. A missing Docker daemon only disables build jobs."""
+        if self.catalog is None:
+            self.catalog = BaseImageCatalog.default()
+        if self.suggestor is None:
+            from analysis.ai_suggestor import GroqAISuggestor
+            self.suggestor = GroqAISuggestor(use_cache=self.use_cache)
+        if self.builder is None:
+            try:
+                from optimization.image_builder import ImageBuilder
+                self.builder = ImageBuilder()
+            except Exception as e:
+                self.backend_errors['builder'] = str(e)
+        if self.scanner is None and self.builder is not None:
+            from security.trivy_scanner import TrivyScanner
+            self.scanner = TrivyScanner(client=self.builder.client, use_cache=self.use_cache)
+        if self.runtime_backend is None and getattr(self.builder, 'client', None) is not None:
+            from optimization.runtime_benchmark import DockerRuntimeBackend
+            self.runtime_backend = DockerRuntimeBackend(self.builder.client)
+
+    def start(self):
+        self.warm()
+        self.started_at = time.time()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"optimizer-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Finish queued jobs, then stop the workers."""
+        for _ in self._threads:
+            self._queue.put((math.inf, next(self._sequence), None))
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self.history is not None:
+            self.history.close()
+
+    def _validate(self, job):
+        if not isinstance(job, dict):
+            raise ValueError("Job must be a JSON object")
+        unknown = set(job) - JOB_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        if ('dockerfile' in job) == ('content' in job):
+            raise ValueError("Job needs exactly one of 'dockerfile' (a path) or 'content'")
+        if 'dockerfile' in job and not os.path.isfile(job['dockerfile']):
+            raise ValueError(f"Dockerfile not found: {job['dockerfile']}")
+        for field in ('scan', 'runtime'):
+            if job.get(field) and not job.get('build'):
+                raise ValueError(f"'{field}' requires 'build'")
+        probe = job.get('probe')
+        if probe is not None and not (isinstance(probe, dict) and len(probe) == 1 and
+                                      (isinstance(probe.get('command'), str) or isinstance(probe.get('port'), int))):
+            raise ValueError("Probe must be {\"command\": \"...\"} or {\"port\": <int>}")
+        priority = job.get('priority', 'normal')
+        if isinstance(priority, str):
+            if priority not in PRIORITIES:
+                raise ValueError(f"Priority must be one of {', '.join(PRIORITIES)} or an integer")
+            priority = PRIORITIES[priority]
+        elif not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError("Priority must be one of high, normal, low or an integer")
+        return priority
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up, from recent job run times."""
+        typical = percentile(list(self._run_latency), 50) or 1.0
+        return max(1, math.ceil(typical * (self._queue.qsize() + 1) / self.workers))
+
+    def submit(self, job):
+        """Queue a job and return its record; raises ValueError or QueueFullError."""
+        priority = self._validate(job)
+        job_id = uuid.uuid4().hex[:12]
+        record = {'id': job_id, 'status': 'queued', 'priority': priority, 'submitted_at': time.time()}
+        if 'request_id' in job:
+            record['request_id'] = job['request_id']
+        with self._lock:
+            self._jobs[job_id] = dict(record, job=job)
+            self._finished_events[job_id] = threading.Event()
+        try:
+            self._queue.put_nowait((priority, next(self._sequence), job_id))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                del self._finished_events[job_id]
+                self.counters['rejected'] += 1
+            raise QueueFullError(self.retry_after())
+        with self._lock:
+            self.counters['submitted'] += 1
+        return dict(record, queue_depth=self._queue.qsize())
+
+    def get_job(self, job_id, wait=0):
+        """Job record without the submitted payload; `wait` blocks until it finishes or times out."""
+        with self._lock:
+            event = self._finished_events.get(job_id)
+        if event is None:
+            return None
+        if wait:
+            event.wait(min(wait, MAX_LONG_POLL_SECONDS))
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return {key: value for key, value in record.items() if key != 'job'} if record else None
+
+    def _worker(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            try:
+                if job_id is None:
+                    return
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        started = time.time()
+        with self._lock:
+            record = self._jobs[job_id]
+            record['status'] = 'running'
+            record['started_at'] = started
+            self.running += 1
+            self._wait_latency.append(started - record['submitted_at'])
+
+        timings = {}
+        try:
+            result, error = self._process(job_id, record['job'], timings), None
+        except Exception as e:
+            result, error = None, str(e)
+
+        finished = time.time()
+        with self._lock:
+            self.running -= 1
+            record.update(status='error' if error else 'done', finished_at=finished, timings=timings)
+            if error:
+                record['error'] = error
+                self.counters['failed'] += 1
+            else:
+                record['result'] = result
+                self.counters['completed'] += 1
+            self._run_latency.append(finished - started)
+            for stage, seconds in timings.items():
+                self._stage_latency.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+            self._finished_events[job_id].set()
+            self._evict_finished()
+        if self.history is not None:
+            job = record['job']
+            image = os.path.abspath(job['dockerfile']) if 'dockerfile' in job else content_image_name(job['content'])
+            result = result or {}
+            self.history.record(run_record(
+                'service', image, result, timings=timings, status='error' if error else 'ok', error=error,
+                ai_result={'source': result.get('ai_source'), 'suggestions': result.get('ai_suggestions')}))
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, record in self._jobs.items() if record['status'] in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+            del self._finished_events[job_id]
+
+    def _process(self, job_id, job, timings):
+        if 'dockerfile' in job:
+            return self._optimize(job_id, job, job['dockerfile'], timings)
+        # Inline content gets a private, empty build context
+        work_dir = tempfile.mkdtemp(prefix='optimizer-job-')
+        try:
+            path = os.path.join(work_dir, 'Dockerfile')
+            with open(path, 'w') as f:
+                f.write(job['content'])
+            return self._optimize(job_id, job, path, timings)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _optimize(self, job_id, job, path, timings):
+        start = time.time()
+        parser = DockerfileParser(path)
+        commands = parser.parse()
+        timings['parse'] = round(time.time() - start, 4)
+        if not commands:
+            raise RuntimeError('No commands found in Dockerfile')
+        result = {'commands': len(commands)}
+
+        hints = job.get('hints', '')
+        if job.get('ai', True):
+            start = time.time()
+            ai_result = self.suggestor.get_suggestions(path, commands=commands)
+            timings['ai'] = round(time.time() - start, 4)
+            if 'error' in ai_result:
+                raise RuntimeError(f"AI Error: {ai_result['error']}")
+            hints = f"{hints}\n{ai_result['suggestions']}" if hints else ai_result['suggestions']
+            result['ai_cached'] = ai_result.get('cached', False)
+            result['ai_source'] = ai_result.get('source')
+            result['ai_suggestions'] = ai_result['suggestions']
+
+        start = time.time()
+        rewriter = DockerfileRewriter(path, parser=parser, catalog=self.catalog,
+                                      multistage=job.get('multistage', True), reorder=job.get('reorder', True),
+                                      prefetch_dependencies=job.get('prefetch_dependencies', False),
+                                      cross_distribution=job.get('cross_distribution', False))
+        optimized_lines = rewriter.apply_optimizations(rewriter.read_dockerfile(), hints)
+        optimized_path = rewriter.write_optimized_dockerfile(optimized_lines, output_path=f"{path}.optimized")
+        timings['rewrite'] = round(time.time() - start, 4)
+        result['optimized_dockerfile'] = ''.join(optimized_lines)
+        result['base_image_changes'] = rewriter.base_image_changes
+        result['multistage'] = rewriter.multistage_result
+        result['reorder'] = rewriter.reorder_result
+        if 'dockerfile' in job:
+            result['optimized_path'] = optimized_path
+
+        if job.get('build'):
+            if self.builder is None:
+                raise RuntimeError(f"Docker is unavailable: {self.backend_errors.get('builder', 'no builder')}")
+            tags = (f"optimizer-job-{job_id}-original", f"optimizer-job-{job_id}-optimized")
+            start = time.time()
+            with self._build_slots:
+                original_stats = self.builder.build_image(path, tags[0])
+                optimized_stats = self.builder.build_image(optimized_path, tags[1])
+            timings['build'] = round(time.time() - start, 4)
+            for label, stats in (('original', original_stats), ('optimized', optimized_stats)):
+                if not stats['success']:
+                    raise RuntimeError(f"{label} build failed: {stats['error']}")
+            result['original_size_mb'] = original_stats['size_mb']
+            result['optimized_size_mb'] = optimized_stats['size_mb']
+            result['improvements'] = self.builder.compare_images(original_stats, optimized_stats)
+
+            if job.get('scan'):
+                start = time.time()
+                scans = self.scanner.scan_images(list(tags))
+                timings['scan'] = round(time.time() - start, 4)
+                result['security_improvements'] = self.scanner.compare_vulnerabilities(scans[tags[0]],
+                                                                                       scans[tags[1]])
+
+            if job.get('runtime'):
+                if self.runtime_backend is None:
+                    raise RuntimeError("No container runtime backend available")
+                from optimization.runtime_benchmark import RuntimeBenchmark
+                bench = RuntimeBenchmark(self.runtime_backend, runs=self.runtime_runs, probe=job.get('probe'))
+                start = time.time()
+                # Under the build slots too, so concurrent builds don't skew startup and pull timings
+                with self._build_slots:
+                    original_runtime = bench.benchmark_image(tags[0])
+                    optimized_runtime = bench.benchmark_image(tags[1])
+                timings['runtime'] = round(time.time() - start, 4)
+                result['runtime_improvements'] = bench.compare(original_runtime, optimized_runtime)
+        return result
+
+    def metrics(self):
+        with self._lock:
+            counters = dict(self.counters)
+            running = self.running
+            latency = {
+                'queue_wait': _latency_summary(self._wait_latency),
+                'run': _latency_summary(self._run_latency),
+                'stages': {stage: _latency_summary(values) for stage, values in self._stage_latency.items()}
+            }
+        metrics = {
+            'uptime_seconds': round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self.max_queue,
+            'running': running,
+            'jobs': counters,
+            'latency_seconds': latency,
+            'backends': {
+                'suggestor': type(self.suggestor).__name__,
+                'builder': type(self.builder).__name__ if self.builder is not None else None,
+                'scanner': type(self.scanner).__name__ if self.scanner is not None else None,
+                'errors': dict(self.backend_errors)
+            }
+        }
+        client = getattr(self.suggestor, 'client', None)
+        if client is not None and hasattr(client, 'stats'):
+            metrics['ai_client'] = dict(client.stats)
+        if getattr(self.suggestor, 'cache', None) is not None:
+            metrics['ai_cache'] = self.suggestor.cache.stats()
+        if hasattr(self.suggestor, 'tier_report'):
+            metrics['ai_tiers'] = self.suggestor.tier_report()
+        if self.scanner is not None:
+            metrics['trivy'] = dict(self.scanner.stats)
+        if self.history is not None:
+            metrics['history'] = {'path': self.history.path, 'runs_recorded': self.history.written,
+                                  'batches': self.history.batches, 'failed': self.history.errors}
+        return metrics
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'DockerOptimizer/1.0'
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so clients reuse one connection for many jobs
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path == '/healthz':
+            return self._send_json(200, {'status': 'ok', 'backend_errors': service.backend_errors})
+        if url.path == '/metrics':
+            return self._send_json(200, service.metrics())
+        if url.path.startswith('/jobs/'):
+            try:
+                wait = float(parse_qs(url.query).get('wait', ['0'])[0])
+            except ValueError:
+                return self._send_json(400, {'error': "'wait' must be a number of seconds"})
+            record = service.get_job(url.path[len('/jobs/'):], wait=wait)
+            if record is None:
+                return self._send_json(404, {'error': 'Unknown job'})
+            return self._send_json(200, record)
+        return self._send_json(404, {'error': f"No route for GET {url.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path != '/jobs':
+            return self._send_json(404, {'error': f"No route for POST {url.path}"})
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self._send_json(413, {'error': 'Request body too large'})
+        try:
+            job = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': 'Request body is not valid JSON'})
+        try:
+            record = service.submit(job)
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+        except QueueFullError as e:
+            return self._send_json(429, {'error': str(e), 'retry_after_seconds': e.retry_after},
+                                   headers={'Retry-After': e.retry_after})
+        return self._send_json(202, record)
+
+    def log_message(self, format, *args):
+        # client_address is empty on Unix sockets, so don't rely on address_string()
+        if self.server.verbose:
+            sys.stderr.write(f"[{self.log_date_time_string()}] {format % args}\n")
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, ServiceRequestHandler)
+
+
+class UnixServiceHTTPServer(ServiceHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)  # Stale socket from a previous run
+        socketserver.TCPServer.server_bind(self)
+        os.chmod(self.server_address, 0o600)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ServiceClient:
+    """Minimal client that keeps one connection open and honours 429 Retry-After."""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, timeout=MAX_LONG_POLL_SECONDS + 30):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._connection = None
+
+    def _connect(self):
+        if self.socket_path:
+            return _UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.request(method, path, body=payload, headers=headers)
+                response = self._connection.getresponse()
+                return response.status, dict(response.getheaders()), json.loads(response.read() or b'{}')
+            except (ConnectionError, http.client.HTTPException):
+                # The server may have closed an idle keep-alive connection: reconnect once
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+
+    def submit(self, job, max_wait=300):
+        """Submit a job, backing off on 429 for up to `max_wait` seconds."""
+        deadline = time.time() + max_wait
+        while True:
+            status, headers, body = self.request('POST', '/jobs', job)
+            if status != 429 or time.time() >= deadline:
+                return body
+            time.sleep(min(float(headers.get('Retry-After', 1)), max(0.0, deadline - time.time())))
+
+    def wait(self, job_id, timeout=600):
+        deadline = time.time() + timeout
+        while True:
+            _, _, record = self.request('GET', f"/jobs/{job_id}?wait={MAX_LONG_POLL_SECONDS}")
+            # Records without a status are errors such as an evicted or unknown job
+            if record.get('status') in FINISHED or 'status' not in record or time.time() >= deadline:
+                return record
+
+    def metrics(self):
+        return self.request('GET', '/metrics')[2]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def read_jobs(path):
+    """Jobs from a JSONL file ('-' for stdin); relative Dockerfile paths are resolved against the file."""
+    base_dir = os.getcwd() if path == '-' else os.path.dirname(os.path.abspath(path))
+    f = sys.stdin if path == '-' else open(path, 'r')
+    try:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError:
+                print(f"⚠️  Skipping line {line_number}: not valid JSON", file=sys.stderr)
+                continue
+            if isinstance(job, dict) and 'dockerfile' in job:
+                job['dockerfile'] = os.path.join(base_dir, job['dockerfile'])
+            yield job
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def build_service(args):
+    if args.fake_backends:
+        from orchestration.fake_backends import (FakeImageBuilder, FakeRuntimeBackend, FakeSuggestor,
+                                                 FakeTrivyScanner)
+        builder = FakeImageBuilder(latency=args.fake_latency)
+        return OptimizerService(workers=args.workers, max_queue=args.max_queue,
+                                build_concurrency=args.build_concurrency,
+                                suggestor=FakeSuggestor(latency=args.fake_latency), builder=builder,
+                                scanner=FakeTrivyScanner(builder, latency=args.fake_latency),
+                                runtime_backend=FakeRuntimeBackend(builder), runtime_runs=args.runtime_runs,
+                                history_path=args.history)
+    return OptimizerService(workers=args.workers, max_queue=args.max_queue,
+                            build_concurrency=args.build_concurrency, use_cache=not args.no_cache,
+                            runtime_runs=args.runtime_runs, history_path=args.history)
+
+
+def serve(args):
+    service = build_service(args).start()
+    if args.socket:
+        server = UnixServiceHTTPServer(args.socket, service, verbose=args.verbose)
+        where = args.socket
+    else:
+        server = ServiceHTTPServer((args.host, args.port), service, verbose=args.verbose)
+        where = f"http://{args.host}:{server.server_port}"
+    print(f"🚀 Optimizer service listening on {where} "
+          f"({service.workers} workers, queue capacity {service.max_queue})")
+    for backend, error in service.backend_errors.items():
+        print(f"⚠️  {backend} unavailable: {error}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+
+def submit(args):
+    client = ServiceClient(args.host, args.port, socket_path=args.socket)
+    accepted = []
+    failed = 0
+    priority = int(args.priority) if args.priority and args.priority.lstrip('-').isdigit() else args.priority
+    for job in read_jobs(args.jobs):
+        if priority is not None and isinstance(job, dict):
+            job.setdefault('priority', priority)
+        record = client.submit(job)
+        if 'error' in record:
+            failed += 1
+            print(f"❌ {json.dumps(job)[:80]}: {record['error']}")
+            continue
+        accepted.append(record['id'])
+        print(f"📥 {record['id']} queued (priority {record['priority']}, depth {record['queue_depth']})")
+
+    if args.wait:
+        output = open(args.output, 'w') if args.output else None
+        try:
+            for job_id in accepted:
+                record = client.wait(job_id)
+                if record.get('status') != 'done':
+                    failed += 1
+                    print(f"❌ {job_id}: {record.get('error', record.get('status'))}")
+                else:
+                    print(f"✅ {job_id} finished in {record['finished_at'] - record['submitted_at']:.2f}s")
+                if output:
+                    output.write(json.dumps(record) + '\n')
+        finally:
+            if output:
+                output.close()
+    client.close()
+    return 1 if failed else 0
+
+
+def show_metrics(args):
+    client = ServiceClient(args.host, args.port, socket_path=args.socket)
+    print(json.dumps(client.metrics(), indent=2))
+    client.close()
+    return 0
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Long-running optimizer service")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    def _address(command):
+        command.add_argument('--host', default=DEFAULT_HOST)
+        command.add_argument('--port', type=int, default=DEFAULT_PORT)
+        command.add_argument('--socket', help="Unix socket path instead of TCP")
+
+    serve_cmd = commands.add_parser('serve', help="Run the service")
+    _address(serve_cmd)
+    serve_cmd.add_argument('--workers', type=int, default=2)
+    serve_cmd.add_argument('--max-queue', type=int, default=64, help="Queued jobs before submissions get 429")
+    serve_cmd.add_argument('--build-concurrency', type=int, default=1)
+    serve_cmd.add_argument('--no-cache', action='store_true', help="Bypass the AI and Trivy caches")
+    serve_cmd.add_argument('--fake-backends', action='store_true',
+                           help="Use the in-process test fakes instead of Groq, Docker and Trivy")
+    serve_cmd.add_argument('--fake-latency', type=float, default=0.05, help="Seconds per fake backend call")
+    serve_cmd.add_argument('--runtime-runs', type=int, default=3,
+                           help="Container starts per image for runtime jobs")
+    serve_cmd.add_argument('--history', help="SQLite history to record every finished job in")
+    serve_cmd.add_argument('--verbose', action='store_true', help="Log every request")
+    serve_cmd.set_defaults(func=serve)
+
+    submit_cmd = commands.add_parser('submit', help="Submit jobs from a JSONL file, one job object per line")
+    _address(submit_cmd)
+    submit_cmd.add_argument('jobs', help="JSONL file of jobs, or - for stdin")
+    submit_cmd.add_argument('--priority', help="Default priority for jobs that don't set one")
+    submit_cmd.add_argument('--wait', action='store_true', help="Wait for every job and report its outcome")
+    submit_cmd.add_argument('--output', help="With --wait, write the finished job records as JSONL")
+    submit_cmd.set_defaults(func=submit)
+
+    metrics_cmd = commands.add_parser('metrics', help="Print the service metrics")
+    _address(metrics_cmd)
+    metrics_cmd.set_defaults(func=show_metrics)
+
+    args = arg_parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
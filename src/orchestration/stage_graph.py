@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class StageGraph:
+    """Runs pipeline stages as a dependency graph on a bounded worker pool."""
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max(1, int(max_workers))
+        self.stages = {}
+        self.order = []
+
+    def add_stage(self, name, func, depends_on=()):
+        """Register a stage. `func` receives a dict of its dependencies' results."""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' already registered")
+        for dep in depends_on:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = {'func': func, 'depends_on': tuple(depends_on)}
+        self.order.append(name)
+        return self
+
+    def run(self):
+        """Execute all stages, starting each one as soon as its dependencies succeed."""
+        results = {}
+        errors = {}
+        skipped = []
+        timings = {}
+        pending = list(self.order)
+        running = {}
+        pipeline_start = time.time()
+
+        def _run_stage(name, func, inputs):
+            start = time.time()
+            try:
+                return func(inputs), None, start, time.time()
+            except Exception as e:
+                return None, str(e), start, time.time()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name in list(pending):
+                    deps = self.stages[name]['depends_on']
+                    if any(dep in errors or dep in skipped for dep in deps):
+                        pending.remove(name)
+                        skipped.append(name)
+                        continue
+                    if all(dep in results for dep in deps):
+                        pending.remove(name)
+                        inputs = {dep: results[dep] for dep in deps}
+                        future = pool.submit(_run_stage, name, self.stages[name]['func'], inputs)
+                        running[future] = name
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    value, error, start, end = future.result()
+                    timings[name] = {
+                        'start_offset_seconds': round(start - pipeline_start, 3),
+                        'duration_seconds': round(end - start, 3)
+                    }
+                    if error is None:
+                        results[name] = value
+                    else:
+                        errors[name] = error
+
+        total_time = time.time() - pipeline_start
+        return {
+            'results': results,
+            'errors': errors,
+            'skipped': skipped,
+            'timings': timings,
+            'total_time_seconds': round(total_time, 3),
+            'serial_time_seconds': round(sum(t['duration_seconds'] for t in timings.values()), 3)
+        }
@@ -1,33 +1,166 @@
-import subprocess
+import hashlib
 import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis.response_cache import ResponseCache
+
+DEFAULT_CACHE_ROOT = os.path.join(os.path.expanduser('~'), '.cache', 'ai-docker-optimizer')
+SEVERITIES = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW', 'UNKNOWN')
+
 
 class TrivyScanner:
-    @staticmethod
-    def scan_image(image_name):
+    """
+    Runs `trivy image` and caches the JSON report keyed by the image's ordered
+    layer digests, so an image whose layers were already scanned is never
+    rescanned, even when it was retagged or only its config changed. Trivy's
+    own layer cache is pinned to a persistent directory so unchanged base
+    layers aren't re-analyzed when a new image does need a scan.
+    """
+
+    def __init__(self, trivy_path=None, cache=None, use_cache=True, timeout=300, max_parallel=2,
+                 client=None, digest_resolver=None, cache_max_age_seconds=24 * 3600):
+        self.trivy_path = trivy_path or os.getenv('TRIVY_PATH', 'trivy')
+        self.timeout = timeout
+        self.max_parallel = max(1, max_parallel)
+        self.client = client
+        self.digest_resolver = digest_resolver
+        self.trivy_cache_dir = os.path.join(os.getenv('OPTIMIZER_CACHE_DIR', DEFAULT_CACHE_ROOT), 'trivy-layers')
+        if use_cache and os.getenv('OPTIMIZER_NO_CACHE') != '1':
+            # Vulnerability databases update daily, so cached reports expire with them
+            self.cache = cache or ResponseCache(
+                cache_dir=os.path.join(os.getenv('OPTIMIZER_CACHE_DIR', DEFAULT_CACHE_ROOT), 'trivy-reports'),
+                max_entries=500, max_bytes=200 * 1024 * 1024, max_age_seconds=cache_max_age_seconds
+            )
+        else:
+            self.cache = None
+        # Bounds concurrent trivy processes however the scans are scheduled
+        self._slots = threading.BoundedSemaphore(self.max_parallel)
+        self.stats = {'scans': 0, 'cache_hits': 0}
+
+    def _scan_args(self, image_name):
+        return [self.trivy_path, 'image', '--format', 'json', '--cache-dir', self.trivy_cache_dir, image_name]
+
+    def image_layers(self, image_name):
+        """Ordered layer digests (RootFS diff IDs) of a local image, or None if unavailable."""
+        if self.digest_resolver is not None:
+            return self.digest_resolver(image_name)
+        try:
+            if self.client is None:
+                import docker
+                self.client = docker.from_env()
+            return self.client.images.get(image_name).attrs['RootFS']['Layers']
+        except Exception:
+            return None
+
+    def _cache_key(self, layers):
+        if not layers or self.cache is None:
+            return None
+        payload = json.dumps({'layers': layers, 'args': self._scan_args('')[1:-1]})
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _run_trivy(self, image_name):
+        with self._slots:
+            self.stats['scans'] += 1
+            result = subprocess.run(self._scan_args(image_name), capture_output=True, text=True,
+                                    timeout=self.timeout)
+        if result.returncode != 0:
+            return {'error': result.stderr}
+        return json.loads(result.stdout)
+
+    def scan_image(self, image_name, layers=None):
         """Run Trivy scan on Docker image and return vulnerabilities"""
         try:
-            result = subprocess.run([
-                'trivy', 'image', '--format', 'json', image_name
-            ], capture_output=True, text=True, timeout=300)
-            
-            if result.returncode == 0:
-                return json.loads(result.stdout)
-            else:
-                return {'error': result.stderr}
-                
+            layers = layers if layers is not None else self.image_layers(image_name)
+            key = self._cache_key(layers)
+            if key:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.stats['cache_hits'] += 1
+                    return dict(cached, cached=True)
+
+            scan = self._run_trivy(image_name)
+            if key and 'error' not in scan:
+                self.cache.set(key, scan)
+            return scan
+
         except subprocess.TimeoutExpired:
             return {'error': 'Trivy scan timed out'}
+        except FileNotFoundError:
+            return {'error': f"Trivy executable not found: {self.trivy_path} (install trivy or set TRIVY_PATH)"}
         except Exception as e:
             return {'error': str(e)}
-    
+
+    def scan_images(self, image_names):
+        """Scan several images in parallel; images with identical layers are scanned once."""
+        layers = {name: self.image_layers(name) for name in image_names}
+        groups = {}
+        for name in image_names:
+            group = tuple(layers[name]) if layers[name] else ('image', name)
+            groups.setdefault(group, []).append(name)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            futures = {executor.submit(self.scan_image, names[0], layers[names[0]]): names
+                       for names in groups.values()}
+            for future, names in futures.items():
+                scan = future.result()
+                for name in names:
+                    results[name] = scan
+        return results
+
+    @staticmethod
+    def vulnerability_set(scan):
+        """Every vulnerability across all Results (OS packages and language packages)."""
+        found = {}
+        for result in scan.get('Results') or []:
+            for vuln in result.get('Vulnerabilities') or []:
+                key = (vuln.get('VulnerabilityID'), vuln.get('PkgName'))
+                found[key] = {
+                    'id': vuln.get('VulnerabilityID'),
+                    'package': vuln.get('PkgName'),
+                    'severity': vuln.get('Severity', 'UNKNOWN'),
+                    'target': result.get('Target')
+                }
+        return found
+
+    @staticmethod
+    def _severity_counts(vulns):
+        counts = {severity: 0 for severity in SEVERITIES}
+        for vuln in vulns:
+            counts[vuln['severity'] if vuln['severity'] in counts else 'UNKNOWN'] += 1
+        return counts
+
     @staticmethod
     def compare_vulnerabilities(original_scan, optimized_scan):
-        """Compare vulnerability counts between scans"""
-        orig_vulns = original_scan.get('Results', [{}])[0].get('Vulnerabilities', [])
-        opt_vulns = optimized_scan.get('Results', [{}])[0].get('Vulnerabilities', [])
-        
+        """Set-based diff of vulnerabilities by ID and package across every scan result"""
+        if 'error' in original_scan or 'error' in optimized_scan:
+            return {'error': original_scan.get('error') or optimized_scan.get('error')}
+
+        original = TrivyScanner.vulnerability_set(original_scan)
+        optimized = TrivyScanner.vulnerability_set(optimized_scan)
+        order = {severity: index for index, severity in enumerate(SEVERITIES)}
+
+        def _sorted(keys, source):
+            return sorted((source[key] for key in keys),
+                          key=lambda vuln: (order.get(vuln['severity'], len(order)), vuln['id'] or ''))
+
+        fixed = _sorted(original.keys() - optimized.keys(), original)
+        introduced = _sorted(optimized.keys() - original.keys(), optimized)
+        unchanged = _sorted(original.keys() & optimized.keys(), optimized)
+
         return {
-            'original_vulnerabilities': len(orig_vulns),
-            'optimized_vulnerabilities': len(opt_vulns),
-            'vulnerabilities_fixed': len(orig_vulns) - len(opt_vulns)
-        }
\ No newline at end of file
+            'original_vulnerabilities': len(original),
+            'optimized_vulnerabilities': len(optimized),
+            'vulnerabilities_fixed': len(fixed),
+            'vulnerabilities_introduced': len(introduced),
+            'vulnerabilities_unchanged': len(unchanged),
+            'fixed_by_severity': TrivyScanner._severity_counts(fixed),
+            'introduced_by_severity': TrivyScanner._severity_counts(introduced),
+            'fixed': fixed,
+            'introduced': introduced,
+            'unchanged': [{'id': vuln['id'], 'package': vuln['package'], 'severity': vuln['severity']}
+                          for vuln in unchanged]
+        }
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def chat_completion(content, prompt_tokens=12, completion_tokens=34):
+    return {
+        'choices': [{'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}
+    }
+
+
+def sse_events(deltas, keep_alive=True):
+    """Server-sent-events body pieces for a streamed chat completion"""
+    events = [': keep-alive\n\n'] if keep_alive else []
+    events += [f"data: {json.dumps({'choices': [{'delta': {'content': delta}}]})}\n\n" for delta in deltas]
+    return events + ['data: [DONE]\n\n']
+
+
+class FakeGroqServer:
+    """
+    Local stand-in for the Groq chat endpoint. Responses are scripted in the
+    order requests arrive; each is a dict with `status`, `body` (JSON-able),
+    `headers`, `delay` (seconds before answering) or `chunks` (a list of
+    strings sent with chunked transfer encoding, `chunk_delay` apart). Once
+    the script runs out, `default` answers every further request.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.default = {'status': 200, 'body': chat_completion('- Use a slim base image to reduce size')}
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                with server.lock:
+                    server.requests.append({'payload': payload, 'headers': dict(self.headers)})
+                    response = server.script.pop(0) if server.script else server.default
+                time.sleep(response.get('delay', 0))
+                try:
+                    self._respond(response)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up on a hedged or timed-out request
+
+            def _respond(self, response):
+                self.send_response(response.get('status', 200))
+                for name, value in response.get('headers', {}).items():
+                    self.send_header(name, value)
+                if 'chunks' in response:
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for chunk in response['chunks']:
+                        data = chunk.encode('utf-8')
+                        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+                        self.wfile.flush()
+                        time.sleep(response.get('chunk_delay', 0))
+                    self.wfile.write(b'0\r\n\r\n')
+                    return
+                body = json.dumps(response.get('body', {})).encode('utf-8')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/openai/v1/chat/completions"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+
+    def respond(self, *responses):
+        with self.lock:
+            self.script.extend(responses)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def groq_server():
+    with FakeGroqServer() as server:
+        yield server
+
+
+@pytest.fixture
+def groq_client(groq_server):
+    """A client against the fake server with backoff and rate limits small enough for tests"""
+    from analysis.groq_client import GroqClient
+    client = GroqClient('test-key', groq_server.url, timeout=5, requests_per_minute=60000, max_retries=3,
+                        backoff_base=0.01, backoff_max=0.05)
+    yield client
+    client.close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep every on-disk cache a test touches out of the user's home directory"""
+    monkeypatch.setenv('OPTIMIZER_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.delenv('OPTIMIZER_NO_CACHE', raising=False)
+    monkeypatch.delenv('GROQ_API_KEY', raising=False)
+    return os.path.join(str(tmp_path), 'cache')
+
+
+@pytest.fixture
+def write_dockerfile(tmp_path):
+    def _write(text, name='Dockerfile'):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        return str(path)
+    return _write
@@ -0,0 +1,64 @@
+import pytest
+
+from optimization.base_image_catalog import BaseImageCatalog
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return BaseImageCatalog.load()
+
+
+@pytest.mark.parametrize('image, package_managers, allow_musl, expected', [
+    ('python:3.11', (), False, 'python:3.11-slim'),
+    ('python:latest', ('apt',), False, 'python:3.12-slim'),
+    ('python:3.11', (), True, 'python:3.11-alpine'),
+    ('node:20', ('apt',), True, 'node:20-slim'),
+    ('debian:bookworm', ('apt',), False, 'debian:bookworm-slim'),
+    ('eclipse-temurin:17-jdk', (), True, 'eclipse-temurin:17-jdk-alpine'),
+])
+def test_slimmer_tag_of_the_same_distribution(catalog, image, package_managers, allow_musl, expected):
+    assert catalog.smallest_compatible(image, package_managers, allow_musl)['image'] == expected
+
+
+@pytest.mark.parametrize('image, package_managers', [
+    ('ubuntu:22.04', ('apt',)),
+    ('ubuntu:latest', ()),           # Not another distribution, and not an older ubuntu release
+    ('openjdk:17', ()),              # Oracle Linux with microdnf, not an ubuntu-based temurin image
+    ('python:3.11-slim', ()),
+    ('python:3.11', ('apk',)),
+    ('ghcr.io/acme/base:1', ()),
+])
+def test_no_cross_distribution_replacement(catalog, image, package_managers):
+    assert catalog.smallest_compatible(image, package_managers) is None
+
+
+def test_patch_pin_is_kept(catalog):
+    assert catalog.smallest_compatible('python:3.11.4')['image'] == 'python:3.11.4-slim'
+    assert catalog.smallest_compatible('python:3.11.4', allow_musl=True)['image'] == 'python:3.11.4-alpine'
+    assert catalog.smallest_compatible('docker.io/library/python:3.12.2')['tag'] == '3.12.2-slim'
+
+
+def test_smallest_for_runtime_stage(catalog):
+    assert catalog.smallest_for('java', '17', 'jre', 'glibc')['image'] == 'eclipse-temurin:17-jre'
+    assert catalog.smallest_for('java', '17', 'jre', 'musl')['image'] == 'eclipse-temurin:17-jre-alpine'
+    assert catalog.smallest_for('java', '11', 'jre') is None
+
+
+@pytest.mark.parametrize('suffix', ['.json', '.db'])
+def test_save_and_load_round_trip(catalog, tmp_path, suffix):
+    loaded = BaseImageCatalog.load(catalog.save(str(tmp_path / f'catalog{suffix}')))
+    assert loaded.entries == catalog.entries and loaded.version == catalog.version
+    assert loaded.smallest_compatible('python:3.11')['image'] == 'python:3.11-slim'
+
+
+@pytest.mark.parametrize('image, package_managers, expected', [
+    ('ubuntu:22.04', ('apt',), 'debian:bookworm-slim'),
+    ('ubuntu:latest', (), 'debian:bookworm-slim'),
+    ('python:3.11', (), 'python:3.11-slim'),
+    ('ubuntu:22.04', ('apk',), None),          # Still the same package manager
+    ('openjdk:17', (), None),                  # microdnf: no other distribution ships it
+    ('alpine:3.20', (), None),
+])
+def test_cross_distribution_is_opt_in(catalog, image, package_managers, expected):
+    best = catalog.smallest_compatible(image, package_managers, cross_distribution=True)
+    assert (best['image'] if best else None) == expected
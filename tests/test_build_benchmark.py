@@ -0,0 +1,118 @@
+import random
+
+from benchmarks.build_benchmark import (BuildBenchmark, bootstrap_ci, compare_samples, significant_regressions,
+                                        summarize)
+
+
+class FakeBuilds:
+    """build_func and clock in one: each build advances the clock by its variant's time plus seeded noise"""
+
+    def __init__(self, seconds, noise=0.0, seed=0, failing=()):
+        self.seconds = seconds
+        self.noise = noise
+        self.failing = set(failing)
+        self.rng = random.Random(seed)
+        self.now = 0.0
+        self.builds = []
+
+    def clock(self):
+        return self.now
+
+    def build(self, dockerfile_path, tag_name, nocache):
+        self.builds.append((dockerfile_path, tag_name, nocache))
+        self.now += self.seconds[dockerfile_path] + self.rng.uniform(-self.noise, self.noise)
+        if dockerfile_path in self.failing:
+            return {'success': False, 'error': 'exit code 1'}
+        return {'success': True, 'size_mb': 100.0}
+
+
+def benchmark(builds, **options):
+    return BuildBenchmark(build_func=builds.build, clock=builds.clock, resamples=500, **options)
+
+
+def test_summarize():
+    assert summarize([]) == {'runs': 0, 'median': None, 'p95': None, 'mean': None, 'min': None, 'max': None,
+                             'stdev': None}
+    summary = summarize([1.0, 2.0, 3.0, 10.0])
+    assert (summary['runs'], summary['median'], summary['max'], summary['p95']) == (4, 2.5, 10.0, 10.0)
+    assert summarize([4.0])['stdev'] == 0.0
+
+
+def test_bootstrap_is_deterministic_and_brackets_the_shift():
+    before = [10.0, 10.2, 9.9, 10.1, 10.0]
+    after = [12.0, 12.1, 11.9, 12.2, 12.0]
+    interval = bootstrap_ci(before, after, resamples=500, rng=random.Random(1))
+    assert interval == bootstrap_ci(before, after, resamples=500, rng=random.Random(1))
+    low, high = interval
+    assert 1.5 < low <= 2.0 <= high < 2.5
+
+
+def test_clear_regression_is_flagged():
+    comparison = compare_samples([10.0, 10.1, 9.9, 10.0, 10.2], [13.0, 13.1, 12.9, 13.0, 13.2],
+                                 resamples=500, rng=random.Random(0))
+    assert comparison['verdict'] == 'regression' and comparison['significant']
+    assert comparison['median_delta_seconds'] == 3.0 and comparison['median_delta_percent'] == 30.0
+    assert comparison['ci_low_seconds'] > 0
+
+
+def test_clear_improvement_is_flagged():
+    comparison = compare_samples([10.0, 10.1, 9.9, 10.0, 10.2], [6.0, 6.1, 5.9, 6.0, 6.2],
+                                 resamples=500, rng=random.Random(0))
+    assert comparison['verdict'] == 'improvement' and comparison['ci_high_seconds'] < 0
+
+
+def test_small_consistent_shift_stays_under_the_minimum_effect():
+    # The interval excludes zero, but 2% is below min_effect_percent
+    comparison = compare_samples([10.0, 10.01, 9.99, 10.0], [10.2, 10.21, 10.19, 10.2], min_effect_percent=5.0,
+                                 resamples=500, rng=random.Random(0))
+    assert comparison['ci_low_seconds'] > 0
+    assert not comparison['significant'] and comparison['verdict'] == 'no significant change'
+
+
+def test_noise_is_not_flagged():
+    rng = random.Random(3)
+    before = [10 + rng.uniform(-1, 1) for _ in range(9)]
+    after = [10 + rng.uniform(-1, 1) for _ in range(9)]
+    comparison = compare_samples(before, after, resamples=500, rng=random.Random(0))
+    assert comparison['ci_low_seconds'] <= 0 <= comparison['ci_high_seconds']
+    assert comparison['verdict'] == 'no significant change'
+
+
+def test_comparison_needs_samples_on_both_sides():
+    assert 'error' in compare_samples([], [1.0])
+
+
+def test_benchmark_flags_a_slower_variant_in_both_modes():
+    builds = FakeBuilds({'original': 10.0, 'optimized': 14.0}, noise=0.3)
+    report = benchmark(builds, runs=6, warmup=1).run([('original', 'original'), ('optimized', 'optimized')],
+                                                     label='svc')
+    for mode in ('cold', 'warm'):
+        variants = report['modes'][mode]['variants']
+        assert variants['original']['runs'] == variants['optimized']['runs'] == 6
+        assert report['modes'][mode]['comparisons']['optimized']['verdict'] == 'regression'
+    assert significant_regressions([report]) == [('svc', 'cold', 'optimized'), ('svc', 'warm', 'optimized')]
+    # Cold builds skip the cache; warm ones are primed by an unmeasured build of each variant first
+    cold = [build for build in builds.builds if build[2]]
+    assert len(cold) == 12 and len(builds.builds) == 12 + 2 + 12
+    assert {tag for _, tag, _ in builds.builds} == {'svc-original', 'svc-optimized'}
+
+
+def test_benchmark_reports_noise_as_no_change():
+    builds = FakeBuilds({'original': 10.0, 'optimized': 10.0}, noise=0.5, seed=7)
+    report = benchmark(builds, runs=8, modes=('cold',)).run([('original', 'original'), ('optimized', 'optimized')])
+    assert report['modes']['cold']['comparisons']['optimized']['verdict'] == 'no significant change'
+    assert significant_regressions([report]) == []
+
+
+def test_failed_builds_are_counted_not_timed():
+    builds = FakeBuilds({'original': 10.0, 'optimized': 5.0}, failing={'optimized'})
+    report = benchmark(builds, runs=3, modes=('cold',)).run([('original', 'original'), ('optimized', 'optimized')])
+    variant = report['modes']['cold']['variants']['optimized']
+    assert variant['runs'] == 0 and variant['failures'] == 3 and variant['last_error'] == 'exit code 1'
+    assert 'error' in report['modes']['cold']['comparisons']['optimized']
+
+
+def test_same_seed_same_report():
+    reports = [benchmark(FakeBuilds({'a': 3.0, 'b': 2.0}, noise=0.2), runs=4, seed=5).run([('a', 'a'), ('b', 'b')])
+               for _ in range(2)]
+    assert reports[0] == reports[1]
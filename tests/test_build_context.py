@@ -0,0 +1,106 @@
+import tarfile
+
+import pytest
+
+from optimization.build_context import ContextMinimizer, DockerignoreMatcher
+
+DOCKERFILE = """FROM python:3.11 AS builder
+COPY requirements.txt .
+COPY ["app/", "/app/"]
+COPY --from=builder /out /out
+ADD https://example.com/tool.tar.gz /tmp/
+COPY <<EOF /etc/app.conf
+debug = false
+EOF
+"""
+CONTEXT = {
+    'app/main.py': 'print("hi")\n',
+    'app/util.py': 'X = 1\n',
+    'requirements.txt': 'flask\n',
+    'docs/guide.md': '# Guide\n' * 100,
+    'node_modules/left-pad/index.js': 'module.exports = 1\n' * 100,
+    '.git/HEAD': 'ref: refs/heads/main\n',
+    'debug.log': 'noise\n' * 100
+}
+
+
+@pytest.fixture
+def context(write_dockerfile, tmp_path):
+    """A context dir with the files above; returns a function writing its Dockerfile"""
+    for name, text in CONTEXT.items():
+        write_dockerfile(text, f'ctx/{name}')
+
+    def with_dockerfile(text=DOCKERFILE, dockerignore=None):
+        if dockerignore is not None:
+            write_dockerfile(dockerignore, 'ctx/.dockerignore')
+        return ContextMinimizer(write_dockerfile(text, 'ctx/Dockerfile'))
+    return with_dockerfile
+
+
+def test_copy_sources_skip_stage_copies_remote_adds_and_heredocs(context):
+    assert context().copy_sources() == ['requirements.txt', 'app/']
+
+
+def test_resolve_files_keeps_only_what_copy_reads(context):
+    assert context().resolve_files() == ['Dockerfile', 'app/main.py', 'app/util.py', 'requirements.txt']
+
+
+def test_resolve_files_respects_dockerignore(context):
+    minimizer = context(dockerignore='app/*.py\n!app/main.py\n')
+    assert minimizer.resolve_files() == ['.dockerignore', 'Dockerfile', 'app/main.py', 'requirements.txt']
+
+
+def test_unresolvable_sources_fall_back_to_the_whole_context(context):
+    minimizer = context("FROM python:3.11\nARG SRC=app\nCOPY $SRC /app\n")
+    assert minimizer.resolve_files() is None
+    _, stats = minimizer.build_tar()
+    assert not stats['minimal'] and stats['files'] == len(CONTEXT) + 1
+
+
+def test_build_tar_sends_the_minimal_context(context):
+    archive_file, stats = context().build_tar()
+    with tarfile.open(fileobj=archive_file) as archive:
+        assert sorted(archive.getnames()) == ['Dockerfile', 'app/main.py', 'app/util.py', 'requirements.txt']
+    assert stats['minimal'] and stats['files'] == 4
+    assert stats['bytes_saved'] == stats['full_context_bytes'] - stats['context_bytes'] > 0
+
+
+def test_suggested_dockerignore_lists_unread_entries(context):
+    suggestions = context().suggest_dockerignore()
+    assert {'docs', 'node_modules', '.git', 'debug.log', '*.log'} <= set(suggestions)
+    assert not {'app', 'requirements.txt', 'Dockerfile'} & set(suggestions)
+    assert len(suggestions) == len(set(suggestions))
+
+
+def test_suggested_dockerignore_keeps_referenced_sources(context):
+    # `COPY . .` reads node_modules and the logs, so only tool metadata may be ignored
+    suggestions = context("FROM node:20\nCOPY . .\nCOPY node_modules/left-pad /vendor/\n").suggest_dockerignore()
+    assert '.git' in suggestions
+    assert 'node_modules' not in suggestions and '*.log' not in suggestions and 'docs' not in suggestions
+
+
+def test_suggested_dockerignore_skips_already_ignored(context):
+    suggestions = context(dockerignore='docs\n*.log\n').suggest_dockerignore()
+    assert 'docs' not in suggestions and '*.log' not in suggestions and 'debug.log' not in suggestions
+
+
+def test_write_dockerignore(context, tmp_path):
+    path = context().write_dockerignore()
+    assert path == str(tmp_path / 'ctx' / '.dockerignore.suggested')
+    lines = (tmp_path / 'ctx' / '.dockerignore.suggested').read_text().splitlines()
+    assert lines[0].startswith('#') and 'docs' in lines
+
+
+@pytest.mark.parametrize('patterns, path, excluded', [
+    (['*.pyc'], 'main.pyc', True),
+    (['*.pyc'], 'pkg/main.pyc', False),
+    (['**/*.pyc'], 'pkg/sub/main.pyc', True),
+    (['docs'], 'docs/guide.md', True),
+    (['/build/'], 'build/out.bin', True),
+    (['*.log', '!keep.log'], 'keep.log', False),
+    (['!keep.log', '*.log'], 'keep.log', True),
+    (['# comment', ''], 'anything', False),
+    (['file[0-9].txt'], 'file3.txt', True),
+])
+def test_dockerignore_matcher(patterns, path, excluded):
+    assert DockerignoreMatcher(patterns).is_excluded(path) is excluded
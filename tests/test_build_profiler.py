@@ -0,0 +1,135 @@
+import json
+import os
+import tarfile
+
+import pytest
+
+from optimization import image_builder
+from optimization.build_profiler import BuildProfiler, compare_profiles
+
+BUILD_LOGS = os.path.join(os.path.dirname(__file__), 'data', 'build_logs')
+
+
+def load_build_log(name):
+    """A recorded `client.api.build(decode=True)` stream as (timestamp, event) pairs"""
+    with open(os.path.join(BUILD_LOGS, name), 'r') as f:
+        return [(row['t'], row['event']) for row in map(json.loads, f)]
+
+
+def test_cached_rebuild_profile():
+    profile = BuildProfiler.from_recorded(load_build_log('cached_rebuild.jsonl'))
+    assert [step['instruction'] for step in profile['steps']] == [
+        'FROM python:3.11-slim', 'WORKDIR /app', 'COPY requirements.txt .',
+        'RUN pip install --no-cache-dir -r requirements.txt', 'COPY . .']
+    assert [step['cached'] for step in profile['steps']] == [False, True, True, True, False]
+    assert profile['cache_hits'] == 3 and profile['cache_misses'] == 2
+    assert profile['steps'][-1]['seconds'] == pytest.approx(1.27)
+    assert profile['steps'][-1]['layer_id'] == '1f2e3d4c5b6a'
+    assert profile['image_id'].startswith('sha256:1f2e3d4c5b6a')
+    assert profile['total_seconds'] == pytest.approx(1.32) and profile['error'] is None
+
+
+def test_failed_step_reports_the_error():
+    profile = BuildProfiler.from_recorded(load_build_log('failed_run.jsonl'))
+    assert profile['error'].startswith("The command '/bin/sh -c pip install no-such-package'")
+    failed = profile['steps'][-1]
+    assert failed['instruction'] == 'RUN pip install no-such-package'
+    assert failed['seconds'] == pytest.approx(3.14) and failed['layer_id'] is None
+    assert profile['image_id'] is None
+
+
+def test_multi_stage_profile():
+    profile = BuildProfiler.from_recorded(load_build_log('multi_stage.jsonl'))
+    steps = profile['steps']
+    assert [step['step'] for step in steps] == list(range(1, 8)) and {step['total'] for step in steps} == {7}
+    assert steps[4]['instruction'] == 'FROM alpine:3.19'
+    assert max(steps, key=lambda step: step['seconds'])['instruction'] == 'RUN go build -o /out/app ./cmd/app'
+    assert steps[3]['seconds'] == pytest.approx(8.5) and steps[3]['layer_id'] == '3d4e5f607182'
+    assert profile['cache_hits'] == 1
+    # Classic builder output without an aux event still yields the image id
+    assert profile['image_id'] == '60718293a4b5'
+
+
+def test_empty_recording():
+    profile = BuildProfiler.from_recorded([])
+    assert profile['steps'] == [] and profile['total_seconds'] == 0 and profile['context_upload_seconds'] is None
+
+
+def test_compare_profiles_explains_cache_changes():
+    original = BuildProfiler.from_recorded(load_build_log('failed_run.jsonl'))
+    optimized = BuildProfiler.from_recorded(load_build_log('cached_rebuild.jsonl'))
+    rows = {row['instruction']: row for row in compare_profiles(original, optimized)['steps']}
+    assert rows['RUN pip install no-such-package']['reason'] == 'removed or merged by the rewriter'
+    assert rows['WORKDIR /app']['reason'] == 'new or rewritten step'
+    assert rows['FROM python:3.11-slim']['reason'] == 'unchanged'
+
+
+class FakeAPI:
+    def __init__(self, events, fail_after=None):
+        self.events = events
+        self.fail_after = fail_after
+        self.calls = []
+
+    def build(self, **kwargs):
+        context = kwargs['fileobj']
+        with tarfile.open(fileobj=context, mode='r') as archive:
+            names = archive.getnames()
+        self.calls.append(dict(kwargs, names=names))
+        for index, event in enumerate(self.events):
+            if index == self.fail_after:
+                raise ConnectionError('daemon went away')
+            yield event
+
+
+class FakeImage:
+    attrs = {'Size': 50 * 1024 * 1024}
+
+
+class FakeClient:
+    def __init__(self, api):
+        self.api = api
+        self.images = type('Images', (), {'get': staticmethod(lambda name: FakeImage())})()
+
+
+@pytest.fixture
+def builder(monkeypatch):
+    def _builder(events, fail_after=None):
+        client = FakeClient(FakeAPI(events, fail_after))
+        monkeypatch.setattr(image_builder.docker, 'from_env', lambda: client)
+        return image_builder.ImageBuilder()
+    return _builder
+
+
+@pytest.fixture
+def project(tmp_path):
+    service = tmp_path / 'services' / 'api'
+    service.mkdir(parents=True)
+    (service / 'Dockerfile').write_text("FROM python:3.11-slim\nCOPY app.py /app/\n")
+    (service / 'app.py').write_text("print('hi')\n")
+    return service / 'Dockerfile'
+
+
+@pytest.mark.parametrize('minimal_context', [False, True])
+def test_profile_build_from_a_subdirectory(builder, project, minimal_context):
+    events = [event for _, event in load_build_log('cached_rebuild.jsonl')]
+    build = builder(events)
+    result = build.profile_build(str(project), 'app:latest', minimal_context=minimal_context)
+    assert result['success'], result.get('error')
+    assert result['profile']['cache_hits'] == 3 and result['size_mb'] == 50
+    [call] = build.client.api.calls
+    assert call['dockerfile'] == 'Dockerfile' and call['custom_context']
+    assert {'Dockerfile', 'app.py'} <= {name.lstrip('./') for name in call['names']}
+
+
+def test_profile_build_closes_the_context_when_the_build_raises(builder, project, monkeypatch):
+    contexts = []
+    real_make = image_builder.make_context_tar
+
+    def make(*args, **kwargs):
+        contexts.append(real_make(*args, **kwargs))
+        return contexts[-1]
+    monkeypatch.setattr(image_builder, 'make_context_tar', make)
+    events = [event for _, event in load_build_log('cached_rebuild.jsonl')]
+    result = builder(events, fail_after=3).profile_build(str(project), 'app:latest')
+    assert not result['success'] and 'daemon went away' in result['error']
+    assert contexts and contexts[0].closed
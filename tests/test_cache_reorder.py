@@ -0,0 +1,93 @@
+import os
+import shutil
+
+import pytest
+
+from benchmarks.build_benchmark import CORPUS_DIR, REWRITE_HINTS
+from optimization.cache_reorder import CacheAwareReorderer
+from optimization.dockerfile_rewriter import DockerfileRewriter
+
+PROJECTS = sorted(name for name in os.listdir(CORPUS_DIR)
+                  if os.path.isfile(os.path.join(CORPUS_DIR, name, 'Dockerfile')))
+
+
+@pytest.fixture
+def project(tmp_path, request):
+    """A copy of a corpus project, so rewrites never land next to the corpus Dockerfile"""
+    target = tmp_path / request.param
+    shutil.copytree(os.path.join(CORPUS_DIR, request.param), target,
+                    ignore=shutil.ignore_patterns('__pycache__', '*.optimized'))
+    return str(target)
+
+
+def rewrite(project_dir, **options):
+    rewriter = DockerfileRewriter(os.path.join(project_dir, 'Dockerfile'), **options)
+    lines = rewriter.apply_optimizations(rewriter.read_dockerfile(), REWRITE_HINTS)
+    return lines, rewriter.reorder_result
+
+
+def scenarios(estimate):
+    return {row['scenario']: row for row in estimate['scenarios']}
+
+
+@pytest.mark.parametrize('project', ['node-express', 'python-flask'], indirect=True)
+def test_source_edits_rebuild_fewer_steps(project):
+    _, report = rewrite(project)
+    rows = scenarios(report['cache_estimate'])
+    assert report['applied'] and report['added_steps'] == []
+    assert rows['source edit']['after']['avg_rebuilt_steps'] < rows['source edit']['before']['avg_rebuilt_steps']
+    assert rows['source edit']['rebuilt_steps_delta'] < 0
+    assert report['cache_estimate']['steps_saved'] > 0
+
+
+@pytest.mark.parametrize('project', PROJECTS, indirect=True)
+def test_reordering_never_rebuilds_more(project):
+    """On the whole corpus, no kind of edit rebuilds more steps after the reorder pass"""
+    rewritten, _ = rewrite(project, reorder=False)
+    reordered, report = rewrite(project)
+    if not report['applied']:
+        assert reordered == rewritten
+        return
+    for row in report['cache_estimate']['scenarios']:
+        assert row['rebuilt_steps_delta'] <= 0, row['scenario']
+
+
+@pytest.mark.parametrize('project', ['node-express'], indirect=True)
+def test_estimate_measures_against_the_users_dockerfile(project):
+    _, report = rewrite(project)
+    with open(os.path.join(project, 'Dockerfile')) as f:
+        original = f.readlines()
+    reorderer = CacheAwareReorderer(project)
+    row = scenarios(report['cache_estimate'])['source edit']
+    edits = reorderer._edit_scenarios()['source edit']
+    expected = sum(reorderer.simulate(original, edit)['rebuilt_steps'] for edit in edits) / len(edits)
+    assert row['original']['avg_rebuilt_steps'] == round(expected, 2)
+
+
+@pytest.mark.parametrize('project', ['java-maven'], indirect=True)
+def test_prefetch_step_is_opt_in_and_reported_apart(project):
+    lines, report = rewrite(project)
+    assert not any('dependency:go-offline' in line for line in lines)
+    assert not report['applied']
+
+    lines, report = rewrite(project, prefetch_dependencies=True)
+    assert any('dependency:go-offline' in line for line in lines)
+    assert report['moves'] == []
+    assert report['added_steps'] == [{'added': 'RUN mvn -B dependency:go-offline', 'ahead_of': 'COPY . .',
+                                      'for': 'RUN mvn -B package -DskipTests && cp target/app.jar /app.jar'}]
+    # The added step is real work: a manifest edit now reruns it
+    rows = scenarios(report['cache_estimate'])
+    assert rows['manifest edit']['rebuilt_steps_delta'] == 1
+    assert rows['source edit']['rebuilt_steps_delta'] == 0
+
+
+def test_added_manifest_copies_are_not_counted():
+    lines = ['FROM node:22-slim\n', 'WORKDIR /app\n', 'COPY . .\n', 'RUN npm install\n', 'CMD ["node", "server.js"]\n']
+    reordered, report = CacheAwareReorderer().reorder(lines)
+    assert reordered[2] == 'COPY package.json package-lock.json* npm-shrinkwrap.json* /app/\n'
+    reorderer = CacheAwareReorderer()
+    counted = reorderer.simulate(reordered, ['package.json'], uncounted_lines={3})
+    assert counted == {'total_steps': 4, 'rebuilt_steps': 3, 'rebuilt_lines': [4, 5, 6]}
+    assert reorderer.simulate(reordered, ['server.js'], uncounted_lines={3})['rebuilt_steps'] == 2
+    rows = scenarios(report['cache_estimate'])
+    assert rows['manifest edit']['rebuilt_steps_delta'] <= 0
@@ -0,0 +1,125 @@
+import glob
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+from conftest import chat_completion
+from benchmarks.build_benchmark import CORPUS_DIR
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+FLASK = "FROM python:3.11\nWORKDIR /app\nCOPY . .\nRUN pip install flask\nRUN pip install gunicorn\n" \
+        "CMD [\"python\", \"app.py\"]\n"
+
+
+def test_parse_prints_instructions(write_dockerfile, capsys):
+    assert cli.main(['parse', write_dockerfile(FLASK)]) == 0
+    out = capsys.readouterr().out
+    assert 'RUN         pip install flask' in out
+    assert '6 instructions in 1 stage(s)' in out
+
+
+def test_parse_json(write_dockerfile, capsys):
+    assert cli.main(['parse', write_dockerfile(FLASK), '--json']) == 0
+    parsed = json.loads(capsys.readouterr().out)
+    assert [cmd['instruction'] for cmd in parsed['commands']][:2] == ['FROM', 'WORKDIR']
+    assert len(parsed['stages']) == 1
+
+
+def test_parse_of_an_empty_file_fails(write_dockerfile):
+    assert cli.main(['parse', write_dockerfile('# nothing\n')]) == 1
+
+
+def test_rewrite_to_stdout(write_dockerfile, capsys):
+    assert cli.main(['rewrite', write_dockerfile(FLASK), '--output', '-', '--no-multistage', '--no-reorder']) == 0
+    assert 'RUN pip install flask && pip install gunicorn' in capsys.readouterr().out
+
+
+def test_rewrite_writes_next_to_the_dockerfile(write_dockerfile, tmp_path, capsys):
+    path = write_dockerfile(FLASK)
+    assert cli.main(['rewrite', path, '--suggest-dockerignore']) == 0
+    out = capsys.readouterr().out
+    assert f"written to: {path}.optimized" in out
+    assert os.path.exists(f"{path}.optimized")
+    assert (tmp_path / '.dockerignore.suggested').exists()
+
+
+def test_suggest_reports_the_api_answer(write_dockerfile, groq_server, monkeypatch, capsys):
+    groq_server.default = {'status': 200, 'body': chat_completion("1. BASE IMAGE OPTIMIZATION:\nUse python:3.11-slim\n")}
+    monkeypatch.setenv('GROQ_API_KEY', 'test-key')
+    monkeypatch.setenv('GROQ_API_URL', groq_server.url)
+    assert cli.main(['suggest', write_dockerfile(FLASK), '--json', '--always-ai']) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert result['source'] == 'Groq Cloud' and len(groq_server.requests) == 1
+    assert result['suggestions']['base_image'] == ['Use python:3.11-slim']
+
+
+def test_history_and_service_have_their_own_parsers(tmp_path, capsys):
+    assert cli.main(['history', '--db', str(tmp_path / 'missing.db'), 'runs']) == 1
+    assert 'No history' in capsys.readouterr().out
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(['service', '--help'])
+    assert exit_info.value.code == 0
+    assert 'serve' in capsys.readouterr().out
+
+
+def test_unknown_subcommand_is_a_usage_error():
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(['frobnicate'])
+    assert exit_info.value.code == 2
+
+
+def test_cli_smoke_runs_as_a_script():
+    dockerfile = os.path.join(CORPUS_DIR, 'python-flask', 'Dockerfile')
+    completed = subprocess.run([sys.executable, 'cli.py', 'parse', dockerfile], cwd=SRC,
+                               capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    assert 'instructions in' in completed.stdout
+
+
+def test_parse_stays_light():
+    # `parse` is meant for pre-commit hooks: no requests, dotenv or docker SDK
+    code = ("import sys, cli; cli.main(['parse', sys.argv[1]]); "
+            "print(sorted(m for m in ('requests', 'dotenv', 'docker') if m in sys.modules))")
+    completed = subprocess.run([sys.executable, '-c', code, os.path.join(CORPUS_DIR, 'node-express', 'Dockerfile')],
+                               cwd=SRC, capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip().splitlines()[-1] == '[]'
+
+
+@pytest.mark.parametrize('package', ['analysis', 'optimization'])
+def test_lazy_exports_resolve(package):
+    module = importlib.import_module(package)
+    for name in module.__all__:
+        assert getattr(module, name).__name__ == name
+        assert name in vars(module)  # Cached after the first lookup
+    with pytest.raises(AttributeError):
+        getattr(module, 'NoSuchThing')
+
+
+def test_lazy_exports_import_submodules_on_first_use():
+    code = ("import sys, analysis; before = 'analysis.ai_suggestor' in sys.modules; "
+            "analysis.GroqAISuggestor; print(before, 'analysis.ai_suggestor' in sys.modules)")
+    completed = subprocess.run([sys.executable, '-c', code], cwd=SRC, capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.split() == ['False', 'True']
+
+
+def test_package_data_covers_the_corpus_and_catalog():
+    tomllib = pytest.importorskip('tomllib')
+    with open(os.path.join(ROOT, 'pyproject.toml'), 'rb') as f:
+        package_data = tomllib.load(f)['tool']['setuptools']['package-data']
+    for package, required in (('benchmarks', ['corpus', 'data']), ('optimization', ['data'])):
+        package_dir = os.path.join(SRC, package)
+        shipped = {os.path.normpath(path) for pattern in package_data[package]
+                   for path in glob.glob(os.path.join(package_dir, pattern), recursive=True) if os.path.isfile(path)}
+        for directory in required:
+            for dirpath, _, filenames in os.walk(os.path.join(package_dir, directory)):
+                for name in filenames:
+                    if not name.endswith(('.pyc', '.optimized', '.suggested')):
+                        assert os.path.join(dirpath, name) in shipped
@@ -0,0 +1,114 @@
+from analysis.ai_suggestor import GroqAISuggestor
+from analysis.similarity import DEFAULT_SIMILARITY_THRESHOLD, DockerfileClusterIndex
+from conftest import chat_completion
+
+ANSWER = "1. Layer optimization:\nRun the asset build in a separate builder stage\n"
+
+SERVICE = """FROM python:3.11-slim
+WORKDIR /srv
+COPY requirements.txt .
+RUN pip install --no-cache-dir -r requirements.txt
+COPY . .
+RUN make-assets --minify static/
+USER app
+EXPOSE {port}
+CMD ["gunicorn", "--bind", "0.0.0.0:{port}", "app:app"]
+"""
+SETTLED = """FROM python:3.11-slim
+WORKDIR /srv
+COPY requirements.txt .
+RUN pip install --no-cache-dir -r requirements.txt
+COPY . .
+USER app
+CMD ["python", "app.py"]
+"""
+
+
+def _suggestor(groq_server):
+    return GroqAISuggestor(api_key='test-key', api_url=groq_server.url, use_cache=False)
+
+
+def test_cluster_report_counts_real_llm_calls(groq_server, write_dockerfile):
+    groq_server.default = {'status': 200, 'body': chat_completion(ANSWER)}
+    paths = [write_dockerfile(SERVICE.format(port=port), f'svc{port}/Dockerfile') for port in (8000, 8001, 8002)]
+    suggestor = _suggestor(groq_server)
+    results, report = suggestor.get_suggestions_clustered(paths)
+    suggestor.client.close()
+
+    assert report['clusters'] == 1 and report['max_llm_calls'] == 1
+    assert report['llm_calls'] == len(groq_server.requests) == 1
+    assert report['shared_answers'] == 2
+    assert [result.get('shared_from') for result in results] == [None, paths[0], paths[0]]
+
+
+def test_cluster_report_without_llm_calls(groq_server, write_dockerfile):
+    paths = [write_dockerfile(SETTLED.replace('app.py', name), f'{name}/Dockerfile') for name in ('a.py', 'b.py')]
+    suggestor = _suggestor(groq_server)
+    results, report = suggestor.get_suggestions_clustered(paths)
+    suggestor.client.close()
+
+    assert report['llm_calls'] == 0 and not groq_server.requests
+    assert report['shared_answers'] == 0
+    assert all(result['source'] == 'Local rules' for result in results)
+
+
+def test_concurrent_callers_count_only_their_own_calls(groq_server, write_dockerfile):
+    from concurrent.futures import ThreadPoolExecutor
+    groq_server.default = {'status': 200, 'body': chat_completion(ANSWER), 'delay': 0.2}
+    fleets = [[write_dockerfile(SERVICE.format(port=port).replace('/srv', f'/{team}'), f'{team}/svc{port}/Dockerfile')
+               for port in (8000, 8001)] for team in ('alpha', 'beta', 'gamma')]
+    suggestor = _suggestor(groq_server)
+    with ThreadPoolExecutor(max_workers=len(fleets)) as pool:
+        reports = [report for _, report in pool.map(suggestor.get_suggestions_clustered, fleets)]
+    suggestor.client.close()
+
+    assert len(groq_server.requests) == 3
+    assert [report['llm_calls'] for report in reports] == [1, 1, 1]
+
+
+def test_default_threshold_is_shared():
+    assert DockerfileClusterIndex().threshold == DEFAULT_SIMILARITY_THRESHOLD
+    assert GroqAISuggestor.get_suggestions_clustered.__defaults__[0] == DEFAULT_SIMILARITY_THRESHOLD
+
+
+def test_fleet_summary_counts_real_llm_calls(groq_server, write_dockerfile, tmp_path):
+    from orchestration.fleet import FleetOptimizer
+    groq_server.default = {'status': 200, 'body': chat_completion(ANSWER)}
+    for port in (8000, 8001, 8002):
+        write_dockerfile(SERVICE.format(port=port), f'repos/svc{port}/Dockerfile')
+    write_dockerfile(SETTLED, 'repos/settled/Dockerfile')
+    suggestor = _suggestor(groq_server)
+    fleet = FleetOptimizer(str(tmp_path / 'repos'), report_path=str(tmp_path / 'report.jsonl'), parse_workers=1,
+                           ai_concurrency=1, suggestor=suggestor, share_similar=True, resume=False)
+    summary = fleet.run()
+    suggestor.client.close()
+
+    clusters = summary['similarity_clusters']
+    assert summary['files_ok'] == 4
+    assert clusters['llm_calls'] == len(groq_server.requests) == 1
+    assert clusters['shared_answers'] == 2 and clusters['clusters'] == 2
+
+
+def test_members_get_their_own_rule_findings(groq_server, write_dockerfile):
+    from analysis.dockerfile_parser import DockerfileParser
+    from analysis.rule_engine import RuleEngine
+    groq_server.default = {'status': 200, 'body': chat_completion(ANSWER)}
+    representative = write_dockerfile(SERVICE.format(port=8000), 'rep/Dockerfile')
+    # Same service with two extra lines on top: an apt install the representative doesn't have
+    member_text = SERVICE.format(port=8001).replace(
+        'WORKDIR /srv\n', 'WORKDIR /srv\nENV PYTHONUNBUFFERED=1\nRUN apt-get update && apt-get install -y curl\n')
+    member = write_dockerfile(member_text, 'member/Dockerfile')
+    suggestor = _suggestor(groq_server)
+    (rep_result, member_result), report = suggestor.get_suggestions_clustered([representative, member], threshold=0.5)
+    suggestor.client.close()
+
+    assert member_result['shared_from'] == representative and len(groq_server.requests) == 1
+    expected = RuleEngine().analyze(DockerfileParser(member).parse())
+    assert member_result['findings'] == expected['findings'] != rep_result['findings']
+    assert member_result['open_questions'] == expected['open_questions']
+    assert any(finding['line'] == 4 for finding in member_result['findings'])
+    # Only the LLM part is shared: the representative's findings don't leak into the member's text
+    assert 'Run the asset build in a separate builder stage' in member_result['suggestions']
+    assert member_result['llm_suggestions'] == rep_result['llm_suggestions'] == ANSWER
+    assert member_result['calls'] == [] and member_result['tokens_sent'] == 0
+    assert suggestor.tier_report()['shared'] == 1
@@ -0,0 +1,118 @@
+import pytest
+
+from analysis.dockerfile_parser import DockerfileParser
+
+
+def parse(text):
+    return DockerfileParser.from_string(text)
+
+
+def spans(text):
+    return [(cmd['instruction'], cmd['start_line'], cmd['end_line']) for cmd in parse(text).commands]
+
+
+def test_instructions_flags_and_json_arguments():
+    commands = parse('from python:3.11 AS build\n'
+                     'copy --from=build --chown=app:app /src /app\n'
+                     'CMD ["python", "-m", "app"]\n'
+                     'ENTRYPOINT [not json]\n').commands
+    assert [cmd['instruction'] for cmd in commands] == ['FROM', 'COPY', 'CMD', 'ENTRYPOINT']
+    assert commands[1]['flags'] == {'from': 'build', 'chown': 'app:app'}
+    assert commands[1]['value'] == '/src /app'
+    assert commands[2]['json_args'] == ['python', '-m', 'app']
+    assert commands[3]['json_args'] is None
+
+
+def test_repeated_flags_become_a_list():
+    run = parse('FROM a\nRUN --mount=type=cache,target=/a --mount=type=secret,id=x make\n').commands[1]
+    assert run['flags']['mount'] == ['type=cache,target=/a', 'type=secret,id=x']
+    assert run['value'] == 'make'
+
+
+def test_continuations_skip_comments_and_blank_lines():
+    text = 'FROM a\nRUN apt-get update && \\\n    # install\n\n    apt-get install -y curl\nUSER app\n'
+    commands = parse(text).commands
+    assert spans(text) == [('FROM', 1, 1), ('RUN', 2, 5), ('USER', 6, 6)]
+    assert commands[1]['original'] == 'RUN apt-get update && apt-get install -y curl'
+
+
+def test_offsets_cover_the_source_span():
+    text = 'FROM a\nRUN one \\\n  two\nUSER app\n'
+    for cmd in parse(text).commands:
+        assert text[cmd['start_offset']:cmd['end_offset']] == ''.join(text.splitlines(True)[cmd['start_line'] - 1:
+                                                                                            cmd['end_line']])
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('FROM a\n\\\nRUN x\n', [('FROM', 1, 1), ('RUN', 3, 3)]),
+    ('FROM a\nRUN a \\\n  # c\n\n  b \\\n', [('FROM', 1, 1), ('RUN', 2, 5)]),
+    ('FROM a\nRUN a \\\n', [('FROM', 1, 1), ('RUN', 2, 2)]),
+    ('FROM a\nRUN a \\\n\\\n  b\n', [('FROM', 1, 1), ('RUN', 2, 4)]),
+])
+def test_edge_spans(text, expected):
+    assert spans(text) == expected
+
+
+def test_escape_directive_switches_the_continuation_character():
+    text = '# escape=`\nFROM mcr.microsoft.com/windows\nRUN dir C:\\ `\n    && echo done\n'
+    parser = parse(text)
+    assert parser.directives == {'escape': '`'}
+    assert spans(text) == [('FROM', 2, 2), ('RUN', 3, 4)]
+    assert parser.commands[1]['value'] == 'dir C:\\ && echo done'
+
+
+def test_directives_stop_at_the_first_instruction_or_comment():
+    parser = parse('# syntax=docker/dockerfile:1\n# note\n# escape=`\nFROM a\nRUN a \\\n  b\n')
+    assert parser.directives == {'syntax': 'docker/dockerfile:1'}
+    assert spans('# syntax=docker/dockerfile:1\n# note\n# escape=`\nFROM a\nRUN a \\\n  b\n')[-1] == ('RUN', 5, 6)
+
+
+def test_heredocs_keep_their_bodies_and_span():
+    text = ('FROM a\n'
+            'RUN <<EOF\n'
+            'set -e\n'
+            'RUN not an instruction\n'
+            'EOF\n'
+            'COPY <<-one <<two /etc/\n'
+            '\tfirst\n'
+            '\tone\n'
+            'second\n'
+            'two\n'
+            'USER app\n')
+    commands = parse(text).commands
+    assert spans(text) == [('FROM', 1, 1), ('RUN', 2, 5), ('COPY', 6, 10), ('USER', 11, 11)]
+    assert commands[1]['heredocs'] == [{'name': 'EOF', 'body': 'set -e\nRUN not an instruction\n'}]
+    assert commands[2]['heredocs'] == [{'name': 'one', 'body': 'first\n'}, {'name': 'two', 'body': 'second\n'}]
+
+
+def test_unterminated_heredoc_keeps_what_was_read():
+    commands = parse('FROM a\nRUN <<EOF\necho hi\n').commands
+    assert commands[1]['heredocs'] == [{'name': 'EOF', 'body': 'echo hi\n'}]
+
+
+def test_json_form_is_not_a_heredoc():
+    commands = parse('FROM a\nRUN ["sh", "-c", "cat <<EOF"]\nUSER app\n').commands
+    assert [cmd['instruction'] for cmd in commands] == ['FROM', 'RUN', 'USER']
+
+
+def test_stage_membership():
+    parser = parse('ARG BASE=python\n'
+                   'FROM ${BASE}:3.11 as builder\n'
+                   'RUN make\n'
+                   'FROM alpine\n'
+                   'COPY --from=builder /out /out\n')
+    assert [(cmd['instruction'], cmd['stage'], cmd['stage_name']) for cmd in parser.commands] == [
+        ('ARG', None, None), ('FROM', 0, 'builder'), ('RUN', 0, 'builder'), ('FROM', 1, None), ('COPY', 1, None)]
+    assert parser.stages == [
+        {'index': 0, 'name': 'builder', 'base_image': '${BASE}:3.11', 'start_line': 2},
+        {'index': 1, 'name': None, 'base_image': 'alpine', 'start_line': 4}]
+
+
+def test_lines_are_kept_for_reuse():
+    text = 'FROM a\n# comment\nRUN x\n'
+    assert parse(text).lines == text.splitlines(True)
+
+
+def test_missing_file_returns_no_commands(tmp_path, capsys):
+    assert DockerfileParser(str(tmp_path / 'Dockerfile')).parse() == []
+    assert 'was not found' in capsys.readouterr().out
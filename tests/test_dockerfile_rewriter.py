@@ -0,0 +1,58 @@
+from analysis.dockerfile_parser import DockerfileParser
+from optimization.dockerfile_rewriter import DockerfileRewriter
+
+
+def rewrite(text, parser=None):
+    rewriter = DockerfileRewriter('Dockerfile', parser=parser, multistage=False, reorder=False)
+    return ''.join(rewriter.apply_optimizations(text.splitlines(True), ''))
+
+
+def test_consecutive_runs_are_merged_whatever_their_case_or_length():
+    text = ('FROM example/base\n'
+            'run apt-get update\n'
+            'RUN apt-get install -y \\\n'
+            '    curl\n'
+            'RUN apt-get update\n'
+            'USER app\n')
+    assert rewrite(text) == ('FROM example/base\n'
+                             'RUN apt-get update && apt-get install -y curl\n'
+                             'USER app\n')
+
+
+def test_heredoc_bodies_are_not_instructions():
+    text = ('FROM example/base\n'
+            'RUN <<EOF\n'
+            'RUN echo one\n'
+            'RUN echo two\n'
+            'EOF\n'
+            'RUN echo three\n')
+    assert rewrite(text) == text
+
+
+def test_runs_with_flags_json_or_gaps_stay_separate():
+    text = ('FROM example/base\n'
+            'RUN --mount=type=cache,target=/root/.cache pip install -r requirements.txt\n'
+            'RUN ["make", "all"]\n'
+            'RUN make test\n'
+            '# keep this comment\n'
+            'RUN make install\n')
+    assert rewrite(text) == text
+
+
+def test_shared_parse_is_reused():
+    text = 'FROM example/base\nRUN a\nRUN b\n'
+    parser = DockerfileParser.from_string(text)
+    parser.commands[1]['value'] = 'from-shared-parse'
+    assert rewrite(text, parser) == 'FROM example/base\nRUN from-shared-parse && b\n'
+    # A parse of other lines is not trusted
+    assert rewrite(text + 'USER app\n', parser) == 'FROM example/base\nRUN a && b\nUSER app\n'
+
+
+def test_pinned_ubuntu_switches_distribution_only_when_allowed():
+    text = 'FROM ubuntu:22.04\nRUN apt-get update && apt-get install -y curl\n'
+    assert rewrite(text) == text
+    rewriter = DockerfileRewriter('Dockerfile', multistage=False, reorder=False, cross_distribution=True)
+    lines = rewriter.apply_optimizations(text.splitlines(True), '')
+    assert lines[0] == 'FROM debian:bookworm-slim\n'
+    assert rewriter.base_image_changes == [{'original': 'ubuntu:22.04', 'replacement': 'debian:bookworm-slim',
+                                            'bytes_saved': 81684070 - 78433484}]
@@ -0,0 +1,124 @@
+import json
+import os
+import time
+
+import pytest
+
+from orchestration.fake_backends import FakeImageBuilder, FakeSuggestor
+from orchestration.fleet import FleetOptimizer, _batches, discover_dockerfiles, percentile
+
+SERVICE = "FROM python:3.11\nWORKDIR /app\nCOPY . .\nRUN pip install flask\nRUN pip install gunicorn\n" \
+          "CMD [\"python\", \"app.py\"]\n"
+NAMES = ['a', 'b', 'c', 'd', 'e']
+
+
+@pytest.fixture
+def repos(write_dockerfile, tmp_path):
+    for name in NAMES:
+        write_dockerfile(SERVICE, f'repos/{name}/Dockerfile')
+    return tmp_path / 'repos'
+
+
+def fleet(repos, tmp_path, **options):
+    options.setdefault('suggestor', FakeSuggestor())
+    return FleetOptimizer(str(repos), report_path=str(tmp_path / 'report.jsonl'), parse_workers=1, **options)
+
+
+def read_report(tmp_path):
+    with open(tmp_path / 'report.jsonl') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_discovery_finds_dockerfile_variants_and_skips_outputs(write_dockerfile, tmp_path):
+    for name in ('svc/Dockerfile', 'svc/Dockerfile.dev', 'svc/api.Dockerfile', 'svc/Dockerfile.optimized',
+                 'svc/node_modules/pkg/Dockerfile', 'svc/.git/Dockerfile', 'svc/README.txt'):
+        write_dockerfile(SERVICE, name)
+    found = [os.path.relpath(path, tmp_path) for path in discover_dockerfiles(str(tmp_path))]
+    assert found == ['svc/Dockerfile', 'svc/Dockerfile.dev', 'svc/api.Dockerfile']
+
+
+def test_percentile_and_batches():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 99) == 4
+    assert list(_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_fleet_writes_one_record_per_file(repos, tmp_path):
+    suggestor = FakeSuggestor()
+    summary = fleet(repos, tmp_path, suggestor=suggestor, parse_batch_size=2, resume=False).run()
+    assert summary['files_processed'] == summary['files_ok'] == len(NAMES)
+    assert suggestor.calls == len(NAMES)
+    records = read_report(tmp_path)
+    assert sorted(os.path.basename(os.path.dirname(record['path'])) for record in records) == NAMES
+    for record in records:
+        assert record['status'] == 'ok' and record['commands'] == 6
+        assert set(record['timings']) == {'parse', 'ai', 'rewrite'}
+        assert os.path.exists(record['optimized_path'])
+    assert set(summary['stage_latency_seconds']) == {'parse', 'ai', 'rewrite'}
+
+
+def test_fleet_builds_both_variants(repos, tmp_path):
+    summary = fleet(repos, tmp_path, build=True, builder=FakeImageBuilder(), resume=False).run()
+    assert summary['files_ok'] == len(NAMES)
+    for record in read_report(tmp_path):
+        assert record['optimized_size_mb'] <= record['original_size_mb']
+        assert 'build' in record['timings'] and 'improvements' in record
+
+
+def test_failures_are_recorded_not_raised(repos, write_dockerfile, tmp_path):
+    write_dockerfile("# nothing to build\n", 'repos/empty/Dockerfile')
+    summary = fleet(repos, tmp_path, resume=False).run()
+    assert (summary['files_ok'], summary['files_failed']) == (len(NAMES), 1)
+    failed = [record for record in read_report(tmp_path) if record['status'] == 'error']
+    assert failed[0]['error'] == 'No commands found in Dockerfile'
+
+
+def test_records_stream_while_the_fleet_is_running(repos, tmp_path):
+    report_path = tmp_path / 'report.jsonl'
+    seen = {}
+
+    class LastWaits(FakeSuggestor):
+        """Holds the last file until the other files' records are on disk"""
+        def get_suggestions(self, dockerfile_path, commands=None):
+            if os.path.basename(os.path.dirname(dockerfile_path)) == NAMES[-1]:
+                deadline = time.time() + 5
+                while time.time() < deadline:
+                    with open(report_path) as f:
+                        seen['lines'] = sum(1 for _ in f)
+                    if seen['lines'] == len(NAMES) - 1:
+                        break
+                    time.sleep(0.01)
+            return super().get_suggestions(dockerfile_path, commands=commands)
+
+    fleet(repos, tmp_path, suggestor=LastWaits(), ai_concurrency=len(NAMES), resume=False).run()
+    assert seen['lines'] == len(NAMES) - 1
+
+
+def test_resume_skips_completed_files_under_any_root_spelling(repos, tmp_path, monkeypatch):
+    fleet(repos, tmp_path, resume=False).run()
+    monkeypatch.chdir(tmp_path)
+    suggestor = FakeSuggestor()
+    summary = fleet('./repos', tmp_path, suggestor=suggestor).run()
+    assert summary['files_skipped'] == len(NAMES) and summary['files_processed'] == 0
+    assert suggestor.calls == 0
+
+
+def test_resume_retries_failures_and_tolerates_a_partial_line(repos, write_dockerfile, tmp_path):
+    report_path = tmp_path / 'report.jsonl'
+    done = os.path.join(str(repos), 'a', 'Dockerfile')
+    failed = os.path.join(str(repos), 'b', 'Dockerfile')
+    # A crash mid-write leaves a truncated last line without a newline
+    report_path.write_text(json.dumps({'path': done, 'status': 'ok', 'timings': {}}) + '\n' +
+                           json.dumps({'path': failed, 'status': 'error', 'timings': {}}) + '\n' +
+                           '{"path": "' + os.path.join(str(repos), 'c', 'Dockerfile'))
+    suggestor = FakeSuggestor()
+    summary = fleet(repos, tmp_path, suggestor=suggestor).run()
+    assert summary['files_skipped'] == 1 and summary['files_ok'] == len(NAMES) - 1
+    assert suggestor.calls == len(NAMES) - 1
+
+    lines = report_path.read_text().splitlines()
+    # The partial line stays on its own line; every new record parses
+    assert lines[2].startswith('{"path"') and not lines[2].endswith('}')
+    records = [json.loads(line) for line in lines[3:]]
+    assert len(records) == len(NAMES) - 1 and all(record['status'] == 'ok' for record in records)
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from analysis.groq_client import GroqAPIError, GroqClient, TokenBucket, parse_duration
+from conftest import chat_completion
+
+PAYLOAD = {'model': 'test', 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('7.66s', 7.66), ('2m59.56s', 179.56), ('120ms', 0.12), ('1h', 3600.0), ('3', 3.0), (None, None), ('soon', None)
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+
+def test_retries_rate_limited_requests_and_honours_retry_after(groq_server, groq_client):
+    groq_server.respond({'status': 429, 'body': {'error': 'slow down'}, 'headers': {'retry-after': '0.3'}},
+                        {'status': 200, 'body': chat_completion('ok')})
+    start = time.monotonic()
+    result = groq_client.chat(PAYLOAD)
+    assert result['choices'][0]['message']['content'] == 'ok'
+    assert time.monotonic() - start >= 0.3
+    assert groq_client.stats == {'requests': 2, 'retries': 1, 'hedged': 0, 'rate_limited': 1}
+
+
+def test_retries_server_errors_until_success(groq_server, groq_client):
+    groq_server.respond({'status': 503}, {'status': 502}, {'status': 200, 'body': chat_completion('ok')})
+    assert groq_client.chat(PAYLOAD)['choices'][0]['message']['content'] == 'ok'
+    assert groq_client.stats['retries'] == 2
+    assert len(groq_server.requests) == 3
+
+
+def test_gives_up_after_max_retries(groq_server, groq_client):
+    groq_server.respond(*[{'status': 500, 'body': {'error': 'boom'}}] * 10)
+    with pytest.raises(GroqAPIError) as error:
+        groq_client.chat(PAYLOAD)
+    assert error.value.status_code == 500 and error.value.retryable
+    assert len(groq_server.requests) == groq_client.max_retries + 1
+
+
+def test_client_errors_are_not_retried(groq_server, groq_client):
+    groq_server.respond({'status': 400, 'body': {'error': 'bad request'}})
+    with pytest.raises(GroqAPIError) as error:
+        groq_client.chat(PAYLOAD)
+    assert error.value.status_code == 400 and not error.value.retryable
+    assert len(groq_server.requests) == 1
+
+
+def test_timeouts_are_retried(groq_server):
+    groq_server.respond({'status': 200, 'body': chat_completion('late'), 'delay': 1.0},
+                        {'status': 200, 'body': chat_completion('on time')})
+    client = GroqClient('test-key', groq_server.url, timeout=0.2, requests_per_minute=60000, backoff_base=0.01)
+    try:
+        assert client.chat(PAYLOAD)['choices'][0]['message']['content'] == 'on time'
+        assert client.stats['retries'] == 1
+    finally:
+        client.close()
+
+
+def test_hedges_slow_requests(groq_server):
+    groq_server.respond({'status': 200, 'body': chat_completion('slow'), 'delay': 1.5},
+                        {'status': 200, 'body': chat_completion('hedged')})
+    client = GroqClient('test-key', groq_server.url, timeout=5, requests_per_minute=60000, hedge_after=0.1)
+    try:
+        start = time.monotonic()
+        result = client.chat(PAYLOAD)
+        assert result['choices'][0]['message']['content'] == 'hedged'
+        assert time.monotonic() - start < 1.0
+        assert client.stats['hedged'] == 1 and client.stats['requests'] == 2
+    finally:
+        client.close()
+
+
+def test_fast_requests_are_not_hedged(groq_server):
+    client = GroqClient('test-key', groq_server.url, timeout=5, requests_per_minute=60000, hedge_after=0.5)
+    try:
+        client.chat(PAYLOAD)
+        assert client.stats['hedged'] == 0 and len(groq_server.requests) == 1
+    finally:
+        client.close()
+
+
+def test_sends_bearer_token_over_a_pooled_session(groq_server, groq_client):
+    for _ in range(3):
+        groq_client.chat(PAYLOAD)
+    assert all(request['headers']['Authorization'] == 'Bearer test-key' for request in groq_server.requests)
+    assert all(request['payload'] == PAYLOAD for request in groq_server.requests)
+
+
+def test_bucket_waits_out_exhausted_rate_limit():
+    bucket = TokenBucket(rate_per_second=1000)
+    bucket.update_from_headers({'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': '200ms'})
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.2
+
+
+def test_bucket_limits_request_rate():
+    bucket = TokenBucket(rate_per_second=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.14
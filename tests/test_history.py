@@ -0,0 +1,136 @@
+import sqlite3
+
+import pytest
+
+from orchestration.history import DAY, HistoryStore, main, parse_duration, parse_since, run_record
+
+# 2026-01-05 00:00 UTC: a day boundary, so local-time labels would show up as an offset
+DAY_START = 20458 * DAY
+
+
+def pipeline_result(original_mb, optimized_mb):
+    return {
+        'original_image': {'size_mb': original_mb, 'build_time_seconds': 10.0},
+        'optimized_image': {'size_mb': optimized_mb, 'build_time_seconds': 8.0},
+        'ai_suggestions': 'Use a slim base'
+    }
+
+
+def run(image, optimized_mb, recorded_at, stages=None, original_mb=100.0):
+    return run_record('pipeline', image, pipeline_result(original_mb, optimized_mb), timings=stages,
+                      ai_result={'source': 'Local rules', 'suggestions': 'Use a slim base'}, recorded_at=recorded_at)
+
+
+@pytest.fixture
+def store(tmp_path):
+    with HistoryStore(str(tmp_path / 'history.db')) as history:
+        yield history
+
+
+def test_run_record_reads_pipeline_and_fleet_shapes():
+    pipeline = run_record('pipeline', 'Dockerfile', pipeline_result(100.0, 40.0),
+                          timings={'ai': {'duration_seconds': 1.5}})
+    fleet = run_record('fleet', 'Dockerfile', {'original_size_mb': 100.0, 'optimized_size_mb': 40.0},
+                       timings={'ai': 1.5})
+    for record in (pipeline, fleet):
+        assert record['images']['optimized']['size_mb'] == 40.0
+        assert record['stages'] == {'ai': 1.5}
+    assert 'ai_suggestions' not in pipeline['report']
+    assert run_record('fleet', 'Dockerfile', {}, status='error', error='boom')['images'] == {}
+
+
+def test_write_batch_commits_runs_and_rollups_in_one_go(store):
+    store.write_batch([run('a/Dockerfile', 40.0, DAY_START + 60, {'ai': 2.0}),
+                       run('b/Dockerfile', 60.0, DAY_START + 120, {'ai': 4.0})])
+    assert (store.written, store.batches) == (2, 1)
+
+    connection = sqlite3.connect(store.path)
+    try:
+        assert connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0] == 2
+        assert connection.execute('SELECT COUNT(*) FROM image_metrics').fetchone()[0] == 4
+        assert connection.execute(
+            "SELECT size_mb_sum, size_mb_count FROM daily_metrics WHERE variant = 'optimized'").fetchall() \
+            == [(100.0, 2)]
+        assert connection.execute('SELECT seconds_sum, seconds_max, samples FROM daily_stages').fetchall() \
+            == [(6.0, 4.0, 2)]
+    finally:
+        connection.close()
+
+
+def test_background_writer_flushes_queued_runs(tmp_path):
+    history = HistoryStore(str(tmp_path / 'history.db'), batch_size=2)
+    for index in range(5):
+        history.record(run('Dockerfile', 40.0 + index, DAY_START + index))
+    history.flush()
+    assert history.written == 5 and history.errors == 0
+    assert len(history.runs(limit=10)) == 5
+    history.close()
+    # Closing stops the writer; recording again starts a new one
+    history.record(run('Dockerfile', 50.0, DAY_START + 10))
+    history.close()
+    assert history.written == 6
+
+
+def test_daily_rollups_average_across_images_per_utc_day(store):
+    store.write_batch([run('a/Dockerfile', 40.0, DAY_START + 60),
+                       run('b/Dockerfile', 60.0, DAY_START + DAY - 1),
+                       run('a/Dockerfile', 30.0, DAY_START + DAY)])
+    rows = store.trend('size_mb')
+    assert [(row['bucket_start'], row['samples'], row['average']) for row in rows] == [
+        ('2026-01-05T00:00+00:00', 2, 50.0),
+        ('2026-01-06T00:00+00:00', 1, 30.0)
+    ]
+    assert [row['average'] for row in store.trend('size_mb', variant='original')] == [100.0, 100.0]
+    assert store.trend('size_mb', since=DAY_START + DAY)[0]['average'] == 30.0
+
+
+def test_image_trend_buckets_one_image(store):
+    store.write_batch([run('a/Dockerfile', 40.0, DAY_START + 60),
+                       run('a/Dockerfile', 50.0, DAY_START + 120),
+                       run('b/Dockerfile', 90.0, DAY_START + 180)])
+    rows = store.trend('size_mb', image='a/Dockerfile', since=DAY_START)
+    assert rows == [{'bucket_start': '2026-01-05T00:00+00:00', 'samples': 2, 'average': 45.0,
+                     'minimum': 40.0, 'maximum': 50.0}]
+
+
+def test_stage_trend_labels_utc_days(store):
+    store.write_batch([run('a/Dockerfile', 40.0, DAY_START + 60, {'build': 30.0}),
+                       run('a/Dockerfile', 40.0, DAY_START + 120, {'build': 10.0})])
+    assert store.stage_trend('build') == [{'bucket_start': '2026-01-05T00:00+00:00', 'samples': 2,
+                                           'average': 20.0, 'maximum': 30.0}]
+    assert store.stage_trend('ai') == []
+
+
+def test_regressions_rank_growth_between_first_and_latest_run(store):
+    store.write_batch([run('grew/Dockerfile', 40.0, DAY_START), run('grew/Dockerfile', 80.0, DAY_START + 60),
+                       run('doubled/Dockerfile', 10.0, DAY_START), run('doubled/Dockerfile', 30.0, DAY_START + 60),
+                       run('shrank/Dockerfile', 50.0, DAY_START), run('shrank/Dockerfile', 20.0, DAY_START + 60)])
+    by_growth = store.regressions('size_mb')
+    assert [(row['image'], row['growth']) for row in by_growth] == [('grew/Dockerfile', 40.0),
+                                                                    ('doubled/Dockerfile', 20.0)]
+    by_percent = store.regressions('size_mb', by_percent=True)
+    assert [(row['image'], row['growth_percent']) for row in by_percent] == [('doubled/Dockerfile', 200.0),
+                                                                             ('grew/Dockerfile', 100.0)]
+    assert store.regressions('size_mb', since=DAY_START + 30) == []
+
+
+def test_queries_reject_unknown_metrics(store):
+    with pytest.raises(ValueError):
+        store.trend('size_mb; DROP TABLE runs')
+    with pytest.raises(ValueError):
+        store.regressions('size_mb', variant='latest')
+
+
+def test_durations():
+    assert parse_duration('30d') == 30 * DAY
+    assert parse_duration('1.5h') == 5400
+    assert parse_since('2d', now=10 * DAY) == 8 * DAY
+    with pytest.raises(ValueError):
+        parse_duration('soon')
+
+
+def test_cli_prints_runs_and_reports_a_missing_store(store, tmp_path, capsys):
+    store.write_batch([run('a/Dockerfile', 40.0, DAY_START)])
+    assert main(['--db', store.path, 'runs']) == 0
+    assert 'a/Dockerfile' in capsys.readouterr().out
+    assert main(['--db', str(tmp_path / 'missing.db'), 'runs']) == 1
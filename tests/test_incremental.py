@@ -0,0 +1,58 @@
+from analysis.ai_suggestor import GroqAISuggestor
+from analysis.dockerfile_parser import DockerfileParser
+from conftest import chat_completion
+from optimization.build_context import ContextMinimizer
+from orchestration.incremental import UNREADABLE, _hash_file, stage_fingerprints
+
+ANSWER = "1. Layer optimization:\nRun the asset build in a separate builder stage\n"
+
+SERVICE = """FROM python:3.11-slim
+WORKDIR /srv
+COPY requirements.txt .
+RUN pip install --no-cache-dir -r requirements.txt
+COPY . .
+RUN make-assets --minify static/
+USER app
+CMD ["gunicorn", "app:app"]
+"""
+
+
+def test_vanished_file_counts_as_changed(tmp_path):
+    path = tmp_path / 'app.py'
+    path.write_text('print(1)\n')
+    memo = {}
+    assert _hash_file(str(path), memo) not in (None, UNREADABLE)
+    path.unlink()
+    assert _hash_file(str(path), memo) == UNREADABLE
+    assert str(path) not in memo
+
+
+def test_fingerprints_survive_a_file_deleted_after_the_walk(tmp_path, monkeypatch):
+    dockerfile = tmp_path / 'Dockerfile'
+    dockerfile.write_text('FROM alpine\nARG SRC=.\nCOPY $SRC /app\n')
+    (tmp_path / 'kept.txt').write_text('kept\n')
+    commands = DockerfileParser(str(dockerfile)).parse()
+    before = stage_fingerprints(str(dockerfile), commands)
+
+    listed = ContextMinimizer.context_files
+    monkeypatch.setattr(ContextMinimizer, 'context_files', lambda self: listed(self) + ['gone.txt'])
+    after = stage_fingerprints(str(dockerfile), commands)
+    assert after[0]['files'] == before[0]['files'] + 1
+    assert after[0]['fingerprint'] != before[0]['fingerprint']
+
+
+def test_stage_tiers_tell_reuse_from_cache_and_llm(groq_server, write_dockerfile):
+    groq_server.default = {'status': 200, 'body': chat_completion(ANSWER)}
+    path = write_dockerfile(SERVICE)
+    commands = DockerfileParser(path).parse()
+    suggestor = GroqAISuggestor(api_key='test-key', api_url=groq_server.url, use_cache=False)
+
+    fresh = suggestor.get_suggestions_by_stage(path, commands=commands)
+    reused = suggestor.get_suggestions_by_stage(path, commands=commands, reuse=fresh['stage_sections'])
+    suggestor.client.close()
+
+    assert fresh['stage_status'] == {0: 'analyzed'} and not fresh['cached']
+    assert reused['stage_status'] == {0: 'reused'} and not reused['cached'] and reused['calls'] == []
+    report = suggestor.tier_report()
+    assert (report['llm'], report['reused'], report['cache_hits'], report['rules']) == (1, 1, 0, 0)
+    assert report['without_network'] == 1
@@ -0,0 +1,49 @@
+import pytest
+
+from analysis.keyword_matcher import KeywordAutomaton, plural, tokenize
+from analysis.suggestion_parser import KEYWORD_MATCHER
+
+TABLE = {
+    'base_image': {'base image': 3, 'slim': 2},
+    'layer_optimization': {'layer': 2, 'run': 1, 'cache': 1},
+    'dependencies': {'pip': 2, 'dependency': 2, 'package': 1},
+}
+
+
+@pytest.mark.parametrize('word, expected', [
+    ('layer', 'layers'), ('cache', 'caches'), ('patch', 'patches'), ('dependency', 'dependencies'), ('key', 'keys')
+])
+def test_plural(word, expected):
+    assert plural(word) == expected
+
+
+def test_tokenize_matches_token_regex():
+    assert tokenize("Use `pip install --no-cache-dir`, then RUN it!") == [
+        b'use', b'pip', b'install', b'no', b'cache', b'dir', b'then', b'run', b'it']
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Combine RUN steps into one layer', {'layer_optimization': 3}),
+    ('Split dependencies across layers and caches', {'layer_optimization': 3, 'dependencies': 2}),
+    ('Pin every package with pip', {'dependencies': 3}),
+    ('Choose slim base images', {'base_image': 5}),
+    ('pipes and runes are not keywords', {}),
+    ('running pipelines with caching', {}),
+    ('a layer and its layers count once', {'layer_optimization': 2}),
+])
+def test_scores_match_whole_words_and_plurals_only(text, expected):
+    assert KeywordAutomaton(TABLE).scores(text) == expected
+
+
+def test_find_reports_phrases_in_order():
+    matcher = KeywordAutomaton(TABLE)
+    assert [keyword for keyword, _, _ in matcher.find('A slim base image with pip')] == ['slim', 'base image', 'pip']
+
+
+def test_categorize_agrees_with_find():
+    lines = ['Use a slim base image', 'Run pip install with --no-cache-dir', 'Nothing relevant here', 'Add a layer']
+    for line in lines:
+        totals = {}
+        for keyword, category, weight in {match for match in KEYWORD_MATCHER.find(line)}:
+            totals[category] = totals.get(category, 0) + weight
+        assert KEYWORD_MATCHER.scores(line) == totals
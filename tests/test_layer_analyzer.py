@@ -0,0 +1,120 @@
+import io
+import json
+import tarfile
+
+from optimization.layer_analyzer import LayerAnalyzer, clean_created_by
+
+
+def _layer_tar(entries):
+    """A layer tar from {path: bytes | None}; None adds a directory"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as layer:
+        for path, data in entries.items():
+            info = tarfile.TarInfo(path)
+            if data is None:
+                info.type = tarfile.DIRTYPE
+                layer.addfile(info)
+            else:
+                info.size = len(data)
+                layer.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def write_image_tarball(path, layers):
+    """A `docker save`-style archive from [(created_by, {path: bytes | None})], base layer first"""
+    names = [f"layer{index}/layer.tar" for index in range(len(layers))]
+    config = {
+        'rootfs': {'type': 'layers'},
+        'history': [{'created_by': '/bin/sh -c #(nop)  ENV PATH=/usr/bin', 'empty_layer': True}] +
+                   [{'created_by': created_by} for created_by, _ in layers]
+    }
+    members = {'config.json': json.dumps(config).encode(),
+               'manifest.json': json.dumps([{'Config': 'config.json', 'Layers': names}]).encode()}
+    members.update((name, _layer_tar(entries)) for name, (_, entries) in zip(names, layers))
+    with tarfile.open(path, mode='w') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+BASE = ('/bin/sh -c #(nop) ADD file:abc in / ', {'bin/sh': b'\x7fELF' + b'\0' * 996, 'etc/os-release': b'ID=test\n'})
+
+
+def _analyze(tmp_path, layers, commands=None):
+    return LayerAnalyzer().analyze_tarball(write_image_tarball(tmp_path / 'image.tar', layers), commands)
+
+
+def test_whiteouts_charge_deleted_bytes_to_the_adding_layer(tmp_path):
+    result = _analyze(tmp_path, [
+        BASE,
+        ('RUN /bin/sh -c apt-get update # buildkit', {'var/lib/apt/lists/': None,
+                                                      'var/lib/apt/lists/index': b'x' * 5000}),
+        ('RUN /bin/sh -c rm -rf /var/lib/apt/lists/* # buildkit', {'var/lib/apt/lists/.wh.index': b''}),
+    ])
+    assert result['layer_count'] == 3
+    update, cleanup = result['layers'][1], result['layers'][2]
+    assert update['added_bytes'] == 5000 and update['wasted_bytes'] == 5000
+    assert cleanup['deleted_bytes'] == 5000 and cleanup['added_bytes'] == 0
+    assert result['wasted_bytes'] == 5000
+    assert result['top_wasted_layers'] == [{'index': 1, 'instruction': 'RUN apt-get update',
+                                            'dockerfile_line': None, 'wasted_bytes': 5000}]
+
+
+def test_cache_dirs_removed_by_an_opaque_directory(tmp_path):
+    result = _analyze(tmp_path, [
+        BASE,
+        ('RUN /bin/sh -c pip install -r requirements.txt', {'root/.cache/pip/http/a': b'a' * 3000,
+                                                            'root/.cache/pip/http/b': b'b' * 2000,
+                                                            'app/lib.py': b'print(1)\n'}),
+        ('RUN /bin/sh -c rm -rf /root/.cache/pip && mkdir -p /root/.cache/pip',
+         {'root/.cache/pip/': None, 'root/.cache/pip/.wh..wh..opq': b''}),
+    ])
+    install, cleanup = result['layers'][1], result['layers'][2]
+    assert install['wasted_bytes'] == 5000
+    assert cleanup['deleted_bytes'] == 5000
+    assert install['instruction'] == 'RUN pip install -r requirements.txt'
+
+
+def test_overwritten_files_and_duplicates(tmp_path):
+    payload = b'shared-content' * 100
+    result = _analyze(tmp_path, [
+        BASE,
+        ('COPY app /app # buildkit', {'app/config.yml': b'v1' * 500, 'app/vendor/lib.so': payload}),
+        ('COPY config.yml /app/config.yml # buildkit', {'app/config.yml': b'v2' * 10,
+                                                       'opt/lib.so': payload, 'srv/lib.so': payload}),
+    ])
+    first, second = result['layers'][1], result['layers'][2]
+    assert first['wasted_bytes'] == 1000 and second['overwritten_bytes'] == 1000
+    [duplicate] = result['duplicate_files']
+    assert duplicate['copies'] == 3 and duplicate['size_bytes'] == len(payload)
+    assert duplicate['wasted_bytes'] == 2 * len(payload)
+    assert duplicate['paths'] == ['/app/vendor/lib.so', '/opt/lib.so', '/srv/lib.so']
+    assert result['duplicate_bytes'] == 2 * len(payload)
+
+
+def test_layers_map_back_to_dockerfile_lines(tmp_path):
+    commands = [
+        {'instruction': 'FROM', 'original': 'FROM debian:bookworm', 'value': 'debian:bookworm', 'start_line': 1},
+        {'instruction': 'RUN', 'original': 'RUN apt-get update', 'value': 'apt-get update', 'start_line': 2},
+        {'instruction': 'COPY', 'original': 'COPY . /app', 'value': '. /app', 'start_line': 3},
+    ]
+    result = _analyze(tmp_path, [
+        BASE,
+        ('RUN /bin/sh -c apt-get update', {'var/lib/apt/lists/index': b'x' * 10}),
+        ('COPY . /app # buildkit', {'app/main.py': b'print(1)\n'}),
+    ], commands)
+    assert [layer['dockerfile_line'] for layer in result['layers']] == [None, 2, 3]
+
+
+def test_clean_image_reports_no_waste(tmp_path):
+    result = _analyze(tmp_path, [BASE, ('COPY . /app', {'app/main.py': b'print(1)\n'})])
+    assert result['wasted_bytes'] == 0 and result['duplicate_bytes'] == 0 and result['wasted_mb'] == 0
+    assert result['top_wasted_layers'] == [] and result['duplicate_files'] == []
+
+
+def test_clean_created_by():
+    assert clean_created_by('/bin/sh -c #(nop)  CMD ["python3"]') == 'CMD ["python3"]'
+    assert clean_created_by('RUN |1 VERSION=3 /bin/sh -c make install # buildkit') == 'RUN make install'
+    assert clean_created_by(None) == ''
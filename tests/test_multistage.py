@@ -0,0 +1,49 @@
+import pytest
+
+from optimization.base_image_catalog import BaseImageCatalog
+from optimization.multistage import MultiStageSynthesizer
+
+
+def synthesize(text):
+    lines, report = MultiStageSynthesizer(BaseImageCatalog.load()).synthesize(text.splitlines(True))
+    assert report['applied'], report
+    builder, runtime = ''.join(lines).split('# Runtime stage')
+    return builder, runtime, report
+
+
+def test_python_builder_copies_only_the_manifests():
+    builder, runtime, report = synthesize(
+        "FROM python:3.11\nWORKDIR /app\nCOPY . /app\n"
+        "RUN apt-get update && apt-get install -y gcc libpq-dev\n"
+        "RUN pip install --no-cache-dir -r requirements.txt -c constraints/prod.txt\n"
+        'CMD ["python", "app.py"]\n')
+    assert 'COPY requirements.txt /app/\n' in builder
+    assert 'COPY constraints/prod.txt /app/constraints/\n' in builder
+    assert 'COPY . /app' not in builder
+    assert builder.index('COPY requirements.txt') < builder.index('RUN pip install')
+    # The source only arrives in the runtime stage, next to the virtualenv
+    assert 'COPY . /app\n' in runtime and 'COPY --from=builder /opt/venv /opt/venv\n' in runtime
+    assert report['runtime_image'] == 'python:3.11-slim' and report['runtime_packages'] == ['libpq5']
+
+
+def test_python_builder_keeps_copy_flags_and_drops_copies_no_install_reads():
+    builder, _, _ = synthesize(
+        "FROM python:3.12\nWORKDIR /srv\nCOPY --chown=app:app . .\nRUN pip install gunicorn flask\n"
+        'CMD ["gunicorn", "app:app"]\n')
+    assert 'COPY' not in builder.split('WORKDIR /srv')[1]
+
+    builder, _, _ = synthesize(
+        "FROM python:3.12\nWORKDIR /srv\nCOPY --chown=app:app . .\nRUN pip install -r requirements.txt\n"
+        'CMD ["gunicorn", "app:app"]\n')
+    assert 'COPY --chown=app:app requirements.txt /srv/\n' in builder
+
+
+@pytest.mark.parametrize('build_steps', [
+    "RUN pip install .\n",                                      # Installs the project itself
+    "RUN pip install -e /app\n",
+    "RUN ./scripts/prepare.sh && pip install -r requirements.txt\n",  # Unknown step may read sources
+    "RUN pip install -r requirements.txt\nRUN python setup.py build_ext\nRUN pip install /app/dist/*.whl\n",
+])
+def test_python_builder_keeps_the_full_copy_when_sources_are_needed(build_steps):
+    builder, _, _ = synthesize(f"FROM python:3.11\nWORKDIR /app\nCOPY . /app\n{build_steps}CMD [\"python\", \"app.py\"]\n")
+    assert 'COPY . /app\n' in builder
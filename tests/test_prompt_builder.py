@@ -0,0 +1,142 @@
+import pytest
+
+from analysis.dockerfile_parser import DockerfileParser
+from analysis.prompt_builder import PromptBuilder, count_tokens, merge_sections, render_sections
+from analysis.suggestion_parser import SuggestionParser
+
+GO_BUILD = 'RUN go build -trimpath -o /out/server ./cmd/server --tags netgo,osusergo --ldflags "-s -w -extldflags static"'
+
+
+def commands(text):
+    return DockerfileParser.from_string(text).commands
+
+
+def texts(lines):
+    return [text for _, text in lines]
+
+
+@pytest.mark.parametrize('text, tokens', [
+    ('', 0),
+    ('RUN', 1),
+    ('installation', 2),
+    ('12345', 2),
+    ('a-b', 3),
+    ('apt-get install -y curl', 8),
+])
+def test_count_tokens(text, tokens):
+    assert count_tokens(text) == tokens
+
+
+def test_abbreviate_long_package_lists_only():
+    builder = PromptBuilder(max_packages=4)
+    text, abbreviated = builder._abbreviate_packages('apt-get install -y a b c d e f && rm -rf /var/lib/apt/lists/*')
+    assert text == 'apt-get install -y a b … (+4 more) && rm -rf /var/lib/apt/lists/*'
+    assert abbreviated == 4
+    assert builder._abbreviate_packages('pip install a b c d') == ('pip install a b c d', 0)
+    assert builder._abbreviate_packages('echo a b c d e f g') == ('echo a b c d e f g', 0)
+
+
+def test_compact_strips_metadata_and_abbreviates():
+    lines, stats = PromptBuilder(max_packages=4).compact(commands(
+        'FROM debian:12\nLABEL maintainer="ops"\nRUN apt-get update && apt-get install -y a b c d e f\n'))
+    assert texts(lines) == ['FROM debian:12', 'RUN apt-get update && apt-get install -y a b … (+4 more)']
+    assert stats['stripped'] == 1 and stats['packages_abbreviated'] == 4
+
+
+def test_repeats_become_back_references():
+    lines, stats = PromptBuilder().compact(commands(
+        f'FROM golang:1.22 AS build\n{GO_BUILD}\nFROM golang:1.22 AS test\n{GO_BUILD}\n'))
+    # FROM lines define stages, so they are never back-references
+    assert texts(lines) == ['FROM golang:1.22 AS build', GO_BUILD, 'FROM golang:1.22 AS test',
+                            'RUN [repeat from build]']
+    assert stats['deduplicated'] == 1
+
+
+def test_back_references_name_changed_numbers():
+    base = 'RUN curl -fsSL https://downloads.example.com/releases/tool-{}.{}.tar.gz -o /tmp/tool.tar.gz'
+    lines, stats = PromptBuilder().compact(commands(
+        f'FROM debian:12\n{base.format(1, 2)}\n{base.format(1, 3)}\n'))
+    assert texts(lines)[2] == 'RUN [repeat, 2→3]'
+    assert stats['deduplicated'] == 1
+
+
+def test_repeats_with_many_changed_numbers_stay_verbatim():
+    base = 'RUN curl -fsSL https://downloads.example.com/v{}/tool-{}.{}.tar.gz -o /tmp/tool.tar.gz'
+    lines, stats = PromptBuilder().compact(commands(
+        f'FROM debian:12\n{base.format(1, 1, 2)}\n{base.format(2, 3, 4)}\n'))
+    assert texts(lines)[2] == base.format(2, 3, 4)
+    assert stats['deduplicated'] == 0
+
+
+def test_oversized_commands_are_truncated():
+    builder = PromptBuilder(max_command_tokens=20)
+    lines, stats = builder.compact(commands('FROM debian:12\nRUN ' + ' && '.join(f'echo step{n}' for n in range(50))))
+    assert texts(lines)[1].endswith('…[truncated]')
+    assert count_tokens(texts(lines)[1]) <= 20 + count_tokens(' …[truncated]')
+    assert stats['truncated'] == 1
+
+
+def test_small_dockerfiles_are_one_part():
+    plan = PromptBuilder().build(commands('FROM python:3.11\nRUN pip install flask\n'), notes='\nNOTES\n')
+    assert not plan['map_reduce'] and len(plan['parts']) == 1
+    part = plan['parts'][0]
+    assert part['label'] == 'dockerfile'
+    assert 'RUN pip install flask' in part['prompt'] and 'NOTES' in part['prompt']
+    assert part['prompt_tokens'] == count_tokens(part['prompt'])
+
+
+def multistage(stages, runs_per_stage):
+    text = ''
+    for stage in range(stages):
+        text += f'FROM debian:12 AS s{stage}\n'
+        for run in range(runs_per_stage):
+            text += f'RUN ./configure --stage s{stage} --step step{run} --with-feature-{stage}-{run} --prefix /opt/s{stage}\n'
+    return commands(text)
+
+
+def test_over_budget_dockerfiles_split_along_stages():
+    cmds = multistage(stages=4, runs_per_stage=4)
+    plan = PromptBuilder(prompt_budget=400).build(cmds)
+    assert plan['map_reduce'] and len(plan['parts']) > 1
+    # Every stage lands in exactly one part, and each part says which stages it holds
+    assert [part['label'] for part in plan['parts']][0].startswith('stage')
+    joined = '\n'.join(part['prompt'] for part in plan['parts'])
+    for stage in range(4):
+        assert joined.count(f'FROM debian:12 AS s{stage}') == 1
+    for part in plan['parts']:
+        assert 'multi-stage Dockerfile analyzed in parts' in part['prompt'] and '*' in part['prompt']
+
+
+def test_a_stage_over_budget_is_chunked():
+    plan = PromptBuilder(prompt_budget=200).build(multistage(stages=1, runs_per_stage=12))
+    labels = [part['label'] for part in plan['parts']]
+    assert len(labels) > 1
+    assert labels[0] == f'stage s0 (part 1 of {len(labels)})'
+
+
+def test_completion_budget_scales_with_content():
+    builder = PromptBuilder(min_completion_tokens=300, max_completion_tokens=1200, completion_ratio=0.6)
+    assert builder.completion_budget(0) == 300
+    assert builder.completion_budget(500) == 600
+    assert builder.completion_budget(10_000) == 1200
+    small = builder.build(commands('FROM python:3.11\nRUN pip install flask\n'))['parts'][0]
+    large = builder.build(multistage(stages=1, runs_per_stage=10))['parts'][0]
+    assert small['max_tokens'] < large['max_tokens'] <= 1200
+
+
+def test_signature_tracks_prompt_settings():
+    assert PromptBuilder().signature() == PromptBuilder().signature()
+    assert PromptBuilder(max_packages=4).signature() != PromptBuilder().signature()
+
+
+def test_merge_drops_reworded_repeats_and_renders_back():
+    merged = merge_sections([
+        {'base_image': ['Use python:3.11-slim'], 'security': ['Run as a non-root user']},
+        {'base_image': ['use python:3.11-slim.'], 'layer_optimization': ['Combine RUN commands']}
+    ])
+    assert merged['base_image'] == ['Use python:3.11-slim']
+    assert merged['layer_optimization'] == ['Combine RUN commands']
+    parsed = SuggestionParser.parse_ai_response(render_sections(merged))
+    for category in ('base_image', 'layer_optimization', 'security'):
+        assert parsed[category] == merged[category]
+    assert render_sections({}) == ''
@@ -0,0 +1,100 @@
+import json
+import os
+import time
+
+from analysis.ai_suggestor import GroqAISuggestor
+from analysis.dockerfile_parser import DockerfileParser
+from analysis.response_cache import ResponseCache
+from conftest import chat_completion
+
+DOCKERFILE = """FROM python:3.11
+WORKDIR /app
+COPY requirements.txt .
+RUN pip install -r requirements.txt
+COPY . .
+CMD ["python", "app.py"]
+"""
+
+
+def _commands(write_dockerfile, text, name='Dockerfile'):
+    return DockerfileParser(write_dockerfile(text, name)).parse()
+
+
+def test_key_ignores_whitespace_and_instruction_case(write_dockerfile):
+    params = {'model': 'm', 'temperature': 0.3}
+    original = _commands(write_dockerfile, DOCKERFILE)
+    reformatted = _commands(write_dockerfile, DOCKERFILE.replace('WORKDIR /app', 'workdir    /app')
+                            .replace('pip install', 'pip   install'), 'Dockerfile.reformatted')
+    assert ResponseCache.make_key(original, params) == ResponseCache.make_key(reformatted, params)
+
+
+def test_key_changes_with_commands_and_params(write_dockerfile):
+    params = {'model': 'm', 'temperature': 0.3}
+    commands = _commands(write_dockerfile, DOCKERFILE)
+    edited = _commands(write_dockerfile, DOCKERFILE.replace('python:3.11', 'python:3.12'), 'Dockerfile.edited')
+    assert ResponseCache.make_key(commands, params) != ResponseCache.make_key(edited, params)
+    assert ResponseCache.make_key(commands, params) != ResponseCache.make_key(commands, dict(params, temperature=0))
+
+
+def test_get_set_and_stats(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    assert cache.get('ab' * 32) is None
+    cache.set('ab' * 32, 'cached answer')
+    assert cache.get('ab' * 32) == 'cached answer'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['hit_rate']) == (1, 1, 1, 0.5)
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_age_seconds=60)
+    cache.set('cd' * 32, 'old answer')
+    path = cache._entry_path('cd' * 32)
+    with open(path, 'r') as f:
+        entry = json.load(f)
+    with open(path, 'w') as f:
+        json.dump(dict(entry, created_at=entry['created_at'] - 120), f)
+    assert cache.get('cd' * 32) is None
+    assert not os.path.exists(path)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_entries=2)
+    keys = [f"{index:02d}" * 32 for index in range(3)]
+    cache.set(keys[0], 'first')
+    cache.set(keys[1], 'second')
+    old = time.time() - 100
+    os.utime(cache._entry_path(keys[1]), (old, old))
+    os.utime(cache._entry_path(keys[0]), (old + 50, old + 50))
+    cache.set(keys[2], 'third')
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 'first'
+    assert cache.get(keys[2]) == 'third'
+
+
+def test_suggestor_serves_repeat_requests_from_cache(groq_server, write_dockerfile, tmp_path):
+    groq_server.respond({'status': 200, 'body': chat_completion('- Switch to python:3.11-slim as the base image')})
+    path = write_dockerfile(DOCKERFILE)
+    suggestor = GroqAISuggestor(api_key='test-key', api_url=groq_server.url, tiered=False,
+                                cache=ResponseCache(cache_dir=str(tmp_path / 'responses')))
+
+    first = suggestor.get_suggestions(path)
+    second = suggestor.get_suggestions(path)
+
+    assert len(groq_server.requests) == 1
+    assert not first['cached'] and second['cached']
+    assert second['suggestions'] == first['suggestions']
+    assert suggestor.cache.stats()['hits'] == 1
+    suggestor.client.close()
+
+
+def test_suggestor_bypasses_cache_when_disabled(groq_server, write_dockerfile, monkeypatch):
+    monkeypatch.setenv('OPTIMIZER_NO_CACHE', '1')
+    path = write_dockerfile(DOCKERFILE)
+    suggestor = GroqAISuggestor(api_key='test-key', api_url=groq_server.url, tiered=False)
+
+    suggestor.get_suggestions(path)
+    suggestor.get_suggestions(path)
+
+    assert suggestor.cache is None
+    assert len(groq_server.requests) == 2
+    suggestor.client.close()
@@ -0,0 +1,41 @@
+import pytest
+
+from analysis.dockerfile_parser import DockerfileParser
+from analysis.rule_engine import RuleEngine
+
+
+def rules_fired(text):
+    return {finding['rule'] for finding in RuleEngine().analyze(DockerfileParser.from_string(text).commands)['findings']}
+
+
+APT = "apt-get update && apt-get install -y --no-install-recommends curl"
+PIP = "pip install -r requirements.txt"
+
+
+@pytest.mark.parametrize('mounts', [
+    '--mount=type=cache,target=/var/lib/apt',
+    '--mount=type=cache,target=/var/lib/apt/lists,sharing=locked',
+    '--mount=type=cache,target=/var/cache/apt --mount=type=cache,target=/var/lib/apt,sharing=locked',
+    '--mount=type=secret,id=netrc --mount=type=cache,dst=/var/lib/apt/',
+])
+def test_apt_cache_mounts_are_recognized(mounts):
+    assert 'apt-lists-not-cleaned' not in rules_fired(f"FROM debian:bookworm-slim\nRUN {mounts} {APT}\n")
+
+
+@pytest.mark.parametrize('mounts', [
+    '',
+    '--mount=type=bind,target=/var/lib/apt',
+    '--mount=type=cache,target=/var/cache/apt --mount=type=cache,target=/tmp/var/lib/apt',
+    '--mount=type=cache,target=/var/lib/aptitude',
+])
+def test_apt_lists_kept_without_a_cache_mount(mounts):
+    assert 'apt-lists-not-cleaned' in rules_fired(f"FROM debian:bookworm-slim\nRUN {mounts} {APT}\n")
+
+
+@pytest.mark.parametrize('mounts, fired', [
+    ('--mount=type=cache,target=/root/.cache/pip', False),
+    ('--mount=type=bind,source=.,target=/src --mount=type=cache,target=/root/.cache', False),
+    ('--mount=type=bind,source=.,target=/src', True),
+])
+def test_pip_cache_mounts(mounts, fired):
+    assert ('pip-no-cache' in rules_fired(f"FROM python:3.12-slim\nRUN {mounts} {PIP}\n")) == fired
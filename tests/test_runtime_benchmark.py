@@ -0,0 +1,146 @@
+import pytest
+
+from optimization.runtime_benchmark import DockerRuntimeBackend, RuntimeBackend, RuntimeBenchmark
+
+
+class FakeContainer:
+    """A container that runs for `running_polls` reloads and then exits with `exit_code`."""
+
+    def __init__(self, exit_code=0, running_polls=1):
+        self.exit_code = exit_code
+        self.running_polls = running_polls
+        self.status = 'created'
+        self.attrs = {'State': {}, 'NetworkSettings': {'Ports': {}}}
+        self.removed = False
+
+    def reload(self):
+        if self.running_polls > 0:
+            self.running_polls -= 1
+            self.status = 'running'
+        else:
+            self.status = 'exited'
+            self.attrs['State']['ExitCode'] = self.exit_code
+
+    def exec_run(self, command):
+        return 0, b''
+
+    def stats(self, stream, decode):
+        sample = {'memory_stats': {'usage': 8 * 1024 * 1024, 'stats': {}},
+                  'cpu_stats': {'cpu_usage': {'total_usage': 20}, 'system_cpu_usage': 200, 'online_cpus': 1},
+                  'precpu_stats': {'cpu_usage': {'total_usage': 10}, 'system_cpu_usage': 100}}
+        return iter([sample] * 5)
+
+    def remove(self, force):
+        self.removed = True
+
+
+class FakeImage:
+    def __init__(self, images, image_id, tags):
+        self.images = images
+        self.id = image_id
+        self.tags = list(tags)
+
+    def save(self, named):
+        yield f"{self.id}|{','.join(self.tags)}".encode()
+
+    def tag(self, repository, tag=None):
+        name = f"{repository}:{tag}"
+        if name not in self.tags:
+            self.tags.append(name)
+        self.images.by_id[self.id] = self
+        return True
+
+
+class FakeImages:
+    def __init__(self, fail_loads=0):
+        self.by_id = {}
+        self.fail_loads = fail_loads
+        self.loads = 0
+
+    def add(self, image_id, tags):
+        self.by_id[image_id] = FakeImage(self, image_id, tags)
+
+    def get(self, name):
+        for image in self.by_id.values():
+            if name == image.id or name in image.tags:
+                return image
+        raise LookupError(name)
+
+    def remove(self, name):
+        image = self.get(name)
+        image.tags.remove(name)
+        if not image.tags:
+            del self.by_id[image.id]
+
+    def load(self, data):
+        self.loads += 1
+        if self.fail_loads:
+            self.fail_loads -= 1
+            raise RuntimeError('load failed')
+        image_id, tags = data.read().decode().split('|')
+        self.add(image_id, tags.split(','))
+
+
+class FakeClient:
+    def __init__(self, containers=(), fail_loads=0):
+        self.images = FakeImages(fail_loads)
+        self.containers = self
+        self._containers = list(containers)
+
+    def run(self, image, detach, ports):
+        return self._containers.pop(0)
+
+
+def test_one_shot_image_is_ready_once_it_exits_zero():
+    backend = DockerRuntimeBackend(FakeClient())
+    container = FakeContainer(exit_code=0, running_polls=0)
+    assert backend.is_ready(container) is True
+    assert backend.stats(container, 3) == []
+
+
+@pytest.mark.parametrize('exit_code, probe', [(1, None), (0, {'command': 'true'})])
+def test_exit_fails_with_a_probe_or_a_non_zero_code(exit_code, probe):
+    backend = DockerRuntimeBackend(FakeClient())
+    with pytest.raises(RuntimeError, match=f"exited with code {exit_code}"):
+        backend.is_ready(FakeContainer(exit_code=exit_code, running_polls=0), probe)
+
+
+def test_benchmark_reports_one_shot_runs_without_usage():
+    client = FakeClient(containers=[FakeContainer(running_polls=0) for _ in range(3)])
+    client.images.add('sha256:one', ['app:latest'])
+    result = RuntimeBenchmark(DockerRuntimeBackend(client), runs=3).benchmark_image('app:latest')
+    assert result['runs'] == 3 and result['failed_runs'] == 0
+    assert result['ready_seconds'] is not None
+    assert result['memory_mb'] is None and result['cpu_percent'] is None
+    assert result['pull_seconds'] is not None and result['errors'] == []
+
+
+def test_running_container_is_sampled():
+    backend = DockerRuntimeBackend(FakeClient())
+    container = FakeContainer(running_polls=5)
+    assert backend.is_ready(container)
+    readings = backend.stats(container, 2)
+    assert readings == [{'memory_bytes': 8 * 1024 * 1024, 'cpu_percent': 10.0}] * 2
+
+
+@pytest.mark.parametrize('tags', [['app:latest'], ['app:latest', 'localhost:5000/app:1.0']])
+@pytest.mark.parametrize('fail_loads', [0, 1])
+def test_save_and_load_keeps_the_users_tags(fail_loads, tags):
+    client = FakeClient(fail_loads=fail_loads)
+    client.images.add('sha256:one', tags)
+    backend = DockerRuntimeBackend(client)
+    if fail_loads:
+        with pytest.raises(RuntimeError, match='load failed'):
+            backend.pull_seconds('app:latest')
+    else:
+        assert backend.pull_seconds('app:latest') >= 0
+    assert sorted(client.images.get('sha256:one').tags) == tags
+
+
+def test_backends_must_implement_the_interface():
+    class Partial(RuntimeBackend):
+        def start(self, image, probe=None):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
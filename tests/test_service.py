@@ -0,0 +1,185 @@
+import json
+import threading
+
+import pytest
+
+from orchestration.fake_backends import FakeImageBuilder, FakeRuntimeBackend, FakeSuggestor, FakeTrivyScanner
+from orchestration.service import (OptimizerService, QueueFullError, ServiceClient, ServiceHTTPServer,
+                                   UnixServiceHTTPServer, read_jobs)
+
+CONTENT = "FROM python:3.11\nWORKDIR /app\nCOPY . .\nRUN pip install -r requirements.txt\nCMD [\"python\", \"app.py\"]\n"
+
+
+class RecordingSuggestor(FakeSuggestor):
+    """FakeSuggestor that remembers the order Dockerfiles reached it in"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.order = []
+
+    def get_suggestions(self, dockerfile_path, commands=None):
+        with open(dockerfile_path) as f:
+            self.order.append(f.read().splitlines()[-1])
+        return super().get_suggestions(dockerfile_path, commands=commands)
+
+
+def make_service(**kwargs):
+    builder = FakeImageBuilder()
+    kwargs.setdefault('suggestor', FakeSuggestor())
+    return OptimizerService(builder=builder, scanner=FakeTrivyScanner(builder),
+                            runtime_backend=FakeRuntimeBackend(builder, latency_scale=0.01), runtime_runs=2,
+                            **kwargs)
+
+
+def job(label='', **fields):
+    return dict({'content': CONTENT + f"# {label}\n" if label else CONTENT}, **fields)
+
+
+@pytest.fixture
+def http_service():
+    """A service behind a TCP server on a free port; yields (service, client)"""
+    servers = []
+
+    def _start(service, start_workers=True):
+        if start_workers:
+            service.start()
+        server = ServiceHTTPServer(('127.0.0.1', 0), service)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service, start_workers))
+        return ServiceClient('127.0.0.1', server.server_port, timeout=10)
+
+    yield _start
+    for server, service, started in servers:
+        server.shutdown()
+        server.server_close()
+        if started:
+            service.stop(timeout=5)
+
+
+def test_jobs_run_by_priority_then_submission_order():
+    suggestor = RecordingSuggestor()
+    service = make_service(workers=1, suggestor=suggestor)
+    records = [service.submit(job(label, priority=priority)) for label, priority in
+               (('low', 'low'), ('normal-1', 'normal'), ('high', 'high'), ('normal-2', 'normal'), ('urgent', -5))]
+    assert [record['priority'] for record in records] == [2, 1, 0, 1, -5]
+    service.start()
+    service.stop(timeout=10)
+
+    assert suggestor.order == ['# urgent', '# high', '# normal-1', '# normal-2', '# low']
+    assert all(service.get_job(record['id'])['status'] == 'done' for record in records)
+
+
+@pytest.mark.parametrize('bad_job, message', [
+    ({}, "exactly one of"),
+    ({'content': CONTENT, 'dockerfile': 'Dockerfile'}, "exactly one of"),
+    ({'dockerfile': '/no/such/Dockerfile'}, "not found"),
+    ({'content': CONTENT, 'scan': True}, "'scan' requires 'build'"),
+    ({'content': CONTENT, 'priority': 'urgent'}, "Priority must be"),
+    ({'content': CONTENT, 'priority': True}, "Priority must be"),
+    ({'content': CONTENT, 'probe': {'port': '80'}}, "Probe must be"),
+    ({'content': CONTENT, 'colour': 'blue'}, "Unknown job fields: colour"),
+])
+def test_invalid_jobs_are_rejected(bad_job, message):
+    with pytest.raises(ValueError, match=message):
+        make_service().submit(bad_job)
+
+
+def test_full_queue_raises_with_retry_after():
+    service = make_service(max_queue=2)
+    service.submit(job('one'))
+    service.submit(job('two'))
+    with pytest.raises(QueueFullError) as error:
+        service.submit(job('three'))
+    assert error.value.retry_after >= 1
+    assert service.counters == {'submitted': 2, 'rejected': 1, 'completed': 0, 'failed': 0}
+
+
+def test_http_full_queue_returns_429_with_retry_after(http_service):
+    service = make_service(max_queue=1)
+    service.warm()
+    client = http_service(service, start_workers=False)  # Nothing drains the queue
+    status, _, body = client.request('POST', '/jobs', job('first'))
+    assert status == 202 and body['status'] == 'queued'
+    status, headers, body = client.request('POST', '/jobs', job('second'))
+    assert status == 429
+    assert int(headers['Retry-After']) == body['retry_after_seconds'] >= 1
+    # The client's back-off gives up once max_wait is spent
+    assert 'full' in client.submit(job('third'), max_wait=0)['error']
+    client.close()
+
+
+def test_http_errors(http_service):
+    client = http_service(make_service())
+    assert client.request('POST', '/jobs', {'colour': 'blue'})[0] == 400
+    assert client.request('GET', '/jobs/unknown')[0] == 404
+    assert client.request('GET', '/jobs/unknown?wait=soon')[0] == 400
+    assert client.request('GET', '/healthz')[2]['status'] == 'ok'
+    client.close()
+
+
+def test_long_poll_returns_when_the_job_finishes(http_service):
+    client = http_service(make_service(suggestor=FakeSuggestor(latency=0.3)))
+    record = client.submit(job())
+    status, _, first = client.request('GET', f"/jobs/{record['id']}")
+    assert status == 200 and first['status'] in ('queued', 'running')
+    status, _, finished = client.request('GET', f"/jobs/{record['id']}?wait=10")
+    assert finished['status'] == 'done'
+    assert 'job' not in finished
+    assert 'FROM' in finished['result']['optimized_dockerfile']
+    assert set(finished['timings']) >= {'parse', 'ai', 'rewrite'}
+    client.close()
+
+
+def test_unix_socket_client_runs_build_scan_and_runtime_jobs(tmp_path):
+    service = make_service(workers=2).start()
+    socket_path = str(tmp_path / 'optimizer.sock')
+    server = UnixServiceHTTPServer(socket_path, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = ServiceClient(socket_path=socket_path, timeout=10)
+    try:
+        record = client.submit(job(build=True, scan=True, runtime=True, request_id='abc'))
+        assert record['request_id'] == 'abc'
+        finished = client.wait(record['id'], timeout=30)
+        assert finished['status'] == 'done', finished.get('error')
+        result = finished['result']
+        assert result['optimized_size_mb'] < result['original_size_mb']
+        assert result['security_improvements']['vulnerabilities_fixed'] > 0
+        assert set(result['runtime_improvements']) >= {'ready_seconds', 'memory_mb', 'pull_seconds'}
+
+        metrics = client.metrics()
+        assert metrics['jobs'] == {'submitted': 1, 'rejected': 0, 'completed': 1, 'failed': 0}
+        assert metrics['latency_seconds']['run']['count'] == 1
+        assert set(metrics['latency_seconds']['stages']) >= {'parse', 'ai', 'rewrite', 'build', 'scan', 'runtime'}
+        assert metrics['backends']['builder'] == 'FakeImageBuilder'
+        assert metrics['trivy']['scans'] == 2
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+        service.stop(timeout=5)
+
+
+def test_failed_jobs_are_reported_and_counted():
+    service = make_service(suggestor=FakeSuggestor()).start()
+    record = service.submit({'content': '# only a comment\n'})
+    finished = service.get_job(record['id'], wait=10)
+    service.stop(timeout=5)
+    assert finished['status'] == 'error' and 'No commands' in finished['error']
+    assert service.metrics()['jobs']['failed'] == 1
+
+
+def test_finished_jobs_are_evicted_beyond_the_limit():
+    service = make_service(workers=1, max_finished_jobs=2)
+    ids = [service.submit(job(str(index)))['id'] for index in range(4)]
+    service.start()
+    service.stop(timeout=10)
+    assert [service.get_job(job_id) is not None for job_id in ids] == [False, False, True, True]
+
+
+def test_read_jobs_resolves_paths_and_skips_bad_lines(tmp_path, capsys):
+    jobs_file = tmp_path / 'jobs.jsonl'
+    jobs_file.write_text(json.dumps({'dockerfile': 'svc/Dockerfile'}) + '\nnot json\n\n' +
+                         json.dumps({'content': CONTENT, 'priority': 'high'}) + '\n')
+    jobs = list(read_jobs(str(jobs_file)))
+    assert jobs == [{'dockerfile': str(tmp_path / 'svc' / 'Dockerfile')}, {'content': CONTENT, 'priority': 'high'}]
+    assert 'Skipping line 2' in capsys.readouterr().err
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from orchestration.stage_graph import StageGraph
+
+
+def test_stages_receive_their_dependencies_results():
+    graph = StageGraph()
+    graph.add_stage('parse', lambda inputs: ['FROM python'])
+    graph.add_stage('ai', lambda inputs: f"{len(inputs['parse'])} commands", depends_on=['parse'])
+    graph.add_stage('rewrite', lambda inputs: sorted(inputs), depends_on=['parse', 'ai'])
+    outcome = graph.run()
+    assert outcome['results'] == {'parse': ['FROM python'], 'ai': '1 commands', 'rewrite': ['ai', 'parse']}
+    assert outcome['errors'] == {} and outcome['skipped'] == []
+
+
+def test_dependents_start_only_after_their_dependencies_finish():
+    finished = []
+    graph = StageGraph(max_workers=4)
+
+    def stage(name, seconds=0.0):
+        def run(inputs):
+            time.sleep(seconds)
+            assert all(dep in finished for dep in inputs), name
+            finished.append(name)
+        return run
+
+    graph.add_stage('parse', stage('parse', 0.05))
+    graph.add_stage('ai', stage('ai', 0.05), depends_on=['parse'])
+    graph.add_stage('lint', stage('lint'), depends_on=['parse'])
+    graph.add_stage('report', stage('report'), depends_on=['ai', 'lint'])
+    outcome = graph.run()
+    assert outcome['errors'] == {}
+    assert finished[0] == 'parse' and finished[-1] == 'report'
+
+
+def test_independent_stages_run_concurrently():
+    both_running = threading.Barrier(2, timeout=5)
+    graph = StageGraph(max_workers=2)
+    graph.add_stage('build_original', lambda inputs: both_running.wait())
+    graph.add_stage('build_optimized', lambda inputs: both_running.wait())
+    assert graph.run()['errors'] == {}
+
+
+def test_failure_skips_every_dependent_but_not_siblings():
+    graph = StageGraph()
+    graph.add_stage('parse', lambda inputs: 'ok')
+    graph.add_stage('build', lambda inputs: 1 / 0, depends_on=['parse'])
+    graph.add_stage('scan', lambda inputs: 'scanned', depends_on=['build'])
+    graph.add_stage('compare', lambda inputs: 'compared', depends_on=['scan'])
+    graph.add_stage('ai', lambda inputs: 'suggested', depends_on=['parse'])
+    outcome = graph.run()
+    assert outcome['errors'] == {'build': 'division by zero'}
+    assert sorted(outcome['skipped']) == ['compare', 'scan']
+    assert outcome['results'] == {'parse': 'ok', 'ai': 'suggested'}
+    assert 'scan' not in outcome['timings']
+
+
+def test_unknown_dependencies_and_duplicates_are_rejected():
+    graph = StageGraph()
+    graph.add_stage('parse', lambda inputs: None)
+    with pytest.raises(ValueError, match="unknown stage 'ai'"):
+        graph.add_stage('rewrite', lambda inputs: None, depends_on=['ai'])
+    with pytest.raises(ValueError, match='already registered'):
+        graph.add_stage('parse', lambda inputs: None)
+
+
+def test_cycles_cannot_be_registered():
+    # Dependencies must already exist, so a stage can never depend on itself or on a later stage
+    graph = StageGraph()
+    with pytest.raises(ValueError, match="unknown stage 'a'"):
+        graph.add_stage('a', lambda inputs: None, depends_on=['a'])
+    graph.add_stage('a', lambda inputs: None)
+    graph.add_stage('b', lambda inputs: None, depends_on=['a'])
+    with pytest.raises(ValueError, match='already registered'):
+        graph.add_stage('a', lambda inputs: None, depends_on=['b'])
+    assert graph.order == ['a', 'b']
+
+
+def test_timings_cover_every_stage_that_ran():
+    graph = StageGraph(max_workers=2)
+    graph.add_stage('slow_a', lambda inputs: time.sleep(0.1))
+    graph.add_stage('slow_b', lambda inputs: time.sleep(0.1))
+    graph.add_stage('after', lambda inputs: None, depends_on=['slow_a', 'slow_b'])
+    outcome = graph.run()
+    timings = outcome['timings']
+    assert set(timings) == {'slow_a', 'slow_b', 'after'}
+    assert timings['slow_a']['duration_seconds'] >= 0.09
+    assert timings['after']['start_offset_seconds'] >= timings['slow_a']['duration_seconds'] - 0.01
+    # Parallel stages overlap, so the wall time is below the sum of stage times
+    assert outcome['serial_time_seconds'] >= 0.18
+    assert outcome['total_time_seconds'] < outcome['serial_time_seconds']
+
+
+def test_empty_graph_runs():
+    outcome = StageGraph().run()
+    assert outcome['results'] == {} and outcome['timings'] == {} and outcome['serial_time_seconds'] == 0
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from analysis.ai_suggestor import GroqAISuggestor
+from analysis.groq_client import GroqAPIError
+from analysis.suggestion_parser import IncrementalSuggestionParser, SuggestionParser
+from conftest import sse_events
+
+ANSWER = """1. Base image optimization:
+Switch to python:3.11-slim to reduce the image size
+```dockerfile
+FROM python:3.11-slim
+RUN pip install --no-cache-dir -r requirements.txt
+```
+2. Security:
+Run the application as a non-root user
+Remove compilers that are not needed at runtime
+"""
+
+PAYLOAD = {'model': 'test', 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+
+def _split(text, size):
+    return [text[index:index + size] for index in range(0, len(text), size)]
+
+
+def test_stream_yields_deltas_in_order(groq_server, groq_client):
+    groq_server.respond({'status': 200, 'chunks': sse_events(['Use ', 'a slim ', 'base image'])})
+    assert list(groq_client.stream_chat(PAYLOAD)) == ['Use ', 'a slim ', 'base image']
+    assert groq_server.requests[0]['payload']['stream'] is True
+
+
+def test_stream_reassembles_events_split_across_chunks(groq_server, groq_client):
+    body = ''.join(sse_events(['first ', 'second ', 'third']) + [': trailing comment\n\n'])
+    groq_server.respond({'status': 200, 'chunks': _split(body, 7), 'chunk_delay': 0.001})
+    assert ''.join(groq_client.stream_chat(PAYLOAD)) == 'first second third'
+
+
+def test_stream_skips_malformed_events_and_stops_at_done(groq_server, groq_client):
+    events = ['data: {not json}\n\n', f"data: {json.dumps({'choices': [{'delta': {}}]})}\n\n"]
+    events += sse_events(['kept']) + [f"data: {json.dumps({'choices': [{'delta': {'content': 'dropped'}}]})}\n\n"]
+    groq_server.respond({'status': 200, 'chunks': events})
+    assert list(groq_client.stream_chat(PAYLOAD)) == ['kept']
+
+
+def test_stream_retries_before_the_first_byte(groq_server, groq_client):
+    groq_server.respond({'status': 503, 'body': {'error': 'unavailable'}},
+                        {'status': 429, 'body': {'error': 'slow down'}, 'headers': {'retry-after': '0.05'}},
+                        {'status': 200, 'chunks': sse_events(['ok'])})
+    assert list(groq_client.stream_chat(PAYLOAD)) == ['ok']
+    assert groq_client.stats['retries'] == 2 and groq_client.stats['rate_limited'] == 1
+
+
+def test_stream_raises_non_retryable_errors(groq_server, groq_client):
+    groq_server.respond({'status': 401, 'body': {'error': 'invalid key'}})
+    with pytest.raises(GroqAPIError) as error:
+        list(groq_client.stream_chat(PAYLOAD))
+    assert error.value.status_code == 401
+
+
+@pytest.mark.parametrize('size', [1, 3, 17, len(ANSWER)])
+def test_incremental_parser_matches_whole_text_parse(size):
+    parser = IncrementalSuggestionParser()
+    emitted = []
+    for chunk in _split(ANSWER, size):
+        emitted.extend(parser.feed(chunk))
+    emitted.extend(parser.close())
+    expected = SuggestionParser.parse_ai_response(ANSWER)
+    assert parser.sections == expected
+    assert sorted(emitted) == sorted((category, text) for category, items in expected.items() for text in items)
+
+
+def test_incremental_parser_drops_code_blocks():
+    sections = SuggestionParser.parse_ai_response(ANSWER)
+    suggestions = [text for items in sections.values() for text in items]
+    assert 'Run the application as a non-root user' in sections['security']
+    assert not any('no-cache-dir' in text or 'FROM' in text for text in suggestions)
+
+
+def test_suggestor_streams_suggestions_as_lines_complete(groq_server, write_dockerfile):
+    groq_server.respond({'status': 200, 'chunks': sse_events(_split(ANSWER, 5)), 'chunk_delay': 0.001})
+    path = write_dockerfile("FROM python:3.11\nCOPY . /app\nRUN pip install -r /app/requirements.txt\n")
+    suggestor = GroqAISuggestor(api_key='test-key', api_url=groq_server.url, tiered=False, use_cache=False)
+    seen = []
+    result = suggestor.get_suggestions_stream(path, on_suggestion=lambda category, text: seen.append((category, text)))
+    suggestor.client.close()
+
+    assert result['suggestions'] == ANSWER
+    assert result['structured'] == SuggestionParser.parse_ai_response(ANSWER)
+    assert seen and all(text in result['structured'][category] for category, text in seen)
+    assert 0 < result['time_to_first_token'] <= result['time_to_first_suggestion'] <= result['total_time']
@@ -0,0 +1,111 @@
+import json
+import os
+
+import pytest
+
+from security.trivy_scanner import TrivyScanner
+
+TRIVY_DATA = os.path.join(os.path.dirname(__file__), 'data', 'trivy')
+FAKE_TRIVY = os.path.join(TRIVY_DATA, 'fake_trivy')
+BASE_LAYERS = ['sha256:' + 'a1' * 32, 'sha256:' + 'b2' * 32]
+LAYERS = {
+    'app:original': BASE_LAYERS + ['sha256:' + 'c3' * 32],
+    'app:optimized': BASE_LAYERS + ['sha256:' + 'd4' * 32],
+    'app:retagged': BASE_LAYERS + ['sha256:' + 'c3' * 32],
+}
+
+
+def recorded_report(name):
+    with open(os.path.join(TRIVY_DATA, name), 'r') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def trivy_log(tmp_path, monkeypatch):
+    """Path of the file the fake trivy appends each invocation's arguments to"""
+    log = tmp_path / 'trivy-calls.jsonl'
+    monkeypatch.setenv('FAKE_TRIVY_LOG', str(log))
+
+    def calls():
+        return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+    return calls
+
+
+def _scanner(**kwargs):
+    return TrivyScanner(trivy_path=FAKE_TRIVY, digest_resolver=LAYERS.get, **kwargs)
+
+
+def test_scan_returns_the_trivy_report(trivy_log, isolated_cache_dir):
+    scan = _scanner().scan_image('app:original')
+    assert scan == recorded_report('original.json')
+    [args] = trivy_log()
+    assert args == ['image', '--format', 'json', '--cache-dir', os.path.join(isolated_cache_dir, 'trivy-layers'),
+                    'app:original']
+
+
+def test_cache_hits_by_layer_digest(trivy_log):
+    scanner = _scanner()
+    first = scanner.scan_image('app:original')
+    again = scanner.scan_image('app:original')
+    retagged = scanner.scan_image('app:retagged')
+    assert len(trivy_log()) == 1 and scanner.stats == {'scans': 1, 'cache_hits': 2}
+    assert again == dict(first, cached=True) and retagged['cached']
+    # A fresh scanner sees the same on-disk cache
+    assert _scanner().scan_image('app:retagged')['cached'] and len(trivy_log()) == 1
+
+
+def test_cache_misses_when_a_layer_changes(trivy_log):
+    scanner = _scanner()
+    scanner.scan_image('app:original')
+    scan = scanner.scan_image('app:optimized')
+    assert 'cached' not in scan and scan == recorded_report('optimized.json')
+    assert len(trivy_log()) == 2 and scanner.stats['cache_hits'] == 0
+
+
+def test_unknown_layers_and_disabled_cache_always_scan(trivy_log, monkeypatch):
+    scanner = TrivyScanner(trivy_path=FAKE_TRIVY, digest_resolver=lambda name: None)
+    scanner.scan_image('app:original')
+    scanner.scan_image('app:original')
+    monkeypatch.setenv('OPTIMIZER_NO_CACHE', '1')
+    uncached = _scanner()
+    uncached.scan_image('app:original')
+    uncached.scan_image('app:original')
+    assert len(trivy_log()) == 4 and uncached.cache is None
+
+
+def test_failed_scans_are_not_cached(trivy_log, monkeypatch):
+    monkeypatch.setenv('FAKE_TRIVY_EXIT', '1')
+    scanner = _scanner()
+    assert 'unable to find the specified image' in scanner.scan_image('app:original')['error']
+    monkeypatch.delenv('FAKE_TRIVY_EXIT')
+    assert scanner.scan_image('app:original') == recorded_report('original.json')
+    assert len(trivy_log()) == 2
+
+
+def test_timeout(trivy_log, monkeypatch):
+    monkeypatch.setenv('FAKE_TRIVY_SLEEP', '5')
+    assert _scanner(timeout=0.5).scan_image('app:original') == {'error': 'Trivy scan timed out'}
+
+
+def test_missing_binary(tmp_path, monkeypatch):
+    monkeypatch.setenv('TRIVY_PATH', str(tmp_path / 'no-such-trivy'))
+    scan = TrivyScanner(digest_resolver=LAYERS.get).scan_image('app:original')
+    assert scan['error'].startswith('Trivy executable not found') and 'no-such-trivy' in scan['error']
+
+
+def test_scan_images_scans_identical_layers_once(trivy_log):
+    results = _scanner().scan_images(['app:original', 'app:retagged', 'app:optimized'])
+    assert len(trivy_log()) == 2
+    assert results['app:original'] is results['app:retagged']
+    assert results['app:optimized'] == recorded_report('optimized.json')
+
+
+def test_compare_vulnerabilities_on_recorded_reports():
+    diff = TrivyScanner.compare_vulnerabilities(recorded_report('original.json'), recorded_report('optimized.json'))
+    assert diff['original_vulnerabilities'] == 5 and diff['optimized_vulnerabilities'] == 3
+    assert [vuln['id'] for vuln in diff['fixed']] == ['CVE-2024-2961', 'CVE-2022-40897', 'CVE-2024-35195']
+    assert diff['introduced'] == [{'id': 'CVE-2024-6345', 'package': 'setuptools', 'severity': 'HIGH',
+                                   'target': 'Python'}]
+    assert diff['fixed_by_severity']['HIGH'] == 1 and diff['fixed_by_severity']['MEDIUM'] == 2
+    assert diff['vulnerabilities_unchanged'] == 2
+    assert TrivyScanner.compare_vulnerabilities({'error': 'boom'}, {}) == {'error': 'boom'}